@@ -0,0 +1 @@
+# Este archivo indica que el directorio es un paquete Python.
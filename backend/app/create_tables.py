@@ -1,13 +1,46 @@
 from backend.app.db import Base, engine  # Importar la base y el motor de la base de datos
 from backend.app.models import User, SP500Data, SP500IntradayData  # Importar todos los modelos definidos
+from backend.app.modules.intraday_storage import (
+    create_intraday_table, migrate_datetimes_to_utc, migrate_to_partitioned, upgrade_intraday_table,
+)
 
 def create_missing_tables():
     """
     Crea todas las tablas definidas en los modelos si no existen en la base de datos.
     """
     print("Verificando y creando tablas faltantes...")
+    # La tabla intradía se crea primero: en Postgres lleva particionado mensual
+    create_intraday_table(engine)
     Base.metadata.create_all(bind=engine)
     print("Tablas faltantes creadas con éxito.")
 
+def create_missing_indexes():
+    """
+    Crea los índices de los modelos que falten en tablas ya existentes.
+    `create_all` no modifica tablas existentes, por lo que las claves únicas nuevas
+    (p. ej. `uq_sp500_data_symbol_date`) deben crearse aparte. Si la tabla tiene
+    filas duplicadas para la clave, la creación falla y hay que depurarlas antes.
+    En Postgres, una tabla intradía antigua sin particionar se migra al esquema particionado.
+    """
+    print("Verificando y creando índices faltantes...")
+    upgrade_intraday_table(engine)
+    migrate_to_partitioned(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    print("Índices faltantes creados con éxito.")
+
+def migrate_intraday_datetimes():
+    """
+    Convierte a UTC las velas intradía guardadas en hora local de Nueva York por la carga
+    anterior. Debe ejecutarse antes de la primera sincronización incremental; repetirla no
+    modifica nada.
+    """
+    print("Convirtiendo fechas intradía antiguas a UTC...")
+    converted, deleted = migrate_datetimes_to_utc(engine)
+    print(f"Fechas intradía migradas: {converted} velas convertidas, {deleted} borradas.")
+
 if __name__ == "__main__":
     create_missing_tables()
+    create_missing_indexes()
+    migrate_intraday_datetimes()
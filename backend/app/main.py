@@ -1,13 +1,14 @@
 # ~/project/backend/app/main.py
 
 from fastapi import FastAPI
-from .routes import users  # Importar las rutas de usuarios
+from .routes import screener, users  # Importar las rutas
 
 # Crear instancia de la aplicación
 app = FastAPI()
 
 # Incluir rutas
 app.include_router(users.router)
+app.include_router(screener.router)
 
 @app.get("/")
 def read_root():
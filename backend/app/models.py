@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index, Text
 from backend.app.db import Base
 
 class User(Base):
@@ -17,6 +17,10 @@ class SP500Data(Base):
     Modelo para almacenar datos diarios de las empresas del S&P 500.
     """
     __tablename__ = "sp500_data"
+    __table_args__ = (
+        # Clave única usada por las cargas masivas (INSERT ... ON CONFLICT)
+        Index("uq_sp500_data_symbol_date", "symbol", "date", unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String, nullable=False, index=True)
     name = Column(String, nullable=False)
@@ -34,10 +38,15 @@ class SP500IntradayData(Base):
     Modelo para almacenar datos intradía de las empresas del S&P 500.
     """
     __tablename__ = "sp500_intraday_data"
+    __table_args__ = (
+        # Clave única compuesta: evita velas duplicadas y sirve las consultas por rango de fechas
+        Index("uq_sp500_intraday_symbol_timeframe_datetime", "symbol", "timeframe", "datetime", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String, index=True, nullable=False)
-    datetime = Column(DateTime, nullable=False)  # Confirmado que este atributo existe
+    timeframe = Column(String, nullable=False, default="5Min", server_default="5Min")  # 1Min, 3Min, 5Min...
+    datetime = Column(DateTime, nullable=False)  # Inicio de la vela en UTC (sin zona horaria)
     open = Column(Float, nullable=False)
     high = Column(Float, nullable=False)
     low = Column(Float, nullable=False)
@@ -47,4 +56,76 @@ class SP500IntradayData(Base):
     vwap = Column(Float, nullable=True)  # Nueva columna: precio promedio ponderado por volumen
 
 
+class IndicatorState(Base):
+    """
+    Estado serializado de los indicadores incrementales de un símbolo y temporalidad.
+    Permite reanudar la actualización en vivo sin recalcular todo el histórico.
+    """
+    __tablename__ = "indicator_state"
+    __table_args__ = (
+        Index("uq_indicator_state_symbol_timeframe", "symbol", "timeframe", unique=True),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, nullable=False)
+    timeframe = Column(String, nullable=False)
+    last_datetime = Column(DateTime, nullable=False)  # Última vela aplicada (UTC sin zona horaria)
+    state = Column(Text, nullable=False)  # JSON con el estado de cada indicador
+    updated_at = Column(DateTime, nullable=False)
+
+
+class ChartPattern(Base):
+    """
+    Patrón de gráfico detectado sobre los pivotes de un símbolo (triángulos, banderas,
+    rectángulos, hombro-cabeza-hombro). `timeframe` es la temporalidad intradía o `1Day`.
+    """
+    __tablename__ = "chart_patterns"
+    __table_args__ = (
+        Index("uq_chart_patterns_symbol_timeframe_pattern_end", "symbol", "timeframe", "pattern", "end_datetime",
+              unique=True),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, nullable=False)
+    timeframe = Column(String, nullable=False)
+    pattern = Column(String, nullable=False)
+    start_datetime = Column(DateTime, nullable=False)  # Primer pivote del patrón (UTC sin zona horaria)
+    end_datetime = Column(DateTime, nullable=False)  # Último pivote del patrón
+    confirmed_at = Column(DateTime, nullable=False)  # Vela que confirmó el último pivote
+    pivots = Column(Text, nullable=False)  # JSON con [fecha, precio] de cada pivote
+
 
+class ChartPatternState(Base):
+    """
+    Estado serializado del detector de patrones de gráfico (ATR, zig-zag y últimos pivotes)
+    de un símbolo y temporalidad, para examinar solo los pivotes nuevos.
+    """
+    __tablename__ = "chart_pattern_state"
+    __table_args__ = (
+        Index("uq_chart_pattern_state_symbol_timeframe", "symbol", "timeframe", unique=True),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, nullable=False)
+    timeframe = Column(String, nullable=False)
+    last_datetime = Column(DateTime, nullable=False)  # Última vela aplicada (UTC sin zona horaria)
+    state = Column(Text, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class MarketRegime(Base):
+    """
+    Régimen de mercado de cada día de sesión, por símbolo y para el índice equiponderado del
+    S&P 500, como máscara de bits (volatilidad, tendencia, hueco y comportamiento de apertura).
+    """
+    __tablename__ = "market_regimes"
+    __table_args__ = (
+        Index("uq_market_regimes_symbol_date", "symbol", "date", unique=True),
+        # Selección de días por régimen sin recorrer precios: WHERE date BETWEEN ... AND flags & :bits
+        Index("ix_market_regimes_date_flags", "date", "flags"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    flags = Column(Integer, nullable=False)  # Bits de `market_regimes.REGIME_FLAGS`
+    realized_vol = Column(Float, nullable=True)  # Volatilidad realizada anualizada
+    trend = Column(Float, nullable=True)  # Cierre sobre la media larga, menos 1
+    gap = Column(Float, nullable=True)  # Apertura sobre el cierre anterior, menos 1
+    open_return = Column(Float, nullable=True)  # Rentabilidad de los primeros minutos de sesión (velas intradía)
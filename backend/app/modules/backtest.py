@@ -0,0 +1,188 @@
+import logging
+import time
+import numpy as np
+import pandas as pd
+from backend.app.modules.bar_store import BarStore
+from backend.app.modules.performance_metrics import (
+    EQUITY_METRIC_COLUMNS, TRADE_METRIC_COLUMNS, TRADING_DAYS, compute_metrics as compute_run_metrics, periods_per_year,
+)
+
+# Backtesting vectorizado sobre matrices ejecuciones × velas (una fila por combinación de
+# símbolo y parámetros). Convenciones:
+#   - Las señales se evalúan al cierre de la vela t y se ejecutan en la apertura de la vela
+#     t + 1 (sin `open_`, al cierre de la vela de la señal). Una salida prevalece sobre una
+#     entrada en la misma vela.
+#   - Cada operación invierte todo el capital disponible (interés compuesto); la comisión es
+#     una fracción del nominal por lado y el deslizamiento empeora el precio de cada ejecución.
+#   - Las posiciones abiertas al final se cierran al último cierre (con costes).
+#   - Las velas sin dato (NaN) repiten el último cierre: no mueven el capital.
+
+DEFAULT_COMMISSION = 0.0005  # Fracción del nominal por ejecución
+DEFAULT_SLIPPAGE = 0.0005  # Fracción del precio por ejecución
+DEFAULT_INITIAL_CAPITAL = 10000.0
+TRADE_COLUMNS = ["run", "entry_index", "exit_index", "entry_price", "exit_price", "bars_held", "pnl", "return"]
+METRIC_COLUMNS = EQUITY_METRIC_COLUMNS + TRADE_METRIC_COLUMNS
+
+
+def _as_2d(values, dtype=np.float64):
+    array = np.asarray(values, dtype=dtype)
+    return array[None, :] if array.ndim == 1 else array
+
+
+def _forward_fill(x):
+    """Rellena los NaN con el último valor válido de la fila (los NaN iniciales se mantienen)."""
+    positions = np.where(np.isnan(x), 0, np.arange(x.shape[1]))
+    np.maximum.accumulate(positions, axis=1, out=positions)
+    return np.take_along_axis(x, positions, axis=1)
+
+
+def _previous(x, fill):
+    result = np.empty_like(x)
+    result[:, 0] = fill
+    result[:, 1:] = x[:, :-1]
+    return result
+
+
+def cross_above(a, b):
+    """True en las velas en que `a` cruza por encima de `b`."""
+    a, b = _as_2d(a), np.broadcast_to(_as_2d(b), np.shape(_as_2d(a)))
+    return (a > b) & (_previous(a, np.nan) <= _previous(b, np.nan))
+
+
+def cross_below(a, b):
+    """True en las velas en que `a` cruza por debajo de `b`."""
+    a, b = _as_2d(a), np.broadcast_to(_as_2d(b), np.shape(_as_2d(a)))
+    return (a < b) & (_previous(a, np.nan) >= _previous(b, np.nan))
+
+
+def positions_from_signals(entries, exits):
+    """
+    Posición objetivo tras cada vela (True = dentro) a partir de señales de entrada y salida:
+    se mantiene desde una entrada hasta la siguiente salida.
+    """
+    entries, exits = _as_2d(entries, bool), _as_2d(exits, bool)
+    events = np.where(entries | exits, np.arange(entries.shape[1]), -1)
+    np.maximum.accumulate(events, axis=1, out=events)
+    state = np.take_along_axis(entries & ~exits, np.maximum(events, 0), axis=1)
+    return state & (events >= 0)
+
+
+class BacktestResult:
+    """
+    Resultado de un backtest por lotes: capital por vela (`equity`, ejecuciones × velas),
+    posición mantenida en cada vela (`positions`), operaciones (`trades`, ordenadas por
+    ejecución) y métricas por ejecución (`metrics`).
+    """
+    def __init__(self, equity, positions, trades, metrics, index=None):
+        self.equity = equity
+        self.positions = positions
+        self.trades = trades
+        self.metrics = metrics
+        self.index = index
+
+    def trades_with_times(self):
+        """Las operaciones con las fechas de entrada y salida (requiere `index`)."""
+        trades = self.trades.copy()
+        trades["entry_datetime"] = self.index[trades["entry_index"].to_numpy()]
+        trades["exit_datetime"] = self.index[trades["exit_index"].to_numpy()]
+        return trades
+
+
+def run_backtest(close, entries, exits, open_=None, rows=None, direction=1, commission=DEFAULT_COMMISSION,
+                 slippage=DEFAULT_SLIPPAGE, initial_capital=DEFAULT_INITIAL_CAPITAL, index=None,
+                 periods=TRADING_DAYS):
+    """
+    Simula todas las ejecuciones a la vez. `entries`/`exits` son matrices booleanas
+    ejecuciones × velas; `close` y `open_` son símbolos × velas. `rows[i]` indica la fila de
+    precios de la ejecución i, de modo que varias combinaciones de parámetros comparten los
+    precios de un símbolo (por defecto, una ejecución por fila de precios).
+    `direction` es 1 (largo) o -1 (corto). `periods` (velas por año) anualiza Sharpe y Sortino.
+    """
+    started = time.perf_counter()
+    close = _forward_fill(_as_2d(close))
+    open_ = _previous(close, np.nan) if open_ is None else _as_2d(open_)
+    open_ = np.where(np.isnan(open_), _previous(close, np.nan), open_)
+    if rows is not None:
+        close, open_ = close[rows], open_[rows]
+
+    valid = ~np.isnan(close)
+    held = positions_from_signals(_as_2d(entries, bool) & valid, _as_2d(exits, bool))
+    held = _previous(held, False) & valid
+    was_held = _previous(held, False)
+
+    fill_in = open_ * (1 + direction * slippage)
+    fill_out = open_ * (1 - direction * slippage)
+    entering, leaving = held & ~was_held, ~held & was_held
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Valor de la operación en curso por unidad de capital invertido, relativo al precio de entrada
+        entry_fill = _forward_fill(np.where(entering, fill_in, np.nan))
+        value = np.where(held, 1 + direction * (close / entry_fill - 1), np.nan)
+        previous_value = _previous(value, np.nan)
+        exit_value = 1 + direction * (fill_out / _previous(entry_fill, np.nan) - 1)
+        factor = np.where(held & was_held, value / previous_value, 1.0)
+        factor = np.where(entering, (1 - commission) * value, factor)
+        factor = np.where(leaving, (1 - commission) * exit_value / previous_value, factor)
+        # Cierre forzoso de las posiciones abiertas en la última vela
+        final_value = 1 + direction * (close[:, -1] * (1 - direction * slippage) / entry_fill[:, -1] - 1)
+        factor[:, -1] = np.where(held[:, -1], factor[:, -1] * (1 - commission) * final_value / value[:, -1],
+                                 factor[:, -1])
+    equity = initial_capital * np.cumprod(factor, axis=1)
+
+    trades = _extract_trades(held, equity, fill_in, fill_out, close, direction, slippage, initial_capital)
+    metrics = compute_metrics(equity, trades, initial_capital, periods)
+    logging.info(f"Backtest de {equity.shape[0]} ejecuciones × {equity.shape[1]} velas: {len(trades)} operaciones "
+                 f"en {time.perf_counter() - started:.2f}s.")
+    return BacktestResult(equity, held, trades, metrics, index)
+
+
+def _extract_trades(held, equity, fill_in, fill_out, close, direction, slippage, initial_capital):
+    """Operaciones a partir de los cambios de posición, en el orden (ejecución, entrada)."""
+    runs, bars = held.shape
+    padded = np.zeros((runs, bars + 2), dtype=np.int8)
+    padded[:, 1:-1] = held
+    changes = np.diff(padded, axis=1)
+    run, entry = np.nonzero(changes == 1)
+    _, exit_ = np.nonzero(changes == -1)
+
+    forced = exit_ == bars
+    exit_bar = np.minimum(exit_, bars - 1)
+    entry_price = fill_in[run, entry]
+    exit_price = np.where(forced, close[run, exit_bar] * (1 - direction * slippage), fill_out[run, exit_bar])
+    equity_before = np.where(entry > 0, equity[run, np.maximum(entry - 1, 0)], initial_capital)
+    pnl = equity[run, exit_bar] - equity_before
+    return pd.DataFrame({
+        "run": run, "entry_index": entry, "exit_index": exit_bar, "entry_price": entry_price,
+        "exit_price": exit_price, "bars_held": exit_ - entry, "pnl": pnl, "return": pnl / equity_before,
+    }, columns=TRADE_COLUMNS)
+
+
+def compute_metrics(equity, trades: pd.DataFrame, initial_capital=DEFAULT_INITIAL_CAPITAL, periods=TRADING_DAYS):
+    """
+    Métricas por ejecución (ver `performance_metrics`): capital final, rentabilidad total,
+    máxima caída (fracción negativa), máximo tiempo bajo agua (velas seguidas por debajo del
+    máximo previo), volatilidad, Sharpe, Sortino y las métricas de las operaciones.
+    """
+    return compute_run_metrics(equity, trades, initial_capital, periods)
+
+
+def backtest_store(store: BarStore, signal_function, parameter_sets, symbols=None, start=None, end=None, **kwargs):
+    """
+    Backtest de una estrategia sobre las velas del almacén columnar para todos los símbolos y
+    combinaciones de parámetros en una sola pasada. `signal_function(prices, **params)` recibe
+    el dict de matrices (símbolos × velas) y devuelve (entries, exits). El resultado incluye
+    `symbol` y los parámetros de cada ejecución en `metrics`.
+    """
+    kwargs.setdefault("periods", periods_per_year(store.timeframe))
+    symbols, index, prices = store.read_matrix(symbols, start, end)
+    entries, exits, rows, labels = [], [], [], []
+    for params in parameter_sets:
+        signal_entries, signal_exits = signal_function(prices, **params)
+        entries.append(signal_entries)
+        exits.append(signal_exits)
+        rows.append(np.arange(len(symbols)))
+        labels.extend(dict(params, symbol=symbol) for symbol in symbols)
+
+    result = run_backtest(prices["close"], np.concatenate(entries), np.concatenate(exits), open_=prices["open"],
+                          rows=np.concatenate(rows), index=index, **kwargs)
+    result.metrics = pd.concat([pd.DataFrame(labels), result.metrics], axis=1)
+    return result
@@ -0,0 +1,261 @@
+import os
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from backend.app.models import SP500Data, SP500IntradayData
+
+# Ruta del almacén columnar
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BAR_STORE_DIR = os.getenv("BAR_STORE_DIR", os.path.join(BASE_DIR, "../../data/bar_store"))
+
+# Esquema de columnas por conjunto de datos: columna en la base de datos -> dtype en disco.
+# La primera columna es la marca de tiempo, guardada como int64 (nanosegundos UTC).
+# `trade_count` nulo se guarda como -1 y `vwap` nulo como NaN.
+DATASETS = {
+    "intraday": {
+        "model": SP500IntradayData,
+        "time_column": "datetime",
+        "columns": {
+            "datetime": np.int64,
+            "open": np.float64,
+            "high": np.float64,
+            "low": np.float64,
+            "close": np.float64,
+            "volume": np.float64,
+            "trade_count": np.int64,
+            "vwap": np.float64,
+        },
+    },
+    "daily": {
+        "model": SP500Data,
+        "time_column": "date",
+        "columns": {
+            "date": np.int64,
+            "open": np.float64,
+            "high": np.float64,
+            "low": np.float64,
+            "close": np.float64,
+            "adj_close": np.float64,
+            "volume": np.int64,
+        },
+    },
+}
+
+NULL_SENTINELS = {np.int64: -1, np.float64: np.nan}
+
+
+def to_ns(value):
+    """Convierte una fecha (con o sin zona horaria) a nanosegundos UTC."""
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.value
+
+
+class BarSlice:
+    """
+    Resultado de una lectura: vistas de solo lectura, mapeadas en memoria, de cada partición
+    mensual que cae en el rango pedido. Si el rango cae en una sola partición, `column()`
+    devuelve la vista directamente (sin copia); si abarca varias, las concatena.
+    """
+    def __init__(self, symbol: str, chunks):
+        self.symbol = symbol
+        self.chunks = chunks
+
+    def __len__(self):
+        return sum(len(next(iter(chunk.values()))) for chunk in self.chunks)
+
+    def column(self, name: str):
+        arrays = [chunk[name] for chunk in self.chunks]
+        if not arrays:
+            return np.empty(0)
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.concatenate(arrays)
+
+    def to_frame(self):
+        """Construye un DataFrame (copia) con la marca de tiempo como columna datetime64."""
+        if not self.chunks:
+            return pd.DataFrame()
+        names = list(self.chunks[0].keys())
+        frame = pd.DataFrame({name: self.column(name) for name in names})
+        time_column = names[0]
+        frame[time_column] = pd.to_datetime(frame[time_column], unit="ns")
+        return frame
+
+
+class BarStore:
+    """
+    Almacén local de velas en formato columnar, particionado por símbolo y mes:
+    `{root}/{dataset}[/{timeframe}]/{symbol}/{YYYY-MM}/{columna}.npy`. Cada columna es un array
+    contiguo que se abre con `np.load(mmap_mode="r")`, por lo que las lecturas no
+    copian datos hasta que se accede a ellos.
+    """
+    def __init__(self, root: str = BAR_STORE_DIR, dataset: str = "intraday", timeframe: str = "5Min"):
+        if dataset not in DATASETS:
+            raise ValueError(f"Conjunto de datos desconocido: {dataset}")
+        self.dataset = dataset
+        self.schema = DATASETS[dataset]
+        # Las velas intradía de cada temporalidad van en su propio subdirectorio
+        self.timeframe = timeframe if dataset == "intraday" else None
+        self.path = os.path.join(root, dataset, self.timeframe) if self.timeframe else os.path.join(root, dataset)
+
+    @property
+    def time_column(self):
+        return self.schema["time_column"]
+
+    def symbols(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(os.listdir(self.path))
+
+    def months(self, symbol: str):
+        symbol_dir = os.path.join(self.path, symbol)
+        if not os.path.isdir(symbol_dir):
+            return []
+        return sorted(m for m in os.listdir(symbol_dir) if not m.startswith("."))
+
+    def write_partition(self, symbol: str, month: str, frame: pd.DataFrame):
+        """Escribe una partición mensual de forma atómica (directorio temporal + rename)."""
+        symbol_dir = os.path.join(self.path, symbol)
+        final_dir = os.path.join(symbol_dir, month)
+        tmp_dir = os.path.join(symbol_dir, f".{month}.tmp-{os.getpid()}")
+        old_dir = os.path.join(symbol_dir, f".{month}.old-{os.getpid()}")
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        frame = frame.sort_values(self.time_column)
+        for name, dtype in self.schema["columns"].items():
+            if name == self.time_column:
+                values = pd.to_datetime(frame[name]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+            else:
+                values = frame[name].to_numpy(dtype=np.float64, na_value=np.nan)
+                if dtype is np.int64:
+                    values = np.where(np.isnan(values), NULL_SENTINELS[dtype], values)
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(values, dtype=dtype))
+
+        if os.path.isdir(final_dir):
+            os.rename(final_dir, old_dir)
+        os.rename(tmp_dir, final_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def write_frame(self, symbol: str, frame: pd.DataFrame):
+        """Divide un DataFrame en particiones mensuales y las escribe. Devuelve los meses escritos."""
+        if frame.empty:
+            return []
+        times = pd.to_datetime(frame[self.time_column])
+        months = times.dt.strftime("%Y-%m")
+        written = []
+        for month, part in frame.groupby(months.values, sort=True):
+            self.write_partition(symbol, month, part)
+            written.append(month)
+        return written
+
+    def _load_partition(self, symbol: str, month: str, columns):
+        partition_dir = os.path.join(self.path, symbol, month)
+        return {
+            name: np.load(os.path.join(partition_dir, f"{name}.npy"), mmap_mode="r")
+            for name in columns
+        }
+
+    def read(self, symbol: str, start=None, end=None, columns=None):
+        """
+        Lee las velas de un símbolo en el rango [start, end) como vistas mapeadas en memoria.
+        Solo abre las particiones mensuales que solapan con el rango.
+        """
+        columns = list(columns or self.schema["columns"].keys())
+        if self.time_column not in columns:
+            columns.insert(0, self.time_column)
+        else:
+            columns.insert(0, columns.pop(columns.index(self.time_column)))
+
+        start_ns, end_ns = to_ns(start), to_ns(end)
+        first_month = pd.Timestamp(start_ns).strftime("%Y-%m") if start_ns is not None else None
+        last_month = pd.Timestamp(end_ns).strftime("%Y-%m") if end_ns is not None else None
+
+        chunks = []
+        for month in self.months(symbol):
+            if (first_month and month < first_month) or (last_month and month > last_month):
+                continue
+            partition = self._load_partition(symbol, month, columns)
+            times = partition[self.time_column]
+            lo = 0 if start_ns is None else int(np.searchsorted(times, start_ns, side="left"))
+            hi = len(times) if end_ns is None else int(np.searchsorted(times, end_ns, side="left"))
+            if hi > lo:
+                chunks.append({name: array[lo:hi] for name, array in partition.items()})
+        return BarSlice(symbol, chunks)
+
+    def read_many(self, symbols, start=None, end=None, columns=None):
+        """Lee varios símbolos. Devuelve un dict symbol -> BarSlice (omitiendo los vacíos)."""
+        result = {}
+        for symbol in symbols:
+            bars = self.read(symbol, start, end, columns)
+            if bars.chunks:
+                result[symbol] = bars
+        return result
+
+    def read_matrix(self, symbols=None, start=None, end=None, columns=("open", "high", "low", "close", "volume")):
+        """
+        Lee varios símbolos alineados en matrices símbolos × velas sobre la unión de sus marcas
+        de tiempo (NaN donde un símbolo no tiene vela). Devuelve (símbolos, índice temporal,
+        dict columna -> matriz float64). Se omiten los símbolos sin velas en el rango.
+        """
+        symbols = self.symbols() if symbols is None else list(symbols)
+        slices = self.read_many(symbols, start, end, columns)
+        symbols = [symbol for symbol in symbols if symbol in slices]
+        times = {symbol: slices[symbol].column(self.time_column) for symbol in symbols}
+        index = np.unique(np.concatenate(list(times.values()))) if symbols else np.empty(0, dtype=np.int64)
+
+        matrices = {name: np.full((len(symbols), len(index)), np.nan) for name in columns}
+        for row, symbol in enumerate(symbols):
+            positions = np.searchsorted(index, times[symbol])
+            for name in columns:
+                matrices[name][row, positions] = slices[symbol].column(name)
+        return symbols, pd.DatetimeIndex(index.view("datetime64[ns]")), matrices
+
+    def refresh_from_db(self, bind, symbols=None, full=False):
+        """
+        Actualiza el almacén desde la base de datos, símbolo a símbolo.
+
+        Por defecto reescribe solo desde el último mes almacenado de cada símbolo (que puede
+        estar incompleto); con `full=True` reconstruye todo. Devuelve las filas leídas por símbolo.
+        """
+        model = self.schema["model"]
+        table = model.__table__
+        time_col = table.c[self.time_column]
+        filters = [table.c.timeframe == self.timeframe] if self.timeframe else []
+        if symbols is None:
+            with bind.connect() as connection:
+                symbols = [row[0] for row in connection.execute(select(table.c.symbol).where(*filters).distinct())]
+
+        refreshed = {}
+        for symbol in symbols:
+            query = select(*[table.c[name] for name in self.schema["columns"]]).where(
+                table.c.symbol == symbol, *filters
+            )
+            months = self.months(symbol)
+            if months and not full:
+                query = query.where(time_col >= pd.Timestamp(f"{months[-1]}-01").to_pydatetime())
+            query = query.order_by(time_col)
+
+            with bind.connect() as connection:
+                frame = pd.read_sql(query, connection)
+            written = self.write_frame(symbol, frame)
+            if full:
+                # Eliminar particiones que ya no tienen filas en la base de datos
+                for month in set(months) - set(written):
+                    shutil.rmtree(os.path.join(self.path, symbol, month), ignore_errors=True)
+            refreshed[symbol] = len(frame)
+            logging.info(f"Almacén {self.dataset} actualizado para {symbol}: {len(frame)} filas.")
+        return refreshed
+
+if __name__ == "__main__":
+    from backend.app.db import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    for dataset_name in DATASETS:
+        logging.info(f"Actualizando el almacén columnar '{dataset_name}' desde la base de datos...")
+        BarStore(dataset=dataset_name).refresh_from_db(engine)
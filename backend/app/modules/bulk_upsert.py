@@ -0,0 +1,44 @@
+import logging
+from sqlalchemy.orm import Session
+
+# Número de filas por sentencia INSERT. SQLite admite hasta 32766 parámetros
+# por sentencia, así que 1000 filas de ~10 columnas quedan muy por debajo.
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_dialect_insert(bind):
+    """Devuelve la construcción `insert` con soporte ON CONFLICT para el motor dado."""
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"El motor '{dialect}' no soporta INSERT ... ON CONFLICT")
+    return insert
+
+
+def upsert_rows(session: Session, table, rows, conflict_columns, update_columns,
+                batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Inserta o actualiza filas en lote con `INSERT ... ON CONFLICT DO UPDATE`.
+
+    `rows` es una lista de diccionarios columna -> valor. Las filas se envían en
+    sentencias multi-VALUES de `batch_size` filas. No hace commit: la transacción
+    queda a cargo de quien llama. Devuelve el número de filas enviadas.
+    """
+    if not rows:
+        return 0
+
+    insert = get_dialect_insert(session.get_bind())
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        stmt = insert(table).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(conflict_columns),
+            set_={col: stmt.excluded[col] for col in update_columns},
+        )
+        session.execute(stmt)
+
+    logging.debug(f"Upsert de {len(rows)} filas en {table.name} en lotes de {batch_size}.")
+    return len(rows)
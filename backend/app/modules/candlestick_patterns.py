@@ -0,0 +1,353 @@
+import logging
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+from backend.app.modules.bar_store import BarStore
+
+# Umbrales por defecto de los patrones de velas (proporciones del rango alto-bajo de la vela)
+DEFAULT_THRESHOLDS = {
+    "doji_body": 0.1,      # Cuerpo máximo de un doji
+    "small_body": 0.3,     # Cuerpo máximo de martillos y de la vela central de las estrellas
+    "long_body": 0.6,      # Cuerpo mínimo de una vela "larga"
+    "shadow_ratio": 2.0,   # Sombra larga mínima, en múltiplos del cuerpo
+    "short_shadow": 0.1,   # Sombra corta máxima
+    "trend_bars": 5,       # Velas para la tendencia previa de martillos y estrellas fugaces (0 = sin exigirla)
+}
+SCAN_CHUNK_SYMBOLS = 50  # Símbolos evaluados juntos en el escaneo del universo
+
+
+class CandleFeatures:
+    """
+    Medidas de una vela (o de todas las velas de un array): cuerpo, rango, sombras, sentido
+    y tendencia previa. Los atributos son arrays o escalares, de modo que las mismas reglas
+    de `PATTERNS` sirven para el escaneo vectorizado y para la comprobación vela a vela.
+    """
+    def __init__(self, open_, high, low, close, body, range_, upper, lower, bull, bear, trend_up, trend_down):
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.body = body
+        self.range = range_
+        self.upper = upper
+        self.lower = lower
+        self.bull = bull
+        self.bear = bear
+        self.trend_up = trend_up
+        self.trend_down = trend_down
+
+    @classmethod
+    def from_arrays(cls, open_, high, low, close, trend_bars):
+        top, bottom = np.maximum(open_, close), np.minimum(open_, close)
+        if trend_bars > 0:
+            previous = _shift(close, trend_bars)
+            trend_up, trend_down = close > previous, close < previous
+        else:
+            trend_up = trend_down = np.ones(close.shape, dtype=bool)
+        return cls(open_, high, low, close, np.abs(close - open_), high - low, high - top, bottom - low,
+                   close > open_, close < open_, trend_up, trend_down)
+
+    @classmethod
+    def from_bar(cls, open_, high, low, close, trend_close=None):
+        """Medidas de una vela; `trend_close` es el cierre `trend_bars` velas atrás (None = sin tendencia)."""
+        top, bottom = (close, open_) if close > open_ else (open_, close)
+        if trend_close is None:
+            trend_up = trend_down = True
+        else:
+            trend_up, trend_down = close > trend_close, close < trend_close
+        return cls(open_, high, low, close, abs(close - open_), high - low, high - top, bottom - low,
+                   close > open_, close < open_, trend_up, trend_down)
+
+    def shift(self, periods):
+        """Las mismas medidas desplazadas `periods` velas hacia atrás (NaN/False al inicio)."""
+        return CandleFeatures(*(_shift(value, periods) for value in (
+            self.open, self.high, self.low, self.close, self.body, self.range, self.upper, self.lower,
+            self.bull, self.bear, self.trend_up, self.trend_down,
+        )))
+
+
+def _shift(values, periods):
+    """Desplaza a lo largo del último eje rellenando con NaN (o False en arrays booleanos)."""
+    result = np.empty_like(values)
+    result[..., :periods] = False if values.dtype == bool else np.nan
+    result[..., periods:] = values[..., :-periods]
+    return result
+
+
+# Reglas de los patrones. Cada regla recibe `bar(k)`, las medidas de la vela `k` posiciones
+# antes de la actual (0 = actual), y los umbrales. Solo usan operadores (`&`, `<=`, `*`, ...)
+# válidos tanto para escalares como para arrays.
+def _hammer_shape(c, t):
+    return (c.range > 0) & (c.body <= t["small_body"] * c.range) & (c.lower >= t["shadow_ratio"] * c.body) \
+        & (c.upper <= t["short_shadow"] * c.range)
+
+
+def _inverted_shape(c, t):
+    return (c.range > 0) & (c.body <= t["small_body"] * c.range) & (c.upper >= t["shadow_ratio"] * c.body) \
+        & (c.lower <= t["short_shadow"] * c.range)
+
+
+def _long(c, t):
+    return c.body >= t["long_body"] * c.range
+
+
+def _doji(bar, t):
+    c = bar(0)
+    return (c.range > 0) & (c.body <= t["doji_body"] * c.range)
+
+
+def _hammer(bar, t):
+    return _hammer_shape(bar(0), t) & bar(1).trend_down
+
+
+def _hanging_man(bar, t):
+    return _hammer_shape(bar(0), t) & bar(1).trend_up
+
+
+def _inverted_hammer(bar, t):
+    return _inverted_shape(bar(0), t) & bar(1).trend_down
+
+
+def _shooting_star(bar, t):
+    return _inverted_shape(bar(0), t) & bar(1).trend_up
+
+
+def _bullish_engulfing(bar, t):
+    c, p = bar(0), bar(1)
+    return p.bear & c.bull & (c.open <= p.close) & (c.close >= p.open) & (c.body > p.body)
+
+
+def _bearish_engulfing(bar, t):
+    c, p = bar(0), bar(1)
+    return p.bull & c.bear & (c.open >= p.close) & (c.close <= p.open) & (c.body > p.body)
+
+
+def _bullish_harami(bar, t):
+    c, p = bar(0), bar(1)
+    return p.bear & _long(p, t) & c.bull & (c.close <= p.open) & (c.open >= p.close) & (c.body < p.body)
+
+
+def _bearish_harami(bar, t):
+    c, p = bar(0), bar(1)
+    return p.bull & _long(p, t) & c.bear & (c.close >= p.open) & (c.open <= p.close) & (c.body < p.body)
+
+
+def _morning_star(bar, t):
+    c, m, f = bar(0), bar(1), bar(2)
+    # Sin exigir hueco entre cuerpos: en velas intradía consecutivas casi nunca lo hay
+    return f.bear & _long(f, t) & (m.range > 0) & (m.body <= t["small_body"] * m.range) \
+        & (m.open <= f.close) & (m.close <= f.close) & c.bull & (c.close >= (f.open + f.close) / 2)
+
+
+def _evening_star(bar, t):
+    c, m, f = bar(0), bar(1), bar(2)
+    return f.bull & _long(f, t) & (m.range > 0) & (m.body <= t["small_body"] * m.range) \
+        & (m.open >= f.close) & (m.close >= f.close) & c.bear & (c.close <= (f.open + f.close) / 2)
+
+
+def _three_white_soldiers(bar, t):
+    c, p, f = bar(0), bar(1), bar(2)
+    return f.bull & p.bull & c.bull & _long(f, t) & _long(p, t) & _long(c, t) \
+        & (p.close > f.close) & (c.close > p.close) \
+        & (p.open >= f.open) & (p.open <= f.close) & (c.open >= p.open) & (c.open <= p.close)
+
+
+def _three_black_crows(bar, t):
+    c, p, f = bar(0), bar(1), bar(2)
+    return f.bear & p.bear & c.bear & _long(f, t) & _long(p, t) & _long(c, t) \
+        & (p.close < f.close) & (c.close < p.close) \
+        & (p.open <= f.open) & (p.open >= f.close) & (c.open <= p.open) & (c.open >= p.close)
+
+
+# Nombre -> (velas del patrón, usa tendencia previa, regla)
+PATTERNS = {
+    "DOJI": (1, False, _doji),
+    "HAMMER": (1, True, _hammer),
+    "HANGING_MAN": (1, True, _hanging_man),
+    "INVERTED_HAMMER": (1, True, _inverted_hammer),
+    "SHOOTING_STAR": (1, True, _shooting_star),
+    "BULLISH_ENGULFING": (2, False, _bullish_engulfing),
+    "BEARISH_ENGULFING": (2, False, _bearish_engulfing),
+    "BULLISH_HARAMI": (2, False, _bullish_harami),
+    "BEARISH_HARAMI": (2, False, _bearish_harami),
+    "MORNING_STAR": (3, False, _morning_star),
+    "EVENING_STAR": (3, False, _evening_star),
+    "THREE_WHITE_SOLDIERS": (3, False, _three_white_soldiers),
+    "THREE_BLACK_CROWS": (3, False, _three_black_crows),
+}
+
+
+def _thresholds(thresholds):
+    merged = dict(DEFAULT_THRESHOLDS)
+    merged.update(thresholds or {})
+    return merged
+
+
+def pattern_lookback(pattern, thresholds=None):
+    """Velas previas que necesita un patrón además de la actual."""
+    bars, uses_trend, _ = PATTERNS[pattern]
+    trend_bars = int(_thresholds(thresholds)["trend_bars"])
+    return max(bars - 1, 1 + trend_bars if uses_trend and trend_bars > 0 else 0)
+
+
+def pattern_masks(open_, high, low, close, thresholds=None, patterns=None, segment_starts=None):
+    """
+    Evalúa los patrones de velas sobre arrays OHLC 1-D o 2-D (símbolos × velas).
+    Devuelve un dict patrón -> máscara booleana con la forma de la entrada.
+
+    Con `segment_starts` (solo 1-D) la entrada son varios símbolos concatenados y se indican
+    las posiciones donde empieza cada uno, para que ningún patrón cruce de un símbolo a otro.
+    """
+    t = _thresholds(thresholds)
+    arrays = [np.asarray(values, dtype=np.float64) for values in (open_, high, low, close)]
+    features = CandleFeatures.from_arrays(*arrays, int(t["trend_bars"]))
+    shifted = {0: features}
+
+    def bar(k):
+        if k not in shifted:
+            shifted[k] = features.shift(k)
+        return shifted[k]
+
+    position = None
+    if segment_starts is not None:
+        starts = np.asarray(segment_starts, dtype=np.int64)
+        lengths = np.diff(np.append(starts, arrays[3].shape[-1]))
+        position = np.arange(arrays[3].shape[-1]) - np.repeat(starts, lengths)
+
+    masks = {}
+    with np.errstate(invalid="ignore"):
+        for name in patterns or PATTERNS:
+            mask = PATTERNS[name][2](bar, t)
+            if position is not None:
+                mask &= position >= pattern_lookback(name, t)
+            masks[name] = mask
+    return masks
+
+
+def hits_from_masks(masks, symbols, times):
+    """
+    Convierte máscaras (símbolos × velas) en la lista dispersa de aciertos:
+    DataFrame `symbol`, `datetime`, `pattern` con símbolo y patrón categóricos.
+    `times` es el índice temporal común o una matriz de tiempos con la forma de las máscaras.
+    """
+    symbol_codes, time_values, pattern_codes = [], [], []
+    times = np.asarray(times)
+    for code, mask in enumerate(masks.values()):
+        rows, columns = np.nonzero(np.atleast_2d(mask))
+        symbol_codes.append(rows)
+        time_values.append(times[columns] if times.ndim == 1 else times[rows, columns])
+        pattern_codes.append(np.full(len(rows), code, dtype=np.int16))
+    return _hits_frame(symbols, list(masks), np.concatenate(symbol_codes) if symbol_codes else [],
+                       np.concatenate(time_values) if time_values else [],
+                       np.concatenate(pattern_codes) if pattern_codes else [])
+
+
+def _hits_frame(symbols, patterns, symbol_codes, times, pattern_codes):
+    hits = pd.DataFrame({
+        "symbol": pd.Categorical.from_codes(np.asarray(symbol_codes, dtype=np.int64), categories=list(symbols)),
+        "datetime": pd.to_datetime(np.asarray(times, dtype="datetime64[ns]")),
+        "pattern": pd.Categorical.from_codes(np.asarray(pattern_codes, dtype=np.int64), categories=list(patterns)),
+    })
+    return hits.sort_values(["symbol", "datetime", "pattern"], kind="stable", ignore_index=True)
+
+
+def _scan_segments(symbols, columns, thresholds, patterns):
+    """Escanea varios símbolos concatenados en arrays 1-D; `columns[symbol]` tiene tiempos y OHLC."""
+    lengths = np.array([len(columns[symbol][0]) for symbol in symbols], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    times, open_, high, low, close = (np.concatenate([columns[symbol][i] for symbol in symbols]) for i in range(5))
+    masks = pattern_masks(open_, high, low, close, thresholds, patterns, segment_starts=starts)
+    owners = np.repeat(np.arange(len(symbols)), lengths)
+    symbol_codes, time_values, pattern_codes = [], [], []
+    for code, mask in enumerate(masks.values()):
+        index = np.flatnonzero(mask)
+        symbol_codes.append(owners[index])
+        time_values.append(times[index])
+        pattern_codes.append(np.full(len(index), code, dtype=np.int16))
+    return symbol_codes, time_values, pattern_codes
+
+
+def _scan_columns(loader, symbols, thresholds, patterns, chunk_symbols):
+    patterns = list(patterns or PATTERNS)
+    symbols = list(symbols)
+    symbol_codes, time_values, pattern_codes = [], [], []
+    for offset in range(0, len(symbols), chunk_symbols):
+        chunk = symbols[offset:offset + chunk_symbols]
+        columns = {symbol: loader(symbol) for symbol in chunk}
+        codes, times, found = _scan_segments(chunk, columns, thresholds, patterns)
+        symbol_codes.extend(code + offset for code in codes)
+        time_values.extend(times)
+        pattern_codes.extend(found)
+    concat = lambda parts, dtype: np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+    return _hits_frame(symbols, patterns, concat(symbol_codes, np.int64),
+                       concat(time_values, "datetime64[ns]"), concat(pattern_codes, np.int16))
+
+
+def scan_frame(data: pd.DataFrame, thresholds=None, patterns=None, time_column="datetime",
+               chunk_symbols=SCAN_CHUNK_SYMBOLS):
+    """
+    Escanea velas en formato largo (`symbol`, tiempo y OHLC, p. ej. una consulta a
+    `sp500_intraday_data` o `sp500_data`) y devuelve la lista dispersa de aciertos.
+    """
+    data = data.sort_values(["symbol", time_column], kind="stable")
+    times = pd.to_datetime(data[time_column]).to_numpy(dtype="datetime64[ns]")
+    ohlc = [data[name].to_numpy(dtype=np.float64) for name in ("open", "high", "low", "close")]
+    symbols, starts = np.unique(data["symbol"].to_numpy(), return_index=True)
+    bounds = list(starts) + [len(data)]
+    columns = {
+        symbol: [times[bounds[i]:bounds[i + 1]]] + [values[bounds[i]:bounds[i + 1]] for values in ohlc]
+        for i, symbol in enumerate(symbols)
+    }
+    return _scan_columns(columns.__getitem__, symbols, thresholds, patterns, chunk_symbols)
+
+
+def scan_store(store: BarStore, symbols=None, start=None, end=None, thresholds=None, patterns=None,
+               chunk_symbols=SCAN_CHUNK_SYMBOLS):
+    """
+    Escanea todo el universo del almacén columnar (intradía o diario) en bloques de
+    `chunk_symbols` símbolos y devuelve la lista dispersa de aciertos.
+    """
+    started = time.perf_counter()
+    symbols = store.symbols() if symbols is None else list(symbols)
+
+    def load(symbol):
+        bars = store.read(symbol, start, end, columns=["open", "high", "low", "close"])
+        return [bars.column(store.time_column).view("datetime64[ns]")] + [
+            bars.column(name) for name in ("open", "high", "low", "close")
+        ]
+
+    hits = _scan_columns(load, symbols, thresholds, patterns, chunk_symbols)
+    logging.info(f"Patrones de velas: {len(hits)} aciertos en {len(symbols)} símbolos "
+                 f"({time.perf_counter() - started:.2f}s).")
+    return hits
+
+
+class CandleStream:
+    """
+    Comprobación incremental de patrones para un símbolo: guarda solo las últimas velas
+    necesarias y evalúa cada vela nueva con aritmética escalar (microsegundos por vela).
+    Da los mismos resultados que `pattern_masks` sobre la serie completa.
+    """
+    def __init__(self, thresholds=None, patterns=None):
+        self.thresholds = _thresholds(thresholds)
+        self.trend_bars = int(self.thresholds["trend_bars"])
+        self.patterns = [(name, pattern_lookback(name, self.thresholds), PATTERNS[name][2])
+                         for name in (patterns or PATTERNS)]
+        self.history = deque(maxlen=3)
+        self.closes = deque(maxlen=self.trend_bars + 1)
+        self.count = 0
+
+    def _bar(self, k):
+        return self.history[-1 - k]
+
+    def update(self, open_, high, low, close):
+        """Añade una vela y devuelve la lista de patrones que se completan en ella."""
+        self.closes.append(close)
+        trend_close = None
+        if self.trend_bars > 0:
+            trend_close = self.closes[0] if len(self.closes) > self.trend_bars else float("nan")
+        self.history.append(CandleFeatures.from_bar(open_, high, low, close, trend_close))
+        self.count += 1
+        return [name for name, lookback, rule in self.patterns
+                if self.count > lookback and rule(self._bar, self.thresholds)]
@@ -0,0 +1,351 @@
+import datetime
+import json
+import logging
+from collections import deque
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from backend.app.models import ChartPattern, ChartPatternState, SP500Data, SP500IntradayData
+from backend.app.modules.bulk_upsert import upsert_rows
+from backend.app.modules.intraday_storage import DEFAULT_TIMEFRAME, fetch_intraday_range
+from backend.app.modules.streaming_indicators import StreamingATR
+
+# Detección de patrones de gráfico en dos pasos:
+#   1. Pivotes de oscilación con un zig-zag cuyo umbral de giro es un múltiplo del ATR:
+#      una pasada lineal, vela a vela, con estado O(1).
+#   2. Cada pivote confirmado se compara, junto con los anteriores, con las plantillas de
+#      triángulos, rectángulos, banderas y hombro-cabeza-hombro. Solo se examinan las
+#      secuencias que terminan en el pivote nuevo.
+
+DAILY_TIMEFRAME = "1Day"  # Velas diarias de `sp500_data`
+DEFAULT_PARAMS = {
+    "atr_period": 14,
+    "atr_multiple": 2.0,         # Movimiento mínimo (en ATR) para confirmar un pivote
+    "flat_tolerance": 0.1,       # Variación máxima de un lado "plano", en fracción de la altura del patrón
+    "flag_pole_ratio": 2.0,      # Mástil mínimo, en múltiplos de la mayor oscilación de la bandera
+    "flag_max_retrace": 0.5,     # Retroceso máximo de la bandera sobre el mástil
+    "shoulder_tolerance": 0.15,  # Diferencia máxima entre hombros, en fracción de la altura
+    "neckline_tolerance": 0.15,  # Inclinación máxima de la línea de cuello, en fracción de la altura
+    "min_head": 0.1,             # Altura mínima de la cabeza sobre los hombros, en fracción de la altura
+}
+PATTERN_PIVOTS = 5  # Todas las plantillas usan los cinco últimos pivotes
+# Historia usada para inicializar símbolos sin estado, por temporalidad (intradía por defecto)
+REPLAY_LOOKBACK = {DAILY_TIMEFRAME: pd.Timedelta(days=5 * 365), DEFAULT_TIMEFRAME: pd.Timedelta(days=60)}
+
+
+def _pivot_state(pivot):
+    index, time, price, kind = pivot
+    return [index, time.isoformat(), price, kind]
+
+
+def _pivot_from_state(state):
+    index, time, price, kind = state
+    return index, datetime.datetime.fromisoformat(time), price, kind
+
+
+class ZigZag:
+    """
+    Zig-zag incremental. Sigue el extremo de la oscilación en curso y lo confirma como pivote
+    (`H` máximo, `L` mínimo) cuando el precio se aleja de él al menos `threshold`.
+    Los extremos se guardan como (índice de vela, fecha, precio, tipo).
+    """
+    def __init__(self):
+        self.direction = 0  # 1 = buscando máximo, -1 = buscando mínimo, 0 = aún sin dirección
+        self.high = None
+        self.low = None
+
+    def update(self, index, time, high, low, threshold):
+        """Aplica una vela; devuelve el pivote confirmado en ella o None."""
+        if self.direction >= 0 and (self.high is None or high > self.high[2]):
+            self.high = (index, time, high, "H")
+            if self.direction > 0:
+                return None
+        if self.direction <= 0 and (self.low is None or low < self.low[2]):
+            self.low = (index, time, low, "L")
+            if self.direction < 0:
+                return None
+
+        if self.direction > 0 and self.high[2] - low >= threshold:
+            pivot, self.direction, self.low = self.high, -1, (index, time, low, "L")
+            return pivot
+        if self.direction < 0 and high - self.low[2] >= threshold:
+            pivot, self.direction, self.high = self.low, 1, (index, time, high, "H")
+            return pivot
+        if self.direction == 0 and self.high[2] - self.low[2] >= threshold:
+            # El primer pivote es el extremo más antiguo; el otro pasa a ser el extremo en curso
+            if self.low[0] < self.high[0]:
+                self.direction = 1
+                return self.low
+            if self.high[0] < self.low[0]:
+                self.direction = -1
+                return self.high
+        return None
+
+    def to_state(self):
+        return {"direction": self.direction,
+                "high": _pivot_state(self.high) if self.high else None,
+                "low": _pivot_state(self.low) if self.low else None}
+
+    @classmethod
+    def from_state(cls, state):
+        zigzag = cls()
+        zigzag.direction = state["direction"]
+        zigzag.high = _pivot_from_state(state["high"]) if state["high"] else None
+        zigzag.low = _pivot_from_state(state["low"]) if state["low"] else None
+        return zigzag
+
+
+def _trend(values, tolerance):
+    """Clasifica una secuencia de precios como 'flat', 'rising', 'falling' o None."""
+    if max(values) - min(values) <= tolerance:
+        return "flat"
+    steps = [b - a for a, b in zip(values, values[1:])]
+    if all(step > 0 for step in steps):
+        return "rising"
+    if all(step < 0 for step in steps):
+        return "falling"
+    return None
+
+
+def _consolidations(window, params):
+    """Triángulos y rectángulos: tendencia de la línea de máximos y de la de mínimos."""
+    highs = [price for _, _, price, kind in window if kind == "H"]
+    lows = [price for _, _, price, kind in window if kind == "L"]
+    tolerance = params["flat_tolerance"] * (max(highs) - min(lows))
+    shape = (_trend(highs, tolerance), _trend(lows, tolerance))
+    return {
+        ("flat", "flat"): ["RECTANGLE"],
+        ("flat", "rising"): ["ASCENDING_TRIANGLE"],
+        ("falling", "flat"): ["DESCENDING_TRIANGLE"],
+        ("falling", "rising"): ["SYMMETRIC_TRIANGLE"],
+    }.get(shape, [])
+
+
+def _is_flag(p0, p1, p2, p3, p4, params):
+    """Bandera alcista sobre pivotes mínimo-máximo-mínimo-máximo-mínimo (la bajista, con precios negados)."""
+    pole = p1 - p0
+    swing = max(p1 - p2, p3 - p2, p3 - p4)
+    if pole <= 0 or swing <= 0 or pole < params["flag_pole_ratio"] * swing:
+        return False
+    drift = params["flat_tolerance"] * pole
+    return p1 - min(p2, p4) <= params["flag_max_retrace"] * pole and p3 - p1 <= drift and p4 - p2 <= drift
+
+
+def _is_head_and_shoulders(left, neck1, head, neck2, right, params):
+    """Hombro-cabeza-hombro sobre pivotes máximo-mínimo-máximo-mínimo-máximo (el invertido, con precios negados)."""
+    height = head - min(neck1, neck2)
+    if height <= 0:
+        return False
+    return head - max(left, right) >= params["min_head"] * height \
+        and abs(left - right) <= params["shoulder_tolerance"] * height \
+        and abs(neck1 - neck2) <= params["neckline_tolerance"] * height
+
+
+def match_patterns(pivots, params=None):
+    """
+    Devuelve los nombres de los patrones que forman los últimos `PATTERN_PIVOTS` pivotes
+    (alternos, del más antiguo al más reciente).
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    if len(pivots) < PATTERN_PIVOTS:
+        return []
+    window = list(pivots)[-PATTERN_PIVOTS:]
+    prices = [price for _, _, price, _ in window]
+    ends_high = window[-1][3] == "H"
+
+    patterns = _consolidations(window, params)
+    if not ends_high and _is_flag(*prices, params):
+        patterns.append("BULL_FLAG")
+    if ends_high and _is_flag(*(-price for price in prices), params):
+        patterns.append("BEAR_FLAG")
+    if ends_high and _is_head_and_shoulders(*prices, params):
+        patterns.append("HEAD_AND_SHOULDERS")
+    if not ends_high and _is_head_and_shoulders(*(-price for price in prices), params):
+        patterns.append("INVERSE_HEAD_AND_SHOULDERS")
+    return patterns
+
+
+class ChartPatternDetector:
+    """
+    Detector incremental de un símbolo: ATR de Wilder, zig-zag y los últimos pivotes.
+    `update` aplica una vela y devuelve los patrones completados por el pivote que confirme
+    (normalmente ninguno). Las velas anteriores o iguales a `last_datetime` se ignoran.
+    """
+    def __init__(self, params=None):
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.atr = StreamingATR(self.params["atr_period"])
+        self.zigzag = ZigZag()
+        self.pivots = deque(maxlen=PATTERN_PIVOTS)
+        self.bars = 0
+        self.last_datetime = None
+
+    def update(self, bar_datetime, high, low, close):
+        if self.last_datetime is not None and bar_datetime <= self.last_datetime:
+            return []
+        threshold = self.params["atr_multiple"] * self.atr.update(high, low, close)
+        # Durante el calentamiento del ATR el umbral es NaN: se siguen los extremos sin confirmar pivotes
+        pivot = self.zigzag.update(self.bars, bar_datetime, high, low, threshold)
+        self.bars += 1
+        self.last_datetime = bar_datetime
+        if pivot is None:
+            return []
+        self.pivots.append(pivot)
+        window = list(self.pivots)
+        return [{
+            "pattern": pattern,
+            "start_datetime": window[0][1],
+            "end_datetime": window[-1][1],
+            "confirmed_at": bar_datetime,
+            "pivots": json.dumps([[time.isoformat(), price] for _, time, price, _ in window]),
+        } for pattern in match_patterns(window, self.params)]
+
+    def to_state(self):
+        return {"params": self.params, "atr": self.atr.to_state(), "zigzag": self.zigzag.to_state(),
+                "pivots": [_pivot_state(pivot) for pivot in self.pivots], "bars": self.bars}
+
+    @classmethod
+    def from_state(cls, state, last_datetime=None):
+        detector = cls(state["params"])
+        detector.atr = StreamingATR.from_state(state["atr"])
+        detector.zigzag = ZigZag.from_state(state["zigzag"])
+        detector.pivots.extend(_pivot_from_state(pivot) for pivot in state["pivots"])
+        detector.bars = state["bars"]
+        detector.last_datetime = last_datetime
+        return detector
+
+
+def apply_bars(detector: ChartPatternDetector, bars: pd.DataFrame):
+    """Aplica velas (`datetime`, `high`, `low`, `close`, ordenadas por fecha). Devuelve los patrones detectados."""
+    matches = []
+    for bar_datetime, high, low, close in zip(
+        pd.DatetimeIndex(pd.to_datetime(bars["datetime"])).to_pydatetime(), bars["high"].to_numpy(float),
+        bars["low"].to_numpy(float), bars["close"].to_numpy(float),
+    ):
+        matches.extend(detector.update(bar_datetime, high, low, close))
+    return matches
+
+
+def detect_chart_patterns(bars: pd.DataFrame, params=None):
+    """Detecta los patrones de gráfico de un símbolo sobre su historia completa. Devuelve un DataFrame."""
+    matches = apply_bars(ChartPatternDetector(params), bars.sort_values("datetime"))
+    return pd.DataFrame(matches, columns=["pattern", "start_datetime", "end_datetime", "confirmed_at", "pivots"])
+
+
+def read_bars(session: Session, symbols, timeframe=DEFAULT_TIMEFRAME, start=None):
+    """
+    Lee velas de `sp500_data` (`timeframe` = `1Day`) o de `sp500_intraday_data` a partir de
+    `start` (incluido), con las columnas `symbol`, `datetime`, `high`, `low`, `close`.
+    """
+    columns = ["symbol", "datetime", "high", "low", "close"]
+    if timeframe != DAILY_TIMEFRAME:
+        return fetch_intraday_range(session, symbols, start=start, timeframe=timeframe, columns=columns)
+    table = SP500Data.__table__
+    query = select(table.c.symbol, table.c.date.label("datetime"), table.c.high, table.c.low, table.c.close).where(
+        table.c.symbol.in_(list(symbols))
+    )
+    if start is not None:
+        query = query.where(table.c.date >= pd.Timestamp(start).date())
+    bars = pd.read_sql(query.order_by(table.c.symbol, table.c.date), session.bind)
+    bars["datetime"] = pd.to_datetime(bars["datetime"])
+    return bars[columns]
+
+
+def load_detectors(session: Session, symbols, timeframe=DEFAULT_TIMEFRAME):
+    """Restaura desde `chart_pattern_state` los detectores guardados de los símbolos dados."""
+    rows = session.query(ChartPatternState).filter(
+        ChartPatternState.timeframe == timeframe, ChartPatternState.symbol.in_(list(symbols))
+    ).all()
+    return {row.symbol: ChartPatternDetector.from_state(json.loads(row.state), row.last_datetime) for row in rows}
+
+
+def save_detectors(session: Session, detectors, timeframe=DEFAULT_TIMEFRAME):
+    """Guarda (upsert) el estado de los detectores. No hace commit."""
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    rows = [
+        {"symbol": symbol, "timeframe": timeframe, "last_datetime": detector.last_datetime,
+         "state": json.dumps(detector.to_state()), "updated_at": now}
+        for symbol, detector in detectors.items() if detector.last_datetime is not None
+    ]
+    return upsert_rows(session, ChartPatternState.__table__, rows, ["symbol", "timeframe"],
+                       ["last_datetime", "state", "updated_at"])
+
+
+def save_patterns(session: Session, symbol, matches, timeframe=DEFAULT_TIMEFRAME):
+    """Guarda (upsert) los patrones detectados de un símbolo. No hace commit."""
+    rows = [dict(match, symbol=symbol, timeframe=timeframe) for match in matches]
+    return upsert_rows(session, ChartPattern.__table__, rows, ["symbol", "timeframe", "pattern", "end_datetime"],
+                       ["start_datetime", "confirmed_at", "pivots"])
+
+
+def update_chart_patterns(session: Session, bars: pd.DataFrame, timeframe=DEFAULT_TIMEFRAME,
+                          replay_lookback=None):
+    """
+    Aplica velas nuevas (`symbol`, `datetime`, `high`, `low`, `close`) a los detectores de
+    cada símbolo, guarda los patrones encontrados y el estado. Los símbolos sin estado se
+    inicializan con las velas guardadas de los últimos `replay_lookback` (por defecto el de
+    `REPLAY_LOOKBACK` para la temporalidad). No hace commit. Devuelve un DataFrame con los
+    patrones nuevos.
+    """
+    if bars.empty:
+        return pd.DataFrame()
+    if replay_lookback is None:
+        replay_lookback = REPLAY_LOOKBACK.get(timeframe, REPLAY_LOOKBACK[DEFAULT_TIMEFRAME])
+
+    bars = bars.sort_values(["symbol", "datetime"])
+    symbols = list(bars["symbol"].unique())
+    detectors = load_detectors(session, symbols, timeframe)
+
+    found = []
+    missing = [symbol for symbol in symbols if symbol not in detectors]
+    if missing:
+        start = pd.to_datetime(bars["datetime"]).max() - replay_lookback
+        history = read_bars(session, missing, timeframe, start=start)
+        for symbol in missing:
+            detectors[symbol] = ChartPatternDetector()
+            matches = apply_bars(detectors[symbol], history[history["symbol"] == symbol])
+            save_patterns(session, symbol, matches, timeframe)
+            found.extend(dict(match, symbol=symbol) for match in matches)
+        logging.info(f"Detectores de patrones inicializados con historia para {len(missing)} símbolos.")
+
+    for symbol, symbol_bars in bars.groupby("symbol", sort=False):
+        matches = apply_bars(detectors[symbol], symbol_bars)
+        save_patterns(session, symbol, matches, timeframe)
+        found.extend(dict(match, symbol=symbol) for match in matches)
+    save_detectors(session, detectors, timeframe)
+    return pd.DataFrame(found)
+
+
+def scan_stored_bars(session: Session, timeframe=DEFAULT_TIMEFRAME, symbols=None):
+    """
+    Recorre las velas guardadas de cada símbolo desde la última vela ya aplicada a su detector
+    (o desde el inicio) y hace commit por símbolo. Devuelve el número de patrones nuevos por símbolo.
+    """
+    if symbols is None:
+        table = SP500Data.__table__ if timeframe == DAILY_TIMEFRAME else SP500IntradayData.__table__
+        query = select(table.c.symbol).distinct()
+        if timeframe != DAILY_TIMEFRAME:
+            query = query.where(table.c.timeframe == timeframe)
+        symbols = sorted(row[0] for row in session.execute(query))
+
+    found = {}
+    for symbol in symbols:
+        detector = load_detectors(session, [symbol], timeframe).get(symbol, ChartPatternDetector())
+        matches = apply_bars(detector, read_bars(session, [symbol], timeframe, start=detector.last_datetime))
+        save_patterns(session, symbol, matches, timeframe)
+        save_detectors(session, {symbol: detector}, timeframe)
+        session.commit()
+        found[symbol] = len(matches)
+        logging.info(f"Patrones de gráfico de {symbol} ({timeframe}): {len(matches)} nuevos.")
+    return found
+
+
+if __name__ == "__main__":
+    from backend.app.db import SessionLocal
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    db_session = SessionLocal()
+    try:
+        for scan_timeframe in (DAILY_TIMEFRAME, DEFAULT_TIMEFRAME):
+            scan_stored_bars(db_session, scan_timeframe)
+    finally:
+        db_session.close()
@@ -0,0 +1,233 @@
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# Valores por defecto de la ingesta concurrente
+DEFAULT_WORKERS = 8
+DEFAULT_QUEUE_SIZE = 32  # Máximo de símbolos descargados esperando al escritor
+DEFAULT_BATCH_ROWS = 50000  # Filas acumuladas antes de escribir en la base de datos
+DEFAULT_FLUSH_SECONDS = 2.0  # Espera máxima del escritor antes de vaciar un lote parcial
+PUT_TIMEOUT_SECONDS = 0.5  # Espera de un descargador con la cola llena antes de comprobar si el escritor sigue vivo
+
+
+class TokenBucket:
+    """
+    Limitador de peticiones tipo token bucket, seguro entre hilos.
+
+    Repone `rate` tokens por segundo hasta un máximo de `capacity`; cada petición
+    consume un token y espera si no hay ninguno disponible.
+    """
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("La tasa del limitador debe ser positiva")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, burst: float = None):
+        """Crea un limitador a partir de una cuota de peticiones por minuto."""
+        return cls(requests_per_minute / 60.0, capacity=burst)
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0):
+        """Bloquea hasta disponer de `tokens` y los consume. Devuelve el tiempo esperado."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+    def limit(self, function):
+        """Envuelve `function` para que cada llamada consuma antes un token."""
+        @functools.wraps(function)
+        def limited(*args, **kwargs):
+            self.acquire()
+            return function(*args, **kwargs)
+        return limited
+
+
+def rate_limited_client(client, rate_limiter: TokenBucket):
+    """
+    Limita un cliente REST de Alpaca por petición HTTP y no por descarga: `get_bars` pagina
+    y el cliente reintenta, y cada una de esas peticiones pasa por `_one_request`.
+    """
+    client._one_request = rate_limiter.limit(client._one_request)
+    return client
+
+
+def _new_stats(symbol):
+    return {
+        "symbol": symbol,
+        "status": "pending",
+        "rows_fetched": 0,
+        "rows_written": 0,
+        "fetch_seconds": 0.0,
+        "write_seconds": 0.0,
+        "error": None,
+    }
+
+
+def run_concurrent_ingestion(symbols, fetch, write_batch, session_factory, workers=DEFAULT_WORKERS,
+                             queue_size=DEFAULT_QUEUE_SIZE, batch_rows=DEFAULT_BATCH_ROWS,
+                             flush_seconds=DEFAULT_FLUSH_SECONDS):
+    """
+    Descarga y guarda un universo de símbolos con descargas concurrentes y escritura en cadena.
+
+    - `fetch(symbol)` devuelve un DataFrame ya limpio (vacío si no hay datos) o lanza una
+      excepción si la descarga falla. Se ejecuta en un pool de `workers` hilos. La cuota de
+      la API se aplica dentro de `fetch`, por petición HTTP (ver `rate_limited_client`).
+    - Los resultados pasan por una cola acotada a `queue_size` elementos, que frena a los
+      descargadores si la base de datos va más lenta que la red.
+    - Un único hilo escritor con su propia sesión (`session_factory()`) acumula resultados
+      hasta `batch_rows` filas y llama a `write_batch(session, lote)`, donde `lote` es una
+      lista de tuplas (symbol, data). Debe devolver un dict symbol -> filas escritas y
+      dejar la transacción confirmada; si lanza una excepción, todo el lote se marca como error.
+    - Si el propio escritor muere (p. ej. `session_factory()` falla), los descargadores dejan
+      de esperar a la cola y los símbolos sin guardar se marcan como `write_error`.
+
+    Devuelve un DataFrame con las estadísticas por símbolo.
+    """
+    symbols = list(symbols)
+    stats = {symbol: _new_stats(symbol) for symbol in symbols}
+    stats_lock = threading.Lock()
+    results = queue.Queue(maxsize=queue_size)
+    done_counter = [0]
+    sentinel = object()
+    writer_failed = threading.Event()
+    writer_error = []
+
+    def report_progress(symbol):
+        with stats_lock:
+            done_counter[0] += 1
+            entry = stats[symbol]
+            logging.info(
+                f"[{done_counter[0]}/{len(symbols)}] {symbol}: {entry['status']} - "
+                f"{entry['rows_fetched']} filas descargadas, {entry['rows_written']} escritas "
+                f"(descarga {entry['fetch_seconds']:.2f}s, escritura {entry['write_seconds']:.2f}s)"
+            )
+
+    def put(item):
+        """Encola sin bloquear para siempre: devuelve False si el escritor ha muerto."""
+        while not writer_failed.is_set():
+            try:
+                results.put(item, timeout=PUT_TIMEOUT_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch_symbol(symbol):
+        if writer_failed.is_set():
+            return
+        started = time.perf_counter()
+        try:
+            data = fetch(symbol)
+        except Exception as e:
+            with stats_lock:
+                stats[symbol].update(status="fetch_error", error=str(e),
+                                     fetch_seconds=time.perf_counter() - started)
+            logging.error(f"Error al descargar los datos para {symbol}: {e}")
+            report_progress(symbol)
+            return
+
+        with stats_lock:
+            stats[symbol]["fetch_seconds"] = time.perf_counter() - started
+            stats[symbol]["rows_fetched"] = 0 if data is None else len(data)
+
+        if data is None or data.empty:
+            with stats_lock:
+                stats[symbol]["status"] = "empty"
+            report_progress(symbol)
+            return
+
+        put((symbol, data))
+
+    def flush(session, pending):
+        started = time.perf_counter()
+        try:
+            written = write_batch(session, pending) or {}
+            error = None
+        except Exception as e:
+            written, error = {}, str(e)
+            logging.error(f"Error al escribir un lote de {len(pending)} símbolos: {e}")
+        elapsed = time.perf_counter() - started
+
+        for symbol, _ in pending:
+            with stats_lock:
+                entry = stats[symbol]
+                entry["write_seconds"] = elapsed
+                if error is not None:
+                    entry.update(status="write_error", error=error)
+                else:
+                    entry.update(status="ok", rows_written=written.get(symbol, 0))
+            report_progress(symbol)
+
+    def writer():
+        session = None
+        pending, pending_rows = [], 0
+        try:
+            session = session_factory()
+            while True:
+                try:
+                    item = results.get(timeout=flush_seconds)
+                except queue.Empty:
+                    item = None
+
+                if item is sentinel:
+                    break
+                if item is not None:
+                    pending.append(item)
+                    pending_rows += len(item[1])
+
+                # Vaciar el lote si está lleno o si la cola lleva un rato sin datos
+                if pending and (pending_rows >= batch_rows or item is None):
+                    flush(session, pending)
+                    pending, pending_rows = [], 0
+
+            if pending:
+                flush(session, pending)
+        except Exception as e:
+            writer_error.append(e)
+            writer_failed.set()
+            logging.error(f"El escritor de la ingesta concurrente se detuvo: {e}")
+        finally:
+            if session is not None:
+                session.close()
+
+    writer_thread = threading.Thread(target=writer, name="ingestion-writer", daemon=True)
+    writer_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingestion-fetch") as pool:
+            list(pool.map(fetch_symbol, symbols))
+    finally:
+        put(sentinel)
+        writer_thread.join()
+
+    if writer_error:
+        for entry in stats.values():
+            if entry["status"] == "pending":
+                entry.update(status="write_error", error=f"Writer failure: {writer_error[0]}")
+
+    report = pd.DataFrame([stats[symbol] for symbol in symbols])
+    if not report.empty:
+        summary = report["status"].value_counts().to_dict()
+        logging.info(f"Ingesta concurrente finalizada: {summary}. Filas escritas: {report['rows_written'].sum()}.")
+    return report
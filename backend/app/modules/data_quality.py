@@ -0,0 +1,259 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
+from backend.app.modules.market_calendar import incomplete_session_counts, session_dates, session_mask
+
+# Tolerancias por defecto de la comparación intradía vs. diario
+CLOSE_TOLERANCE = 0.01  # Diferencia absoluta máxima entre cierres (USD)
+RANGE_TOLERANCE = None  # Diferencia relativa máxima de máximos y mínimos (None = sin comprobar)
+VOLUME_TOLERANCE = None  # Diferencia relativa máxima de volumen (None = sin comprobar)
+
+SUMMARY_COLUMNS = ["symbol", "date", "bars", "intraday_open", "intraday_high", "intraday_low",
+                   "intraday_close", "intraday_volume"]
+FLAG_COLUMNS = ["missing_intraday", "close_mismatch", "high_mismatch", "low_mismatch", "volume_mismatch"]
+
+# Criterios de símbolo recuperable y parámetros del modo streaming
+MAX_INCOMPLETE_DAYS = 5
+MAX_INCONSISTENCIES = 10
+STREAM_CHUNK_ROWS = 50000  # Filas por bloque leídas del cursor del servidor
+REPORT_COLUMNS = ["symbol", "status", "incomplete_days", "inconsistencies", "incomplete_days_list",
+                  "inconsistencies_list"]
+
+
+def summarize_intraday_sessions(df_intraday: pd.DataFrame, regular_hours=True):
+    """
+    Resume las velas intradía por símbolo y sesión en una sola pasada.
+
+    `df_intraday` tiene `symbol`, `datetime` (UTC sin zona horaria) y los precios.
+    La fecha de sesión es el día en Nueva York; con `regular_hours` solo se usan velas
+    de sesión regular, que es lo que recoge la vela diaria. Devuelve por símbolo-día el
+    número de velas, apertura, máximo, mínimo, último cierre y volumen acumulado.
+    """
+    if df_intraday.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    times = pd.to_datetime(df_intraday["datetime"])
+    data = df_intraday[["symbol", "open", "high", "low", "close", "volume"]]
+    if regular_hours:
+        mask = session_mask(times)
+        data, times = data[mask], times[mask]
+
+    data = data.assign(datetime=times.values, date=session_dates(times).astype("datetime64[ns]"))
+    # Una única ordenación; `first`/`last` dentro del grupo respetan ese orden
+    data = data.sort_values(["symbol", "datetime"], kind="stable")
+    summary = data.groupby(["symbol", "date"], sort=False).agg(
+        bars=("close", "size"),
+        intraday_open=("open", "first"),
+        intraday_high=("high", "max"),
+        intraday_low=("low", "min"),
+        intraday_close=("close", "last"),
+        intraday_volume=("volume", "sum"),
+    )
+    return summary.reset_index()[SUMMARY_COLUMNS]
+
+
+def combine_session_summaries(summaries):
+    """
+    Combina resúmenes de `summarize_intraday_sessions` calculados sobre bloques consecutivos
+    (en orden de `datetime`): una sesión partida entre dos bloques queda en una sola fila.
+    """
+    summaries = [summary for summary in summaries if not summary.empty]
+    if not summaries:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    summary = pd.concat(summaries, ignore_index=True).groupby(["symbol", "date"], sort=False).agg(
+        bars=("bars", "sum"),
+        intraday_open=("intraday_open", "first"),
+        intraday_high=("intraday_high", "max"),
+        intraday_low=("intraday_low", "min"),
+        intraday_close=("intraday_close", "last"),
+        intraday_volume=("intraday_volume", "sum"),
+    )
+    return summary.reset_index()[SUMMARY_COLUMNS]
+
+
+def _relative_difference(a, b):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.abs(a - b) / np.abs(b)
+
+
+def compare_intraday_with_daily(df_intraday: pd.DataFrame, df_daily: pd.DataFrame,
+                                close_tolerance=CLOSE_TOLERANCE, range_tolerance=RANGE_TOLERANCE,
+                                volume_tolerance=VOLUME_TOLERANCE, summary: pd.DataFrame = None):
+    """
+    Compara cada vela diaria de `sp500_data` con el resumen intradía de la misma sesión.
+
+    Devuelve una fila por vela diaria con los valores de ambos lados, una columna booleana
+    por comprobación (`FLAG_COLUMNS`) e `inconsistent` si falla cualquiera. Una tolerancia
+    `None` desactiva su comprobación. Si ya se dispone del resumen intradía se puede pasar
+    en `summary` para no recalcularlo.
+    """
+    if summary is None:
+        summary = summarize_intraday_sessions(df_intraday)
+
+    daily = df_daily[["symbol", "date", "high", "low", "close", "volume"]].copy()
+    daily["date"] = pd.to_datetime(daily["date"])
+    merged = daily.merge(summary, on=["symbol", "date"], how="left")
+
+    missing = merged["bars"].isna().to_numpy()
+    merged["missing_intraday"] = missing
+    merged["close_mismatch"] = ~missing & (
+        np.abs(merged["close"].to_numpy() - merged["intraday_close"].to_numpy()) > close_tolerance
+    )
+    for flag, daily_col, intraday_col, tolerance in (
+        ("high_mismatch", "high", "intraday_high", range_tolerance),
+        ("low_mismatch", "low", "intraday_low", range_tolerance),
+        ("volume_mismatch", "volume", "intraday_volume", volume_tolerance),
+    ):
+        if tolerance is None:
+            merged[flag] = False
+            continue
+        difference = _relative_difference(merged[intraday_col].to_numpy(dtype=float),
+                                          merged[daily_col].to_numpy(dtype=float))
+        merged[flag] = ~missing & (difference > tolerance)
+
+    merged["inconsistent"] = merged[FLAG_COLUMNS].any(axis=1)
+    logging.info(f"Comparadas {len(merged)} velas diarias: {int(merged['inconsistent'].sum())} inconsistentes.")
+    return merged
+
+
+def inconsistent_dates(flags: pd.DataFrame):
+    """Agrupa las fechas inconsistentes por símbolo: dict symbol -> lista de `datetime.date`."""
+    bad = flags.loc[flags["inconsistent"], ["symbol", "date"]]
+    return {symbol: list(dates.dt.date) for symbol, dates in bad.groupby("symbol")["date"]}
+
+
+def symbol_report_row(symbol, summary: pd.DataFrame, daily: pd.DataFrame, timeframe="5Min"):
+    """
+    Fila del reporte de calidad de un símbolo a partir de su resumen por sesión
+    (`summarize_intraday_sessions`): sesiones incompletas e inconsistencias con el diario.
+    """
+    incomplete_days = incomplete_session_counts(summary.set_index("date")["bars"], timeframe)
+    inconsistencies = inconsistent_dates(compare_intraday_with_daily(None, daily, summary=summary)).get(symbol, [])
+    return {
+        "symbol": symbol,
+        "status": "problematic" if len(incomplete_days) > 0 or len(inconsistencies) > 0 else "ok",
+        "incomplete_days": len(incomplete_days),
+        "inconsistencies": len(inconsistencies),
+        "incomplete_days_list": [day.date() for day in incomplete_days.index],
+        "inconsistencies_list": inconsistencies,
+    }
+
+
+def is_recoverable(row):
+    """Un símbolo es recuperable con pocos días incompletos y pocas inconsistencias."""
+    return row["incomplete_days"] <= MAX_INCOMPLETE_DAYS and row["inconsistencies"] <= MAX_INCONSISTENCIES
+
+
+def stream_symbol_intraday(bind, symbol, timeframe="5Min", chunksize=STREAM_CHUNK_ROWS):
+    """
+    Genera las velas intradía de un símbolo en bloques de `chunksize` filas, en orden de
+    `datetime`, leídos con un cursor del lado del servidor: en memoria solo hay un bloque.
+    """
+    with bind.connect() as connection:
+        connection = connection.execution_options(stream_results=True)
+        for chunk in pd.read_sql(
+            text("SELECT symbol, datetime, open, high, low, close, volume FROM sp500_intraday_data "
+                 "WHERE symbol = :symbol AND timeframe = :timeframe ORDER BY datetime"),
+            connection, params={"symbol": symbol, "timeframe": timeframe}, chunksize=chunksize,
+        ):
+            chunk["datetime"] = pd.to_datetime(chunk["datetime"])
+            yield chunk
+
+
+def summarize_symbol_intraday(bind, symbol, timeframe="5Min", chunksize=STREAM_CHUNK_ROWS):
+    """
+    Resume por sesión las velas de un símbolo agregando cada bloque según llega del cursor.
+    Devuelve el resumen (`SUMMARY_COLUMNS`) y el número de velas leídas.
+    """
+    summaries, rows = [], 0
+    for chunk in stream_symbol_intraday(bind, symbol, timeframe, chunksize):
+        summaries.append(summarize_intraday_sessions(chunk))
+        rows += len(chunk)
+    return combine_session_summaries(summaries), rows
+
+
+def read_symbol_daily(bind, symbol):
+    """Lee las velas diarias de un símbolo desde `sp500_data`."""
+    with bind.connect() as connection:
+        return pd.read_sql(
+            text("SELECT symbol, date, high, low, close, volume FROM sp500_data WHERE symbol = :symbol"),
+            connection, params={"symbol": symbol},
+        )
+
+
+def completed_symbols(report_path):
+    """Símbolos ya presentes en un reporte CSV parcial (para reanudar)."""
+    if not os.path.exists(report_path) or os.path.getsize(report_path) == 0:
+        return set()
+    return set(pd.read_csv(report_path, usecols=["symbol"])["symbol"])
+
+
+def replace_symbol_rows(bind, table, symbol, timeframe="5Min", copy=True):
+    """
+    Sustituye las filas de un símbolo en `table` en una transacción: las borra y, con `copy`,
+    vuelve a copiar sus velas desde `sp500_intraday_data` en el propio servidor (INSERT ...
+    SELECT), sin pasarlas por el proceso. La tabla se crea con la estructura de la de origen.
+    """
+    with bind.begin() as connection:
+        if inspect(connection).has_table(table):
+            connection.execute(text(f"DELETE FROM {table} WHERE symbol = :symbol"), {"symbol": symbol})
+        else:
+            connection.execute(text(f"CREATE TABLE {table} AS SELECT * FROM sp500_intraday_data WHERE 1 = 0"))
+        if copy:
+            connection.execute(
+                text(f"INSERT INTO {table} SELECT * FROM sp500_intraday_data "
+                     "WHERE symbol = :symbol AND timeframe = :timeframe"),
+                {"symbol": symbol, "timeframe": timeframe},
+            )
+
+
+def run_streaming_quality_report(bind, report_path, filtered_table=None, timeframe="5Min", resume=True,
+                                 symbols=None, chunksize=STREAM_CHUNK_ROWS):
+    """
+    Genera el reporte de calidad símbolo a símbolo con memoria acotada.
+
+    Cada símbolo se lee por bloques que se resumen por sesión según llegan, se evalúa y su
+    fila se añade al CSV `report_path` en cuanto termina. Si se indica `filtered_table`, las
+    velas de los símbolos recuperables se copian allí en el servidor de forma incremental
+    (las del símbolo se reemplazan). Con `resume` se saltan
+    los símbolos que ya figuran en el reporte; sin él, el reporte y la tabla filtrada se
+    rehacen desde cero. Devuelve el reporte completo.
+    """
+    if symbols is None:
+        with bind.connect() as connection:
+            symbols = [row[0] for row in connection.execute(
+                text("SELECT DISTINCT symbol FROM sp500_intraday_data WHERE timeframe = :timeframe ORDER BY symbol"),
+                {"timeframe": timeframe},
+            )]
+
+    if resume:
+        done = completed_symbols(report_path)
+    else:
+        done = set()
+        if os.path.exists(report_path):
+            os.remove(report_path)
+        if filtered_table is not None:
+            with bind.begin() as connection:
+                connection.execute(text(f"DROP TABLE IF EXISTS {filtered_table}"))
+
+    pending = [symbol for symbol in symbols if symbol not in done]
+    logging.info(f"Reporte de calidad: {len(pending)} símbolos pendientes ({len(done)} ya procesados).")
+
+    for position, symbol in enumerate(pending, start=1):
+        summary, rows = summarize_symbol_intraday(bind, symbol, timeframe, chunksize)
+        row = symbol_report_row(symbol, summary, read_symbol_daily(bind, symbol), timeframe)
+
+        # La tabla filtrada se escribe antes que la fila del reporte para que reanudar sea seguro
+        if filtered_table is not None:
+            replace_symbol_rows(bind, filtered_table, symbol, timeframe, copy=is_recoverable(row))
+
+        write_header = not os.path.exists(report_path) or os.path.getsize(report_path) == 0
+        pd.DataFrame([row], columns=REPORT_COLUMNS).to_csv(report_path, mode="a", header=write_header, index=False)
+        logging.info(f"[{position}/{len(pending)}] {symbol}: {row['status']} ({rows} velas).")
+
+    if not os.path.exists(report_path):
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.read_csv(report_path)
@@ -0,0 +1,407 @@
+import bisect
+import logging
+import math
+import time
+import numpy as np
+import pandas as pd
+from backend.app.modules.backtest import DEFAULT_COMMISSION, DEFAULT_INITIAL_CAPITAL, DEFAULT_SLIPPAGE, compute_metrics
+from backend.app.modules.bar_store import BarStore
+from backend.app.modules.intraday_storage import DEFAULT_TIMEFRAME
+from backend.app.modules.market_calendar import NYSE_TZ, session_dates, session_mask
+from backend.app.modules.performance_metrics import periods_per_year
+from backend.app.modules.time_windows import WINDOWS, TimeWindow
+
+# Backtester por eventos para velas intradía. Diseño del bucle principal:
+#   - Las velas se convierten una vez a listas de floats; el bucle no toca DataFrames.
+#   - Las órdenes viven en un libro de "slots" (listas paralelas por campo, con reutilización
+#     de huecos) y solo se recorren las órdenes vivas.
+#   - Sin posición ni órdenes vivas, el bucle salta directamente a la siguiente vela en la que
+#     la estrategia pidió despertar (`Strategy.wake`), así que las velas inactivas no cuestan nada.
+# Reglas de ejecución:
+#   - Las órdenes enviadas en la vela i participan desde la vela i + 1.
+#   - Mercado: apertura de la vela (o su VWAP con `fill_price="vwap"`) con deslizamiento.
+#   - Límite: en la apertura si ya la mejora; si no, al precio límite si el rango lo toca.
+#   - Stop: en la apertura si abre más allá del disparo; si no, al precio de disparo; con deslizamiento.
+#   - Dentro de la vela se supone el recorrido apertura → extremo más cercano → el otro extremo
+#     → cierre, que decide qué pata de un OCO se ejecuta primero.
+#   - Las órdenes hijas de un bracket (objetivo y stop, OCO entre sí) se activan en la vela
+#     siguiente a la ejecución de la orden padre.
+#   - En la última vela de cada ventana de sesión se cancelan las órdenes y se cierra la posición
+#     al cierre.
+
+MARKET, LIMIT, STOP = 0, 1, 2
+FREE, WORKING, WAITING = 0, 1, 2  # Estado de un slot: libre, activa, esperando a su orden padre
+FILL_COLUMNS = ["bar", "slot", "side", "quantity", "price", "commission"]
+EVENT_TRADE_COLUMNS = ["run", "entry_index", "exit_index", "side", "quantity", "entry_price", "exit_price",
+                       "bars_held", "pnl", "return"]
+
+
+def window_mask(times, window=None, tz=NYSE_TZ):
+    """
+    Velas operables: por defecto la sesión regular de NYSE (con cierres anticipados y
+    festivos); con el nombre de una franja registrada en `time_windows` (p. ej. "ny_open"),
+    esa franja; con `window=("HH:MM", "HH:MM")`, esa franja en hora local de `tz` en días de
+    sesión. Devuelve (máscara, identificador de día de sesión por vela).
+    """
+    index = pd.DatetimeIndex(times)
+    index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    days = session_dates(index)
+    if window is None or len(index) == 0:
+        return session_mask(index), days
+    if isinstance(window, str):
+        if window not in WINDOWS:
+            raise ValueError(f"Franja horaria desconocida: {window}")
+        return WINDOWS[window].mask(index), days
+    return TimeWindow("custom", window[0], window[1], tz).mask(index), days
+
+
+class OrderBook:
+    """Órdenes en slots: listas paralelas por campo y una pila de huecos libres."""
+    def __init__(self, capacity=16):
+        self.state = [FREE] * capacity
+        self.kind = [MARKET] * capacity
+        self.side = [0] * capacity
+        self.quantity = [0.0] * capacity
+        self.price = [math.nan] * capacity
+        self.oco = [-1] * capacity  # Orden que se cancela al ejecutarse esta
+        self.children = [()] * capacity  # Órdenes que se activan al ejecutarse esta
+        self.free = list(range(capacity - 1, -1, -1))
+        self.working = []
+
+    def _grow(self):
+        capacity = len(self.state)
+        for field in (self.state, self.kind, self.side, self.quantity, self.price, self.oco, self.children):
+            field.extend(field[:1] * capacity)
+        self.state[capacity:] = [FREE] * capacity
+        self.oco[capacity:] = [-1] * capacity
+        self.children[capacity:] = [()] * capacity
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def add(self, side, quantity, kind=MARKET, price=math.nan, waiting=False):
+        if not quantity > 0:
+            raise ValueError(f"La cantidad de una orden debe ser positiva: {quantity}")
+        if not self.free:
+            self._grow()
+        slot = self.free.pop()
+        self.state[slot] = WAITING if waiting else WORKING
+        self.kind[slot], self.side[slot], self.quantity[slot], self.price[slot] = kind, side, quantity, price
+        self.oco[slot], self.children[slot] = -1, ()
+        if not waiting:
+            self.working.append(slot)
+        return slot
+
+    def release(self, slot):
+        if self.state[slot] == WORKING:
+            self.working.remove(slot)
+        if self.state[slot] != FREE:
+            self.state[slot] = FREE
+            self.free.append(slot)
+            for child in self.children[slot]:
+                self.release(child)
+
+    def clear(self):
+        for slot in range(len(self.state)):
+            if self.state[slot] != FREE:
+                self.state[slot] = FREE
+                self.free.append(slot)
+        self.working = []
+
+
+class Strategy:
+    """
+    Estrategia por eventos. `on_bar(ctx, i)` se llama en las velas operables indicadas por
+    `wake` (array booleano por vela o None = todas) y, con posición u órdenes vivas, en todas
+    las velas operables. `on_fill(ctx, fill)` recibe cada ejecución.
+    """
+    wake = None
+
+    def on_start(self, ctx):
+        pass
+
+    def on_bar(self, ctx, i):
+        pass
+
+    def on_fill(self, ctx, fill):
+        pass
+
+
+class BacktestContext:
+    """
+    Estado visible para la estrategia: listas de precios por vela (`open`, `high`, `low`,
+    `close`, `volume`, `vwap`), posición, caja y métodos para enviar y cancelar órdenes.
+    """
+    def __init__(self, bars, commission, slippage, initial_capital, fill_price):
+        for name in ("open", "high", "low", "close", "volume", "vwap"):
+            setattr(self, name, bars[name])
+        self.commission = commission
+        self.slippage = slippage
+        self.cash = initial_capital
+        self.position = 0.0
+        self.book = OrderBook()
+        self.use_vwap = fill_price == "vwap"
+        self.fills = []
+        self.bar = -1
+
+    def equity(self, i=None):
+        i = self.bar if i is None else i
+        return self.cash + self.position * self.close[i]
+
+    def shares_for(self, fraction, price=None):
+        """Acciones enteras que se compran con `fraction` del capital actual."""
+        price = self.close[self.bar] if price is None else price
+        return math.floor(self.equity() * fraction / price)
+
+    def buy(self, quantity, kind=MARKET, price=math.nan):
+        """Orden de compra. Con cantidad 0 (p. ej. `shares_for` redondeado a 0) no envía nada y devuelve None."""
+        if quantity == 0:
+            return None
+        return self.book.add(1, quantity, kind, price)
+
+    def sell(self, quantity, kind=MARKET, price=math.nan):
+        """Orden de venta. Con cantidad 0 no envía nada y devuelve None."""
+        if quantity == 0:
+            return None
+        return self.book.add(-1, quantity, kind, price)
+
+    def bracket(self, side, quantity, take_profit, stop_loss, kind=MARKET, price=math.nan):
+        """
+        Orden de entrada con objetivo (límite) y stop de protección, OCO entre sí. Con
+        cantidad 0 no envía nada y devuelve None.
+        """
+        if quantity == 0:
+            return None
+        book = self.book
+        entry = book.add(side, quantity, kind, price)
+        target = book.add(-side, quantity, LIMIT, take_profit, waiting=True)
+        stop = book.add(-side, quantity, STOP, stop_loss, waiting=True)
+        book.oco[target], book.oco[stop] = stop, target
+        book.children[entry] = (target, stop)
+        return entry
+
+    def cancel(self, slot):
+        self.book.release(slot)
+
+    def cancel_all(self):
+        self.book.clear()
+
+    def flatten(self):
+        """Envía una orden de mercado que cierra la posición."""
+        if self.position:
+            return self.book.add(-1 if self.position > 0 else 1, abs(self.position))
+        return None
+
+    def _fill(self, slot, i, price):
+        book = self.book
+        side, quantity = book.side[slot], book.quantity[slot]
+        commission = abs(quantity * price) * self.commission
+        self.cash -= side * quantity * price + commission
+        self.position += side * quantity
+        fill = (i, slot, side, quantity, price, commission)
+        self.fills.append(fill)
+        return fill
+
+
+class EventBacktestResult:
+    """Ejecuciones, operaciones cerradas, capital por vela y métricas del backtest por eventos."""
+    def __init__(self, fills, trades, equity, metrics, index=None):
+        self.fills = fills
+        self.trades = trades
+        self.equity = equity
+        self.metrics = metrics
+        self.index = index
+
+
+def _bar_lists(bars: pd.DataFrame):
+    lists = {name: bars[name].to_numpy(dtype=np.float64).tolist() for name in ("open", "high", "low", "close")}
+    lists["volume"] = bars["volume"].to_numpy(dtype=np.float64).tolist() if "volume" in bars else None
+    lists["vwap"] = bars["vwap"].to_numpy(dtype=np.float64).tolist() if "vwap" in bars else lists["open"]
+    return lists
+
+
+def run_event_backtest(bars: pd.DataFrame, strategy: Strategy, window=None, commission=DEFAULT_COMMISSION,
+                       slippage=DEFAULT_SLIPPAGE, initial_capital=DEFAULT_INITIAL_CAPITAL, fill_price="open",
+                       timeframe=DEFAULT_TIMEFRAME):
+    """
+    Reproduce las velas de un símbolo (`datetime` y OHLC; `volume`/`vwap` opcionales, p. ej.
+    de `fetch_intraday_range`) a través de la estrategia. `window` limita las velas operables
+    (ver `window_mask`); `timeframe` solo se usa para anualizar las métricas. Devuelve un
+    `EventBacktestResult`.
+    """
+    started = time.perf_counter()
+    bars = bars.sort_values("datetime", ignore_index=True)
+    times = pd.DatetimeIndex(pd.to_datetime(bars["datetime"]))
+    tradable, days = window_mask(times, window)
+    n = len(bars)
+    # Última vela operable de cada día: ahí se cancelan órdenes y se cierra la posición
+    next_tradable = np.append(tradable[1:], False)
+    next_day = np.append(days[1:], np.datetime64("NaT"))
+    session_last = (tradable & (~next_tradable | (next_day != days))).tolist()
+
+    tradable_index = np.flatnonzero(tradable)
+    wake = tradable if strategy.wake is None else tradable & np.asarray(strategy.wake, dtype=bool)
+    wake_index = np.flatnonzero(wake).tolist()
+    wake_flags = wake.tolist()
+    following = np.full(n + 1, n, dtype=np.int64)  # Siguiente vela operable posterior a cada vela
+    following[tradable_index[:-1]] = tradable_index[1:]
+    following = following.tolist()
+
+    ctx = BacktestContext(_bar_lists(bars), commission, slippage, initial_capital, fill_price)
+    strategy.on_start(ctx)
+    book = ctx.book
+    opens, highs, lows, closes, vwaps = ctx.open, ctx.high, ctx.low, ctx.close, ctx.vwap
+    use_vwap = ctx.use_vwap
+    visited = 0
+
+    i = wake_index[0] if wake_index else n
+    while i < n:
+        visited += 1
+        ctx.bar = i
+        if book.working:
+            _match_orders(ctx, strategy, i, opens[i], highs[i], lows[i], closes[i],
+                          vwaps[i] if use_vwap else opens[i])
+        if wake_flags[i]:
+            strategy.on_bar(ctx, i)
+        if session_last[i] and (ctx.position or book.working):
+            book.clear()
+            if ctx.position:
+                side = -1 if ctx.position > 0 else 1
+                slot = book.add(side, abs(ctx.position))
+                fill = ctx._fill(slot, i, closes[i] * (1 + side * slippage))
+                book.release(slot)
+                strategy.on_fill(ctx, fill)
+
+        if ctx.position or book.working:
+            i = following[i]
+        else:
+            position = bisect.bisect_right(wake_index, i)
+            i = wake_index[position] if position < len(wake_index) else n
+
+    fills = pd.DataFrame(ctx.fills, columns=FILL_COLUMNS)
+    equity = _equity_curve(fills, bars["close"].to_numpy(dtype=np.float64), initial_capital)
+    trades = _round_trips(fills, equity, initial_capital)
+    metrics = compute_metrics(equity[None, :], trades, initial_capital, periods_per_year(timeframe))
+    elapsed = time.perf_counter() - started
+    logging.info(f"Backtest por eventos: {n} velas ({visited} visitadas), {len(fills)} ejecuciones "
+                 f"en {elapsed:.3f}s.")
+    return EventBacktestResult(fills, trades, equity, metrics, times)
+
+
+def _match_orders(ctx, strategy, i, open_, high, low, close, market_price):
+    """Ejecuta las órdenes vivas que toca la vela, en el orden del recorrido intrabarra supuesto."""
+    book = ctx.book
+    slippage = ctx.slippage
+    high_first = high - open_ <= open_ - low
+    candidates = []
+    for slot in book.working:
+        kind, side, level = book.kind[slot], book.side[slot], book.price[slot]
+        if kind == MARKET:
+            candidates.append((0, slot, market_price * (1 + side * slippage)))
+            continue
+        # Nivel por encima del precio (compra stop, venta límite) o por debajo (compra límite, venta stop)
+        above = (kind == STOP) == (side > 0)
+        if above:
+            if open_ >= level:
+                price = open_
+                rank = 0
+            elif high >= level:
+                price = level
+                rank = 1 if high_first else 2
+            else:
+                continue
+        else:
+            if open_ <= level:
+                price = open_
+                rank = 0
+            elif low <= level:
+                price = level
+                rank = 2 if high_first else 1
+            else:
+                continue
+        if kind == STOP:
+            price *= 1 + side * slippage
+        candidates.append((rank, slot, price))
+
+    if not candidates:
+        return
+    candidates.sort()
+    activated = []
+    for _, slot, price in candidates:
+        if book.state[slot] != WORKING:
+            continue  # Cancelada por su OCO en esta misma vela
+        fill = ctx._fill(slot, i, price)
+        children, sibling = book.children[slot], book.oco[slot]
+        book.children[slot] = ()
+        book.release(slot)
+        if sibling >= 0:
+            book.release(sibling)
+        activated.extend(children)
+        strategy.on_fill(ctx, fill)
+    for child in activated:
+        if book.state[child] == WAITING:
+            book.state[child] = WORKING
+            book.working.append(child)
+
+
+def _equity_curve(fills: pd.DataFrame, close, initial_capital):
+    """Capital al cierre de cada vela a partir de las ejecuciones (caja + posición × cierre)."""
+    n = len(close)
+    cash_flow = np.zeros(n)
+    quantity = np.zeros(n)
+    if not fills.empty:
+        bars = fills["bar"].to_numpy()
+        signed = fills["side"].to_numpy() * fills["quantity"].to_numpy()
+        np.add.at(cash_flow, bars, -(signed * fills["price"].to_numpy()) - fills["commission"].to_numpy())
+        np.add.at(quantity, bars, signed)
+    cash = initial_capital + np.cumsum(cash_flow)
+    position = np.cumsum(quantity)
+    marked = pd.Series(close).ffill().to_numpy()
+    return cash + np.where(position != 0, position * np.nan_to_num(marked), 0.0)
+
+
+def _round_trips(fills: pd.DataFrame, equity, initial_capital):
+    """
+    Agrupa las ejecuciones en operaciones, de posición plana a posición plana. Una ejecución
+    que da la vuelta a la posición cierra la operación y abre otra con el resto.
+    """
+    rows = []
+    position = 0.0
+    for bar, _, side, quantity, price, commission in fills.itertuples(index=False):
+        fee = commission / quantity
+        while quantity > 1e-9:
+            if position == 0:
+                entry_bar, trade_side = bar, side
+                entry_value = entry_quantity = exit_value = exit_quantity = costs = 0.0
+            # Parte de la ejecución que aumenta la posición o que la reduce hasta cerrarla
+            part = quantity if side == trade_side else min(quantity, abs(position))
+            if side == trade_side:
+                entry_value += part * price
+                entry_quantity += part
+            else:
+                exit_value += part * price
+                exit_quantity += part
+            costs += part * fee
+            position += side * part
+            quantity -= part
+            if abs(position) < 1e-9:
+                position = 0.0
+                before = equity[entry_bar - 1] if entry_bar > 0 else initial_capital
+                pnl = trade_side * (exit_value - entry_value) - costs
+                rows.append((0, entry_bar, bar, trade_side, entry_quantity, entry_value / entry_quantity,
+                             exit_value / exit_quantity, bar - entry_bar, pnl, pnl / before))
+    return pd.DataFrame(rows, columns=EVENT_TRADE_COLUMNS)
+
+
+def backtest_store_events(store: BarStore, strategy_factory, symbols=None, start=None, end=None, **kwargs):
+    """
+    Backtest por eventos de cada símbolo del almacén columnar. `strategy_factory(symbol)`
+    devuelve una estrategia nueva por símbolo. Devuelve (métricas con `symbol`, dict symbol ->
+    `EventBacktestResult`).
+    """
+    results = {}
+    for symbol in symbols or store.symbols():
+        bars = store.read(symbol, start, end).to_frame()
+        if not bars.empty:
+            results[symbol] = run_event_backtest(bars, strategy_factory(symbol), **kwargs)
+    metrics = pd.concat([result.metrics.assign(symbol=symbol) for symbol, result in results.items()],
+                        ignore_index=True) if results else pd.DataFrame()
+    return metrics, results
@@ -0,0 +1,79 @@
+import logging
+import numpy as np
+import pandas as pd
+from backend.app.modules.market_calendar import expected_index
+
+# Parámetros de agrupación de peticiones de relleno
+BAR_FREQ = pd.Timedelta(minutes=5)
+MAX_MERGE_GAP = pd.Timedelta(days=1)  # Rangos del mismo símbolo más cercanos que esto se piden juntos
+MAX_REQUEST_SPAN = pd.Timedelta(days=30)  # Longitud máxima de la ventana de una petición
+MAX_SYMBOLS_PER_REQUEST = 50
+
+
+def find_missing_timestamps(available: pd.DatetimeIndex, start, end, freq=BAR_FREQ):
+    """Velas de sesión regular (calendario NYSE) entre `start` y `end` que no están en `available` (UTC)."""
+    if available.tz is None:
+        available = available.tz_localize("UTC")
+    expected = expected_index(start, end, freq)
+    return expected[~expected.isin(available.tz_convert("UTC"))]
+
+
+def coalesce_gaps(missing: pd.DatetimeIndex, freq=BAR_FREQ):
+    """
+    Agrupa marcas de tiempo faltantes consecutivas (separadas por `freq`) en rangos contiguos.
+    Devuelve un DataFrame con `start`, `end` (inicio de la última vela faltante) y `bars`.
+    """
+    if len(missing) == 0:
+        return pd.DataFrame(columns=["start", "end", "bars"])
+
+    missing = missing.sort_values()
+    values = missing.asi8
+    breaks = np.flatnonzero(np.diff(values) != freq.value) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks - 1, [len(values) - 1]))
+    return pd.DataFrame({
+        "start": missing[starts],
+        "end": missing[ends],
+        "bars": ends - starts + 1,
+    })
+
+
+def plan_backfill_requests(gaps: pd.DataFrame, freq=BAR_FREQ, max_merge_gap=MAX_MERGE_GAP,
+                           max_span=MAX_REQUEST_SPAN, max_symbols=MAX_SYMBOLS_PER_REQUEST):
+    """
+    Convierte los rangos faltantes de todos los símbolos en el menor número de peticiones.
+
+    `gaps` tiene columnas `symbol`, `start`, `end`. Primero se fusionan los rangos de cada
+    símbolo separados por menos de `max_merge_gap` (sin superar `max_span`); después se
+    agrupan ventanas de distintos símbolos que caben juntas en una petición de como mucho
+    `max_span` y `max_symbols`. Devuelve una lista de dicts con `symbols`, `start` y `end`
+    (ventana semiabierta [start, end)).
+    """
+    if gaps.empty:
+        return []
+
+    windows = []
+    for symbol, symbol_gaps in gaps.sort_values(["symbol", "start"]).groupby("symbol", sort=True):
+        current_start, current_end = None, None
+        for start, end in zip(symbol_gaps["start"], symbol_gaps["end"] + freq):
+            if current_start is not None and start - current_end <= max_merge_gap \
+                    and end - current_start <= max_span:
+                current_end = max(current_end, end)
+                continue
+            if current_start is not None:
+                windows.append((current_start, current_end, symbol))
+            current_start, current_end = start, end
+        windows.append((current_start, current_end, symbol))
+
+    requests = []
+    for start, end, symbol in sorted(windows):
+        last = requests[-1] if requests else None
+        if last is not None and len(last["symbols"]) < max_symbols and symbol not in last["symbols"] \
+                and max(last["end"], end) - last["start"] <= max_span:
+            last["symbols"].append(symbol)
+            last["end"] = max(last["end"], end)
+        else:
+            requests.append({"symbols": [symbol], "start": start, "end": end})
+
+    logging.info(f"{len(gaps)} rangos faltantes agrupados en {len(requests)} peticiones.")
+    return requests
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from backend.app.modules import indicators
+from backend.app.modules.market_calendar import session_dates
+from backend.app.modules.streaming_indicators import (
+    StreamingATR, StreamingEMA, StreamingMACD, StreamingPSAR, StreamingRSI, StreamingSMA, StreamingVWAP,
+)
+
+# Caché de series de indicadores en dos niveles: memoria (LRU con presupuesto en bytes) y disco
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDICATOR_CACHE_DIR = os.getenv("INDICATOR_CACHE_DIR", os.path.join(BASE_DIR, "../../data/indicator_cache"))
+INDICATOR_CACHE_BYTES = int(os.getenv("INDICATOR_CACHE_BYTES", str(256 * 1024 * 1024)))
+# Velas finales de la serie cacheada cuya huella (OHLCV) se comprueba antes de reutilizarla
+FINGERPRINT_BARS = 64
+FINGERPRINT_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def _sessions(bars):
+    return session_dates(bars["datetime"]).astype("int64")
+
+
+def _columns(bars, *names):
+    return [bars[name].to_numpy(dtype=float) for name in names]
+
+
+# Indicadores soportados. Cada uno define:
+#   - batch: cálculo completo con `indicators.py`, devuelve una lista de salidas (arrays).
+#   - stream: (fábrica del indicador incremental, función que lo actualiza con una vela) para
+#     los recursivos, que se extienden sin recalcular; o
+#   - lookback: velas previas necesarias para recalcular solo la cola en los de ventana finita.
+INDICATOR_SPECS = {
+    "SMA": {
+        "batch": lambda bars, window: [indicators.sma(*_columns(bars, "close"), window)],
+        "stream": (StreamingSMA, lambda ind, bar: ind.update(bar["close"])),
+    },
+    "EMA": {
+        "batch": lambda bars, span: [indicators.ema(*_columns(bars, "close"), span=span)],
+        "stream": (lambda span: StreamingEMA(span=span), lambda ind, bar: ind.update(bar["close"])),
+    },
+    "RSI": {
+        "batch": lambda bars, period: [indicators.rsi(*_columns(bars, "close"), period)],
+        "stream": (StreamingRSI, lambda ind, bar: ind.update(bar["close"])),
+    },
+    "MACD": {
+        "batch": lambda bars, *params: list(indicators.macd(*_columns(bars, "close"), *params)),
+        "stream": (StreamingMACD, lambda ind, bar: ind.update(bar["close"])),
+    },
+    "ATR": {
+        "batch": lambda bars, period: [indicators.atr(*_columns(bars, "high", "low", "close"), period)],
+        "stream": (StreamingATR, lambda ind, bar: ind.update(bar["high"], bar["low"], bar["close"])),
+    },
+    "PSAR": {
+        "batch": lambda bars, *params: [indicators.parabolic_sar(*_columns(bars, "high", "low"), *params)],
+        "stream": (StreamingPSAR, lambda ind, bar: ind.update(bar["high"], bar["low"])),
+    },
+    "VWAP": {
+        "batch": lambda bars: [indicators.vwap(*_columns(bars, "high", "low", "close", "volume"), _sessions(bars))],
+        "stream": (StreamingVWAP, lambda ind, bar: ind.update(bar["high"], bar["low"], bar["close"], bar["volume"],
+                                                               bar["session"])),
+    },
+    "BOLLINGER": {
+        "batch": lambda bars, window, num_std: list(indicators.bollinger_bands(*_columns(bars, "close"), window,
+                                                                               num_std)),
+        "lookback": lambda window, num_std: window - 1,
+    },
+    "FIBONACCI": {
+        "batch": lambda bars, window: list(indicators.fibonacci_levels(*_columns(bars, "high", "low"),
+                                                                        window).values()),
+        "lookback": lambda window: window - 1,
+    },
+}
+
+
+def _times_ns(bars):
+    return pd.to_datetime(bars["datetime"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def _fingerprint(bars, end):
+    """
+    Huella de las `FINGERPRINT_BARS` velas anteriores a la posición `end`: fechas y OHLCV.
+    Cambia si el proveedor corrige velas recientes (ventana de solapamiento de la
+    sincronización) o ajusta toda la historia (splits, dividendos).
+    """
+    window = bars.iloc[max(0, end - FINGERPRINT_BARS):end]
+    digest = hashlib.sha1(_times_ns(window).tobytes())
+    for column in FINGERPRINT_COLUMNS:
+        if column in window:
+            digest.update(np.ascontiguousarray(window[column].to_numpy(dtype=float)).tobytes())
+    return digest.hexdigest()
+
+
+def _stream_values(indicator, update, bars):
+    """Aplica velas a un indicador incremental y devuelve sus valores (salidas × velas)."""
+    records = bars.assign(session=_sessions(bars)) if "volume" in bars else bars
+    values = []
+    for bar in records.to_dict("records"):
+        value = update(indicator, bar)
+        values.append(value if isinstance(value, tuple) else (value,))
+    return np.array(values, dtype=np.float64).T.reshape(-1, len(bars))
+
+
+class CacheEntry:
+    """
+    Serie cacheada: marcas de tiempo (ns), valores (salidas × velas), huella de las últimas
+    velas de entrada y estado incremental opcional.
+    """
+    def __init__(self, times, values, fingerprint, state=None):
+        self.times = times
+        self.values = values
+        self.fingerprint = fingerprint
+        self.state = state
+
+    @property
+    def watermark(self):
+        return int(self.times[-1]) if len(self.times) else None
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes
+
+
+class IndicatorCache:
+    """
+    Caché de series de indicadores por (símbolo, temporalidad, indicador, parámetros, versión).
+
+    La validez la marca la última vela (`watermark`) junto con la huella de las últimas
+    velas cacheadas: si llegan velas nuevas que continúan la serie cacheada sin corregir
+    su cola, se calcula solo la cola nueva (con el estado incremental para los indicadores
+    recursivos o con una ventana de velas previas para los de ventana finita); si la cola
+    cacheada se corrigió, la serie se recalcula completa.
+    El nivel en memoria es un LRU limitado a `max_bytes`; el nivel en disco (`disk_dir`,
+    None para desactivarlo) conserva las series entre procesos.
+    """
+    def __init__(self, max_bytes=INDICATOR_CACHE_BYTES, disk_dir=INDICATOR_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "extensions": 0, "restated": 0,
+                         "evictions": 0}
+
+    def stats(self):
+        """Contadores de aciertos, fallos, extensiones, series corregidas y desalojos, más el uso de memoria."""
+        return dict(self.counters, bytes=self.bytes, entries=len(self.entries))
+
+    def get(self, symbol, timeframe, indicator, params=(), bars: pd.DataFrame = None, version=None):
+        """
+        Devuelve la serie del indicador alineada con `bars` (velas de un símbolo ordenadas por
+        fecha): un array 1-D si tiene una salida o (salidas × velas) si tiene varias.
+        `version` permite invalidar explícitamente si se corrigen velas anteriores a la
+        ventana de la huella.
+        """
+        if indicator not in INDICATOR_SPECS:
+            raise ValueError(f"Indicador no soportado por la caché: {indicator}")
+        params = tuple(params)
+        key = (symbol, timeframe, indicator, params, version)
+        times = _times_ns(bars)
+
+        entry = self._lookup(key)
+        cached = 0 if entry is None else len(entry.times)
+        continues = entry is not None and 0 < cached <= len(times) and np.array_equal(entry.times, times[:cached])
+        if continues and entry.fingerprint != _fingerprint(bars, cached):
+            # Velas ya cacheadas corregidas por el proveedor: la serie no es reutilizable
+            self.counters["restated"] += 1
+            continues = False
+
+        if continues and cached == len(times):
+            self.counters["hits"] += 1
+            return self._result(entry.values)
+        if continues:
+            entry = self._extend(entry, indicator, params, bars)
+            self.counters["extensions"] += 1
+        else:
+            self.counters["misses"] += 1
+            outputs = INDICATOR_SPECS[indicator]["batch"](bars, *params)
+            entry = CacheEntry(times, np.vstack(outputs), _fingerprint(bars, len(bars)))
+        self._store(key, entry)
+        return self._result(entry.values)
+
+    @staticmethod
+    def _result(values):
+        return values[0] if values.shape[0] == 1 else values
+
+    def _extend(self, entry, indicator, params, bars):
+        """Calcula solo las velas posteriores a la marca de agua de la serie cacheada."""
+        spec = INDICATOR_SPECS[indicator]
+        cached = len(entry.times)
+        if "stream" in spec:
+            factory, update = spec["stream"]
+            if entry.state is None:
+                # Primera extensión: se reconstruye el estado incremental con la historia cacheada
+                stream = factory(*params)
+                _stream_values(stream, update, bars.iloc[:cached])
+            else:
+                stream = type(factory(*params)).from_state(entry.state)
+            tail = _stream_values(stream, update, bars.iloc[cached:])
+            state = stream.to_state()
+        else:
+            start = max(0, cached - spec["lookback"](*params))
+            tail = np.vstack(spec["batch"](bars.iloc[start:], *params))[:, cached - start:]
+            state = None
+        return CacheEntry(_times_ns(bars), np.hstack([entry.values, tail]), _fingerprint(bars, len(bars)), state)
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+        entry = self._load(key)
+        if entry is not None:
+            self.counters["disk_hits"] += 1
+            self._remember(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self._remember(key, entry)
+        self._save(key, entry)
+
+    def _remember(self, key, entry):
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= previous.nbytes
+        self.entries[key] = entry
+        self.bytes += entry.nbytes
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.counters["evictions"] += 1
+
+    def _path(self, key):
+        symbol, timeframe, indicator, params, version = key
+        digest = hashlib.sha1(json.dumps([list(params), version]).encode()).hexdigest()[:16]
+        return os.path.join(self.disk_dir, str(timeframe), symbol, f"{indicator}_{digest}.npz")
+
+    def _save(self, key, entry):
+        if self.disk_dir is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + ".tmp.npz"
+        np.savez(temporary, times=entry.times, values=entry.values, fingerprint=np.array(entry.fingerprint),
+                 state=np.array(json.dumps(entry.state) if entry.state is not None else ""))
+        os.replace(temporary, path)
+
+    def _load(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as stored:
+                state = str(stored["state"])
+                # Las entradas sin huella (formato anterior) nunca coinciden y se recalculan
+                fingerprint = str(stored["fingerprint"]) if "fingerprint" in stored else ""
+                return CacheEntry(stored["times"], stored["values"], fingerprint, json.loads(state) if state else None)
+        except Exception as e:
+            logging.warning(f"Entrada de caché ilegible en {path}: {e}")
+            return None
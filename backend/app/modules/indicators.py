@@ -0,0 +1,370 @@
+import numpy as np
+import pandas as pd
+
+# Motor de indicadores técnicos sobre matrices símbolos × velas (una fila por símbolo).
+# Convenciones:
+#   - Las entradas son arrays float (1-D o 2-D); NaN marca velas sin dato. Un panel con
+#     símbolos de distinta antigüedad se rellena con NaN a la izquierda.
+#   - Las salidas tienen la misma forma que la entrada y son NaN durante el calentamiento
+#     (contado desde la primera vela válida de cada fila) y donde la entrada es NaN.
+#   - Las medias exponenciales tratan un NaN intermedio como repetición del último valor válido.
+
+FIBONACCI_RATIOS = (0.236, 0.382, 0.5, 0.618, 0.786)
+EMA_BLOCK_CONDITION = 1e4  # Amplificación máxima admitida en los bloques de la EMA
+
+
+def _as_2d(values):
+    """Convierte la entrada a float64 2-D; devuelve también si era 1-D para deshacerlo al final."""
+    array = np.asarray(values, dtype=np.float64)
+    if array.ndim == 1:
+        return array[None, :], True
+    if array.ndim != 2:
+        raise ValueError("Los indicadores esperan arrays 1-D o 2-D (símbolos × velas).")
+    return array, False
+
+
+def _restore(array, was_1d):
+    return array[0] if was_1d else array
+
+
+def _row_offset(x):
+    """Media de cada fila (0 si no tiene datos); se resta para que las sumas acumuladas no pierdan precisión."""
+    valid = ~np.isnan(x)
+    counts = valid.sum(axis=1, keepdims=True)
+    return np.where(counts > 0, np.where(valid, x, 0.0).sum(axis=1, keepdims=True) / np.maximum(counts, 1), 0.0)
+
+
+def _valid_count(valid):
+    """Número de velas válidas vistas hasta cada posición (para el calentamiento)."""
+    return np.cumsum(valid, axis=1)
+
+
+def _fill_forward(x):
+    """
+    Rellena los NaN con el último valor válido de la fila; los NaN iniciales toman el primer
+    valor válido (una EMA sobre un valor constante no cambia). Las filas vacías quedan a 0.
+    """
+    valid = ~np.isnan(x)
+    if valid.all():
+        return x
+    positions = np.where(valid, np.arange(x.shape[1]), 0)
+    np.maximum.accumulate(positions, axis=1, out=positions)
+    filled = np.take_along_axis(x, positions, axis=1)
+
+    first = valid.argmax(axis=1)
+    first_values = x[np.arange(x.shape[0]), first]
+    first_values = np.where(valid.any(axis=1), first_values, 0.0)
+    leading = np.arange(x.shape[1]) < first[:, None]
+    filled[leading] = np.broadcast_to(first_values[:, None], x.shape)[leading]
+    filled[~valid.any(axis=1)] = 0.0
+    return filled
+
+
+def _ema_core(x, alpha):
+    """
+    EMA recursiva y[t] = alpha·x[t] + (1 - alpha)·y[t-1], sembrada con x[0], sobre una matriz
+    sin NaN. Se resuelve por bloques en forma cerrada (suma acumulada escalada), de modo que
+    el bucle en Python recorre T / bloque iteraciones en lugar de T.
+    """
+    n, length = x.shape
+    out = np.empty_like(x)
+    if length == 0:
+        return out
+    decay = 1.0 - alpha
+    if decay <= 0:
+        return x.copy()
+    block = int(max(1, min(length, np.log(EMA_BLOCK_CONDITION) // -np.log(decay))))
+    powers = decay ** np.arange(block + 1)  # powers[k] = (1 - alpha)^k
+
+    previous = x[:, 0].copy()
+    for start in range(0, length, block):
+        chunk = x[:, start:start + block]
+        size = chunk.shape[1]
+        scaled = np.cumsum(chunk / powers[:size], axis=1) * powers[:size]
+        out[:, start:start + size] = alpha * scaled + previous[:, None] * powers[1:size + 1]
+        previous = out[:, start + size - 1]
+    return out
+
+
+def ema(values, span=None, alpha=None):
+    """
+    Media móvil exponencial por fila (equivale a `ewm(span, adjust=False)` de pandas sembrada
+    con el primer valor válido). NaN durante las primeras `span - 1` velas válidas.
+    """
+    x, was_1d = _as_2d(values)
+    if alpha is None:
+        if span is None:
+            raise ValueError("Hay que indicar `span` o `alpha`.")
+        alpha = 2.0 / (span + 1.0)
+    warmup = span if span is not None else int(round(1.0 / alpha))
+
+    valid = ~np.isnan(x)
+    out = _ema_core(_fill_forward(x), alpha)
+    out[~valid | (_valid_count(valid) < warmup)] = np.nan
+    return _restore(out, was_1d)
+
+
+def _rolling_count(valid, window):
+    """Número de velas válidas en cada ventana de `window` velas."""
+    counts = np.cumsum(valid, axis=1, dtype=np.int32)
+    counts[:, window:] -= counts[:, :-window].copy()
+    return counts
+
+
+def _rolling_sum(x, window):
+    """Suma móvil y número de valores válidos en cada ventana (NaN cuentan como 0)."""
+    valid = ~np.isnan(x)
+    sums = np.cumsum(np.where(valid, x, 0.0), axis=1)
+    sums[:, window:] -= sums[:, :-window].copy()
+    return sums, _rolling_count(valid, window)
+
+
+def sma(values, window):
+    """Media móvil simple; NaN si la ventana no tiene `window` velas válidas."""
+    x, was_1d = _as_2d(values)
+    offset = _row_offset(x)
+    sums, counts = _rolling_sum(x - offset, window)
+    out = np.where(counts == window, sums / window + offset, np.nan)
+    out[np.isnan(x)] = np.nan
+    return _restore(out, was_1d)
+
+
+def rolling_std(values, window, ddof=0):
+    """Desviación típica móvil (poblacional por defecto, como en las Bandas de Bollinger)."""
+    x, was_1d = _as_2d(values)
+    offset = _row_offset(x)
+    centered = x - offset
+    sums, counts = _rolling_sum(centered, window)
+    squares, _ = _rolling_sum(centered * centered, window)
+    variance = (squares - sums * sums / window) / (window - ddof)
+    out = np.where(counts == window, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+    out[np.isnan(x)] = np.nan
+    return _restore(out, was_1d)
+
+
+def _rolling_extreme(x, window, maximum=True):
+    """Máximo o mínimo móvil en O(n) (van Herk / Gil-Werman) sobre todas las filas a la vez."""
+    n, length = x.shape
+    fill = -np.inf if maximum else np.inf
+    op = np.maximum if maximum else np.minimum
+    blocks = -(-length // window)
+    padded = np.full((n, blocks * window), fill)
+    padded[:, :length] = np.where(np.isnan(x), fill, x)
+
+    shaped = padded.reshape(n, blocks, window)
+    prefix = op.accumulate(shaped, axis=2).reshape(n, -1)
+    suffix = op.accumulate(shaped[:, :, ::-1], axis=2)[:, :, ::-1].reshape(n, -1)
+
+    out = np.full((n, length), np.nan)
+    if length >= window:
+        end = np.arange(window - 1, length)
+        out[:, window - 1:] = op(suffix[:, end - window + 1], prefix[:, end])
+    missing = np.isnan(x)
+    if missing.any():
+        out[_rolling_count(~missing, window) < window] = np.nan
+    return out
+
+
+def rolling_max(values, window):
+    """Máximo de las últimas `window` velas."""
+    x, was_1d = _as_2d(values)
+    return _restore(_rolling_extreme(x, window, maximum=True), was_1d)
+
+
+def rolling_min(values, window):
+    """Mínimo de las últimas `window` velas."""
+    x, was_1d = _as_2d(values)
+    return _restore(_rolling_extreme(x, window, maximum=False), was_1d)
+
+
+def _previous(x):
+    """Valor de la vela anterior de cada fila (NaN en la primera)."""
+    shifted = np.full_like(x, np.nan)
+    shifted[:, 1:] = x[:, :-1]
+    return shifted
+
+
+def rsi(values, period=14):
+    """RSI de Wilder (suavizado exponencial con alpha = 1/period). NaN en las primeras `period` velas."""
+    x, was_1d = _as_2d(values)
+    delta = x - _previous(x)
+    valid = ~np.isnan(delta)
+    gains = _ema_core(_fill_forward(np.where(valid, np.maximum(delta, 0.0), np.nan)), 1.0 / period)
+    losses = _ema_core(_fill_forward(np.where(valid, np.maximum(-delta, 0.0), np.nan)), 1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(losses == 0, 100.0, 100.0 - 100.0 / (1.0 + gains / losses))
+    out[~valid | (_valid_count(valid) < period)] = np.nan
+    return _restore(out, was_1d)
+
+
+def macd(values, fast=12, slow=26, signal=9):
+    """MACD: devuelve (línea MACD, señal, histograma)."""
+    x, was_1d = _as_2d(values)
+    line = ema(x, span=fast) - ema(x, span=slow)
+    signal_line = ema(line, span=signal)
+    return tuple(_restore(part, was_1d) for part in (line, signal_line, line - signal_line))
+
+
+def bollinger_bands(values, window=20, num_std=2.0):
+    """Bandas de Bollinger: devuelve (media, banda superior, banda inferior)."""
+    x, was_1d = _as_2d(values)
+    middle = sma(x, window)
+    width = num_std * rolling_std(x, window)
+    return tuple(_restore(part, was_1d) for part in (middle, middle + width, middle - width))
+
+
+def true_range(high, low, close):
+    """Rango verdadero; en la primera vela es máximo - mínimo."""
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    prev_close = _previous(close)
+    # `fmax` ignora el NaN del cierre anterior en la primera vela
+    out = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    out[np.isnan(high) | np.isnan(low) | np.isnan(close)] = np.nan
+    return _restore(out, was_1d)
+
+
+def atr(high, low, close, period=14):
+    """Average True Range de Wilder (alpha = 1/period). NaN en las primeras `period - 1` velas."""
+    tr, was_1d = _as_2d(true_range(high, low, close))
+    valid = ~np.isnan(tr)
+    out = _ema_core(_fill_forward(tr), 1.0 / period)
+    out[~valid | (_valid_count(valid) < period)] = np.nan
+    return _restore(out, was_1d)
+
+
+def parabolic_sar(high, low, step=0.02, max_step=0.2):
+    """
+    SAR parabólico de Wilder. Es intrínsecamente secuencial en el tiempo, así que el bucle
+    recorre las velas pero cada paso actualiza todos los símbolos a la vez. Cada fila empieza
+    en largo en su primera vela válida (que queda como NaN).
+    """
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    n, length = high.shape
+    out = np.full((n, length), np.nan)
+
+    started = np.zeros(n, dtype=bool)
+    long = np.ones(n, dtype=bool)
+    sar = np.full(n, np.nan)
+    extreme = np.full(n, np.nan)
+    factor = np.full(n, step)
+    low_1 = np.full(n, np.nan)
+    low_2 = np.full(n, np.nan)
+    high_1 = np.full(n, np.nan)
+    high_2 = np.full(n, np.nan)
+
+    for t in range(length):
+        h, l = high[:, t], low[:, t]
+        valid = ~(np.isnan(h) | np.isnan(l))
+        begin = valid & ~started
+        active = valid & started
+
+        candidate = sar + factor * (extreme - sar)
+        candidate = np.where(long, np.fmin(np.fmin(candidate, low_1), low_2),
+                             np.fmax(np.fmax(candidate, high_1), high_2))
+        reverse = np.where(long, l < candidate, h > candidate)
+        new_extreme = np.where(long, np.maximum(extreme, h), np.minimum(extreme, l))
+        improved = np.where(long, h > extreme, l < extreme)
+
+        next_sar = np.where(reverse, extreme, candidate)
+        next_extreme = np.where(reverse, np.where(long, l, h), new_extreme)
+        next_factor = np.where(reverse, step, np.where(improved, np.minimum(factor + step, max_step), factor))
+        next_long = np.where(reverse, ~long, long)
+
+        sar = np.where(active, next_sar, np.where(begin, l, sar))
+        extreme = np.where(active, next_extreme, np.where(begin, h, extreme))
+        factor = np.where(active, next_factor, np.where(begin, step, factor))
+        long = np.where(active, next_long, np.where(begin, True, long))
+        out[active, t] = sar[active]
+
+        low_2 = np.where(valid, np.where(begin, np.nan, low_1), low_2)
+        low_1 = np.where(valid, l, low_1)
+        high_2 = np.where(valid, np.where(begin, np.nan, high_1), high_2)
+        high_1 = np.where(valid, h, high_1)
+        started |= valid
+    return _restore(out, was_1d)
+
+
+def vwap(high, low, close, volume, session_ids=None):
+    """
+    VWAP acumulado con el precio típico (máximo + mínimo + cierre) / 3. Si se indican
+    `session_ids` (1-D común a todas las filas o 2-D), el acumulado se reinicia al cambiar de sesión.
+    """
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    volume, _ = _as_2d(volume)
+    typical = (high + low + close) / 3.0
+    valid = ~(np.isnan(typical) | np.isnan(volume))
+    price_volume = np.cumsum(np.where(valid, typical * volume, 0.0), axis=1)
+    cumulative_volume = np.cumsum(np.where(valid, volume, 0.0), axis=1)
+
+    if session_ids is not None:
+        ids = np.broadcast_to(np.asarray(session_ids), high.shape)
+        starts = np.ones(high.shape, dtype=bool)
+        starts[:, 1:] = ids[:, 1:] != ids[:, :-1]
+        first = np.where(starts, np.arange(high.shape[1]), 0)
+        np.maximum.accumulate(first, axis=1, out=first)
+        before = first - 1
+        has_before = before >= 0
+        safe = np.where(has_before, before, 0)
+        price_volume = price_volume - np.where(has_before, np.take_along_axis(price_volume, safe, axis=1), 0.0)
+        cumulative_volume = cumulative_volume - np.where(
+            has_before, np.take_along_axis(cumulative_volume, safe, axis=1), 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(cumulative_volume > 0, price_volume / cumulative_volume, np.nan)
+    out[~valid] = np.nan
+    return _restore(out, was_1d)
+
+
+def fibonacci_levels(high, low, window=100, ratios=FIBONACCI_RATIOS):
+    """
+    Niveles de retroceso de Fibonacci sobre el máximo y mínimo de las últimas `window` velas:
+    nivel = máximo - (máximo - mínimo) · ratio. Devuelve un dict ratio -> array.
+    """
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    highest = _rolling_extreme(high, window, maximum=True)
+    lowest = _rolling_extreme(low, window, maximum=False)
+    span = highest - lowest
+    return {ratio: _restore(highest - span * ratio, was_1d) for ratio in ratios}
+
+
+def indicator_panel(high, low, close, volume=None, session_ids=None, sma_windows=(50, 200), ema_spans=(20,),
+                    rsi_period=14, macd_params=(12, 26, 9), bollinger_params=(20, 2.0), atr_period=14,
+                    sar_params=(0.02, 0.2), fibonacci_window=100):
+    """
+    Calcula el panel completo de indicadores para todas las filas (símbolos) a la vez.
+    Devuelve un dict nombre -> array con la forma de `close`.
+    """
+    panel = {}
+    for window in sma_windows:
+        panel[f"SMA_{window}"] = sma(close, window)
+    for span in ema_spans:
+        panel[f"EMA_{span}"] = ema(close, span=span)
+    panel[f"RSI_{rsi_period}"] = rsi(close, rsi_period)
+    panel["MACD"], panel["MACD_signal"], panel["MACD_hist"] = macd(close, *macd_params)
+    panel["BB_middle"], panel["BB_upper"], panel["BB_lower"] = bollinger_bands(close, *bollinger_params)
+    panel[f"ATR_{atr_period}"] = atr(high, low, close, atr_period)
+    panel["PSAR"] = parabolic_sar(high, low, *sar_params)
+    if volume is not None:
+        panel["VWAP"] = vwap(high, low, close, volume, session_ids)
+    for ratio, level in fibonacci_levels(high, low, fibonacci_window).items():
+        panel[f"FIB_{ratio}"] = level
+    return panel
+
+
+def to_matrix(data: pd.DataFrame, column: str, symbols=None, index=None):
+    """
+    Convierte velas en formato largo (`symbol`, `datetime`, columnas) en una matriz
+    símbolos × velas alineada por fecha. Devuelve (símbolos, índice temporal, matriz).
+    """
+    wide = data.pivot(index="datetime", columns="symbol", values=column).sort_index()
+    if symbols is not None:
+        wide = wide.reindex(columns=list(symbols))
+    if index is not None:
+        wide = wide.reindex(index)
+    return list(wide.columns), wide.index, np.ascontiguousarray(wide.to_numpy(dtype=np.float64).T)
@@ -0,0 +1,394 @@
+import io
+import logging
+from contextlib import nullcontext
+import pandas as pd
+from sqlalchemy import Engine, bindparam, event, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from backend.app.models import SP500IntradayData
+from backend.app.modules.market_calendar import NYSE_TZ, session_mask
+
+# Temporalidades intradía admitidas en `sp500_intraday_data`
+INTRADAY_TIMEFRAMES = ("1Min", "3Min", "5Min")
+DEFAULT_TIMEFRAME = "5Min"
+
+TABLE_NAME = SP500IntradayData.__tablename__
+UNIQUE_INDEX_NAME = "uq_sp500_intraday_symbol_timeframe_datetime"
+
+# En Postgres la tabla se particiona por rango mensual de `datetime`. Las claves primarias y
+# únicas de una tabla particionada deben incluir la columna de partición.
+POSTGRES_PARTITIONED_DDL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+    id BIGSERIAL NOT NULL,
+    symbol VARCHAR NOT NULL,
+    timeframe VARCHAR NOT NULL DEFAULT '{DEFAULT_TIMEFRAME}',
+    datetime TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    open DOUBLE PRECISION NOT NULL,
+    high DOUBLE PRECISION NOT NULL,
+    low DOUBLE PRECISION NOT NULL,
+    close DOUBLE PRECISION NOT NULL,
+    volume DOUBLE PRECISION NOT NULL,
+    trade_count INTEGER,
+    vwap DOUBLE PRECISION,
+    PRIMARY KEY (id, datetime)
+) PARTITION BY RANGE (datetime)
+"""
+POSTGRES_INDEX_DDL = [
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX_NAME} ON {TABLE_NAME} (symbol, timeframe, datetime)",
+    f"CREATE INDEX IF NOT EXISTS ix_{TABLE_NAME}_symbol ON {TABLE_NAME} (symbol)",
+]
+
+# Vía de escritura directa (sin ORM): columnas en el orden de inserción
+WRITE_COLUMNS = ["symbol", "timeframe", "datetime", "open", "high", "low", "close", "volume", "trade_count", "vwap"]
+UPDATE_COLUMNS = ["open", "high", "low", "close", "volume", "trade_count", "vwap"]
+DEFAULT_WRITE_BATCH_SIZE = 10000
+# Formato de texto de `datetime`: el que usa SQLAlchemy para DateTime en SQLite y que Postgres acepta
+DATETIME_TEXT_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+STAGE_TABLE = "tmp_sp500_intraday_stage"
+STAGE_DDL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+    symbol VARCHAR,
+    timeframe VARCHAR,
+    datetime TIMESTAMP WITHOUT TIME ZONE,
+    open DOUBLE PRECISION,
+    high DOUBLE PRECISION,
+    low DOUBLE PRECISION,
+    close DOUBLE PRECISION,
+    volume DOUBLE PRECISION,
+    trade_count INTEGER,
+    vwap DOUBLE PRECISION
+) ON COMMIT DELETE ROWS
+"""
+
+_ON_CONFLICT = (
+    "ON CONFLICT (symbol, timeframe, datetime) DO UPDATE SET "
+    + ", ".join(f"{col} = excluded.{col}" for col in UPDATE_COLUMNS)
+)
+
+# Particiones mensuales ya verificadas en este proceso, por URL de conexión
+_known_partitions = {}
+
+
+def to_utc_naive(value):
+    """Convierte una fecha a `pd.Timestamp` UTC sin zona horaria (formato de la columna `datetime`)."""
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts
+
+
+def to_utc_naive_series(values: pd.Series):
+    """Normaliza una columna de fechas a UTC sin zona horaria (las fechas sin zona se asumen UTC)."""
+    values = pd.to_datetime(values, errors="coerce", utc=True)
+    return values.dt.tz_localize(None)
+
+
+def prepare_intraday_bars(symbol: str, data: pd.DataFrame, timeframe=DEFAULT_TIMEFRAME):
+    """
+    Convierte velas descargadas de Alpaca (columnas Datetime, Open, ..., TradeCount, VWAP) al
+    formato de columnas de `sp500_intraday_data`, de forma vectorizada y sin objetos por fila.
+    """
+    frame = pd.DataFrame({
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "datetime": to_utc_naive_series(data["Datetime"]),
+        "open": pd.to_numeric(data["Open"], errors="coerce"),
+        "high": pd.to_numeric(data["High"], errors="coerce"),
+        "low": pd.to_numeric(data["Low"], errors="coerce"),
+        "close": pd.to_numeric(data["Close"], errors="coerce"),
+        "volume": pd.to_numeric(data["Volume"], errors="coerce"),
+        "trade_count": pd.to_numeric(data["TradeCount"], errors="coerce").round().astype("Int64"),
+        "vwap": pd.to_numeric(data["VWAP"], errors="coerce"),
+    })
+    frame = frame.dropna(subset=["datetime", "open", "high", "low", "close", "volume"])
+    return frame.drop_duplicates(subset="datetime", keep="last")
+
+
+def is_postgres(bind):
+    return bind.dialect.name == "postgresql"
+
+
+def partition_name(month_start: pd.Timestamp):
+    return f"{TABLE_NAME}_{month_start:%Y_%m}"
+
+
+def create_intraday_table(bind):
+    """
+    Crea `sp500_intraday_data` si no existe. En Postgres la crea particionada por mes;
+    en otros motores (SQLite) usa la definición plana del modelo con el mismo índice único.
+    Con una conexión la DDL va en su transacción, como en `ensure_month_partitions`.
+    """
+    if not is_postgres(bind):
+        SP500IntradayData.__table__.create(bind=bind, checkfirst=True)
+        return
+
+    with bind.begin() if isinstance(bind, Engine) else nullcontext(bind) as connection:
+        connection.execute(text(POSTGRES_PARTITIONED_DDL))
+        for ddl in POSTGRES_INDEX_DDL:
+            connection.execute(text(ddl))
+    logging.info(f"Tabla particionada {TABLE_NAME} verificada.")
+
+
+def ensure_month_partitions(bind, start, end):
+    """
+    Crea (si faltan) las particiones mensuales de Postgres que cubren [start, end].
+    En otros motores no hace nada. Devuelve los nombres de partición verificados.
+
+    Con un `Engine` la DDL va en su propia transacción. Con una conexión (p. ej.
+    `session.connection()` de la transacción de escritura) va en esa misma transacción: no
+    espera a los bloqueos que la propia escritura tiene sobre la tabla y, si la escritura se
+    deshace, las particiones también. Solo se recuerdan como existentes tras el commit.
+    """
+    if not is_postgres(bind):
+        return []
+
+    known = _known_partitions.setdefault(str(bind.engine.url), set())
+    first = to_utc_naive(start).to_period("M").to_timestamp()
+    last = to_utc_naive(end).to_period("M").to_timestamp()
+    months = pd.date_range(first, last, freq="MS")
+    missing = [month for month in months if partition_name(month) not in known]
+    if not missing:
+        return [partition_name(month) for month in months]
+
+    created = [partition_name(month) for month in missing]
+    with bind.begin() if isinstance(bind, Engine) else nullcontext(bind) as connection:
+        for month in missing:
+            next_month = month + pd.offsets.MonthBegin(1)
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE_NAME} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+            ))
+        event.listen(connection, "commit", lambda _: known.update(created), once=True)
+    logging.info(f"Particiones mensuales verificadas: {[partition_name(m) for m in missing]}")
+    return [partition_name(month) for month in months]
+
+
+def upgrade_intraday_table(bind):
+    """
+    Actualiza una tabla `sp500_intraday_data` existente sin particionar: añade la columna
+    `timeframe` (rellenada con 5Min) si falta y crea el índice único compuesto.
+    """
+    columns = {column["name"] for column in inspect(bind).get_columns(TABLE_NAME)}
+    if "timeframe" not in columns:
+        with bind.begin() as connection:
+            connection.execute(text(
+                f"ALTER TABLE {TABLE_NAME} ADD COLUMN timeframe VARCHAR NOT NULL DEFAULT '{DEFAULT_TIMEFRAME}'"
+            ))
+        logging.info(f"Columna timeframe añadida a {TABLE_NAME}.")
+    with bind.begin() as connection:
+        # La clave (symbol, datetime) anterior impediría guardar varias temporalidades
+        connection.execute(text("DROP INDEX IF EXISTS uq_sp500_intraday_symbol_datetime"))
+    for index in SP500IntradayData.__table__.indexes:
+        index.create(bind=bind, checkfirst=True)
+
+
+def legacy_datetime_mask(rows: pd.DataFrame):
+    """
+    Filas (`id`, `timeframe`, `datetime`) de un símbolo guardadas con la convención antigua:
+    hora local de Nueva York sin zona horaria en lugar de UTC.
+
+    Las velas de sesión regular en hora de Nueva York van de 9:30 a 16:00; en UTC, de 13:30
+    a 21:00. Por cada (temporalidad, fecha): una hora anterior a 13:30 solo puede ser
+    antigua y una posterior a 16:00 solo UTC. Las horas intermedias son antiguas si la fecha
+    tiene alguna fila antigua y se guardaron (`id` menor) antes de la primera fila UTC segura.
+    """
+    times = pd.to_datetime(rows["datetime"])
+    time_of_day = times - times.dt.normalize()
+    surely_legacy = time_of_day < pd.Timedelta(hours=13, minutes=30)
+    surely_utc = time_of_day > pd.Timedelta(hours=16)
+    groups = [rows["timeframe"], times.dt.normalize()]
+    has_legacy = surely_legacy.groupby(groups).transform("any")
+    first_utc_id = rows["id"].where(surely_utc).groupby(groups).transform("min")
+    inserted_before_utc = first_utc_id.isna() | (rows["id"] < first_utc_id)
+    return (has_legacy & (surely_legacy | (~surely_utc & inserted_before_utc))).to_numpy()
+
+
+def migrate_datetimes_to_utc(bind, symbols=None):
+    """
+    Convierte a UTC sin zona horaria las velas guardadas en hora local de Nueva York por la
+    carga anterior (ver `legacy_datetime_mask`). Se borra la vela antigua si su versión UTC
+    ya existe (la sincronización incremental la descargó de nuevo) o si cae fuera de la
+    sesión regular (la carga anterior guardaba también la vela de las 16:00). Es
+    idempotente: una segunda ejecución no convierte nada.
+    Devuelve (filas convertidas, filas antiguas borradas).
+    """
+    table = SP500IntradayData.__table__
+    if symbols is None:
+        with bind.connect() as connection:
+            symbols = [row[0] for row in connection.execute(select(table.c.symbol).distinct())]
+
+    converted = deleted = 0
+    for symbol in symbols:
+        with bind.begin() as connection:
+            rows = pd.read_sql(select(table.c.id, table.c.timeframe, table.c.datetime)
+                               .where(table.c.symbol == symbol), connection)
+            if rows.empty:
+                continue
+            legacy = legacy_datetime_mask(rows)
+            if not legacy.any():
+                continue
+            old = rows[legacy].copy()
+            old["datetime"] = pd.to_datetime(old["datetime"])
+            old["utc"] = (old["datetime"].dt.tz_localize(NYSE_TZ, ambiguous="NaT", nonexistent="NaT")
+                          .dt.tz_convert("UTC").dt.tz_localize(None))
+            current = rows[~legacy]
+            existing = set(zip(current["timeframe"], pd.to_datetime(current["datetime"])))
+            duplicate = [key in existing for key in zip(old["timeframe"], old["utc"])]
+            duplicate = pd.Series(duplicate, index=old.index) | ~session_mask(old["utc"])
+
+            if duplicate.any():
+                connection.execute(table.delete().where(table.c.id == bindparam("row_id")), [
+                    {"row_id": int(row_id)} for row_id in old.loc[duplicate, "id"]
+                ])
+            # Las velas se desplazan hacia delante: de la más tardía a la más temprana, cada una
+            # ocupa un hueco ya libre y nunca choca con la clave única
+            moved = old[~duplicate].sort_values("datetime", ascending=False)
+            if not moved.empty:
+                connection.execute(
+                    table.update().where(table.c.id == bindparam("row_id"), table.c.datetime == bindparam("old"))
+                    .values(datetime=bindparam("new")),
+                    [{"row_id": int(row_id), "old": old_time.to_pydatetime(), "new": new_time.to_pydatetime()}
+                     for row_id, old_time, new_time in zip(moved["id"], moved["datetime"], moved["utc"])],
+                )
+            converted += len(moved)
+            deleted += int(duplicate.sum())
+        logging.info(f"{symbol}: {len(moved)} velas convertidas a UTC, {int(duplicate.sum())} borradas.")
+    logging.info(f"Migración de fechas a UTC: {converted} velas convertidas, {deleted} borradas.")
+    return converted, deleted
+
+
+def migrate_to_partitioned(bind):
+    """
+    Migra una tabla `sp500_intraday_data` plana de Postgres al esquema particionado.
+
+    Renombra la tabla actual a `sp500_intraday_data_legacy`, crea la tabla particionada con
+    las particiones necesarias y copia las filas con su temporalidad (5Min si la tabla antigua
+    no tiene la columna `timeframe`), descartando duplicados. Todo va en una sola transacción:
+    si algo falla, la tabla original queda intacta. La tabla antigua se conserva para que
+    pueda eliminarse manualmente tras verificar la copia.
+    """
+    if not is_postgres(bind):
+        logging.info("El particionado solo aplica a Postgres; no hay nada que migrar.")
+        return
+
+    legacy = f"{TABLE_NAME}_legacy"
+    with bind.begin() as connection:
+        if not inspect(connection).has_table(TABLE_NAME):
+            return
+        partitioned = connection.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :name"
+        ), {"name": TABLE_NAME}).first()
+        if partitioned:
+            logging.info(f"{TABLE_NAME} ya está particionada.")
+            return
+
+        connection.execute(text(f"ALTER TABLE {TABLE_NAME} RENAME TO {legacy}"))
+        # Liberar los nombres de índices, clave primaria y secuencia para la tabla nueva
+        inspector = inspect(connection)
+        for index in inspector.get_indexes(legacy):
+            connection.execute(text(f'ALTER INDEX "{index["name"]}" RENAME TO "{index["name"]}_legacy"'))
+        primary_key = inspector.get_pk_constraint(legacy).get("name")
+        if primary_key:
+            connection.execute(text(
+                f'ALTER TABLE {legacy} RENAME CONSTRAINT "{primary_key}" TO "{primary_key}_legacy"'
+            ))
+        connection.execute(text(f"ALTER SEQUENCE IF EXISTS {TABLE_NAME}_id_seq RENAME TO {legacy}_id_seq"))
+        has_timeframe = "timeframe" in {column["name"] for column in inspector.get_columns(legacy)}
+        bounds = connection.execute(text(f"SELECT MIN(datetime), MAX(datetime) FROM {legacy}")).first()
+
+        create_intraday_table(connection)
+        if bounds[0] is None:
+            return
+        ensure_month_partitions(connection, bounds[0], bounds[1])
+
+        timeframe = "timeframe" if has_timeframe else f"'{DEFAULT_TIMEFRAME}'"
+        copied = connection.execute(text(
+            f"INSERT INTO {TABLE_NAME} "
+            "(symbol, timeframe, datetime, open, high, low, close, volume, trade_count, vwap) "
+            f"SELECT symbol, {timeframe}, datetime, open, high, low, close, volume, trade_count, vwap "
+            f"FROM {legacy} ON CONFLICT (symbol, timeframe, datetime) DO NOTHING"
+        )).rowcount
+    logging.info(f"{copied} filas copiadas a la tabla particionada. Tabla antigua conservada como {legacy}.")
+
+
+def fetch_intraday_range(session: Session, symbols, start=None, end=None, timeframe=DEFAULT_TIMEFRAME,
+                         columns=None):
+    """
+    Extrae velas intradía de varios símbolos (todos con `symbols=None`) en el rango [start, end).
+
+    El filtro (symbol, timeframe, datetime) coincide con el índice único compuesto, y en
+    Postgres el rango de `datetime` permite descartar particiones mensuales enteras.
+    """
+    table = SP500IntradayData.__table__
+    columns = columns or ["symbol", "datetime", "open", "high", "low", "close", "volume", "trade_count", "vwap"]
+    query = select(*[table.c[name] for name in columns]).where(table.c.timeframe == timeframe)
+    if symbols is not None:
+        query = query.where(table.c.symbol.in_(list(symbols)))
+    if start is not None:
+        query = query.where(table.c.datetime >= to_utc_naive(start).to_pydatetime())
+    if end is not None:
+        query = query.where(table.c.datetime < to_utc_naive(end).to_pydatetime())
+    query = query.order_by(table.c.symbol, table.c.datetime)
+    return pd.read_sql(query, session.bind)
+
+
+def _write_postgres(session: Session, bars: pd.DataFrame, batch_size):
+    """COPY FROM STDIN a una tabla temporal y un único INSERT ... SELECT ... ON CONFLICT."""
+    columns = ", ".join(WRITE_COLUMNS)
+    raw_connection = session.connection().connection
+    with raw_connection.cursor() as cursor:
+        cursor.execute(STAGE_DDL)
+        cursor.execute(f"TRUNCATE {STAGE_TABLE}")
+        for start in range(0, len(bars), batch_size):
+            buffer = io.StringIO()
+            bars.iloc[start:start + batch_size].to_csv(
+                buffer, header=False, index=False, date_format=DATETIME_TEXT_FORMAT
+            )
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {STAGE_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f"INSERT INTO {TABLE_NAME} ({columns}) SELECT {columns} FROM {STAGE_TABLE} {_ON_CONFLICT}"
+        )
+
+
+def _write_sqlite(session: Session, bars: pd.DataFrame, batch_size):
+    """`executemany` por lotes con una única sentencia preparada (reutilizada por sqlite3)."""
+    placeholders = ", ".join("?" for _ in WRITE_COLUMNS)
+    sql = f"INSERT INTO {TABLE_NAME} ({', '.join(WRITE_COLUMNS)}) VALUES ({placeholders}) {_ON_CONFLICT}"
+
+    values = {
+        "datetime": bars["datetime"].dt.strftime(DATETIME_TEXT_FORMAT).tolist(),
+        "trade_count": bars["trade_count"].astype(object).where(bars["trade_count"].notna(), None).tolist(),
+        "vwap": bars["vwap"].astype(object).where(bars["vwap"].notna(), None).tolist(),
+    }
+    params = list(zip(*[values[col] if col in values else bars[col].tolist() for col in WRITE_COLUMNS]))
+
+    connection = session.connection()
+    for start in range(0, len(params), batch_size):
+        connection.exec_driver_sql(sql, params[start:start + batch_size])
+
+
+def write_intraday_bars(session: Session, bars: pd.DataFrame, batch_size=DEFAULT_WRITE_BATCH_SIZE):
+    """
+    Escribe velas intradía directamente desde las columnas de un DataFrame, sin objetos ORM.
+
+    `bars` debe tener las columnas de `WRITE_COLUMNS`, `datetime` en UTC sin zona horaria,
+    `trade_count` como entero anulable y ninguna clave (symbol, timeframe, datetime) repetida.
+    En Postgres usa `COPY FROM STDIN` a una tabla temporal; en SQLite, `executemany` por lotes
+    de `batch_size` filas. En ambos casos las velas existentes se actualizan (ON CONFLICT).
+    No hace commit. Devuelve el número de filas escritas.
+    """
+    if bars.empty:
+        return 0
+
+    bind = session.get_bind()
+    ensure_month_partitions(session.connection(), bars["datetime"].min(), bars["datetime"].max())
+    bars = bars[WRITE_COLUMNS]
+    if is_postgres(bind):
+        _write_postgres(session, bars, batch_size)
+    elif bind.dialect.name == "sqlite":
+        _write_sqlite(session, bars, batch_size)
+    else:
+        raise ValueError(f"El motor '{bind.dialect.name}' no tiene vía de escritura directa")
+    return len(bars)
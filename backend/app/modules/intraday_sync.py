@@ -0,0 +1,150 @@
+import logging
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from backend.app.models import SP500IntradayData
+from backend.app.modules.chart_patterns import update_chart_patterns
+from backend.app.modules.concurrent_ingestion import DEFAULT_WORKERS, run_concurrent_ingestion
+from backend.app.modules.intraday_storage import (
+    DEFAULT_TIMEFRAME, DEFAULT_WRITE_BATCH_SIZE, prepare_intraday_bars, write_intraday_bars,
+)
+from backend.app.modules.streaming_indicators import update_indicator_states
+
+# Sincronización incremental de velas intradía, independiente del proveedor de datos: la
+# descarga se recibe como función `fetch_bars(symbol, timeframe, start_date)` que devuelve
+# velas con las columnas de Alpaca (Datetime, Open, ..., TradeCount, VWAP).
+
+SYNC_START_DATE = "2022-12-19"  # Inicio de la descarga para símbolos sin datos
+SYNC_OVERLAP = pd.Timedelta(minutes=30)  # Ventana que se vuelve a descargar para recoger correcciones tardías
+
+
+def upsert_intraday_data(session: Session, symbol: str, data: pd.DataFrame, commit=True,
+                         timeframe=DEFAULT_TIMEFRAME, batch_size=DEFAULT_WRITE_BATCH_SIZE):
+    """
+    Inserta o actualiza velas intradía por (symbol, timeframe, datetime) sin vaciar la tabla.
+
+    Escribe directamente desde las columnas del DataFrame (COPY en Postgres, `executemany`
+    en SQLite) en lotes de `batch_size` filas. Devuelve el número de filas escritas.
+    Con `commit=False` no confirma la transacción y propaga los errores a quien llama.
+    """
+    if data.empty:
+        return 0
+
+    try:
+        written = write_intraday_bars(session, prepare_intraday_bars(symbol, data, timeframe), batch_size)
+        if commit:
+            session.commit()
+        logging.info(f"Datos guardados para {symbol} ({timeframe}): {written} filas.")
+        return written
+    except Exception as e:
+        session.rollback()
+        logging.error(f"Error al guardar datos en la base de datos para {symbol}: {e}")
+        if not commit:
+            raise
+        return 0
+
+
+def fetch_high_water_marks(session: Session, timeframe=DEFAULT_TIMEFRAME):
+    """Devuelve un dict symbol -> última `datetime` guardada, con una sola consulta agregada."""
+    rows = session.query(
+        SP500IntradayData.symbol, func.max(SP500IntradayData.datetime)
+    ).filter(SP500IntradayData.timeframe == timeframe).group_by(SP500IntradayData.symbol).all()
+    return {symbol: last_datetime for symbol, last_datetime in rows}
+
+
+def sync_start_date(high_water_mark, overlap=SYNC_OVERLAP, default_start=SYNC_START_DATE):
+    """Calcula desde cuándo descargar un símbolo a partir de su última vela guardada (UTC sin zona)."""
+    if high_water_mark is None:
+        return default_start
+    return (pd.Timestamp(high_water_mark).tz_localize("UTC") - overlap).isoformat()
+
+
+def refresh_indicator_states(session: Session, batch, timeframe=DEFAULT_TIMEFRAME):
+    """
+    Alimenta los indicadores incrementales y los detectores de patrones de gráfico con las
+    velas recién escritas. Cada uno se ejecuta en su SAVEPOINT: si falla, se registra el
+    error pero las velas se guardan igualmente.
+    """
+    bars = [prepare_intraday_bars(symbol, data, timeframe) for symbol, data in batch if not data.empty]
+    if not bars:
+        return
+    bars = pd.concat(bars, ignore_index=True)
+    for description, update in (("los indicadores incrementales", update_indicator_states),
+                                ("los patrones de gráfico", update_chart_patterns)):
+        try:
+            with session.begin_nested():
+                update(session, bars, timeframe)
+        except Exception as e:
+            logging.error(f"Error al actualizar {description}: {e}")
+
+
+def write_intraday_upsert_batch(session: Session, batch, timeframe=DEFAULT_TIMEFRAME, update_indicators=False):
+    """
+    Escribe un lote de (symbol, data) con upsert en una sola transacción.
+    Con `update_indicators` actualiza también los indicadores incrementales y los patrones de gráfico.
+    """
+    written = {}
+    for symbol, data in batch:
+        written[symbol] = upsert_intraday_data(session, symbol, data, commit=False, timeframe=timeframe)
+    if update_indicators:
+        refresh_indicator_states(session, batch, timeframe)
+    session.commit()
+    return written
+
+
+def sync_intraday_bars(symbols, fetch_bars, session_factory, concurrent=False, overlap=SYNC_OVERLAP,
+                       default_start=SYNC_START_DATE, workers=DEFAULT_WORKERS, timeframe=DEFAULT_TIMEFRAME,
+                       update_indicators=True):
+    """
+    Sincroniza incrementalmente las velas intradía de los símbolos dados.
+
+    Lee la última vela guardada de cada símbolo, descarga con `fetch_bars` (que lanza una
+    excepción si la descarga falla) solo las
+    posteriores (más una ventana de solapamiento `overlap` para correcciones tardías) y las
+    inserta o actualiza. La tabla no se vacía en ningún momento, por lo que sigue siendo
+    consultable. Con `update_indicators` las velas nuevas alimentan los indicadores
+    incrementales y los detectores de patrones de gráfico en la misma transacción.
+    Con `concurrent` devuelve el informe por símbolo de `run_concurrent_ingestion`; en
+    serie, un dict symbol -> filas escritas.
+    """
+    db_session = session_factory()
+    try:
+        high_water_marks = fetch_high_water_marks(db_session, timeframe)
+    finally:
+        db_session.close()
+    logging.info(f"Marcas de agua leídas para {len(high_water_marks)} símbolos.")
+
+    def fetch(symbol):
+        start_date = sync_start_date(high_water_marks.get(symbol), overlap, default_start)
+        return fetch_bars(symbol, timeframe, start_date)
+
+    if concurrent:
+        return run_concurrent_ingestion(
+            symbols, fetch,
+            lambda session, batch: write_intraday_upsert_batch(session, batch, timeframe, update_indicators),
+            session_factory, workers=workers,
+        )
+
+    written = {}
+    db_session = session_factory()
+    try:
+        for symbol in symbols:
+            logging.info(f"Sincronizando {symbol}...")
+            try:
+                stock_data = fetch(symbol)
+            except Exception as e:
+                logging.error(f"Error al descargar los datos para {symbol}: {e}")
+                continue
+            if not stock_data.empty:
+                try:
+                    written.update(write_intraday_upsert_batch(db_session, [(symbol, stock_data)], timeframe,
+                                                               update_indicators))
+                except Exception as e:
+                    db_session.rollback()
+                    logging.error(f"Error al sincronizar {symbol}: {e}")
+            else:
+                logging.info(f"Sin velas nuevas para {symbol}.")
+    finally:
+        db_session.close()
+        logging.info("Conexión a la base de datos cerrada.")
+    return written
@@ -0,0 +1,261 @@
+import datetime
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pytz import timezone
+
+# Calendario de la Bolsa de Nueva York (NYSE): sesiones, festivos y cierres anticipados
+NYSE_TZ = timezone("America/New_York")
+REGULAR_OPEN = datetime.time(9, 30)
+REGULAR_CLOSE = datetime.time(16, 0)
+EARLY_CLOSE = datetime.time(13, 0)
+
+# Temporalidades conocidas -> duración de la vela
+TIMEFRAME_FREQ = {
+    "1Min": pd.Timedelta(minutes=1),
+    "3Min": pd.Timedelta(minutes=3),
+    "5Min": pd.Timedelta(minutes=5),
+    "15Min": pd.Timedelta(minutes=15),
+    "30Min": pd.Timedelta(minutes=30),
+    "1Hour": pd.Timedelta(hours=1),
+}
+
+# Cierres extraordinarios (duelos nacionales, 11-S, huracán Sandy)
+SPECIAL_CLOSURES = {
+    datetime.date(2001, 9, 11), datetime.date(2001, 9, 12), datetime.date(2001, 9, 13),
+    datetime.date(2001, 9, 14), datetime.date(2004, 6, 11), datetime.date(2007, 1, 2),
+    datetime.date(2012, 10, 29), datetime.date(2012, 10, 30), datetime.date(2018, 12, 5),
+    datetime.date(2025, 1, 9),
+}
+
+
+def timeframe_to_timedelta(timeframe):
+    """Convierte una temporalidad ("5Min", "1Hour" o un Timedelta) a `pd.Timedelta`."""
+    if isinstance(timeframe, pd.Timedelta):
+        return timeframe
+    if timeframe in TIMEFRAME_FREQ:
+        return TIMEFRAME_FREQ[timeframe]
+    return pd.Timedelta(str(timeframe).replace("Min", "min").replace("Hour", "h"))
+
+
+def _easter(year: int):
+    """Domingo de Pascua (algoritmo anónimo gregoriano)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n-ésimo día de la semana `weekday` (0 = lunes) del mes; n = -1 para el último."""
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = datetime.date(year, month + 1, 1) - datetime.timedelta(days=1) if month < 12 \
+        else datetime.date(year, 12, 31)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: datetime.date):
+    """Festivo en sábado se observa el viernes anterior; en domingo, el lunes siguiente."""
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year: int):
+    """Festivos (días sin sesión) de la NYSE para un año."""
+    holidays = set()
+    new_year = datetime.date(year, 1, 1)
+    if new_year.weekday() != 5:  # Si cae en sábado no se observa el viernes 31 anterior
+        holidays.add(_observed(new_year))
+    holidays.add(_nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr.
+    holidays.add(_nth_weekday(year, 2, 0, 3))  # Washington's Birthday
+    holidays.add(_easter(year) - datetime.timedelta(days=2))  # Viernes Santo
+    holidays.add(_nth_weekday(year, 5, 0, -1))  # Memorial Day
+    if year >= 2022:
+        holidays.add(_observed(datetime.date(year, 6, 19)))  # Juneteenth
+    holidays.add(_observed(datetime.date(year, 7, 4)))  # Independence Day
+    holidays.add(_nth_weekday(year, 9, 0, 1))  # Labor Day
+    holidays.add(_nth_weekday(year, 11, 3, 4))  # Thanksgiving
+    holidays.add(_observed(datetime.date(year, 12, 25)))  # Navidad
+    holidays.update(day for day in SPECIAL_CLOSURES if day.year == year)
+    return frozenset(holidays)
+
+
+@lru_cache(maxsize=None)
+def nyse_early_closes(year: int):
+    """Días con cierre anticipado a las 13:00 (víspera de Independencia, Black Friday, Nochebuena)."""
+    early = set()
+    july_3 = datetime.date(year, 7, 3)
+    if july_3.weekday() < 4:
+        early.add(july_3)
+    early.add(_nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1))
+    christmas_eve = datetime.date(year, 12, 24)
+    if christmas_eve.weekday() < 4:
+        early.add(christmas_eve)
+    return frozenset(early - nyse_holidays(year))
+
+
+@lru_cache(maxsize=None)
+def _year_sessions(year: int):
+    """Sesiones de un año como arrays int64 (ns UTC) de apertura y cierre, más sus fechas."""
+    days = pd.bdate_range(f"{year}-01-01", f"{year}-12-31")
+    holidays = nyse_holidays(year)
+    early = nyse_early_closes(year)
+    dates = [day.date() for day in days if day.date() not in holidays]
+
+    local_days = pd.DatetimeIndex(dates)
+    close_offsets = np.array([
+        pd.Timedelta(hours=EARLY_CLOSE.hour).value if day in early
+        else pd.Timedelta(hours=REGULAR_CLOSE.hour).value
+        for day in dates
+    ], dtype=np.int64)
+    open_offset = pd.Timedelta(hours=REGULAR_OPEN.hour, minutes=REGULAR_OPEN.minute).value
+
+    opens = (local_days + pd.to_timedelta(open_offset, unit="ns")).tz_localize(NYSE_TZ).tz_convert("UTC")
+    closes = (local_days + pd.to_timedelta(close_offsets, unit="ns")).tz_localize(NYSE_TZ).tz_convert("UTC")
+    return np.array(dates, dtype="datetime64[D]"), opens.asi8, closes.asi8
+
+
+def _session_arrays(start_year: int, end_year: int):
+    parts = [_year_sessions(year) for year in range(start_year, end_year + 1)]
+    return tuple(np.concatenate([part[i] for part in parts]) for i in range(3))
+
+
+def _to_utc(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def sessions(start, end):
+    """
+    Sesiones de la NYSE cuyo día (hora de Nueva York) está entre `start` y `end`, incluidos.
+    Devuelve un DataFrame indexado por fecha con `open` y `close` en UTC y `early_close`.
+    """
+    start_day = pd.Timestamp(start).date()
+    end_day = pd.Timestamp(end).date()
+    dates, opens, closes = _session_arrays(start_day.year, end_day.year)
+    keep = (dates >= np.datetime64(start_day)) & (dates <= np.datetime64(end_day))
+    frame = pd.DataFrame({
+        "open": pd.to_datetime(opens[keep], utc=True),
+        "close": pd.to_datetime(closes[keep], utc=True),
+    }, index=pd.DatetimeIndex(dates[keep], name="date"))
+    frame["early_close"] = (frame["close"] - frame["open"]) < pd.Timedelta(hours=6, minutes=30)
+    return frame
+
+
+def is_session(day):
+    """Indica si la NYSE abre el día dado."""
+    day = pd.Timestamp(day).date()
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+
+@lru_cache(maxsize=256)
+def _expected_index(start_day: datetime.date, end_day: datetime.date, freq_ns: int):
+    dates, opens, closes = _session_arrays(start_day.year, end_day.year)
+    keep = (dates >= np.datetime64(start_day)) & (dates <= np.datetime64(end_day))
+    opens, closes = opens[keep], closes[keep]
+    if len(opens) == 0:
+        return pd.DatetimeIndex([], tz="UTC")
+
+    counts = (closes - opens) // freq_ns
+    # Posición de cada vela dentro de su sesión: 0, 1, ..., counts[i] - 1
+    session_starts = np.repeat(opens, counts)
+    position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return pd.DatetimeIndex(pd.to_datetime(session_starts + position * freq_ns, utc=True))
+
+
+def expected_index(start, end, timeframe="5Min"):
+    """
+    Inicio (UTC) de cada vela esperada en sesión regular entre `start` y `end`, incluidos.
+
+    El índice de cada rango de días se calcula una sola vez (caché) y se recorta a los
+    instantes exactos pedidos. Tiene en cuenta festivos y cierres anticipados.
+    """
+    start_ts, end_ts = _to_utc(start), _to_utc(end)
+    freq = timeframe_to_timedelta(timeframe)
+    index = _expected_index(start_ts.tz_convert(NYSE_TZ).date(), end_ts.tz_convert(NYSE_TZ).date(), freq.value)
+    lo = index.searchsorted(start_ts, side="left")
+    hi = index.searchsorted(end_ts, side="right")
+    return index[lo:hi]
+
+
+def expected_bars_per_session(start, end, timeframe="5Min"):
+    """Número de velas esperadas en cada sesión (78 de 5 minutos en un día normal, 42 con cierre a las 13:00)."""
+    frame = sessions(start, end)
+    freq = timeframe_to_timedelta(timeframe)
+    return ((frame["close"] - frame["open"]) // freq).rename("expected_bars")
+
+
+def session_mask(timestamps):
+    """
+    Máscara booleana de las marcas de tiempo que caen dentro de una sesión regular [apertura, cierre).
+
+    Acepta fechas con zona horaria o sin ella (se asumen UTC). Es totalmente vectorizada:
+    busca cada instante en los arrays cacheados de aperturas y cierres con `searchsorted`,
+    sin convertir zonas horarias ni formatear cadenas.
+    """
+    index = pd.DatetimeIndex(timestamps)
+    if len(index) == 0:
+        return np.zeros(0, dtype=bool)
+    index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    values = index.asi8
+    valid = ~index.isna()
+    years = index[valid].year
+    if len(years) == 0:
+        return np.zeros(len(index), dtype=bool)
+
+    _, opens, closes = _session_arrays(int(years.min()), int(years.max()))
+    position = np.searchsorted(opens, values, side="right") - 1
+    in_range = position >= 0
+    mask = np.zeros(len(values), dtype=bool)
+    mask[in_range] = values[in_range] < closes[position[in_range]]
+    return mask & valid
+
+
+def session_dates(timestamps):
+    """Fecha de sesión (día en Nueva York) de cada marca de tiempo, como array datetime64[D]."""
+    index = pd.DatetimeIndex(timestamps)
+    index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    return index.tz_convert(NYSE_TZ).tz_localize(None).values.astype("datetime64[D]")
+
+
+def incomplete_sessions(timestamps, timeframe="5Min"):
+    """
+    Sesiones con menos velas de las esperadas entre la primera y la última marca de tiempo.
+
+    Solo cuenta velas dentro de sesión regular; una sesión sin ninguna vela cuenta con 0.
+    Devuelve una Series fecha -> velas presentes, únicamente con las sesiones incompletas.
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(timestamps)).dropna()
+    index = index[session_mask(index)]
+    if len(index) == 0:
+        return pd.Series(dtype="int64", name="bars")
+
+    days = session_dates(index)
+    return incomplete_session_counts(pd.Series(1, index=pd.DatetimeIndex(days)).groupby(level=0).size(), timeframe)
+
+
+def incomplete_session_counts(counts: pd.Series, timeframe="5Min"):
+    """
+    Como `incomplete_sessions`, pero a partir de las velas de sesión ya contadas por fecha
+    (Series fecha -> velas), p. ej. el resumen acumulado al leer un símbolo por bloques.
+    """
+    counts = counts[counts > 0]
+    if counts.empty:
+        return pd.Series(dtype="int64", name="bars")
+    days = pd.DatetimeIndex(counts.index)
+    expected = expected_bars_per_session(days.min(), days.max(), timeframe)
+    counts = pd.Series(counts.to_numpy(), index=days).reindex(expected.index, fill_value=0)
+    return counts.astype("int64").rename("bars")[counts < expected]
@@ -0,0 +1,300 @@
+import logging
+import math
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from backend.app.models import MarketRegime, SP500Data
+from backend.app.modules.bulk_upsert import upsert_rows
+from backend.app.modules.intraday_storage import DEFAULT_TIMEFRAME, fetch_intraday_range
+from backend.app.modules.market_calendar import session_dates, session_mask
+
+# Etiquetas de régimen de mercado por día de sesión, precalculadas en `market_regimes`.
+# Cada día de cada símbolo (y del índice equiponderado `INDEX_SYMBOL`) guarda una máscara de
+# bits, de modo que un backtest condicionado ("solo días de volatilidad alta y tendencia
+# bajista") es una consulta por índice o un `np.isin` sobre las fechas de sesión, sin
+# recorrer precios. Criterios:
+#   - Volatilidad: desviación de los retornos logarítmicos de `vol_window` días frente a la
+#     de `vol_baseline` días; baja, normal o alta según su cociente.
+#   - Tendencia: cierre y media rápida frente a la media lenta (alcista, bajista o lateral).
+#   - Hueco: apertura frente al cierre anterior; "cerrado" si el rango del día lo recorre.
+#   - Apertura: rentabilidad de los primeros `open_minutes` de sesión (velas intradía).
+
+VOL_LOW = 1 << 0
+VOL_NORMAL = 1 << 1
+VOL_HIGH = 1 << 2
+TREND_BULL = 1 << 3
+TREND_BEAR = 1 << 4
+TREND_SIDEWAYS = 1 << 5
+GAP_UP = 1 << 6
+GAP_DOWN = 1 << 7
+GAP_FILLED = 1 << 8
+OPEN_DRIVE_UP = 1 << 9
+OPEN_DRIVE_DOWN = 1 << 10
+REGIME_FLAGS = {
+    "VOL_LOW": VOL_LOW, "VOL_NORMAL": VOL_NORMAL, "VOL_HIGH": VOL_HIGH,
+    "TREND_BULL": TREND_BULL, "TREND_BEAR": TREND_BEAR, "TREND_SIDEWAYS": TREND_SIDEWAYS,
+    "GAP_UP": GAP_UP, "GAP_DOWN": GAP_DOWN, "GAP_FILLED": GAP_FILLED,
+    "OPEN_DRIVE_UP": OPEN_DRIVE_UP, "OPEN_DRIVE_DOWN": OPEN_DRIVE_DOWN,
+}
+INDEX_SYMBOL = "^SP500EW"  # Índice equiponderado calculado con los componentes de `sp500_data`
+DEFAULT_PARAMS = {
+    "vol_window": 20,
+    "vol_baseline": 252,
+    "low_vol_ratio": 0.8,          # Cociente de volatilidades por debajo del cual es baja
+    "high_vol_ratio": 1.25,        # Cociente de volatilidades por encima del cual es alta
+    "fast_ma": 50,
+    "slow_ma": 200,
+    "gap_threshold": 0.01,         # Hueco mínimo, en fracción del cierre anterior
+    "open_minutes": 30,
+    "open_drive_threshold": 0.005,  # Movimiento mínimo de la apertura, en fracción del precio inicial
+}
+REGIME_COLUMNS = ["symbol", "date", "flags", "realized_vol", "trend", "gap", "open_return"]
+
+
+def flags_from_names(*names):
+    """Máscara con los bits de los regímenes nombrados (p. ej. "VOL_HIGH", "TREND_BEAR")."""
+    flags = 0
+    for name in names:
+        flags |= REGIME_FLAGS[name]
+    return flags
+
+
+def flag_names(flags):
+    """Nombres de los regímenes activos en una máscara."""
+    return [name for name, bit in REGIME_FLAGS.items() if flags & bit]
+
+
+def warmup_days(params=None):
+    """Días naturales de historia necesarios antes del primer día a etiquetar."""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    sessions = max(params["vol_baseline"], params["slow_ma"]) + params["vol_window"] + 1
+    return int(math.ceil(sessions * 7 / 5)) + 20  # Holgura para festivos
+
+
+def label_daily(open_, high, low, close, params=None):
+    """
+    Etiqueta días a partir de tablas anchas fechas × símbolos (todos los símbolos a la vez).
+    Devuelve un dict con las tablas `flags`, `realized_vol`, `trend` y `gap`.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    previous_close = close.shift(1)
+    returns = np.log(close / previous_close)
+    realized_vol = returns.rolling(params["vol_window"]).std() * math.sqrt(252)
+    baseline_vol = returns.rolling(params["vol_baseline"], min_periods=3 * params["vol_window"]).std() * math.sqrt(252)
+    ratio = realized_vol / baseline_vol
+
+    fast = close.rolling(params["fast_ma"]).mean()
+    slow = close.rolling(params["slow_ma"]).mean()
+    bull = (close > slow) & (fast > slow)
+    bear = (close < slow) & (fast < slow)
+
+    gap = open_ / previous_close - 1
+    gap_up = gap > params["gap_threshold"]
+    gap_down = gap < -params["gap_threshold"]
+    filled = (gap_up & (low <= previous_close)) | (gap_down & (high >= previous_close))
+
+    flags = (
+        VOL_LOW * (ratio < params["low_vol_ratio"])
+        + VOL_HIGH * (ratio > params["high_vol_ratio"])
+        + VOL_NORMAL * ((ratio >= params["low_vol_ratio"]) & (ratio <= params["high_vol_ratio"]))
+        + TREND_BULL * bull + TREND_BEAR * bear + TREND_SIDEWAYS * (slow.notna() & ~bull & ~bear)
+        + GAP_UP * gap_up + GAP_DOWN * gap_down + GAP_FILLED * filled
+    )
+    return {"flags": flags.astype(np.int64), "realized_vol": realized_vol, "trend": close / slow - 1, "gap": gap}
+
+
+def opening_returns(intraday: pd.DataFrame, params=None):
+    """
+    Rentabilidad de los primeros `open_minutes` de cada sesión regular por símbolo y día:
+    del precio de apertura de la primera vela al cierre de la última vela de la franja.
+    Devuelve un DataFrame `symbol`, `date`, `open_return`.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    if intraday.empty:
+        return pd.DataFrame(columns=["symbol", "date", "open_return"])
+    times = pd.to_datetime(intraday["datetime"])
+    bars = intraday.loc[session_mask(times), ["symbol", "datetime", "open", "close"]].copy()
+    bars["datetime"] = pd.to_datetime(bars["datetime"])
+    bars["date"] = session_dates(bars["datetime"])
+    bars = bars.sort_values(["symbol", "datetime"])
+    first = bars.groupby(["symbol", "date"])["datetime"].transform("min")
+    opening = bars[bars["datetime"] < first + pd.Timedelta(minutes=params["open_minutes"])]
+    grouped = opening.groupby(["symbol", "date"], sort=False)
+    result = (grouped["close"].last() / grouped["open"].first() - 1).rename("open_return").reset_index()
+    result["date"] = pd.to_datetime(result["date"])
+    return result
+
+
+def _equal_weight_index(open_, high, low, close):
+    """Índice equiponderado: media de los retornos diarios (y huecos) de los componentes."""
+    returns = (close / close.shift(1)).apply(np.log).mean(axis=1).fillna(0.0)
+    index_close = 100 * np.exp(returns.cumsum())
+    previous = index_close.shift(1)
+    index_open = previous * (1 + (open_ / close.shift(1) - 1).mean(axis=1))
+    # Rango aproximado con los extremos medios de los componentes, relativos a su cierre anterior
+    index_high = previous * (high / close.shift(1)).mean(axis=1)
+    index_low = previous * (low / close.shift(1)).mean(axis=1)
+    return tuple(series.to_frame(INDEX_SYMBOL) for series in (index_open, index_high, index_low, index_close))
+
+
+def compute_regimes(daily: pd.DataFrame, opening: pd.DataFrame = None, params=None, with_index=True):
+    """
+    Etiquetas de régimen a partir de velas diarias (`symbol`, `date`, `open`, `high`, `low`,
+    `close`) y, opcionalmente, de las rentabilidades de apertura de `opening_returns`.
+    Incluye las filas del índice equiponderado (`INDEX_SYMBOL`). Devuelve un DataFrame con
+    `REGIME_COLUMNS`.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    if daily.empty:
+        return pd.DataFrame(columns=REGIME_COLUMNS)
+    daily = daily.assign(date=pd.to_datetime(daily["date"]))
+    wide = {name: daily.pivot(index="date", columns="symbol", values=name).sort_index()
+            for name in ("open", "high", "low", "close")}
+    frames = [wide]
+    if with_index:
+        frames.append(dict(zip(("open", "high", "low", "close"), _equal_weight_index(
+            wide["open"], wide["high"], wide["low"], wide["close"]))))
+
+    parts = []
+    for prices in frames:
+        labels = label_daily(prices["open"], prices["high"], prices["low"], prices["close"], params)
+        present = prices["close"].notna().stack(future_stack=True)
+        long = pd.DataFrame({name: table.stack(future_stack=True) for name, table in labels.items()})
+        parts.append(long[present.reindex(long.index, fill_value=False)])
+    regimes = pd.concat(parts).rename_axis(["date", "symbol"]).reset_index()
+
+    if opening is not None and not opening.empty:
+        opening = opening.assign(date=pd.to_datetime(opening["date"]))
+        index_opening = opening.groupby("date", as_index=False)["open_return"].mean().assign(symbol=INDEX_SYMBOL)
+        opening = pd.concat([opening, index_opening]) if with_index else opening
+        regimes = regimes.merge(opening[["symbol", "date", "open_return"]], on=["symbol", "date"], how="left")
+        threshold = params["open_drive_threshold"]
+        regimes["flags"] += (OPEN_DRIVE_UP * (regimes["open_return"] > threshold)
+                             + OPEN_DRIVE_DOWN * (regimes["open_return"] < -threshold))
+    else:
+        regimes["open_return"] = np.nan
+    regimes["date"] = regimes["date"].dt.date
+    return regimes[REGIME_COLUMNS].sort_values(["symbol", "date"], ignore_index=True)
+
+
+def read_daily_bars(session: Session, start=None, symbols=None):
+    """Velas diarias de `sp500_data` desde `start` (incluido) para el etiquetado."""
+    table = SP500Data.__table__
+    query = select(table.c.symbol, table.c.date, table.c.open, table.c.high, table.c.low, table.c.close)
+    if start is not None:
+        query = query.where(table.c.date >= pd.Timestamp(start).date())
+    if symbols is not None:
+        query = query.where(table.c.symbol.in_(list(symbols)))
+    return pd.read_sql(query.order_by(table.c.symbol, table.c.date), session.bind)
+
+
+def _label_since(session: Session, daily, first_new, last_dates, params, timeframe, with_index):
+    """Etiquetas de `daily` que faltan o deben recalcularse (desde la última etiqueta de cada símbolo)."""
+    symbols = sorted(daily["symbol"].unique())
+    intraday = fetch_intraday_range(session, symbols, start=first_new, timeframe=timeframe,
+                                    columns=["symbol", "datetime", "open", "close"])
+    regimes = compute_regimes(daily, opening_returns(intraday, params), params, with_index=with_index)
+    last = pd.to_datetime(regimes["symbol"].map(last_dates))
+    return regimes[last.isna() | (pd.to_datetime(regimes["date"]) >= last)]
+
+
+def update_regimes(session: Session, params=None, timeframe=DEFAULT_TIMEFRAME):
+    """
+    Etiqueta los días cargados desde el último día ya etiquetado de cada símbolo (que se
+    recalcula, por si entonces faltaban velas intradía). Solo lee la historia necesaria para
+    calentar las ventanas desde la etiqueta más antigua de los símbolos activos: los que
+    tienen velas diarias posteriores a su última etiqueta o están al día. Un símbolo que
+    dejó de cotizar no obliga a releer años de historia. Los símbolos sin etiquetas se
+    etiquetan aparte con toda su historia. Guarda con upsert y no hace commit. Devuelve el
+    número de filas escritas.
+    """
+    table = SP500Data.__table__
+    last_dates = dict(session.execute(
+        select(MarketRegime.symbol, func.max(MarketRegime.date)).group_by(MarketRegime.symbol)
+    ).all())
+    last_daily = dict(session.execute(select(table.c.symbol, func.max(table.c.date)).group_by(table.c.symbol)).all())
+    if not last_daily:
+        return 0
+    if not last_dates:
+        regimes = _label_since(session, read_daily_bars(session), None, last_dates, params, timeframe, True)
+    else:
+        newest = max(last_dates.values())
+        active = [last_dates[symbol] for symbol, day in last_daily.items()
+                  if symbol in last_dates and (day > last_dates[symbol] or last_dates[symbol] >= newest)]
+        since = pd.Timestamp(min(active + [last_dates.get(INDEX_SYMBOL, newest)]))
+        daily = read_daily_bars(session, since - pd.Timedelta(days=warmup_days(params)))
+        new_symbols = sorted(set(last_daily) - set(last_dates))
+        # Los símbolos nuevos entran en el índice de los días recientes, pero sus filas salen del cálculo aparte
+        labelled = _label_since(session, daily, since, last_dates, params, timeframe, True)
+        parts = [labelled[~labelled["symbol"].isin(new_symbols)]]
+        if new_symbols:
+            parts.append(_label_since(session, read_daily_bars(session, symbols=new_symbols), None, last_dates,
+                                      params, timeframe, False))
+        regimes = pd.concat(parts, ignore_index=True)
+        logging.info(f"Regímenes desde {since.date()}: {len(active)} símbolos activos, {len(new_symbols)} nuevos.")
+
+    rows = regimes.astype(object).where(regimes.notna(), None).to_dict("records")
+    upsert_rows(session, MarketRegime.__table__, rows, ["symbol", "date"],
+                ["flags", "realized_vol", "trend", "gap", "open_return"])
+    logging.info(f"Regímenes de mercado actualizados: {len(rows)} filas de {regimes['symbol'].nunique()} símbolos.")
+    return len(rows)
+
+
+def select_days(session: Session, require=0, exclude=0, symbol=INDEX_SYMBOL, start=None, end=None):
+    """
+    Días (fechas) cuyo régimen contiene todos los bits de `require` y ninguno de `exclude`,
+    p. ej. `select_days(session, VOL_HIGH | TREND_BEAR)` para el índice.
+    """
+    query = select(MarketRegime.date).where(MarketRegime.symbol == symbol)
+    if require:
+        query = query.where(MarketRegime.flags.op("&")(require) == require)
+    if exclude:
+        query = query.where(MarketRegime.flags.op("&")(exclude) == 0)
+    if start is not None:
+        query = query.where(MarketRegime.date >= pd.Timestamp(start).date())
+    if end is not None:
+        query = query.where(MarketRegime.date <= pd.Timestamp(end).date())
+    return [row[0] for row in session.execute(query.order_by(MarketRegime.date))]
+
+
+def load_regimes(session: Session, symbols=None, start=None, end=None):
+    """Etiquetas guardadas como DataFrame (`REGIME_COLUMNS`), para filtrar en memoria."""
+    table = MarketRegime.__table__
+    query = select(*[table.c[name] for name in REGIME_COLUMNS])
+    if symbols is not None:
+        query = query.where(table.c.symbol.in_(list(symbols)))
+    if start is not None:
+        query = query.where(table.c.date >= pd.Timestamp(start).date())
+    if end is not None:
+        query = query.where(table.c.date <= pd.Timestamp(end).date())
+    return pd.read_sql(query.order_by(table.c.symbol, table.c.date), session.bind)
+
+
+def regime_mask(times, regimes: pd.DataFrame, require=0, exclude=0, symbols=None):
+    """
+    Máscara de velas cuyo día de sesión cumple el régimen. Sin `symbols`, usa las filas del
+    índice y devuelve un array por vela; con `symbols`, una matriz símbolos × velas (como las
+    de `BarStore.read_matrix`) con el régimen de cada símbolo.
+    """
+    days = session_dates(times)
+    flags = regimes["flags"].to_numpy(dtype=np.int64)
+    selected = regimes[((flags & require) == require) & ((flags & exclude) == 0)]
+    selected_days = pd.to_datetime(selected["date"]).to_numpy().astype("datetime64[D]")
+    if symbols is None:
+        return np.isin(days, selected_days[selected["symbol"].to_numpy() == INDEX_SYMBOL])
+    owners = selected["symbol"].to_numpy()
+    return np.vstack([np.isin(days, selected_days[owners == symbol]) for symbol in symbols]) \
+        if len(symbols) else np.zeros((0, len(days)), dtype=bool)
+
+
+if __name__ == "__main__":
+    from backend.app.db import SessionLocal
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    db_session = SessionLocal()
+    try:
+        update_regimes(db_session)
+        db_session.commit()
+    finally:
+        db_session.close()
@@ -0,0 +1,312 @@
+import itertools
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from backend.app.modules.backtest import DEFAULT_INITIAL_CAPITAL, run_backtest
+from backend.app.modules.bar_store import BarStore
+from backend.app.modules.performance_metrics import TradeArrays, trade_metrics
+
+# Optimización de parámetros de estrategias sobre el backtester vectorizado. Las matrices de
+# precios (símbolos × velas) se copian una sola vez a un bloque de memoria compartida; cada
+# proceso del pool las abre como vistas de solo lectura y recibe únicamente lotes de
+# combinaciones de parámetros. `signal_function(prices, **params)` debe ser una función de
+# módulo (se envía por pickle) y devolver (entries, exits) como en `backtest_store`.
+
+OPTIMIZER_WORKERS = int(os.getenv("OPTIMIZER_WORKERS", str(os.cpu_count() or 1)))
+RANK_COLUMNS = ["profit_factor", "expectancy", "max_drawdown"]  # Criterios de ordenación, por prioridad
+SUMMARY_COLUMNS = ["trades", "win_rate", "profit_factor", "expectancy", "total_return", "max_drawdown",
+                   "max_time_under_water"]
+
+_WORKER_PRICES = None  # Precios compartidos abiertos en cada proceso del pool
+
+
+class SharedPrices:
+    """
+    Matrices float64 en un único bloque de memoria compartida. `spec` (nombre del bloque y
+    disposición de cada matriz) basta para abrirlas desde otro proceso sin copiarlas.
+    """
+    def __init__(self, block, layout, owner=False):
+        self.block = block
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {
+            name: np.ndarray(shape, dtype=np.float64, buffer=block.buf, offset=offset)
+            for name, shape, offset in layout
+        }
+
+    @classmethod
+    def create(cls, prices):
+        layout, offset = [], 0
+        for name, matrix in prices.items():
+            layout.append((name, tuple(np.shape(matrix)), offset))
+            offset += int(np.prod(np.shape(matrix))) * 8
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        shared = cls(block, layout, owner=True)
+        for name, matrix in prices.items():
+            shared.arrays[name][...] = matrix
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        name, layout = spec
+        shared = cls(shared_memory.SharedMemory(name=name), layout)
+        for array in shared.arrays.values():
+            array.flags.writeable = False
+        return shared
+
+    @property
+    def spec(self):
+        return self.block.name, self.layout
+
+    def close(self):
+        self.arrays = {}
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+
+
+def _init_optimizer_worker(spec):
+    """Cada proceso abre una vez el bloque de precios compartido."""
+    global _WORKER_PRICES
+    _WORKER_PRICES = SharedPrices.attach(spec)
+
+
+def _evaluate_in_worker(signal_function, parameter_sets, start, stop, backtest_kwargs):
+    return evaluate_parameter_sets(_WORKER_PRICES.arrays, signal_function, parameter_sets, start, stop,
+                                   **backtest_kwargs)
+
+
+def grid_parameters(space):
+    """Todas las combinaciones de un espacio {parámetro: lista de valores}."""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_parameters(space, count, seed=None):
+    """
+    Combinaciones aleatorias sin repetir. Cada parámetro es una lista de valores (se elige
+    uno) o una tupla (mínimo, máximo): entero si ambos extremos lo son, real en otro caso.
+    """
+    rng = np.random.default_rng(seed)
+    candidates, seen = [], set()
+    for _ in range(count * 20):
+        if len(candidates) == count:
+            break
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    params[name] = int(rng.integers(low, high + 1))
+                else:
+                    params[name] = float(rng.uniform(low, high))
+            else:
+                params[name] = values[int(rng.integers(len(values)))]
+        key = tuple(params.items())
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+
+def evaluate_parameter_sets(prices, signal_function, parameter_sets, start=0, stop=None,
+                            initial_capital=DEFAULT_INITIAL_CAPITAL, **backtest_kwargs):
+    """
+    Backtest de cada combinación sobre todos los símbolos en las velas [start, stop). Las
+    señales se calculan con la historia hasta `stop`, de modo que los indicadores llegan
+    calentados al inicio de la ventana. Devuelve una fila de resumen por combinación.
+    """
+    stop = prices["close"].shape[1] if stop is None else stop
+    history = {name: matrix[:, :stop] for name, matrix in prices.items()}
+    symbols = prices["close"].shape[0]
+    entries, exits = [], []
+    for params in parameter_sets:
+        signal_entries, signal_exits = signal_function(history, **params)
+        entries.append(np.asarray(signal_entries)[:, start:stop])
+        exits.append(np.asarray(signal_exits)[:, start:stop])
+    result = run_backtest(history["close"][:, start:stop], np.concatenate(entries), np.concatenate(exits),
+                          open_=history["open"][:, start:stop], rows=np.tile(np.arange(symbols), len(parameter_sets)),
+                          initial_capital=initial_capital, **backtest_kwargs)
+    summary = summarize_runs(result.metrics, result.trades, len(parameter_sets), symbols, initial_capital)
+    return pd.concat([pd.DataFrame(parameter_sets), summary], axis=1)
+
+
+def summarize_runs(metrics: pd.DataFrame, trades: pd.DataFrame, parameter_sets, symbols,
+                   initial_capital=DEFAULT_INITIAL_CAPITAL):
+    """
+    Agrega las ejecuciones de cada combinación (una por símbolo, consecutivas) como una
+    cartera con el mismo capital por símbolo: operaciones y profit factor del conjunto,
+    esperanza en fracción del capital de cada símbolo, rentabilidad media y peor caída.
+    """
+    grouped = TradeArrays.from_runs(trades["run"].to_numpy() // symbols, trades["pnl"].to_numpy() / initial_capital,
+                                    parameter_sets)
+    summary = trade_metrics(grouped)
+    by_set = metrics.groupby(np.arange(len(metrics)) // symbols)
+    summary["total_return"] = by_set["total_return"].mean().to_numpy()
+    summary["max_drawdown"] = by_set["max_drawdown"].min().to_numpy()
+    summary["max_time_under_water"] = by_set["max_time_under_water"].max().to_numpy()
+    return summary[SUMMARY_COLUMNS]
+
+
+def rank_results(table: pd.DataFrame, by=RANK_COLUMNS, min_trades=1):
+    """
+    Ordena de mejor a peor: mayor profit factor, después mayor esperanza y después menor
+    caída. Las combinaciones con menos de `min_trades` operaciones van al final.
+    """
+    keys = pd.DataFrame({column: table[column].fillna(-np.inf) for column in by})
+    keys.insert(0, "_enough_trades", table["trades"] >= min_trades)
+    order = keys.sort_values(list(keys.columns), ascending=False, kind="stable").index
+    ranked = table.loc[order].reset_index(drop=True)
+    ranked.insert(0, "rank", np.arange(1, len(ranked) + 1))
+    return ranked
+
+
+class ParameterOptimizer:
+    """
+    Optimizador de parámetros sobre precios en memoria compartida. Usar como contexto para
+    liberar el pool y el bloque compartido:
+
+        with ParameterOptimizer.from_store(store, crossover) as optimizer:
+            ranking = optimizer.successive_halving(grid_parameters(space))
+    """
+    def __init__(self, prices, signal_function, index=None, workers=OPTIMIZER_WORKERS, batch_size=None,
+                 max_drawdown_limit=-0.5, min_trades=1, **backtest_kwargs):
+        self.signal_function = signal_function
+        self.index = index
+        self.symbols = None
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.max_drawdown_limit = max_drawdown_limit
+        self.min_trades = min_trades
+        self.backtest_kwargs = backtest_kwargs
+        self.bars = np.shape(prices["close"])[1]
+        self.shared = None
+        self.pool = None
+        if self.workers > 1:
+            self.shared = SharedPrices.create(prices)
+            self.prices = self.shared.arrays
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_optimizer_worker,
+                                            initargs=(self.shared.spec,))
+        else:
+            self.prices = {name: np.asarray(matrix, dtype=np.float64) for name, matrix in prices.items()}
+
+    @classmethod
+    def from_store(cls, store: BarStore, signal_function, symbols=None, start=None, end=None, **kwargs):
+        symbols, index, prices = store.read_matrix(symbols, start, end)
+        optimizer = cls(prices, signal_function, index=index, **kwargs)
+        optimizer.symbols = symbols
+        return optimizer
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def evaluate(self, parameter_sets, start=0, stop=None):
+        """Resumen de cada combinación en las velas [start, stop), en el orden recibido."""
+        stop = self.bars if stop is None else stop
+        if not parameter_sets:
+            return pd.DataFrame(columns=SUMMARY_COLUMNS)
+        if self.pool is None:
+            return evaluate_parameter_sets(self.prices, self.signal_function, parameter_sets, start, stop,
+                                           **self.backtest_kwargs)
+        size = self.batch_size or max(1, math.ceil(len(parameter_sets) / (self.workers * 4)))
+        batches = [parameter_sets[i:i + size] for i in range(0, len(parameter_sets), size)]
+        futures = [self.pool.submit(_evaluate_in_worker, self.signal_function, batch, start, stop, self.backtest_kwargs)
+                   for batch in batches]
+        return pd.concat([future.result() for future in futures], ignore_index=True)
+
+    def _discard_bad(self, table):
+        """Descarta las combinaciones claramente malas: caída por debajo del límite o sin operaciones."""
+        bad = (table["max_drawdown"] < self.max_drawdown_limit) | (table["trades"] < self.min_trades)
+        return table[~bad]
+
+    def search(self, parameter_sets, start=0, stop=None):
+        """Evalúa todas las combinaciones (rejilla o aleatorias) y devuelve el ranking."""
+        started = time.perf_counter()
+        ranked = rank_results(self.evaluate(parameter_sets, start, stop), min_trades=self.min_trades)
+        logging.info(f"Optimización de {len(parameter_sets)} combinaciones en {time.perf_counter() - started:.2f}s.")
+        return ranked
+
+    def successive_halving(self, parameter_sets, start=0, stop=None, eta=3, min_fraction=1 / 9):
+        """
+        Búsqueda por eliminación sucesiva: evalúa todas las combinaciones en un tramo inicial
+        corto de la ventana, descarta las claramente malas, conserva el mejor 1/`eta` y repite
+        con un tramo `eta` veces más largo hasta usar la ventana completa. El ranking final
+        solo contiene las combinaciones que llegaron a la última ronda.
+        """
+        started = time.perf_counter()
+        stop = self.bars if stop is None else stop
+        candidates = list(parameter_sets)
+        fraction = min_fraction
+        evaluated = 0
+        while True:
+            fraction = min(fraction, 1.0)
+            rung_stop = start + max(1, int(round((stop - start) * fraction)))
+            table = self.evaluate(candidates, start, rung_stop)
+            evaluated += len(candidates)
+            if fraction >= 1.0:
+                break
+            survivors = rank_results(self._discard_bad(table), min_trades=self.min_trades)
+            keep = max(1, len(candidates) // eta)
+            if survivors.empty:
+                survivors = rank_results(table, min_trades=self.min_trades)
+            candidates = [candidates[i] for i in self._positions(table, survivors.head(keep))]
+            fraction *= eta
+        logging.info(f"Eliminación sucesiva: {len(parameter_sets)} combinaciones, {evaluated} evaluaciones "
+                     f"en {time.perf_counter() - started:.2f}s.")
+        return rank_results(table, min_trades=self.min_trades)
+
+    @staticmethod
+    def _positions(table, selected):
+        """Posiciones en `table` de las filas elegidas (mismas columnas de parámetros)."""
+        names = [column for column in table.columns if column not in SUMMARY_COLUMNS]
+        keys = list(map(tuple, table[names].itertuples(index=False)))
+        return [keys.index(key) for key in map(tuple, selected[names].itertuples(index=False))]
+
+    def walk_forward(self, parameter_sets, splits=4, in_sample=0.75, halving=True, **halving_kwargs):
+        """
+        Validación walk-forward: el último (1 - `in_sample`) de las velas se divide en
+        `splits` tramos fuera de muestra; cada uno se evalúa con la mejor combinación de las
+        `in_sample` × velas inmediatamente anteriores. Devuelve una fila por tramo con los
+        parámetros elegidos y sus métricas dentro (`is_`) y fuera (`oos_`) de muestra.
+        """
+        in_sample_bars = int(self.bars * in_sample)
+        out_sample_bars = (self.bars - in_sample_bars) // splits
+        if out_sample_bars < 1:
+            raise ValueError("No hay velas suficientes para los tramos fuera de muestra")
+        rows = []
+        for fold in range(splits):
+            oos_start = in_sample_bars + fold * out_sample_bars
+            oos_stop = self.bars if fold == splits - 1 else oos_start + out_sample_bars
+            is_start = oos_start - in_sample_bars
+            if halving:
+                ranking = self.successive_halving(parameter_sets, is_start, oos_start, **halving_kwargs)
+            else:
+                ranking = self.search(parameter_sets, is_start, oos_start)
+            best = ranking.iloc[0]
+            params = {name: best[name] for name in parameter_sets[0]}
+            params = {name: type(parameter_sets[0][name])(value) for name, value in params.items()}
+            out_sample = self.evaluate([params], oos_start, oos_stop).iloc[0]
+            row = {"fold": fold, "is_start": is_start, "oos_start": oos_start, "oos_stop": oos_stop, **params}
+            row.update({f"is_{column}": best[column] for column in SUMMARY_COLUMNS})
+            row.update({f"oos_{column}": out_sample[column] for column in SUMMARY_COLUMNS})
+            rows.append(row)
+        result = pd.DataFrame(rows)
+        if self.index is not None:
+            result.insert(1, "oos_start_datetime", self.index[result["oos_start"].to_numpy()])
+        return result
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+from backend.app.modules.market_calendar import timeframe_to_timedelta
+
+# Métricas de rendimiento por lotes: una matriz de capital ejecuciones × velas y las
+# operaciones de todas las ejecuciones en arrays planos con desplazamientos (formato CSR:
+# las operaciones de la ejecución r ocupan [offsets[r], offsets[r + 1])). Cada métrica se
+# calcula para todas las ejecuciones a la vez, sin bucles por ejecución en Python.
+
+TRADING_DAYS = 252
+SESSION_MINUTES = 390  # Sesión regular de 9:30 a 16:00
+EQUITY_METRIC_COLUMNS = ["final_equity", "total_return", "max_drawdown", "max_time_under_water", "volatility",
+                         "sharpe", "sortino"]
+TRADE_METRIC_COLUMNS = ["trades", "win_rate", "profit_factor", "expectancy", "average_win", "average_loss",
+                        "max_loss", "max_consecutive_losses"]
+# Objetivos por defecto del reporte: esperanza positiva y más ganancia bruta que pérdida bruta
+DEFAULT_TARGETS = {"profit_factor": 1.0, "expectancy": 0.0}
+
+
+def periods_per_year(timeframe=None):
+    """Velas por año para anualizar: 252 con velas diarias (`None` o `1Day`), proporcional en intradía."""
+    if timeframe in (None, "1Day"):
+        return TRADING_DAYS
+    return TRADING_DAYS * SESSION_MINUTES / (timeframe_to_timedelta(timeframe).total_seconds() / 60)
+
+
+class TradeArrays:
+    """
+    Operaciones de muchas ejecuciones en formato CSR: `offsets` (ejecuciones + 1) y arrays
+    planos `pnl` y, opcionalmente, `returns` y `bars_held`, ordenados por ejecución.
+    """
+    def __init__(self, offsets, pnl, returns=None, bars_held=None):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.pnl = np.asarray(pnl, dtype=np.float64)
+        self.returns = None if returns is None else np.asarray(returns, dtype=np.float64)
+        self.bars_held = None if bars_held is None else np.asarray(bars_held, dtype=np.int64)
+
+    @classmethod
+    def from_runs(cls, run, pnl, runs, returns=None, bars_held=None):
+        """Construye los arrays a partir del número de ejecución de cada operación (en cualquier orden)."""
+        run = np.asarray(run, dtype=np.int64)
+        order = np.argsort(run, kind="stable")
+        offsets = np.zeros(runs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(run, minlength=runs), out=offsets[1:])
+        pick = (lambda values: None if values is None else np.asarray(values)[order])
+        return cls(offsets, np.asarray(pnl)[order], pick(returns), pick(bars_held))
+
+    @classmethod
+    def from_frame(cls, trades: pd.DataFrame, runs):
+        """Desde un DataFrame de operaciones con `run` y `pnl` (y `return`/`bars_held` si existen)."""
+        return cls.from_runs(trades["run"].to_numpy(), trades["pnl"].to_numpy(), runs,
+                             trades["return"].to_numpy() if "return" in trades else None,
+                             trades["bars_held"].to_numpy() if "bars_held" in trades else None)
+
+    @property
+    def runs(self):
+        return len(self.offsets) - 1
+
+    def run_ids(self):
+        """Ejecución de cada operación."""
+        return np.repeat(np.arange(self.runs), np.diff(self.offsets))
+
+
+def drawdown(equity):
+    """Caída desde el máximo previo (fracción negativa o 0) y velas seguidas bajo ese máximo."""
+    equity = np.atleast_2d(equity)
+    bars = equity.shape[1]
+    peak = np.maximum.accumulate(equity, axis=1)
+    at_peak = np.where(equity >= peak, np.arange(bars), 0)
+    np.maximum.accumulate(at_peak, axis=1, out=at_peak)
+    return equity / peak - 1, np.arange(bars) - at_peak
+
+
+def equity_metrics(equity, initial_capital=None, periods=TRADING_DAYS):
+    """
+    Métricas de las curvas de capital (ejecuciones × velas): capital final, rentabilidad
+    total, máxima caída, máximo tiempo bajo agua (velas), volatilidad, Sharpe y Sortino
+    anualizados con `periods` velas por año. Sin `initial_capital` se usa la primera vela.
+    """
+    equity = np.atleast_2d(np.asarray(equity, dtype=np.float64))
+    start = equity[:, 0] if initial_capital is None else np.full(equity.shape[0], float(initial_capital))
+    previous = np.concatenate([start[:, None], equity[:, :-1]], axis=1)
+    dd, under_water = drawdown(equity)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = equity / previous - 1
+        mean = returns.mean(axis=1)
+        std = returns.std(axis=1, ddof=1) if equity.shape[1] > 1 else np.full(equity.shape[0], np.nan)
+        downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2, axis=1))
+        scale = np.sqrt(periods)
+        return pd.DataFrame({
+            "final_equity": equity[:, -1],
+            "total_return": equity[:, -1] / start - 1,
+            "max_drawdown": dd.min(axis=1),
+            "max_time_under_water": under_water.max(axis=1),
+            "volatility": std * scale,
+            "sharpe": np.where(std > 0, mean / std * scale, np.nan),
+            "sortino": np.where(downside > 0, mean / downside * scale, np.nan),
+        }, columns=EQUITY_METRIC_COLUMNS)
+
+
+def _max_consecutive_losses(trades: TradeArrays):
+    """Racha más larga de operaciones perdedoras seguidas de cada ejecución."""
+    losing = trades.pnl < 0
+    position = np.arange(len(losing))
+    # Última operación no perdedora antes de cada operación; el inicio de cada ejecución corta la racha
+    reset = np.where(~losing, position, -1)
+    starts = trades.offsets[:-1][np.diff(trades.offsets) > 0]
+    reset[starts] = np.maximum(reset[starts], starts - 1)
+    np.maximum.accumulate(reset, out=reset)
+    streak = np.where(losing, position - reset, 0)
+    result = np.zeros(trades.runs, dtype=np.int64)
+    np.maximum.at(result, trades.run_ids(), streak)
+    return result
+
+
+def trade_metrics(trades: TradeArrays):
+    """
+    Métricas de las operaciones de cada ejecución: número, porcentaje de aciertos, profit
+    factor, esperanza, ganancia y pérdida medias, mayor pérdida (negativa, 0 si no hay
+    pérdidas) y racha máxima de pérdidas.
+    """
+    runs = trades.runs
+    run = trades.run_ids()
+    pnl = trades.pnl
+    count = np.diff(trades.offsets)
+    wins = np.bincount(run, weights=pnl > 0, minlength=runs)
+    losses = np.bincount(run, weights=pnl < 0, minlength=runs)
+    gross_profit = np.bincount(run, weights=np.where(pnl > 0, pnl, 0.0), minlength=runs)
+    gross_loss = -np.bincount(run, weights=np.where(pnl < 0, pnl, 0.0), minlength=runs)
+    max_loss = np.zeros(runs)
+    np.minimum.at(max_loss, run, pnl)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            "trades": count,
+            "win_rate": np.where(count > 0, wins / count, np.nan),
+            "profit_factor": np.where(gross_loss > 0, gross_profit / gross_loss,
+                                      np.where(gross_profit > 0, np.inf, np.nan)),
+            "expectancy": np.where(count > 0, (gross_profit - gross_loss) / count, np.nan),
+            "average_win": np.where(wins > 0, gross_profit / wins, np.nan),
+            "average_loss": np.where(losses > 0, -gross_loss / losses, np.nan),
+            "max_loss": max_loss,
+            "max_consecutive_losses": _max_consecutive_losses(trades),
+        }, columns=TRADE_METRIC_COLUMNS)
+
+
+def compute_metrics(equity, trades, initial_capital=None, periods=TRADING_DAYS):
+    """
+    Todas las métricas por ejecución. `trades` es un `TradeArrays` o un DataFrame con `run`
+    y `pnl`.
+    """
+    equity = np.atleast_2d(equity)
+    if not isinstance(trades, TradeArrays):
+        trades = TradeArrays.from_frame(trades, equity.shape[0])
+    return pd.concat([equity_metrics(equity, initial_capital, periods), trade_metrics(trades)], axis=1)
+
+
+def comparison_report(equity, trades, labels=None, initial_capital=None, periods=TRADING_DAYS,
+                      targets=DEFAULT_TARGETS, sort_by=("profit_factor", "expectancy", "max_drawdown")):
+    """
+    Reporte comparativo de muchas variantes en una llamada: métricas por ejecución junto a
+    sus etiquetas (`labels`, p. ej. símbolo y parámetros), si supera los objetivos
+    (`targets`: métrica -> mínimo exigido, estricto) y su puesto según `sort_by`.
+    """
+    metrics = compute_metrics(equity, trades, initial_capital, periods)
+    report = metrics if labels is None else pd.concat([pd.DataFrame(labels).reset_index(drop=True), metrics], axis=1)
+    meets = np.ones(len(report), dtype=bool)
+    for column, minimum in targets.items():
+        meets &= (report[column] > minimum).to_numpy()
+    report["meets_targets"] = meets
+    keys = report[list(sort_by)].fillna(-np.inf)
+    order = keys.sort_values(list(sort_by), ascending=False, kind="stable").index
+    report = report.loc[order].reset_index(drop=True)
+    report.insert(0, "rank", np.arange(1, len(report) + 1))
+    return report
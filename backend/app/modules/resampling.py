@@ -0,0 +1,198 @@
+import logging
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from backend.app.modules.bar_store import BarStore
+from backend.app.modules.intraday_storage import DEFAULT_TIMEFRAME, fetch_intraday_range
+from backend.app.modules.market_calendar import session_dates, session_mask, sessions, timeframe_to_timedelta
+
+# Remuestreo de velas base (5 minutos) a temporalidades mayores, para todos los símbolos a la vez.
+#   - Solo se usan velas de sesión regular. Las velas intradía se alinean con la apertura de
+#     cada sesión (9:30, 10:00, ... con 30 minutos; la última vela de 60 minutos es 15:30-16:00)
+#     y respetan los cierres anticipados.
+#   - `1Day` es la sesión regular de cada día (comparable con `sp500_data`); `1Week` agrupa las
+#     sesiones de cada semana. Se fechan a medianoche del día de sesión y del lunes de la semana.
+#   - open = primer open, close = último close, high/low = extremos, volume y trade_count se
+#     suman, vwap = media de los vwap ponderada por volumen y `bars` cuenta las velas base.
+# La agregación es asociativa: una vela ya remuestreada se combina con las velas nuevas del
+# mismo periodo con las mismas reglas, lo que permite extender la caché de forma incremental.
+
+RESAMPLE_TIMEFRAMES = ("15Min", "30Min", "1Hour", "1Day", "1Week")
+RESAMPLED_COLUMNS = ["symbol", "datetime", "open", "high", "low", "close", "volume", "trade_count", "vwap", "bars"]
+
+
+def bucket_starts(times, timeframe, days=None):
+    """
+    Inicio (UTC sin zona horaria) del periodo de `timeframe` de cada marca de tiempo de sesión
+    regular. Las marcas fuera de sesión deben filtrarse antes (`session_mask`). `days` son sus
+    fechas de sesión, si ya se calcularon.
+    """
+    index = pd.DatetimeIndex(times)
+    days = session_dates(index) if days is None else days
+    if timeframe == "1Day":
+        return days.astype("datetime64[ns]")
+    if timeframe == "1Week":
+        weekday = (days.astype("datetime64[D]").view(np.int64) - 4) % 7  # 1970-01-05 fue lunes
+        return (days - weekday.astype("timedelta64[D]")).astype("datetime64[ns]")
+    freq = timeframe_to_timedelta(timeframe).value
+    if len(index) == 0:
+        return np.empty(0, dtype="datetime64[ns]")
+    calendar = sessions(days.min(), days.max())
+    opens = calendar["open"].dt.tz_convert(None).to_numpy().astype(np.int64)
+    position = np.searchsorted(calendar.index.values.astype("datetime64[D]"), days)
+    values = index.tz_convert(None).asi8 if index.tz is not None else index.asi8
+    session_open = opens[position]
+    return (session_open + (values - session_open) // freq * freq).astype("datetime64[ns]")
+
+
+def _columns(frame: pd.DataFrame, order):
+    """Columnas de agregación como arrays, en el orden de filas `order`."""
+    trade_count = frame["trade_count"].fillna(0) if "trade_count" in frame else pd.Series(0, index=frame.index)
+    vwap = frame["vwap"] if "vwap" in frame else pd.Series(np.nan, index=frame.index)
+    bars = frame["bars"] if "bars" in frame else pd.Series(1, index=frame.index)
+    columns = {name: frame[name].to_numpy(dtype=np.float64)[order]
+               for name in ("open", "high", "low", "close", "volume")}
+    columns["trade_count"] = trade_count.to_numpy(dtype=np.int64)[order]
+    columns["vwap"] = vwap.to_numpy(dtype=np.float64)[order]
+    columns["bars"] = bars.to_numpy(dtype=np.int64)[order]
+    return columns
+
+
+def _reduce(symbols, codes, buckets, columns):
+    """
+    Agrega filas ordenadas por (símbolo, periodo, fecha): una fila por (símbolo, periodo).
+    `codes` identifica el símbolo de cada fila y `symbols[code]` es su nombre. Las filas de
+    entrada pueden ser velas base (bars = 1) o velas ya agregadas.
+    """
+    new_group = np.ones(len(codes), dtype=bool)
+    new_group[1:] = (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], len(codes)) - 1
+
+    volume, vwap, close = columns["volume"], columns["vwap"], columns["close"]
+    weighted = np.where(np.isnan(vwap), close, vwap) * volume
+    total_volume = np.add.reduceat(volume, starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        group_vwap = np.add.reduceat(weighted, starts) / total_volume
+    return pd.DataFrame({
+        "symbol": np.asarray(symbols, dtype=object)[codes[starts]],
+        "datetime": buckets[starts],
+        "open": columns["open"][starts],
+        "high": np.maximum.reduceat(columns["high"], starts),
+        "low": np.minimum.reduceat(columns["low"], starts),
+        "close": close[ends],
+        "volume": total_volume,
+        "trade_count": np.add.reduceat(columns["trade_count"], starts),
+        "vwap": np.where(total_volume > 0, group_vwap, close[ends]),
+        "bars": np.add.reduceat(columns["bars"], starts),
+    }, columns=RESAMPLED_COLUMNS)
+
+
+def resample_bars(bars: pd.DataFrame, timeframes):
+    """
+    Remuestrea velas base de varios símbolos (`symbol`, `datetime`, OHLCV, `trade_count`,
+    `vwap`) a una temporalidad o a varias (lista: devuelve un dict temporalidad -> DataFrame).
+    El filtrado, la ordenación y las fechas de sesión se calculan una sola vez para todas.
+    Cada resultado tiene `RESAMPLED_COLUMNS`, ordenado por símbolo y fecha.
+    """
+    single = isinstance(timeframes, str)
+    timeframes = [timeframes] if single else list(timeframes)
+    times = pd.DatetimeIndex(pd.to_datetime(bars["datetime"])) if not bars.empty else pd.DatetimeIndex([])
+    regular = session_mask(times)
+    if not regular.any():
+        empty = {timeframe: pd.DataFrame(columns=RESAMPLED_COLUMNS) for timeframe in timeframes}
+        return empty[timeframes[0]] if single else empty
+
+    frame = bars[regular]
+    times = times[regular]
+    codes, symbols = pd.factorize(frame["symbol"], sort=True)
+    order = np.lexsort((times.asi8, codes))
+    codes, times = codes[order], times[order]
+    columns = _columns(frame, order)
+    days = session_dates(times)
+    result = {timeframe: _reduce(symbols, codes, bucket_starts(times, timeframe, days), columns)
+              for timeframe in timeframes}
+    return result[timeframes[0]] if single else result
+
+
+def merge_resampled(cached: pd.DataFrame, new: pd.DataFrame):
+    """
+    Añade a `cached` las velas remuestreadas de `new` (posteriores a las ya agregadas). Un
+    periodo presente en ambos (el último, aún abierto) se combina con las reglas de agregación.
+    Las filas nuevas se añaden al final: el resultado queda en orden cronológico dentro de
+    cada símbolo, pero no ordenado por símbolo.
+    """
+    if cached.empty:
+        return new.reset_index(drop=True)
+    if new.empty:
+        return cached
+    first_new = new.groupby("symbol")["datetime"].min()
+    overlap = cached["datetime"].to_numpy() >= cached["symbol"].map(first_new).to_numpy()
+    combined = pd.concat([cached[overlap], new], ignore_index=True)
+    codes, symbols = pd.factorize(combined["symbol"], sort=True)
+    buckets = combined["datetime"].to_numpy(dtype="datetime64[ns]")
+    order = np.lexsort((buckets, codes))  # Estable: la vela guardada va antes que la nueva del mismo periodo
+    merged = _reduce(symbols, codes[order], buckets[order], _columns(combined, order))
+    return pd.concat([cached[~overlap], merged], ignore_index=True)
+
+
+class ResampleCache:
+    """
+    Velas remuestreadas en memoria para varias temporalidades, extendidas de forma
+    incremental: cada símbolo guarda la última vela base aplicada y solo se agregan las
+    posteriores, combinando el último periodo abierto con las velas nuevas.
+    """
+    def __init__(self, timeframes=RESAMPLE_TIMEFRAMES, base_timeframe=DEFAULT_TIMEFRAME):
+        self.timeframes = tuple(timeframes)
+        self.base_timeframe = base_timeframe
+        self.frames = {timeframe: pd.DataFrame(columns=RESAMPLED_COLUMNS) for timeframe in self.timeframes}
+        self.watermarks = {}  # symbol -> última vela base aplicada
+
+    def update(self, bars: pd.DataFrame):
+        """Aplica velas base nuevas; ignora las ya aplicadas. Devuelve el número de velas usadas."""
+        if bars.empty:
+            return 0
+        started = time.perf_counter()
+        times = pd.to_datetime(bars["datetime"])
+        last = pd.to_datetime(bars["symbol"].map(self.watermarks))
+        bars = bars[last.isna().to_numpy() | (times > last).to_numpy()]
+        if bars.empty:
+            return 0
+        for timeframe, resampled in resample_bars(bars, self.timeframes).items():
+            self.frames[timeframe] = merge_resampled(self.frames[timeframe], resampled)
+        latest = pd.to_datetime(bars["datetime"]).groupby(bars["symbol"]).max()
+        self.watermarks.update(latest.to_dict())
+        logging.info(f"Remuestreo incremental: {len(bars)} velas base de {len(latest)} símbolos "
+                     f"en {time.perf_counter() - started:.3f}s.")
+        return len(bars)
+
+    def get(self, timeframe, symbols=None, start=None, end=None):
+        """Velas remuestreadas de `timeframe` en [start, end), ordenadas por símbolo y fecha."""
+        frame = self.frames[timeframe]
+        keep = np.ones(len(frame), dtype=bool)
+        if symbols is not None:
+            keep &= frame["symbol"].isin(list(symbols)).to_numpy()
+        if start is not None:
+            keep &= (frame["datetime"] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            keep &= (frame["datetime"] < pd.Timestamp(end)).to_numpy()
+        return frame[keep].sort_values(["symbol", "datetime"], kind="stable", ignore_index=True)
+
+    def _since(self, symbols):
+        marks = [self.watermarks.get(symbol) for symbol in symbols]
+        return None if any(mark is None for mark in marks) or not marks else min(marks)
+
+    def update_from_db(self, session: Session, symbols, start=None):
+        """Lee de `sp500_intraday_data` las velas base posteriores a las ya aplicadas y las agrega."""
+        since = self._since(symbols) if start is None else pd.Timestamp(start)
+        bars = fetch_intraday_range(session, symbols, start=since, timeframe=self.base_timeframe)
+        return self.update(bars)
+
+    def update_from_store(self, store: BarStore, symbols=None, start=None):
+        """Igual que `update_from_db`, leyendo del almacén columnar."""
+        symbols = store.symbols() if symbols is None else list(symbols)
+        since = self._since(symbols) if start is None else pd.Timestamp(start)
+        frames = [store.read(symbol, since).to_frame().assign(symbol=symbol) for symbol in symbols]
+        frames = [frame for frame in frames if not frame.empty]
+        return self.update(pd.concat(frames, ignore_index=True)) if frames else 0
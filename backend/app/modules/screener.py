@@ -0,0 +1,339 @@
+import ast
+import logging
+import math
+import os
+import threading
+import time
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from backend.app.models import SP500IntradayData
+from backend.app.modules.intraday_storage import DEFAULT_TIMEFRAME, fetch_intraday_range
+from backend.app.modules.market_calendar import session_dates
+from backend.app.modules.streaming_indicators import IndicatorSet, StreamingSMA
+
+# Escáner de todo el universo sobre la última vela de cada símbolo.
+#   - `UniverseSnapshot` guarda en memoria una fila por símbolo (arrays numpy por columna) con
+#     la última vela, los indicadores incrementales de `streaming_indicators` y columnas
+#     derivadas. Se extiende aplicando solo las velas nuevas de la base de datos.
+#   - El volumen relativo (`relative_volume`) compara el volumen acumulado de la sesión en curso
+#     con la media del volumen total de las últimas `DAILY_VOLUME_SESSIONS` sesiones completas.
+#     `bar_relative_volume` es el equivalente vela a vela (media de las últimas velas).
+#   - Los filtros son expresiones como "RSI_14 < 30 and relative_volume > 3". Se analizan con
+#     `ast` y se evalúan sobre las columnas completas con numpy; solo se admiten columnas,
+#     números, aritmética, comparaciones, and/or/not y las funciones de `EXPRESSION_FUNCTIONS`.
+#     Nunca se usa `eval`.
+
+SCREENER_LOOKBACK = pd.Timedelta(days=int(os.getenv("SCREENER_LOOKBACK_DAYS", "10")))  # Historia inicial
+SCREENER_REFRESH_SECONDS = float(os.getenv("SCREENER_REFRESH_SECONDS", "5"))
+DAILY_VOLUME_HISTORY = pd.Timedelta(days=45)  # Historia de volumen diario leída al iniciar (más de 20 sesiones)
+REFRESH_OVERLAP = pd.Timedelta(minutes=30)  # Ventana releída en cada refresco para recoger velas tardías
+DAILY_VOLUME_SESSIONS = 20
+BAR_VOLUME_WINDOW = 20
+MAX_EXPRESSION_LENGTH = 500
+MAX_PAGE_SIZE = 500
+
+BAR_COLUMNS = ["open", "high", "low", "close", "volume", "vwap"]
+DERIVED_COLUMNS = ["change", "session_volume", f"volume_avg_{DAILY_VOLUME_SESSIONS}d", "relative_volume",
+                   f"bar_volume_sma_{BAR_VOLUME_WINDOW}", "bar_relative_volume"]
+SNAPSHOT_COLUMNS = BAR_COLUMNS + list(IndicatorSet().values()) + DERIVED_COLUMNS
+DEFAULT_RESULT_COLUMNS = ["close", "change", "session_volume", "relative_volume"]
+
+# Funciones permitidas: nombre -> (número de argumentos, función). Los envoltorios no
+# exponen el parámetro `out` de los ufuncs de numpy.
+EXPRESSION_FUNCTIONS = {
+    "abs": (1, lambda value: np.abs(value)),
+    "min": (2, lambda left, right: np.minimum(left, right)),
+    "max": (2, lambda left, right: np.maximum(left, right)),
+}
+_COMPARISONS = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+
+def _check_node(node, columns):
+    """Valida recursivamente un nodo de la expresión y acumula las columnas que usa."""
+    if isinstance(node, ast.Expression):
+        return _check_node(node.body, columns)
+    if isinstance(node, ast.BoolOp):
+        return all(_check_node(value, columns) for value in node.values)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub, ast.UAdd)):
+        return _check_node(node.operand, columns)
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+        return _check_node(node.left, columns) and _check_node(node.right, columns)
+    if isinstance(node, ast.Compare) and all(type(op) in _COMPARISONS for op in node.ops):
+        return _check_node(node.left, columns) and all(_check_node(value, columns) for value in node.comparators)
+    if isinstance(node, ast.Name):
+        if node.id not in SNAPSHOT_COLUMNS:
+            raise ValueError(f"Columna desconocida en la expresión: {node.id}")
+        columns.add(node.id)
+        return True
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return True
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in EXPRESSION_FUNCTIONS \
+            and not node.keywords:
+        arity = EXPRESSION_FUNCTIONS[node.func.id][0]
+        if len(node.args) != arity:
+            raise ValueError(f"La función {node.func.id} admite {arity} argumento(s), no {len(node.args)}")
+        return all(_check_node(arg, columns) for arg in node.args)
+    raise ValueError(f"Elemento no permitido en la expresión: {type(node).__name__}")
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression: str):
+    """
+    Analiza y valida una expresión de filtro u orden. Devuelve (árbol, columnas usadas).
+    Lanza ValueError si la expresión no es válida.
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"La expresión supera los {MAX_EXPRESSION_LENGTH} caracteres")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Expresión no válida: {e.msg}")
+    columns = set()
+    _check_node(tree, columns)
+    return tree, tuple(sorted(columns))
+
+
+def _evaluate(node, columns):
+    """Evalúa un nodo ya validado sobre las columnas (arrays de igual longitud)."""
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, columns)
+    if isinstance(node, ast.BoolOp):
+        values = [np.asarray(_evaluate(value, columns), dtype=bool) for value in node.values]
+        reduce = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return reduce.reduce(values)
+    if isinstance(node, ast.UnaryOp):
+        operand = _evaluate(node.operand, columns)
+        if isinstance(node.op, ast.Not):
+            return ~np.asarray(operand, dtype=bool)
+        return -operand if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.BinOp):
+        return _ARITHMETIC[type(node.op)](_evaluate(node.left, columns), _evaluate(node.right, columns))
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left, columns)
+        result = True
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator, columns)
+            result = result & _COMPARISONS[type(op)](left, right)
+            left = right
+        return result
+    if isinstance(node, ast.Name):
+        return columns[node.id]
+    if isinstance(node, ast.Constant):
+        return node.value
+    return EXPRESSION_FUNCTIONS[node.func.id][1](*[_evaluate(arg, columns) for arg in node.args])
+
+
+def _read_only(values):
+    view = values.view()
+    view.setflags(write=False)
+    return view
+
+
+def evaluate_expression(expression: str, columns, rows):
+    """
+    Evalúa una expresión sobre las columnas y la difunde a `rows` valores (float o bool). Las
+    columnas se pasan como vistas de solo lectura: una expresión nunca modifica la instantánea.
+    """
+    tree, _ = compile_expression(expression)
+    columns = {name: _read_only(values) for name, values in columns.items()}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.broadcast_to(_evaluate(tree, columns), (rows,))
+
+
+class SymbolState:
+    """
+    Estado incremental de un símbolo: indicadores, volumen de la sesión en curso, medias de
+    volumen diaria y por vela y cierre de la sesión anterior.
+    """
+    def __init__(self):
+        self.indicators = IndicatorSet()
+        self.daily_volume = StreamingSMA(DAILY_VOLUME_SESSIONS)  # Volumen total de las sesiones completas
+        self.bar_volume = StreamingSMA(BAR_VOLUME_WINDOW)
+        self.session = None
+        self.session_volume = 0.0
+        self.session_close = math.nan  # Último cierre de la sesión en curso
+        self.previous_close = math.nan  # Cierre de la sesión anterior
+
+    def update(self, bar_datetime, open_, high, low, close, volume, vwap, session):
+        if self.session is not None and session != self.session:
+            self.previous_close = self.session_close
+            self.daily_volume.update(self.session_volume)
+            self.session_volume = 0.0
+        self.session = session
+        self.session_close = close
+        self.session_volume += volume
+        values = self.indicators.update(bar_datetime, high, low, close, volume, session)
+        daily_average = self.daily_volume.value
+        bar_average = self.bar_volume.update(volume)
+        values.update({
+            "open": open_, "high": high, "low": low, "close": close, "volume": volume, "vwap": vwap,
+            "change": close / self.previous_close - 1 if self.previous_close > 0 else math.nan,
+            "session_volume": self.session_volume,
+            f"volume_avg_{DAILY_VOLUME_SESSIONS}d": daily_average,
+            "relative_volume": self.session_volume / daily_average if daily_average > 0 else math.nan,
+            f"bar_volume_sma_{BAR_VOLUME_WINDOW}": bar_average,
+            "bar_relative_volume": volume / bar_average if bar_average > 0 else math.nan,
+        })
+        return values
+
+
+class UniverseSnapshot:
+    """
+    Última vela e indicadores de cada símbolo del universo, en columnas numpy (una fila por
+    símbolo), actualizados de forma incremental. Seguro entre hilos: los refrescos y los
+    escaneos se serializan con un cerrojo.
+    """
+    def __init__(self, timeframe=DEFAULT_TIMEFRAME, lookback=SCREENER_LOOKBACK):
+        self.timeframe = timeframe
+        self.lookback = lookback
+        self.symbols = []
+        self.rows = {}  # symbol -> fila
+        self.states = {}  # symbol -> SymbolState
+        self.columns = {name: np.empty(0) for name in SNAPSHOT_COLUMNS}
+        self.datetimes = np.empty(0, dtype="datetime64[ns]")
+        self.watermark = None  # Última vela aplicada de todo el universo
+        self.refreshed_at = None
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _row(self, symbol):
+        if symbol not in self.rows:
+            self.rows[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.states[symbol] = SymbolState()
+            for name, values in self.columns.items():
+                self.columns[name] = np.append(values, np.nan)
+            self.datetimes = np.append(self.datetimes, np.datetime64("NaT", "ns"))
+        return self.rows[symbol]
+
+    def update(self, bars: pd.DataFrame):
+        """
+        Aplica velas (formato de `sp500_intraday_data`) de cualquier número de símbolos;
+        ignora las ya aplicadas. Devuelve el número de velas nuevas.
+        """
+        if bars.empty:
+            return 0
+        with self.lock:
+            bars = bars.sort_values(["symbol", "datetime"], kind="stable")
+            times = pd.DatetimeIndex(pd.to_datetime(bars["datetime"]))
+            sessions = session_dates(times).astype(np.int64)
+            vwap = bars["vwap"].to_numpy(float) if "vwap" in bars else np.full(len(bars), np.nan)
+            fields = zip(bars["symbol"].to_numpy(), times.to_pydatetime(), bars["open"].to_numpy(float),
+                         bars["high"].to_numpy(float), bars["low"].to_numpy(float), bars["close"].to_numpy(float),
+                         bars["volume"].to_numpy(float), vwap, sessions.tolist())
+            applied, latest = 0, {}
+            for symbol, bar_datetime, open_, high, low, close, volume, bar_vwap, session in fields:
+                self._row(symbol)
+                state = self.states[symbol]
+                last = state.indicators.last_datetime
+                if last is not None and bar_datetime <= last:
+                    continue
+                latest[symbol] = (bar_datetime, state.update(bar_datetime, open_, high, low, close, volume, bar_vwap,
+                                                             session))
+                applied += 1
+            for symbol, (bar_datetime, values) in latest.items():
+                row = self.rows[symbol]
+                self.datetimes[row] = np.datetime64(bar_datetime, "ns")
+                for name in SNAPSHOT_COLUMNS:
+                    self.columns[name][row] = values[name]
+            if latest:
+                newest = max(bar_datetime for bar_datetime, _ in latest.values())
+                self.watermark = newest if self.watermark is None else max(self.watermark, newest)
+            return applied
+
+    def seed_daily_volumes(self, bars: pd.DataFrame):
+        """
+        Inicializa la media de volumen diario con velas anteriores a las que se van a aplicar
+        (solo se usan `symbol`, `datetime` y `volume`): el volumen total de cada sesión entra
+        en la media en orden cronológico.
+        """
+        if bars.empty:
+            return
+        with self.lock:
+            days = session_dates(pd.DatetimeIndex(pd.to_datetime(bars["datetime"])))
+            totals = bars.assign(day=days).groupby(["symbol", "day"], sort=True)["volume"].sum()
+            for (symbol, _), total in totals.items():
+                self._row(symbol)
+                self.states[symbol].daily_volume.update(float(total))
+
+    def _seed_daily_volumes(self, session: Session, start, end):
+        bars = fetch_intraday_range(session, None, start=start, end=end, timeframe=self.timeframe,
+                                    columns=["symbol", "datetime", "volume"])
+        self.seed_daily_volumes(bars)
+
+    def refresh_from_db(self, session: Session, max_age=0.0):
+        """
+        Aplica las velas nuevas de `sp500_intraday_data`. La primera vez lee los últimos
+        `lookback` de todo el universo; después, solo desde la última vela aplicada (menos un
+        margen). No hace nada si el último refresco tiene menos de `max_age` segundos.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.refreshed_at is not None and now - self.refreshed_at < max_age:
+                return 0
+            started = time.perf_counter()
+            if self.watermark is None:
+                last = session.query(func.max(SP500IntradayData.datetime)).filter(
+                    SP500IntradayData.timeframe == self.timeframe).scalar()
+                # Se empieza a medianoche UTC (antes de la apertura) para reproducir sesiones completas
+                start = None if last is None else (pd.Timestamp(last) - self.lookback).normalize()
+                if start is not None:
+                    self._seed_daily_volumes(session, start - DAILY_VOLUME_HISTORY, start)
+            else:
+                start = pd.Timestamp(self.watermark) - REFRESH_OVERLAP
+            bars = fetch_intraday_range(session, None, start=start, timeframe=self.timeframe)
+            applied = self.update(bars)
+            self.refreshed_at = now
+            if applied:
+                logging.info(f"Escáner: {applied} velas nuevas aplicadas en {time.perf_counter() - started:.3f}s.")
+            return applied
+
+    def screen(self, expression=None, sort=None, descending=True, offset=0, limit=50, columns=None):
+        """
+        Evalúa el filtro `expression` sobre todo el universo, ordena por la expresión `sort`
+        (los valores NaN al final) y devuelve la página [offset, offset + limit). Cada
+        resultado incluye el símbolo, la fecha de la vela, `rank`, las columnas pedidas (por
+        defecto `DEFAULT_RESULT_COLUMNS`) y las usadas por el filtro y el orden.
+        """
+        if not 1 <= limit <= MAX_PAGE_SIZE or offset < 0:
+            raise ValueError(f"Paginación no válida: offset >= 0 y 1 <= limit <= {MAX_PAGE_SIZE}")
+        output = list(DEFAULT_RESULT_COLUMNS if columns is None else columns)
+        unknown = [name for name in output if name not in SNAPSHOT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Columnas desconocidas: {', '.join(unknown)}")
+        for text in (expression, sort):
+            if text:
+                output.extend(name for name in compile_expression(text)[1] if name not in output)
+
+        with self.lock:
+            rows = len(self.symbols)
+            selected = ~np.isnat(self.datetimes)
+            if expression:
+                selected &= evaluate_expression(expression, self.columns, rows).astype(bool)
+            candidates = np.flatnonzero(selected)
+            if sort:
+                keys = evaluate_expression(sort, self.columns, rows).astype(np.float64)[candidates]
+                keys = np.where(np.isnan(keys), -np.inf if descending else np.inf, keys)
+                order = np.argsort(-keys if descending else keys, kind="stable")
+                candidates = candidates[order]
+            page = candidates[offset:offset + limit]
+            results = []
+            for rank, row in enumerate(page, start=offset + 1):
+                result = {"rank": rank, "symbol": self.symbols[row],
+                          "datetime": pd.Timestamp(self.datetimes[row]).isoformat()}
+                for name in output:
+                    value = float(self.columns[name][row])
+                    result[name] = None if math.isnan(value) or math.isinf(value) else value
+                results.append(result)
+            as_of = None if self.watermark is None else pd.Timestamp(self.watermark).isoformat()
+        return {"total": int(len(candidates)), "universe": rows, "offset": offset, "limit": limit, "as_of": as_of,
+                "results": results}
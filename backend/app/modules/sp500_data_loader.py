@@ -4,6 +4,9 @@ from alpaca_trade_api.rest import REST
 from sqlalchemy.orm import Session
 from backend.app.db import SessionLocal
 from backend.app.models import SP500Data
+from backend.app.modules.bulk_upsert import upsert_rows, DEFAULT_BATCH_SIZE
+from backend.app.modules.concurrent_ingestion import TokenBucket, rate_limited_client, run_concurrent_ingestion
+from backend.app.modules.market_regimes import update_regimes
 from dotenv import load_dotenv
 import logging
 import time
@@ -25,8 +28,13 @@ ALPACA_SECRET_KEY = os.getenv("ALPACA_SECRET_KEY")
 if not ALPACA_API_KEY or not ALPACA_SECRET_KEY:
     raise ValueError("Las claves API de Alpaca no están configuradas en el archivo .env")
 
-# Configuración de Alpaca
-alpaca_api = REST(ALPACA_API_KEY, ALPACA_SECRET_KEY, base_url="https://paper-api.alpaca.markets")
+# Configuración de la ingesta concurrente (cuota de peticiones del plan de Alpaca)
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "8"))
+ALPACA_REQUESTS_PER_MINUTE = float(os.getenv("ALPACA_REQUESTS_PER_MINUTE", "200"))
+
+# Configuración de Alpaca: cada petición HTTP (páginas y reintentos incluidos) consume cuota
+alpaca_api = rate_limited_client(REST(ALPACA_API_KEY, ALPACA_SECRET_KEY, base_url="https://paper-api.alpaca.markets"),
+                                 TokenBucket.per_minute(ALPACA_REQUESTS_PER_MINUTE))
 
 # Ruta de la carpeta de datos
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -48,8 +56,11 @@ def fetch_sp500_companies():
         logging.error(f"Error al obtener las empresas del S&P 500: {e}")
         return pd.DataFrame(columns=["Symbol", "Security"])
 
-def download_stock_data(symbol, start_date="2000-01-01", retries=3):
-    """Descarga los datos históricos de una acción desde Alpaca con manejo de errores y paginación."""
+def download_stock_data(symbol, start_date="2000-01-01", retries=3, raise_errors=False):
+    """
+    Descarga los datos históricos de una acción desde Alpaca con manejo de errores y paginación.
+    Si fallan todos los intentos devuelve un DataFrame vacío o, con `raise_errors`, relanza el último error.
+    """
     for attempt in range(retries):
         try:
             # Obtener datos históricos diarios
@@ -81,6 +92,8 @@ def download_stock_data(symbol, start_date="2000-01-01", retries=3):
                 time.sleep(2 ** attempt)  # Retraso exponencial antes de reintentar
             else:
                 logging.error(f"Falló la descarga para {symbol} después de {retries} intentos.")
+                if raise_errors:
+                    raise
     return pd.DataFrame()
 
 def clean_data(data: pd.DataFrame):
@@ -107,44 +120,128 @@ def clean_data(data: pd.DataFrame):
         logging.error(f"Error al limpiar los datos: {e}")
         return pd.DataFrame()
 
-def save_or_update_data_to_db(session: Session, symbol: str, company_name: str, data: pd.DataFrame):
-    """Guarda o actualiza los datos en la base de datos."""
-    for _, row in data.iterrows():
-        try:
-            existing_record = session.query(SP500Data).filter(
-                SP500Data.symbol == symbol, SP500Data.date == row["Date"]
-            ).first()
-            if existing_record:
-                existing_record.open, existing_record.high = row["Open"], row["High"]
-                existing_record.low, existing_record.close = row["Low"], row["Close"]
-                existing_record.adj_close, existing_record.volume = row["Adj Close"], row["Volume"]
-            else:
-                session.add(SP500Data(
-                    symbol=symbol,
-                    name=company_name,
-                    date=row["Date"],
-                    open=row["Open"],
-                    high=row["High"],
-                    low=row["Low"],
-                    close=row["Close"],
-                    adj_close=row["Adj Close"],
-                    volume=row["Volume"],
-                ))
-        except Exception as e:
-            logging.error(f"Error al guardar/actualizar el registro para {symbol}: {e}")
+def save_or_update_data_to_db(session: Session, symbol: str, company_name: str, data: pd.DataFrame,
+                              batch_size=DEFAULT_BATCH_SIZE, commit=True):
+    """
+    Guarda o actualiza en bloque los datos diarios de un símbolo.
+
+    Usa `INSERT ... ON CONFLICT (symbol, date) DO UPDATE` en lotes en lugar de una
+    consulta por fila. Devuelve una tupla (filas_insertadas, filas_actualizadas).
+    Con `commit=False` no confirma la transacción y propaga los errores a quien llama.
+    """
+    if data.empty:
+        return 0, 0
+
     try:
-        session.commit()
-        logging.info(f"Datos para {symbol} guardados/actualizados en la base de datos.")
+        frame = data.drop_duplicates(subset="Date", keep="last")
+        dates = pd.to_datetime(frame["Date"]).dt.date.tolist()
+        rows = [
+            {
+                "symbol": symbol,
+                "name": company_name,
+                "date": date,
+                "open": open_,
+                "high": high,
+                "low": low,
+                "close": close,
+                "adj_close": adj_close,
+                "volume": volume,
+            }
+            for date, open_, high, low, close, adj_close, volume in zip(
+                dates,
+                frame["Open"].tolist(),
+                frame["High"].tolist(),
+                frame["Low"].tolist(),
+                frame["Close"].tolist(),
+                frame["Adj Close"].tolist(),
+                frame["Volume"].astype(int).tolist(),
+            )
+        ]
+
+        # Una sola consulta para saber qué fechas ya existen y poder reportar inserciones/actualizaciones
+        existing = {
+            row[0] for row in session.query(SP500Data.date).filter(
+                SP500Data.symbol == symbol,
+                SP500Data.date >= min(dates),
+                SP500Data.date <= max(dates),
+            )
+        }
+        updated = sum(1 for date in dates if date in existing)
+        inserted = len(rows) - updated
+
+        upsert_rows(
+            session,
+            SP500Data.__table__,
+            rows,
+            conflict_columns=["symbol", "date"],
+            update_columns=["name", "open", "high", "low", "close", "adj_close", "volume"],
+            batch_size=batch_size,
+        )
+        if commit:
+            session.commit()
+        logging.info(f"Datos para {symbol} guardados: {inserted} insertadas, {updated} actualizadas.")
+        return inserted, updated
     except Exception as e:
         session.rollback()
-        logging.error(f"Error al guardar datos en la base de datos: {e}")
+        logging.error(f"Error al guardar datos en la base de datos para {symbol}: {e}")
+        if not commit:
+            raise
+        return 0, 0
 
-def download_sp500_data():
-    """Descarga datos históricos de empresas del S&P 500 y los guarda en la base de datos."""
+def download_sp500_data_concurrent(sp500_companies: pd.DataFrame, workers=INGESTION_WORKERS):
+    """
+    Descarga datos diarios del S&P 500 con descargas concurrentes limitadas por cuota
+    y un único escritor que guarda los resultados en lotes. Devuelve el reporte por símbolo.
+    """
+    company_names = dict(zip(sp500_companies["Symbol"], sp500_companies["Security"]))
+
+    def fetch(symbol):
+        stock_data = download_stock_data(symbol, raise_errors=True)
+        if stock_data.empty:
+            return stock_data
+        return clean_data(stock_data)
+
+    def write_batch(session, batch):
+        written = {}
+        for symbol, data in batch:
+            inserted, updated = save_or_update_data_to_db(
+                session, symbol, company_names[symbol], data, commit=False
+            )
+            written[symbol] = inserted + updated
+        session.commit()
+        return written
+
+    return run_concurrent_ingestion(
+        company_names.keys(), fetch, write_batch, SessionLocal, workers=workers,
+    )
+
+def refresh_market_regimes():
+    """Etiqueta los regímenes de mercado de los días recién cargados; un fallo no invalida la carga."""
+    db_session = SessionLocal()
+    try:
+        update_regimes(db_session)
+        db_session.commit()
+    except Exception as e:
+        db_session.rollback()
+        logging.error(f"Error al actualizar los regímenes de mercado: {e}")
+    finally:
+        db_session.close()
+
+def download_sp500_data(concurrent=False, workers=INGESTION_WORKERS):
+    """
+    Descarga datos históricos de empresas del S&P 500, los guarda en la base de datos y
+    actualiza los regímenes de mercado con los días nuevos.
+    """
     sp500_companies = fetch_sp500_companies()
 
+    if concurrent and not sp500_companies.empty:
+        report = download_sp500_data_concurrent(sp500_companies, workers=workers)
+        refresh_market_regimes()
+        return report
+
     if not sp500_companies.empty:
         db_session = SessionLocal()
+        total_inserted, total_updated = 0, 0
         try:
             for _, row in sp500_companies.iterrows():
                 symbol, company_name = row["Symbol"], row["Security"]
@@ -154,7 +251,9 @@ def download_sp500_data():
                 if not stock_data.empty:
                     clean_stock_data = clean_data(stock_data)
                     if not clean_stock_data.empty:
-                        save_or_update_data_to_db(db_session, symbol, company_name, clean_stock_data)
+                        inserted, updated = save_or_update_data_to_db(db_session, symbol, company_name, clean_stock_data)
+                        total_inserted += inserted
+                        total_updated += updated
 
                         file_path = os.path.join(DATA_DIR, f"{symbol}.csv")
                         clean_stock_data.to_csv(file_path, index=False)
@@ -170,7 +269,9 @@ def download_sp500_data():
                     logging.warning(f"No se encontraron datos para {symbol}.")
         finally:
             db_session.close()
+            logging.info(f"Carga finalizada: {total_inserted} filas insertadas, {total_updated} actualizadas.")
             logging.info("Conexión a la base de datos cerrada.")
+        refresh_market_regimes()
 
 if __name__ == "__main__":
-    download_sp500_data()
+    download_sp500_data(concurrent=os.getenv("INGESTION_CONCURRENT", "0") == "1")
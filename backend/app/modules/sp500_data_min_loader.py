@@ -4,11 +4,15 @@ from alpaca_trade_api.rest import REST
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import text
 from backend.app.db import SessionLocal
-from backend.app.models import SP500IntradayData
+from backend.app.modules.concurrent_ingestion import TokenBucket, rate_limited_client, run_concurrent_ingestion
+from backend.app.modules.market_calendar import session_mask
+from backend.app.modules.intraday_storage import DEFAULT_TIMEFRAME, DEFAULT_WRITE_BATCH_SIZE, INTRADAY_TIMEFRAMES
+from backend.app.modules.intraday_sync import (
+    SYNC_OVERLAP, SYNC_START_DATE, sync_intraday_bars, upsert_intraday_data,
+)
 from dotenv import load_dotenv
 import logging
 import time
-from pytz import timezone
 
 # Configuración de logging
 logging.basicConfig(
@@ -20,11 +24,6 @@ logging.basicConfig(
     ]
 )
 
-# Configuración del horario de la Bolsa de Nueva York (NYSE)
-NYSE_TZ = timezone("America/New_York")
-MARKET_OPEN = "09:30:00"
-MARKET_CLOSE = "16:00:00"
-
 # Cargar variables de entorno del archivo .env
 load_dotenv()
 ALPACA_API_KEY = os.getenv("ALPACA_LIVE_API_KEY")
@@ -33,8 +32,13 @@ ALPACA_SECRET_KEY = os.getenv("ALPACA_LIVE_SECRET_KEY")
 if not ALPACA_API_KEY or not ALPACA_SECRET_KEY:
     raise ValueError("Las claves API Live de Alpaca no están configuradas en el archivo .env")
 
-# Configuración de Alpaca Live
-alpaca_api = REST(ALPACA_API_KEY, ALPACA_SECRET_KEY, base_url="https://api.alpaca.markets")
+# Configuración de la ingesta concurrente (cuota de peticiones del plan de Alpaca)
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "8"))
+ALPACA_REQUESTS_PER_MINUTE = float(os.getenv("ALPACA_REQUESTS_PER_MINUTE", "200"))
+
+# Configuración de Alpaca Live: cada petición HTTP (páginas y reintentos incluidos) consume cuota
+alpaca_api = rate_limited_client(REST(ALPACA_API_KEY, ALPACA_SECRET_KEY, base_url="https://api.alpaca.markets"),
+                                 TokenBucket.per_minute(ALPACA_REQUESTS_PER_MINUTE))
 
 # Ruta de la carpeta de datos
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -53,22 +57,13 @@ def clear_intraday_table(session: Session):
         logging.error(f"Error al limpiar la tabla sp500_intraday_data: {e}")
 
 def filter_market_hours(data: pd.DataFrame):
-    """Filtra los datos para incluir solo las horas normales del mercado."""
+    """
+    Filtra los datos para incluir solo las velas de sesión regular del calendario NYSE
+    (festivos y cierres anticipados incluidos). `Datetime` se deja en UTC.
+    """
     try:
-        # Convertir Datetime a un objeto datetime y gestionar la zona horaria
-        data["Datetime"] = pd.to_datetime(data["Datetime"], errors="coerce")
-
-        if data["Datetime"].dt.tz is None:  # Si no tiene timezone
-            data["Datetime"] = data["Datetime"].dt.tz_localize("UTC")
-        else:  # Si ya tiene timezone, convertir a NYSE
-            data["Datetime"] = data["Datetime"].dt.tz_convert(NYSE_TZ)
-
-        # Filtrar solo las filas dentro del horario normal del mercado
-        data["time"] = data["Datetime"].dt.strftime("%H:%M:%S")
-        data = data[(data["time"] >= MARKET_OPEN) & (data["time"] <= MARKET_CLOSE)]
-
-        # Crear una nueva copia eliminando la columna auxiliar 'time'
-        data = data.drop(columns=["time"])
+        data["Datetime"] = pd.to_datetime(data["Datetime"], errors="coerce", utc=True)
+        data = data[session_mask(data["Datetime"])]
 
         logging.info(f"Datos filtrados al horario del mercado (NYSE). Filas restantes: {len(data)}.")
         return data
@@ -77,14 +72,20 @@ def filter_market_hours(data: pd.DataFrame):
         return pd.DataFrame()
 
 
+def download_intraday_data(symbol, timeframe=DEFAULT_TIMEFRAME, start_date="2000-01-01", retries=3,
+                           raise_errors=False):
+    """
+    Descarga datos históricos intradía (1Min, 3Min, 5Min) para una acción desde Alpaca Live.
+    Si fallan todos los intentos devuelve un DataFrame vacío o, con `raise_errors`, relanza
+    el último error (la ingesta concurrente lo registra como `fetch_error`).
+    """
+    if timeframe not in INTRADAY_TIMEFRAMES:
+        raise ValueError(f"Temporalidad no soportada: {timeframe}")
 
-
-def download_5min_data(symbol, start_date="2000-01-01", retries=3):
-    """Descarga datos históricos de 5 minutos para una acción desde Alpaca Live."""
     for attempt in range(retries):
         try:
             bars = alpaca_api.get_bars(
-                symbol, timeframe="5Min", start=start_date, adjustment="all"
+                symbol, timeframe=timeframe, start=start_date, adjustment="all"
             ).df
 
             if bars.empty:
@@ -114,49 +115,73 @@ def download_5min_data(symbol, start_date="2000-01-01", retries=3):
                 time.sleep(2 ** attempt)
             else:
                 logging.error(f"Falló la descarga para {symbol} después de {retries} intentos.")
+                if raise_errors:
+                    raise
     return pd.DataFrame()
 
-def save_to_db(session: Session, symbol: str, data: pd.DataFrame):
-    """Guarda datos de 5 minutos en la base de datos."""
+def download_5min_data(symbol, start_date="2000-01-01", retries=3, raise_errors=False):
+    """Descarga datos históricos de 5 minutos para una acción desde Alpaca Live."""
+    return download_intraday_data(symbol, "5Min", start_date=start_date, retries=retries, raise_errors=raise_errors)
+
+def save_to_db(session: Session, symbol: str, data: pd.DataFrame, commit=True,
+               batch_size=DEFAULT_WRITE_BATCH_SIZE):
+    """
+    Guarda datos de 5 minutos en la base de datos y devuelve el número de filas guardadas.
+    Con `commit=False` no confirma la transacción y propaga los errores a quien llama.
+    """
     logging.info(f"Comenzando el guardado de datos para {symbol}. Total de filas: {len(data)}")
-
-    records = []
-    for _, row in data.iterrows():
-        try:
-            record = SP500IntradayData(
-                symbol=symbol,
-                datetime=row["Datetime"],
-                open=row["Open"],
-                high=row["High"],
-                low=row["Low"],
-                close=row["Close"],
-                volume=row["Volume"],
-                trade_count=row["TradeCount"],
-                vwap=row["VWAP"]
-            )
-            records.append(record)
-        except Exception as e:
-            logging.error(f"Error al procesar fila para {symbol}: {e}")
-            continue
-
-    try:
-        session.bulk_save_objects(records)
-        session.commit()
-        logging.info(f"Datos guardados exitosamente para {symbol}.")
-    except Exception as e:
-        session.rollback()
-        logging.error(f"Error al guardar datos en la base de datos para {symbol}: {e}")
-
-def download_live_data():
-    """Descarga datos de 5 minutos para empresas del S&P 500 desde la cuenta Alpaca Live."""
+    return upsert_intraday_data(session, symbol, data, commit=commit, timeframe="5Min", batch_size=batch_size)
+
+def sync_intraday_data(symbols, concurrent=False, overlap=SYNC_OVERLAP, default_start=SYNC_START_DATE,
+                       workers=INGESTION_WORKERS, timeframe=DEFAULT_TIMEFRAME, update_indicators=True):
+    """
+    Sincroniza incrementalmente desde Alpaca Live las velas intradía (5 minutos por defecto)
+    de los símbolos dados (ver `intraday_sync.sync_intraday_bars`).
+    """
+    return sync_intraday_bars(
+        symbols,
+        lambda symbol, frame, start_date: download_intraday_data(symbol, frame, start_date=start_date,
+                                                                 raise_errors=True),
+        SessionLocal, concurrent=concurrent, overlap=overlap, default_start=default_start, workers=workers,
+        timeframe=timeframe, update_indicators=update_indicators,
+    )
+
+def write_intraday_batch(session: Session, batch):
+    """Escribe un lote de (symbol, data) en una sola transacción. Devuelve filas por símbolo."""
+    written = {}
+    for symbol, data in batch:
+        written[symbol] = save_to_db(session, symbol, data, commit=False)
+    session.commit()
+    return written
+
+def download_live_data(concurrent=False, workers=INGESTION_WORKERS, incremental=True, timeframe=DEFAULT_TIMEFRAME):
+    """
+    Descarga datos de 5 minutos para empresas del S&P 500 desde la cuenta Alpaca Live.
+    Por defecto sincroniza de forma incremental (en la temporalidad `timeframe`); con
+    `incremental=False` vacía la tabla y recarga todo el histórico de 5 minutos.
+    """
     sp500_companies = pd.read_html("https://en.wikipedia.org/wiki/List_of_S%26P_500_companies")[0]
 
+    if incremental and not sp500_companies.empty:
+        return sync_intraday_data(sp500_companies["Symbol"], concurrent=concurrent, workers=workers,
+                                  timeframe=timeframe)
+
     if not sp500_companies.empty:
         db_session = SessionLocal()
 
         # Limpiar la tabla antes de la descarga
         clear_intraday_table(db_session)
 
+        if concurrent:
+            db_session.close()
+            return run_concurrent_ingestion(
+                sp500_companies["Symbol"],
+                lambda symbol: download_5min_data(symbol, start_date="2022-12-19", raise_errors=True),
+                write_intraday_batch,
+                SessionLocal,
+                workers=workers,
+            )
+
         try:
             for _, row in sp500_companies.iterrows():
                 symbol = row["Symbol"]
@@ -175,6 +200,9 @@ def download_live_data():
 
 if __name__ == "__main__":
     logging.info("Iniciando el proceso de descarga de datos de 5 minutos con Alpaca Live...")
-    download_live_data()
-z
+    download_live_data(
+        concurrent=os.getenv("INGESTION_CONCURRENT", "0") == "1",
+        incremental=os.getenv("INTRADAY_FULL_RELOAD", "0") != "1",
+        timeframe=os.getenv("INTRADAY_TIMEFRAME", DEFAULT_TIMEFRAME),
+    )
 
@@ -0,0 +1,395 @@
+import datetime
+import json
+import logging
+import math
+from collections import deque
+import pandas as pd
+from sqlalchemy.orm import Session
+from backend.app.models import IndicatorState
+from backend.app.modules.bulk_upsert import upsert_rows
+from backend.app.modules.intraday_storage import DEFAULT_TIMEFRAME, fetch_intraday_range
+from backend.app.modules.market_calendar import session_dates
+
+# Indicadores incrementales: cada `update` cuesta O(1) y el estado completo cabe en unos
+# pocos números, de modo que se puede guardar en `indicator_state` y reanudar más tarde.
+# Con la misma historia producen los mismos valores que `indicators.py`.
+
+REPLAY_LOOKBACK = pd.Timedelta(days=30)  # Historia usada para inicializar símbolos sin estado
+NAN = float("nan")
+
+
+def _number(value):
+    """Convierte NaN en None (para guardarlo en JSON) y None en NaN (al restaurarlo)."""
+    if value is None:
+        return NAN
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+class StreamingSMA:
+    """Media móvil simple con suma acumulada; la suma se recalcula cada `window` velas para no derivar."""
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.updates = 0
+        self.value = NAN
+
+    def update(self, x):
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(x)
+        self.total += x
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self.total = math.fsum(self.values)
+        self.value = self.total / self.window if len(self.values) == self.window else NAN
+        return self.value
+
+    def to_state(self):
+        return {"window": self.window, "values": list(self.values), "updates": self.updates}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state["window"])
+        for x in state["values"]:
+            indicator.update(x)
+        indicator.updates = state["updates"]
+        return indicator
+
+
+class StreamingEMA:
+    """Media exponencial sembrada con el primer valor; NaN durante las primeras `span - 1` velas."""
+    def __init__(self, span=None, alpha=None):
+        if alpha is None:
+            alpha = 2.0 / (span + 1.0)
+        self.span = span
+        self.alpha = alpha
+        self.warmup = span if span is not None else int(round(1.0 / alpha))
+        self.average = NAN
+        self.count = 0
+
+    @property
+    def value(self):
+        return self.average if self.count >= self.warmup else NAN
+
+    def update(self, x):
+        self.average = x if self.count == 0 else self.alpha * x + (1.0 - self.alpha) * self.average
+        self.count += 1
+        return self.value
+
+    def to_state(self):
+        return {"span": self.span, "alpha": self.alpha, "average": _number(self.average), "count": self.count}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(span=state["span"], alpha=state["alpha"])
+        indicator.average = _number(state["average"])
+        indicator.count = state["count"]
+        return indicator
+
+
+class StreamingRSI:
+    """RSI de Wilder; NaN en las primeras `period` velas."""
+    def __init__(self, period=14):
+        self.period = period
+        self.previous = NAN
+        self.gains = StreamingEMA(alpha=1.0 / period)
+        self.losses = StreamingEMA(alpha=1.0 / period)
+        self.value = NAN
+
+    def update(self, close):
+        if not math.isnan(self.previous):
+            delta = close - self.previous
+            self.gains.update(max(delta, 0.0))
+            self.losses.update(max(-delta, 0.0))
+            if self.gains.count >= self.period:
+                losses = self.losses.average
+                self.value = 100.0 if losses == 0 else 100.0 - 100.0 / (1.0 + self.gains.average / losses)
+        self.previous = close
+        return self.value
+
+    def to_state(self):
+        return {"period": self.period, "previous": _number(self.previous), "gains": self.gains.to_state(),
+                "losses": self.losses.to_state(), "value": _number(self.value)}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state["period"])
+        indicator.previous = _number(state["previous"])
+        indicator.gains = StreamingEMA.from_state(state["gains"])
+        indicator.losses = StreamingEMA.from_state(state["losses"])
+        indicator.value = _number(state["value"])
+        return indicator
+
+
+class StreamingMACD:
+    """MACD incremental; `value` es la tupla (línea, señal, histograma)."""
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(span=fast)
+        self.slow = StreamingEMA(span=slow)
+        self.signal = StreamingEMA(span=signal)
+        self.value = (NAN, NAN, NAN)
+
+    def update(self, close):
+        line = self.fast.update(close) - self.slow.update(close)
+        signal = self.signal.update(line) if not math.isnan(line) else NAN
+        self.value = (line, signal, line - signal)
+        return self.value
+
+    def to_state(self):
+        return {"fast": self.fast.to_state(), "slow": self.slow.to_state(), "signal": self.signal.to_state()}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls()
+        indicator.fast = StreamingEMA.from_state(state["fast"])
+        indicator.slow = StreamingEMA.from_state(state["slow"])
+        indicator.signal = StreamingEMA.from_state(state["signal"])
+        line = indicator.fast.value - indicator.slow.value
+        signal = indicator.signal.value
+        indicator.value = (line, signal, line - signal)
+        return indicator
+
+
+class StreamingATR:
+    """Average True Range de Wilder; NaN en las primeras `period - 1` velas."""
+    def __init__(self, period=14):
+        self.period = period
+        self.previous_close = NAN
+        self.average = StreamingEMA(alpha=1.0 / period)
+        self.average.warmup = period
+
+    @property
+    def value(self):
+        return self.average.value
+
+    def update(self, high, low, close):
+        true_range = high - low
+        if not math.isnan(self.previous_close):
+            true_range = max(true_range, abs(high - self.previous_close), abs(low - self.previous_close))
+        self.previous_close = close
+        return self.average.update(true_range)
+
+    def to_state(self):
+        return {"period": self.period, "previous_close": _number(self.previous_close),
+                "average": self.average.to_state()}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state["period"])
+        indicator.previous_close = _number(state["previous_close"])
+        indicator.average = StreamingEMA.from_state(state["average"])
+        indicator.average.warmup = indicator.period
+        return indicator
+
+
+class StreamingVWAP:
+    """VWAP con precio típico que se reinicia al cambiar de sesión."""
+    def __init__(self):
+        self.session = None
+        self.price_volume = 0.0
+        self.volume = 0.0
+        self.value = NAN
+
+    def update(self, high, low, close, volume, session=None):
+        if session != self.session:
+            self.session, self.price_volume, self.volume = session, 0.0, 0.0
+        self.price_volume += (high + low + close) / 3.0 * volume
+        self.volume += volume
+        self.value = self.price_volume / self.volume if self.volume > 0 else NAN
+        return self.value
+
+    def to_state(self):
+        return {"session": self.session, "price_volume": self.price_volume, "volume": self.volume}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls()
+        indicator.session = state["session"]
+        indicator.price_volume = state["price_volume"]
+        indicator.volume = state["volume"]
+        indicator.value = indicator.price_volume / indicator.volume if indicator.volume > 0 else NAN
+        return indicator
+
+
+class StreamingPSAR:
+    """SAR parabólico de Wilder; empieza en largo y la primera vela queda como NaN."""
+    def __init__(self, step=0.02, max_step=0.2):
+        self.step = step
+        self.max_step = max_step
+        self.started = False
+        self.long = True
+        self.sar = NAN
+        self.extreme = NAN
+        self.factor = step
+        self.lows = []  # Mínimos de las dos últimas velas (más reciente al final)
+        self.highs = []
+        self.value = NAN
+
+    def update(self, high, low):
+        if not self.started:
+            self.started, self.long, self.sar, self.extreme, self.factor = True, True, low, high, self.step
+        else:
+            candidate = self.sar + self.factor * (self.extreme - self.sar)
+            if self.long:
+                candidate = min([candidate] + self.lows)
+                if low < candidate:
+                    self.long, candidate, self.extreme, self.factor = False, self.extreme, low, self.step
+                elif high > self.extreme:
+                    self.extreme, self.factor = high, min(self.factor + self.step, self.max_step)
+            else:
+                candidate = max([candidate] + self.highs)
+                if high > candidate:
+                    self.long, candidate, self.extreme, self.factor = True, self.extreme, high, self.step
+                elif low < self.extreme:
+                    self.extreme, self.factor = low, min(self.factor + self.step, self.max_step)
+            self.sar = candidate
+            self.value = candidate
+        self.lows = (self.lows + [low])[-2:]
+        self.highs = (self.highs + [high])[-2:]
+        return self.value
+
+    def to_state(self):
+        return {"step": self.step, "max_step": self.max_step, "started": self.started, "long": self.long,
+                "sar": _number(self.sar), "extreme": _number(self.extreme), "factor": self.factor,
+                "lows": self.lows, "highs": self.highs, "value": _number(self.value)}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state["step"], state["max_step"])
+        for name in ("started", "long", "factor", "lows", "highs"):
+            setattr(indicator, name, state[name])
+        for name in ("sar", "extreme", "value"):
+            setattr(indicator, name, _number(state[name]))
+        return indicator
+
+
+INDICATOR_CLASSES = {
+    "SMA": StreamingSMA, "EMA": StreamingEMA, "RSI": StreamingRSI, "MACD": StreamingMACD,
+    "ATR": StreamingATR, "VWAP": StreamingVWAP, "PSAR": StreamingPSAR,
+}
+
+
+class IndicatorSet:
+    """
+    Conjunto de indicadores incrementales de un símbolo. `update` aplica una vela y devuelve
+    los valores actuales con los mismos nombres que `indicators.indicator_panel`. Las velas
+    con fecha anterior o igual a `last_datetime` se ignoran (la sincronización vuelve a
+    descargar una ventana de solapamiento).
+    """
+    def __init__(self, sma_windows=(50, 200), ema_spans=(20,), rsi_period=14, macd_params=(12, 26, 9),
+                 atr_period=14, sar_params=(0.02, 0.2)):
+        self.indicators = {}
+        for window in sma_windows:
+            self.indicators[f"SMA_{window}"] = StreamingSMA(window)
+        for span in ema_spans:
+            self.indicators[f"EMA_{span}"] = StreamingEMA(span=span)
+        self.indicators[f"RSI_{rsi_period}"] = StreamingRSI(rsi_period)
+        self.indicators["MACD"] = StreamingMACD(*macd_params)
+        self.indicators[f"ATR_{atr_period}"] = StreamingATR(atr_period)
+        self.indicators["VWAP"] = StreamingVWAP()
+        self.indicators["PSAR"] = StreamingPSAR(*sar_params)
+        self.last_datetime = None
+
+    def update(self, bar_datetime, high, low, close, volume, session=None):
+        if self.last_datetime is not None and bar_datetime <= self.last_datetime:
+            return self.values()
+        for indicator in self.indicators.values():
+            if isinstance(indicator, (StreamingSMA, StreamingEMA, StreamingRSI, StreamingMACD)):
+                indicator.update(close)
+            elif isinstance(indicator, StreamingATR):
+                indicator.update(high, low, close)
+            elif isinstance(indicator, StreamingVWAP):
+                indicator.update(high, low, close, volume, session)
+            else:
+                indicator.update(high, low)
+        self.last_datetime = bar_datetime
+        return self.values()
+
+    def values(self):
+        result = {}
+        for name, indicator in self.indicators.items():
+            if isinstance(indicator, StreamingMACD):
+                result["MACD"], result["MACD_signal"], result["MACD_hist"] = indicator.value
+            else:
+                result[name] = indicator.value
+        return result
+
+    def to_state(self):
+        return {name: {"type": type(indicator).__name__.replace("Streaming", ""), "state": indicator.to_state()}
+                for name, indicator in self.indicators.items()}
+
+    @classmethod
+    def from_state(cls, state, last_datetime=None):
+        indicator_set = cls.__new__(cls)
+        indicator_set.indicators = {
+            name: INDICATOR_CLASSES[entry["type"]].from_state(entry["state"]) for name, entry in state.items()
+        }
+        indicator_set.last_datetime = last_datetime
+        return indicator_set
+
+
+def apply_bars(indicator_set: IndicatorSet, bars: pd.DataFrame):
+    """Aplica velas (columnas de `sp500_intraday_data`, ordenadas por fecha) a un conjunto de indicadores."""
+    if bars.empty:
+        return indicator_set.values()
+    times = pd.to_datetime(bars["datetime"])
+    sessions = session_dates(times).astype("int64")
+    values = indicator_set.values()
+    for bar_datetime, high, low, close, volume, session in zip(
+        pd.DatetimeIndex(times).to_pydatetime(), bars["high"].to_numpy(float), bars["low"].to_numpy(float),
+        bars["close"].to_numpy(float), bars["volume"].to_numpy(float), sessions,
+    ):
+        values = indicator_set.update(bar_datetime, high, low, close, volume, int(session))
+    return values
+
+
+def load_indicator_sets(session: Session, symbols, timeframe=DEFAULT_TIMEFRAME):
+    """Restaura desde `indicator_state` los conjuntos de indicadores guardados de los símbolos dados."""
+    rows = session.query(IndicatorState).filter(
+        IndicatorState.timeframe == timeframe, IndicatorState.symbol.in_(list(symbols))
+    ).all()
+    return {row.symbol: IndicatorSet.from_state(json.loads(row.state), row.last_datetime) for row in rows}
+
+
+def save_indicator_sets(session: Session, indicator_sets, timeframe=DEFAULT_TIMEFRAME):
+    """Guarda (upsert) el estado de los conjuntos de indicadores. No hace commit."""
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    rows = [
+        {"symbol": symbol, "timeframe": timeframe, "last_datetime": indicator_set.last_datetime,
+         "state": json.dumps(indicator_set.to_state()), "updated_at": now}
+        for symbol, indicator_set in indicator_sets.items() if indicator_set.last_datetime is not None
+    ]
+    return upsert_rows(session, IndicatorState.__table__, rows, ["symbol", "timeframe"],
+                       ["last_datetime", "state", "updated_at"])
+
+
+def update_indicator_states(session: Session, bars: pd.DataFrame, timeframe=DEFAULT_TIMEFRAME,
+                            replay_lookback=REPLAY_LOOKBACK):
+    """
+    Aplica velas nuevas (formato de `sp500_intraday_data`) a los indicadores incrementales
+    de cada símbolo y guarda el estado. Los símbolos sin estado se inicializan reproduciendo
+    las velas guardadas de los últimos `replay_lookback`. No hace commit.
+    Devuelve un DataFrame con los valores actuales de los indicadores por símbolo.
+    """
+    if bars.empty:
+        return pd.DataFrame()
+
+    bars = bars.sort_values(["symbol", "datetime"])
+    symbols = list(bars["symbol"].unique())
+    indicator_sets = load_indicator_sets(session, symbols, timeframe)
+
+    missing = [symbol for symbol in symbols if symbol not in indicator_sets]
+    if missing:
+        start = pd.to_datetime(bars["datetime"]).max() - replay_lookback
+        history = fetch_intraday_range(session, missing, start=start, timeframe=timeframe)
+        for symbol in missing:
+            indicator_sets[symbol] = IndicatorSet()
+            apply_bars(indicator_sets[symbol], history[history["symbol"] == symbol])
+        logging.info(f"Indicadores inicializados con historia reciente para {len(missing)} símbolos.")
+
+    latest = {}
+    for symbol, symbol_bars in bars.groupby("symbol", sort=False):
+        latest[symbol] = apply_bars(indicator_sets[symbol], symbol_bars)
+    save_indicator_sets(session, indicator_sets, timeframe)
+    return pd.DataFrame.from_dict(latest, orient="index")
@@ -0,0 +1,205 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pytz import timezone
+from backend.app.modules.intraday_storage import DEFAULT_TIMEFRAME
+from backend.app.modules.market_calendar import NYSE_TZ, sessions, timeframe_to_timedelta
+
+# Franjas horarias para filtrar estrategias y escáneres por hora del día.
+#   - Una franja va de `start` a `end` (extremo final excluido). Cada extremo es una hora local
+#     "HH:MM" en la zona horaria de la franja o un desplazamiento en minutos respecto a la
+#     apertura o el cierre de la sesión de la NYSE (("open", 30), ("close", -60)), que respeta
+#     los cierres anticipados. Una franja de reloj con `end <= start` cruza la medianoche.
+#   - Los cambios de horario se resuelven por día al convertir los extremos a UTC (Londres y
+#     Nueva York cambian en fechas distintas), nunca vela a vela.
+#   - Cada franja registrada ocupa un bit. `window_flags` devuelve por vela un entero con los
+#     bits de las franjas que la contienen, leído de una rejilla precalculada por temporalidad
+#     y rango de años: las franjas se combinan con operaciones de bits (`&`, `|`, `~`).
+
+ANCHORS = ("open", "close")
+
+
+def _minutes(clock):
+    """"HH:MM" -> minutos desde la medianoche."""
+    hours, minutes = str(clock).split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _utc_ns(times):
+    """Marcas de tiempo como int64 (ns UTC; sin zona horaria se asumen UTC) y máscara de válidas."""
+    index = pd.DatetimeIndex(times)
+    return index.asi8, ~index.isna()
+
+
+class TimeWindow:
+    """
+    Franja horaria con nombre. `trading_days=True` la limita a los días (fecha local de la
+    franja) en que abre la NYSE; las franjas ancladas a la apertura o al cierre lo exigen.
+    """
+    def __init__(self, name, start, end, tz=NYSE_TZ, trading_days=True):
+        self.name = name
+        self.start = self._edge_spec(start)
+        self.end = self._edge_spec(end)
+        self.tz = timezone(tz) if isinstance(tz, str) else tz
+        self.trading_days = trading_days
+        anchored = isinstance(self.start, tuple) or isinstance(self.end, tuple)
+        if anchored and not trading_days:
+            raise ValueError(f"La franja {name} está anclada a la sesión y requiere trading_days=True")
+        self.overnight = not anchored and _minutes(self.end) <= _minutes(self.start)
+
+    @staticmethod
+    def _edge_spec(edge):
+        if isinstance(edge, (tuple, list)):
+            anchor, offset = edge
+            if anchor not in ANCHORS:
+                raise ValueError(f"Ancla de franja no soportada: {anchor}")
+            return anchor, int(offset)
+        _minutes(edge)
+        return str(edge)
+
+    @property
+    def spec(self):
+        """Definición hashable de la franja (clave de caché)."""
+        return self.name, self.start, self.end, self.tz.zone, self.trading_days
+
+    def _edges(self, edge, days, calendar):
+        """Instantes (ns UTC) de un extremo para cada fecha local de `days`."""
+        if isinstance(edge, tuple):
+            anchor, offset = edge
+            return calendar[anchor].to_numpy().astype(np.int64) + offset * 60 * 10 ** 9
+        local = days + pd.Timedelta(minutes=_minutes(edge))
+        utc = local.tz_localize(self.tz, ambiguous=np.zeros(len(local), dtype=bool), nonexistent="shift_forward")
+        return utc.asi8
+
+    def intervals(self, first_day, last_day):
+        """Intervalos [inicio, fin) en ns UTC de la franja para las fechas locales entre `first_day` y `last_day`."""
+        days = pd.date_range(pd.Timestamp(first_day).normalize(), pd.Timestamp(last_day).normalize(), freq="D")
+        calendar = None
+        if self.trading_days and len(days):
+            calendar = sessions(days[0], days[-1])
+            days = pd.DatetimeIndex(calendar.index)
+            calendar = calendar.assign(open=calendar["open"].dt.tz_convert(None),
+                                       close=calendar["close"].dt.tz_convert(None))
+        if len(days) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        starts = self._edges(self.start, days, calendar)
+        ends = self._edges(self.end, days + pd.Timedelta(days=1) if self.overnight else days, calendar)
+        return starts, ends
+
+    def contains(self, values):
+        """Máscara de los instantes (int64 ns UTC) que caen dentro de la franja."""
+        values = np.asarray(values, dtype=np.int64)
+        if len(values) == 0:
+            return np.zeros(0, dtype=bool)
+        first = pd.Timestamp(values.min()) - pd.Timedelta(days=2)
+        last = pd.Timestamp(values.max()) + pd.Timedelta(days=1)
+        starts, ends = self.intervals(first, last)
+        position = np.searchsorted(starts, values, side="right") - 1
+        inside = position >= 0
+        mask = np.zeros(len(values), dtype=bool)
+        mask[inside] = values[inside] < ends[position[inside]]
+        return mask
+
+    def mask(self, times):
+        """Máscara de las marcas de tiempo (con o sin zona horaria; sin ella, UTC) dentro de la franja."""
+        values, valid = _utc_ns(times)
+        mask = np.zeros(len(values), dtype=bool)
+        mask[valid] = self.contains(values[valid])
+        return mask
+
+
+# Franjas con nombre: su posición en el registro es su bit
+WINDOWS = {}
+WINDOW_BITS = {}
+
+
+def register_window(name, start, end, tz=NYSE_TZ, trading_days=True):
+    """
+    Registra (o redefine, conservando su bit) una franja con nombre y devuelve su bit. Admite
+    hasta 63 franjas.
+    """
+    window = TimeWindow(name, start, end, tz, trading_days)
+    if name not in WINDOW_BITS:
+        if len(WINDOW_BITS) >= 63:
+            raise ValueError("No se admiten más de 63 franjas horarias")
+        WINDOW_BITS[name] = 1 << len(WINDOW_BITS)
+    WINDOWS[name] = window
+    return WINDOW_BITS[name]
+
+
+register_window("premarket", "04:00", ("open", 0))
+register_window("regular", ("open", 0), ("close", 0))
+register_window("after_hours", ("close", 0), "20:00")
+register_window("ny_open", ("open", 0), ("open", 60))
+register_window("ny_close", ("close", -60), ("close", 0))
+register_window("london_open", "08:00", "09:00", tz="Europe/London", trading_days=False)
+register_window("london_session", "08:00", "16:30", tz="Europe/London", trading_days=False)
+
+
+def window_bits(*names):
+    """Bits de las franjas indicadas por nombre, combinados con OR."""
+    bits = 0
+    for name in names:
+        if name not in WINDOW_BITS:
+            raise ValueError(f"Franja horaria desconocida: {name}")
+        bits |= WINDOW_BITS[name]
+    return bits
+
+
+def window_names(flags):
+    """Nombres de las franjas presentes en un entero de bits."""
+    return [name for name, bit in WINDOW_BITS.items() if int(flags) & bit]
+
+
+def _as_bits(windows):
+    if isinstance(windows, (int, np.integer)):
+        return int(windows)
+    if isinstance(windows, str):
+        return window_bits(windows)
+    return window_bits(*windows)
+
+
+@lru_cache(maxsize=32)
+def _window_grid(freq_ns, first_year, last_year, specs):
+    """
+    Bits de todas las franjas en una rejilla UTC de paso `freq_ns` que cubre años completos.
+    Se calcula una vez por (temporalidad, rango de años, definición de las franjas).
+    """
+    origin = pd.Timestamp(f"{first_year}-01-01").value
+    grid = np.arange(origin, pd.Timestamp(f"{last_year + 1}-01-01").value, freq_ns, dtype=np.int64)
+    flags = np.zeros(len(grid), dtype=np.int64)
+    for bit, spec in enumerate(specs):
+        flags[TimeWindow(*spec).contains(grid)] |= 1 << bit
+    flags.setflags(write=False)
+    return origin, flags
+
+
+def window_flags(times, timeframe=DEFAULT_TIMEFRAME):
+    """
+    Bits de las franjas registradas que contienen cada marca de tiempo (int64, 0 fuera de
+    todas). Las marcas deben estar alineadas con la rejilla de `timeframe` (inicio de vela);
+    el valor se lee de la rejilla cacheada por aritmética entera, sin convertir fechas.
+    """
+    values, valid = _utc_ns(times)
+    flags = np.zeros(len(values), dtype=np.int64)
+    if not valid.any():
+        return flags
+    freq = timeframe_to_timedelta(timeframe).value
+    bounds = np.array([values[valid].min(), values[valid].max()]).astype("datetime64[ns]")
+    first_year, last_year = (bounds.astype("datetime64[Y]").astype(np.int64) + 1970).tolist()
+    specs = tuple(WINDOWS[name].spec for name in WINDOW_BITS)
+    origin, grid = _window_grid(freq, first_year, last_year, specs)
+    flags[valid] = grid[(values[valid] - origin) // freq]
+    return flags
+
+
+def window_mask(times, include, exclude=0, timeframe=DEFAULT_TIMEFRAME):
+    """
+    Máscara de las velas dentro de alguna franja de `include` y fuera de todas las de
+    `exclude`. Ambos aceptan bits, un nombre o una lista de nombres. Para exigir varias
+    franjas a la vez (intersección) se combinan máscaras con `&` o se filtran los bits de
+    `window_flags`.
+    """
+    flags = window_flags(times, timeframe)
+    include, exclude = _as_bits(include), _as_bits(exclude)
+    return ((flags & include) != 0) & ((flags & exclude) == 0)
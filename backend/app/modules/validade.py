@@ -3,11 +3,13 @@ import pandas as pd
 from sqlalchemy.orm import Session
 from backend.app.db import SessionLocal
 from backend.app.models import SP500IntradayData
+from backend.app.modules.bar_store import BarStore
+from backend.app.modules.gap_backfill import BAR_FREQ, coalesce_gaps, find_missing_timestamps, plan_backfill_requests
+from backend.app.modules.market_calendar import NYSE_TZ
+from backend.app.modules.intraday_storage import fetch_intraday_range, prepare_intraday_bars, write_intraday_bars
 from alpaca_trade_api.rest import REST
 from dotenv import load_dotenv
 import logging
-from pytz import timezone
-import datetime as dt
 
 # Configuración de logging
 logging.basicConfig(
@@ -19,9 +21,6 @@ logging.basicConfig(
     ]
 )
 
-# Configuración de horario de la Bolsa de Nueva York
-NYSE_TZ = timezone("America/New_York")
-
 # Cargar claves API desde el archivo .env
 load_dotenv()
 ALPACA_API_KEY = os.getenv("ALPACA_LIVE_API_KEY")
@@ -35,11 +34,20 @@ alpaca_api = REST(ALPACA_API_KEY, ALPACA_SECRET_KEY, base_url="https://api.alpac
 
 
 # Función para extraer datos de la base de datos
-def fetch_data_from_db(session: Session, symbol: str):
-    """Extrae datos para un símbolo específico desde la base de datos."""
+def fetch_data_from_db(session: Session, symbol: str, store: BarStore = None):
+    """
+    Extrae datos para un símbolo específico desde la base de datos.
+    Si se indica un almacén columnar (`store`), lee de él en lugar de consultar SQL.
+    """
     try:
-        query = session.query(SP500IntradayData.datetime).filter(SP500IntradayData.symbol == symbol)
-        data = pd.read_sql(query.statement, session.bind)
+        if store is not None:
+            times = store.read(symbol, columns=["datetime"]).column("datetime")
+            if len(times) == 0:
+                logging.warning(f"No se encontraron datos para {symbol} en el almacén columnar.")
+                return pd.DataFrame()
+            return pd.DataFrame(index=pd.DatetimeIndex(pd.to_datetime(times, unit="ns"), name="datetime"))
+
+        data = fetch_intraday_range(session, [symbol], columns=["datetime"])
         
         if data.empty:
             logging.warning(f"No se encontraron datos para {symbol} en la base de datos.")
@@ -56,78 +64,99 @@ def fetch_data_from_db(session: Session, symbol: str):
 
 # Función para identificar lagunas en los datos
 def identify_gaps(data: pd.DataFrame, symbol: str, start_date, end_date):
-    """Identifica lagunas de tiempo en los datos de un símbolo."""
+    """
+    Identifica lagunas de tiempo en los datos de un símbolo.
+
+    Solo considera velas de sesión regular según el calendario NYSE (las noches, fines de
+    semana, festivos y tardes de cierre anticipado no son lagunas) y agrupa las marcas de
+    tiempo faltantes consecutivas en rangos. Devuelve un DataFrame con `symbol`, `start`,
+    `end` y `bars`, o None si no hay lagunas.
+    """
     try:
-        # Crear un rango completo de fechas de 5 minutos entre start_date y end_date
-        full_range = pd.date_range(start=start_date, end=end_date, freq='5min', tz=NYSE_TZ)
-        available_data = data.index
-        missing_times = full_range.difference(available_data)
+        missing_times = find_missing_timestamps(pd.DatetimeIndex(data.index), start_date, end_date)
 
         if missing_times.empty:
             logging.info(f"No se encontraron lagunas de datos para {symbol}.")
             return None
 
-        # Crear un DataFrame con las fechas faltantes
-        gaps = pd.DataFrame(missing_times, columns=["MissingDatetime"])
-        gaps.to_csv(f"missing_times_{symbol}.csv", index=False)
-        logging.warning(f"Se encontraron lagunas de datos para {symbol}. Archivo: missing_times_{symbol}.csv")
+        gaps = coalesce_gaps(missing_times)
+        gaps.insert(0, "symbol", symbol)
+        logging.warning(
+            f"Se encontraron lagunas de datos para {symbol}: {len(missing_times)} velas en {len(gaps)} rangos."
+        )
         return gaps
     except Exception as e:
         logging.error(f"Error al identificar lagunas de tiempo para {symbol}: {e}")
         return None
 
 
-# Función para rellenar los datos faltantes desde Alpaca
-def fetch_missing_data(symbol: str, missing_times: pd.DataFrame):
-    """Descarga datos para rellenar las lagunas identificadas."""
-    try:
-        filled_data = []
+def _missing_index(symbol_gaps: pd.DataFrame):
+    """Reconstruye las marcas de tiempo faltantes (UTC) a partir de los rangos de un símbolo."""
+    ranges = [pd.date_range(start, end, freq=BAR_FREQ) for start, end in zip(symbol_gaps["start"], symbol_gaps["end"])]
+    return ranges[0].append(ranges[1:]) if ranges else pd.DatetimeIndex([], tz="UTC")
 
-        for missing_time in missing_times["MissingDatetime"]:
-            start = missing_time - pd.Timedelta(minutes=10)
-            end = missing_time + pd.Timedelta(minutes=10)
 
-            # Descargar datos para el rango faltante
+# Función para rellenar los datos faltantes desde Alpaca
+def fetch_missing_data(session: Session, gaps: pd.DataFrame):
+    """
+    Descarga las velas faltantes y las guarda en `SP500IntradayData`.
+
+    Los rangos de todos los símbolos se agrupan en el menor número de peticiones
+    multi-símbolo (`plan_backfill_requests`). De cada respuesta solo se guardan las velas
+    que realmente faltaban. Devuelve un dict symbol -> velas rellenadas.
+    """
+    missing_by_symbol = {symbol: _missing_index(group) for symbol, group in gaps.groupby("symbol")}
+    filled = {symbol: 0 for symbol in missing_by_symbol}
+
+    for request in plan_backfill_requests(gaps):
+        try:
             bars = alpaca_api.get_bars(
-                symbol, 
-                timeframe="5Min", 
-                start=start.isoformat(), 
-                end=end.isoformat(), 
+                request["symbols"],
+                timeframe="5Min",
+                start=request["start"].isoformat(),
+                end=request["end"].isoformat(),
                 adjustment="all"
             ).df
+            if bars.empty:
+                continue
 
-            if not bars.empty:
-                bars.reset_index(inplace=True)
-                bars.rename(columns={
-                    'timestamp': 'Datetime',
-                    'open': 'Open',
-                    'high': 'High',
-                    'low': 'Low',
-                    'close': 'Close',
-                    'volume': 'Volume',
-                    'trade_count': 'TradeCount',
-                    'vwap': 'VWAP'
-                }, inplace=True)
-                bars['Datetime'] = pd.to_datetime(bars['Datetime'])
-                filled_data.append(bars)
-
-        # Guardar los datos rellenados en un archivo CSV
-        if filled_data:
-            filled_data = pd.concat(filled_data)
-            filled_data.to_csv(f"filled_data_{symbol}.csv", index=False)
-            logging.info(f"Datos rellenados para {symbol}. Archivo: filled_data_{symbol}.csv")
-            return filled_data
-        else:
-            logging.warning(f"No se pudo rellenar ninguna laguna para {symbol}.")
-            return None
-    except Exception as e:
-        logging.error(f"Error al rellenar lagunas para {symbol}: {e}")
-        return None
+            bars.reset_index(inplace=True)
+            bars.rename(columns={
+                'timestamp': 'Datetime',
+                'open': 'Open',
+                'high': 'High',
+                'low': 'Low',
+                'close': 'Close',
+                'volume': 'Volume',
+                'trade_count': 'TradeCount',
+                'vwap': 'VWAP'
+            }, inplace=True)
+            if "symbol" not in bars.columns:
+                bars["symbol"] = request["symbols"][0]
+
+            for symbol, symbol_bars in bars.groupby("symbol"):
+                if symbol not in missing_by_symbol:
+                    continue
+                symbol_bars = symbol_bars[
+                    pd.to_datetime(symbol_bars["Datetime"], utc=True).isin(missing_by_symbol[symbol])
+                ]
+                filled[symbol] += write_intraday_bars(session, prepare_intraday_bars(symbol, symbol_bars))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logging.error(f"Error al rellenar lagunas para {request['symbols']}: {e}")
+
+    for symbol, count in filled.items():
+        logging.info(f"Velas rellenadas para {symbol}: {count} de {len(missing_by_symbol[symbol])}.")
+    return filled
 
 
 # Función principal para analizar y rellenar gaps
-def analyze_gaps():
-    """Analiza lagunas de tiempo para cada símbolo y rellena datos faltantes si es posible."""
+def analyze_gaps(store: BarStore = None):
+    """
+    Analiza lagunas de tiempo para cada símbolo y rellena datos faltantes si es posible.
+    Con `store` las marcas de tiempo se leen del almacén columnar en lugar de SQL.
+    """
     session = SessionLocal()
     try:
         # Verificar si la tabla tiene datos
@@ -140,24 +169,28 @@ def analyze_gaps():
         symbols = [s[0] for s in symbols]
         logging.info(f"Símbolos detectados: {symbols}")
 
+        all_gaps = []
         for symbol in symbols:
             logging.info(f"Analizando lagunas para {symbol}...")
-            data = fetch_data_from_db(session, symbol)
+            data = fetch_data_from_db(session, symbol, store)
 
-            if data.empty:
+            # El DataFrame solo tiene índice (sin columnas), así que `empty` siempre sería True
+            if len(data.index) == 0:
                 continue
 
-            # Rango de fechas disponibles
+            # Rango de datos disponibles
             min_date = data.index.min()
             max_date = data.index.max()
             logging.info(f"Rango de datos para {symbol}: {min_date} a {max_date}")
 
             # Identificar lagunas
             gaps = identify_gaps(data, symbol, start_date=min_date, end_date=max_date)
+            if gaps is not None:
+                all_gaps.append(gaps)
 
-            # Rellenar datos faltantes si se encuentran lagunas
-            if gaps is not None and not gaps.empty:
-                fetch_missing_data(symbol, gaps)
+        # Rellenar todas las lagunas a la vez para agrupar símbolos en las mismas peticiones
+        if all_gaps:
+            fetch_missing_data(session, pd.concat(all_gaps, ignore_index=True))
     except Exception as e:
         logging.error(f"Error durante el análisis de lagunas: {e}")
     finally:
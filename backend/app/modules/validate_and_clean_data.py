@@ -1,11 +1,21 @@
 import pandas as pd
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import text
-from backend.app.db import SessionLocal
+from backend.app.db import SessionLocal, engine
 from backend.app.models import SP500IntradayData
+from backend.app.modules.bar_store import BarStore
+from backend.app.modules.indicator_cache import IndicatorCache
+from backend.app.modules.indicators import sma
+from backend.app.modules.market_calendar import NYSE_TZ, session_mask
+from backend.app.modules.validation_metrics import (
+    MIN_DATE_RANGE_DAYS, MIN_REQUIRED_BARS, fetch_validation_metrics, verdict_from_metrics,
+)
 import logging
 import datetime
-from pytz import timezone
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
 # Configuración de logging
 logging.basicConfig(
@@ -18,14 +28,26 @@ logging.basicConfig(
 )
 
 # Configuración de parámetros de validación
-MIN_REQUIRED_BARS = 50000  # Aproximadamente 18 meses de velas de 5 minutos
 VALIDATION_START_DATE = (datetime.datetime.now() - datetime.timedelta(days=18 * 30)).date()
-NYSE_TZ = timezone("America/New_York")  # Huso horario de la Bolsa de Nueva York
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", "1"))  # Procesos para la validación en paralelo
+VALIDATION_POOL_RESTARTS = int(os.getenv("VALIDATION_POOL_RESTARTS", "2"))  # Pools nuevos tras la caída de uno
+# Caché de indicadores (memoria + disco) reutilizada entre validaciones del mismo proceso
+INDICATOR_CACHE = IndicatorCache() if os.getenv("VALIDATION_INDICATOR_CACHE", "1") == "1" else None
 
-def fetch_data_from_db(session: Session, symbol: str):
-    """Extrae datos de un símbolo específico desde la base de datos."""
+def fetch_data_from_db(session: Session, symbol: str, store: BarStore = None):
+    """
+    Extrae datos de un símbolo específico desde la base de datos.
+    Si se indica un almacén columnar (`store`), lee de él en lugar de consultar SQL.
+    """
     try:
-        query = session.query(SP500IntradayData).filter(SP500IntradayData.symbol == symbol)
+        if store is not None:
+            data = store.read(symbol).to_frame()
+            logging.info(f"Datos leídos del almacén columnar para {symbol}. Total de filas: {len(data)}")
+            return data
+
+        query = session.query(SP500IntradayData).filter(
+            SP500IntradayData.symbol == symbol, SP500IntradayData.timeframe == "5Min"
+        )
         data = pd.read_sql(query.statement, session.bind)
         logging.info(f"Datos extraídos para {symbol}. Total de filas: {len(data)}")
         return data
@@ -34,18 +56,14 @@ def fetch_data_from_db(session: Session, symbol: str):
         return pd.DataFrame()
 
 def adjust_to_nyse_time(data: pd.DataFrame):
-    """Ajusta los datos al horario de la Bolsa de Nueva York (sin horario de verano)."""
+    """
+    Conserva solo las velas de sesión regular según el calendario NYSE (festivos y cierres
+    anticipados incluidos) y expresa `datetime` en hora de Nueva York.
+    """
     try:
-        # Convertir el campo 'datetime' a zona horaria de NYSE
         data["datetime"] = pd.to_datetime(data["datetime"], errors="coerce")
+        data = data[session_mask(data["datetime"])].copy()
         data["datetime"] = data["datetime"].dt.tz_localize("UTC").dt.tz_convert(NYSE_TZ)
-        
-        # Filtro: solo incluir datos de 9:00 AM a 4:00 PM
-        data["hour"] = data["datetime"].dt.hour
-        data = data[(data["hour"] >= 9) & (data["hour"] <= 16)].copy()
-
-        # Eliminar la columna auxiliar 'hour'
-        data.drop(columns=["hour"], inplace=True)
 
         logging.info("Datos ajustados exitosamente al horario de NYSE.")
         return data
@@ -74,7 +92,7 @@ def validate_data_quality(data: pd.DataFrame, symbol: str):
 
         # Validar rango de fechas
         min_date, max_date = data["datetime"].min(), data["datetime"].max()
-        if (max_date - min_date).days < 18 * 30:
+        if (max_date - min_date).days < MIN_DATE_RANGE_DAYS:
             logging.warning(f"Rango de fechas insuficiente para {symbol}: {min_date} a {max_date}")
             return False, "Insufficient date range"
 
@@ -95,11 +113,21 @@ def validate_data_quality(data: pd.DataFrame, symbol: str):
         logging.error(f"Error al validar datos para {symbol}: {e}")
         return False, "Validation error"
 
-def calculate_indicators(data: pd.DataFrame):
-    """Calcula indicadores como medias móviles."""
+def calculate_indicators(data: pd.DataFrame, cache: IndicatorCache = None, timeframe="5Min"):
+    """
+    Calcula indicadores como medias móviles.
+    Con `cache` las series se reutilizan (o se extienden con las velas nuevas) entre llamadas.
+    """
     try:
-        data["SMA_50"] = data["close"].rolling(window=50).mean()
-        data["SMA_200"] = data["close"].rolling(window=200).mean()
+        if cache is not None and not data.empty:
+            data = data.sort_values("datetime", ignore_index=True)
+            symbol = data["symbol"].iloc[0]
+            data["SMA_50"] = cache.get(symbol, timeframe, "SMA", (50,), data)
+            data["SMA_200"] = cache.get(symbol, timeframe, "SMA", (200,), data)
+        else:
+            close = data["close"].to_numpy(dtype=float)
+            data["SMA_50"] = sma(close, 50)
+            data["SMA_200"] = sma(close, 200)
         data.dropna(inplace=True)  # Eliminar filas sin cálculos válidos
         logging.info("Indicadores calculados exitosamente.")
         return data
@@ -107,33 +135,135 @@ def calculate_indicators(data: pd.DataFrame):
         logging.error(f"Error al calcular indicadores: {e}")
         return pd.DataFrame()
 
-def process_validation():
-    """Valida y clasifica los datos de la base de datos."""
+def validate_symbol(symbol: str, store: BarStore = None, session: Session = None):
+    """
+    Valida un símbolo y calcula sus indicadores. Devuelve la fila del reporte con el tiempo
+    empleado (`Seconds`). Cualquier error queda aislado en la fila del símbolo.
+    """
+    started = time.perf_counter()
+    own_session = session is None
+    if own_session:
+        session = SessionLocal()
+    try:
+        logging.info(f"Procesando validación para {symbol}...")
+        data = fetch_data_from_db(session, symbol, store)
+
+        valid, message = validate_data_quality(data, symbol)
+        if valid:
+            processed_data = calculate_indicators(data, INDICATOR_CACHE)
+            if not processed_data.empty:
+                row = {"Symbol": symbol, "Status": "Valid", "Message": "Data ready for backtesting"}
+                logging.info(f"Datos listos para backtesting para {symbol}.")
+            else:
+                row = {"Symbol": symbol, "Status": "Error", "Message": "Error calculating indicators"}
+        else:
+            row = {"Symbol": symbol, "Status": "Invalid", "Message": message}
+    except Exception as e:
+        logging.error(f"Error inesperado al validar {symbol}: {e}")
+        row = {"Symbol": symbol, "Status": "Error", "Message": f"Unexpected error: {e}"}
+    finally:
+        if own_session:
+            session.close()
+    row["Seconds"] = round(time.perf_counter() - started, 3)
+    return row
+
+def _init_validation_worker():
+    """Cada proceso abre sus propias conexiones en lugar de reutilizar las del proceso padre."""
+    engine.dispose(close=False)
+
+def _worker_failure(symbol, error):
+    logging.error(f"Fallo del proceso al validar {symbol}: {error}")
+    return {"Symbol": symbol, "Status": "Error", "Message": f"Worker failure: {error}", "Seconds": None}
+
+def validate_symbols_parallel(symbols, store: BarStore = None, workers=VALIDATION_WORKERS,
+                              restarts=VALIDATION_POOL_RESTARTS):
+    """
+    Valida los símbolos en un pool de procesos, cada uno con su propia conexión a la base de
+    datos. Devuelve las filas del reporte en el mismo orden que `symbols`; si un proceso
+    falla, solo se marca como error el símbolo afectado.
+
+    Si un proceso muere (p. ej. por falta de memoria) el pool queda inservible y todos sus
+    símbolos sin terminar fallan con `BrokenProcessPool`: se vuelven a enviar a un pool nuevo
+    hasta `restarts` veces antes de marcarlos como error.
+    """
+    rows = {}
+    pending = list(symbols)
+    for attempt in range(restarts + 1):
+        broken = set()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_validation_worker) as executor:
+            futures = {executor.submit(validate_symbol, symbol, store): symbol for symbol in pending}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    rows[symbol] = future.result()
+                except BrokenProcessPool:
+                    broken.add(symbol)
+                except Exception as e:
+                    rows[symbol] = _worker_failure(symbol, e)
+        pending = [symbol for symbol in pending if symbol in broken]
+        if not pending:
+            break
+        if attempt < restarts:
+            logging.warning(f"El pool de procesos se rompió; se reintentan {len(pending)} símbolos en un pool nuevo.")
+    for symbol in pending:
+        rows[symbol] = _worker_failure(symbol, "process pool broken")
+    return [rows[symbol] for symbol in symbols]
+
+def _pushdown_verdicts(session: Session, symbols, regular_hours=True):
+    """Veredictos de todos los símbolos a partir de un único GROUP BY en la base de datos."""
+    metrics = fetch_validation_metrics(session, timeframe="5Min", regular_hours=regular_hours)
+    metrics = {row["symbol"]: row for row in metrics.to_dict("records")}
+    with_rows = {s[0] for s in session.query(SP500IntradayData.symbol).filter(
+        SP500IntradayData.timeframe == "5Min").distinct()}
+
+    verdicts = {}
+    for symbol in symbols:
+        if symbol not in with_rows:
+            logging.warning(f"No se encontraron datos para {symbol}.")
+            verdicts[symbol] = (False, "No data")
+        else:
+            verdicts[symbol] = verdict_from_metrics(metrics.get(symbol), symbol)
+    return verdicts
+
+def process_validation(store: BarStore = None, pushdown=False, deep_checks=False, regular_hours=True,
+                       workers=VALIDATION_WORKERS):
+    """
+    Valida y clasifica los datos de la base de datos.
+    Con `store` las velas se leen del almacén columnar en lugar de SQL.
+
+    Con `pushdown` los criterios de validación se calculan en la base de datos para todo el
+    universo con una sola consulta agregada (restringida a sesión regular con `regular_hours`)
+    y solo se transfieren kilobytes. Las velas de un símbolo solo se cargan si `deep_checks`
+    pide repetir la validación completa y calcular indicadores de los símbolos válidos.
+
+    Con `workers` > 1 los símbolos que requieren carga completa se validan en paralelo en
+    procesos separados. El reporte sigue el orden alfabético de los símbolos en cualquier modo.
+    """
     session = SessionLocal()
     try:
         symbols = session.query(SP500IntradayData.symbol).distinct().all()
-        symbols = [s[0] for s in symbols]
+        symbols = sorted(s[0] for s in symbols)
         logging.info(f"Se encontraron {len(symbols)} símbolos en la base de datos.")
 
-        report = []
+        rows = {}
+        if pushdown:
+            for symbol, (valid, message) in _pushdown_verdicts(session, symbols, regular_hours).items():
+                if valid and deep_checks:
+                    continue
+                rows[symbol] = {"Symbol": symbol, "Status": "Valid" if valid else "Invalid",
+                                "Message": "Data ready for backtesting" if valid else message, "Seconds": 0.0}
 
-        for symbol in symbols:
-            logging.info(f"Procesando validación para {symbol}...")
-            data = fetch_data_from_db(session, symbol)
-
-            valid, message = validate_data_quality(data, symbol)
-            if valid:
-                processed_data = calculate_indicators(data)
-                if not processed_data.empty:
-                    report.append({"Symbol": symbol, "Status": "Valid", "Message": "Data ready for backtesting"})
-                    logging.info(f"Datos listos para backtesting para {symbol}.")
-                else:
-                    report.append({"Symbol": symbol, "Status": "Error", "Message": "Error calculating indicators"})
-            else:
-                report.append({"Symbol": symbol, "Status": "Invalid", "Message": message})
+        pending = [symbol for symbol in symbols if symbol not in rows]
+        if workers > 1 and len(pending) > 1:
+            logging.info(f"Validando {len(pending)} símbolos con {workers} procesos...")
+            results = validate_symbols_parallel(pending, store, workers)
+        else:
+            results = [validate_symbol(symbol, store, session) for symbol in pending]
+        rows.update((row["Symbol"], row) for row in results)
 
         # Generar reporte
-        report_df = pd.DataFrame(report)
+        report_df = pd.DataFrame([rows[symbol] for symbol in symbols],
+                                 columns=["Symbol", "Status", "Message", "Seconds"])
         report_path = "validation_report.csv"
         report_df.to_csv(report_path, index=False)
         logging.info(f"Reporte generado: {report_path}")
@@ -146,4 +276,5 @@ def process_validation():
 
 if __name__ == "__main__":
     logging.info("Iniciando proceso de validación de datos...")
-    process_validation()
+    process_validation(pushdown=os.getenv("VALIDATION_PUSHDOWN") == "1",
+                       deep_checks=os.getenv("VALIDATION_DEEP_CHECKS") == "1")
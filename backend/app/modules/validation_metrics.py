@@ -0,0 +1,113 @@
+import logging
+import pandas as pd
+from sqlalchemy import Column, DateTime, MetaData, Table, case, func, or_, select
+from backend.app.models import SP500IntradayData
+from backend.app.modules.market_calendar import sessions
+
+# Parámetros de validación compartidos por la validación en pandas y en SQL
+MIN_REQUIRED_BARS = 50000  # Aproximadamente 18 meses de velas de 5 minutos
+MIN_DATE_RANGE_DAYS = 18 * 30
+VALUE_COLUMNS = ["open", "high", "low", "close", "volume"]
+SESSION_WINDOWS_TABLE = "tmp_session_windows"
+
+
+def _session_windows_table():
+    return Table(
+        SESSION_WINDOWS_TABLE, MetaData(),
+        Column("open_utc", DateTime, primary_key=True),
+        Column("close_utc", DateTime, nullable=False),
+        prefixes=["TEMPORARY"],
+    )
+
+
+def _load_session_windows(connection, table, start, end):
+    """Crea la tabla temporal de sesiones NYSE (UTC sin zona horaria) que cubre [start, end]."""
+    table.create(connection, checkfirst=True)
+    windows = sessions(pd.Timestamp(start) - pd.Timedelta(days=1), pd.Timestamp(end) + pd.Timedelta(days=1))
+    rows = [
+        {"open_utc": open_.tz_localize(None).to_pydatetime(), "close_utc": close.tz_localize(None).to_pydatetime()}
+        for open_, close in zip(windows["open"], windows["close"])
+    ]
+    if rows:
+        connection.execute(table.insert(), rows)
+    return len(rows)
+
+
+def fetch_validation_metrics(session, timeframe="5Min", regular_hours=True):
+    """
+    Calcula en la base de datos, con un único GROUP BY symbol, las métricas que usa la validación:
+    número de velas, primera y última fecha y velas con valores nulos o negativos por columna.
+
+    Con `regular_hours` solo cuentan las velas de sesión regular, comparando cada vela con
+    una tabla temporal de sesiones del calendario NYSE. Devuelve un DataFrame con una fila por
+    símbolo que tenga velas.
+    """
+    bars = SP500IntradayData.__table__
+    metrics = [
+        func.count().label("bars"),
+        func.min(bars.c.datetime).label("min_datetime"),
+        func.max(bars.c.datetime).label("max_datetime"),
+    ] + [
+        func.sum(case((or_(bars.c[col].is_(None), bars.c[col] < 0), 1), else_=0)).label(f"invalid_{col}")
+        for col in VALUE_COLUMNS
+    ]
+    query = select(bars.c.symbol, *metrics).where(bars.c.timeframe == timeframe).group_by(bars.c.symbol)
+
+    connection = session.connection()
+    windows = None
+    if regular_hours:
+        start, end = connection.execute(
+            select(func.min(bars.c.datetime), func.max(bars.c.datetime)).where(bars.c.timeframe == timeframe)
+        ).one()
+        if start is None:
+            return pd.DataFrame(columns=["symbol", "bars", "min_datetime", "max_datetime"]
+                                + [f"invalid_{col}" for col in VALUE_COLUMNS])
+        windows = _session_windows_table()
+        _load_session_windows(connection, windows, start, end)
+        # Cierre de la última sesión abierta antes de cada vela: búsqueda indexada por `open_utc`
+        # en lugar de una unión por rango, que obligaría a comparar cada vela con cada sesión
+        session_close = (
+            select(windows.c.close_utc).where(windows.c.open_utc <= bars.c.datetime)
+            .order_by(windows.c.open_utc.desc()).limit(1).scalar_subquery()
+        )
+        query = query.where(bars.c.datetime < session_close)
+
+    try:
+        metrics = pd.DataFrame(connection.execute(query).mappings().all())
+    finally:
+        if windows is not None:
+            windows.drop(connection, checkfirst=True)
+
+    if metrics.empty:
+        return pd.DataFrame(columns=["symbol", "bars", "min_datetime", "max_datetime"]
+                            + [f"invalid_{col}" for col in VALUE_COLUMNS])
+    metrics["min_datetime"] = pd.to_datetime(metrics["min_datetime"])
+    metrics["max_datetime"] = pd.to_datetime(metrics["max_datetime"])
+    logging.info(f"Métricas de validación calculadas en SQL para {len(metrics)} símbolos.")
+    return metrics
+
+
+def verdict_from_metrics(metrics, symbol: str):
+    """
+    Devuelve `(valid, message)` a partir de las métricas agregadas de un símbolo, con los
+    mismos criterios y mensajes que `validate_data_quality`. `metrics` es una fila de
+    `fetch_validation_metrics` o None si el símbolo no tiene velas en sesión.
+    """
+    if metrics is None or metrics["bars"] == 0:
+        return False, "No data in NYSE trading hours"
+
+    min_date, max_date = metrics["min_datetime"], metrics["max_datetime"]
+    if (max_date - min_date).days < MIN_DATE_RANGE_DAYS:
+        logging.warning(f"Rango de fechas insuficiente para {symbol}: {min_date} a {max_date}")
+        return False, "Insufficient date range"
+
+    if metrics["bars"] < MIN_REQUIRED_BARS:
+        logging.warning(f"Datos insuficientes para {symbol}: {metrics['bars']} filas disponibles.")
+        return False, "Insufficient bars"
+
+    for col in VALUE_COLUMNS:
+        if metrics[f"invalid_{col}"] > 0:
+            logging.warning(f"Valores inválidos encontrados en {col} para {symbol}.")
+            return False, f"Invalid values in {col}"
+
+    return True, "Data valid"
@@ -0,0 +1,43 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from ..db import get_db
+from ..modules.screener import MAX_PAGE_SIZE, SCREENER_REFRESH_SECONDS, SNAPSHOT_COLUMNS, UniverseSnapshot
+
+router = APIRouter()
+
+# Instantánea del universo compartida por todas las peticiones
+snapshot = UniverseSnapshot()
+
+
+@router.get("/screener")
+def screen_universe(
+    expression: str = Query(None, alias="filter", description='Filtro, p. ej. "RSI_14 < 30 and relative_volume > 3"'),
+    sort: str = Query(None, description='Expresión de orden, p. ej. "relative_volume"'),
+    descending: bool = True,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    columns: str = Query(None, description="Columnas adicionales separadas por comas"),
+    db: Session = Depends(get_db),
+):
+    """
+    Escanea todo el universo con la última vela de cada símbolo y devuelve los resultados
+    ordenados y paginados. La instantánea se refresca como mucho cada `SCREENER_REFRESH_SECONDS`.
+    """
+    try:
+        snapshot.refresh_from_db(db, max_age=SCREENER_REFRESH_SECONDS)
+    except Exception as e:
+        logging.error(f"Error al refrescar la instantánea del escáner: {e}")
+    try:
+        return snapshot.screen(expression, sort, descending, offset, limit,
+                               [name.strip() for name in columns.split(",")] if columns else None)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/screener/columns")
+def screener_columns():
+    """
+    Devuelve las columnas disponibles en filtros y órdenes.
+    """
+    return {"columns": SNAPSHOT_COLUMNS}
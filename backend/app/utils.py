@@ -1,7 +1,7 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from app.config import settings  # Importa el objeto de configuración desde config.py
+from backend.app.config import settings  # Importa el objeto de configuración desde config.py
 
 # Configuración de la base de datos
 engine = create_engine(settings.database_url, connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {})
@@ -0,0 +1,108 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from backend.app.modules.backtest import backtest_store, cross_above, cross_below, positions_from_signals, run_backtest
+from backend.app.modules.bar_store import BarStore
+from backend.app.modules.indicators import sma
+from backend.tests.utils import random_open_close
+
+
+class TestBacktest(unittest.TestCase):
+    """
+    Pruebas unitarias para el backtester vectorizado.
+    """
+    def test_single_trade_with_costs(self):
+        """
+        Verifica capital, operación y métricas de una operación calculada a mano.
+        """
+        close = np.array([10, 11, 12, 11, 13, 14.0])
+        open_ = np.array([10, 10.5, 11.5, 11.5, 12, 13.5])
+        entries = np.array([1, 0, 0, 0, 0, 0], dtype=bool)
+        exits = np.array([0, 0, 1, 0, 0, 0], dtype=bool)
+        result = run_backtest(close, entries, exits, open_, commission=0.01, slippage=0.001)
+
+        entry, exit_ = 10.5 * 1.001, 11.5 * 0.999
+        final = 10000 * 0.99 * (11 / entry) * (exit_ / 11) * 0.99
+        self.assertAlmostEqual(result.equity[0, -1], final)
+        trade = result.trades.iloc[0]
+        self.assertEqual((trade["entry_index"], trade["exit_index"], trade["bars_held"]), (1, 3, 2))
+        self.assertAlmostEqual(trade["pnl"], final - 10000)
+        metrics = result.metrics.iloc[0]
+        self.assertEqual(metrics["trades"], 1)
+        self.assertEqual(metrics["profit_factor"], np.inf)
+        self.assertAlmostEqual(metrics["max_drawdown"], result.equity[0, 3] / result.equity[0, 2] - 1)
+        self.assertEqual(metrics["max_time_under_water"], 3)
+
+    def test_signal_state_machine(self):
+        """
+        Verifica que la posición se mantiene entre entrada y salida y que la salida prevalece.
+        """
+        entries = np.array([0, 1, 0, 1, 0, 0, 1, 0], dtype=bool)
+        exits = np.array([1, 0, 0, 0, 1, 0, 1, 0], dtype=bool)
+        np.testing.assert_array_equal(positions_from_signals(entries, exits)[0], [0, 1, 1, 1, 0, 0, 0, 0])
+
+    def test_batched_runs_match_individual_runs(self):
+        """
+        Verifica que varias ejecuciones que comparten precios equivalen a ejecutarlas por separado.
+        """
+        open_, close = random_open_close()
+        runs = []
+        for fast, slow in ((10, 50), (20, 100)):
+            fast_ma, slow_ma = sma(close, fast), sma(close, slow)
+            runs.append((cross_above(fast_ma, slow_ma), cross_below(fast_ma, slow_ma)))
+        entries = np.concatenate([e for e, _ in runs])
+        exits = np.concatenate([x for _, x in runs])
+        batched = run_backtest(close, entries, exits, open_, rows=np.tile(np.arange(3), 2))
+
+        for i in range(6):
+            single = run_backtest(close[i % 3], entries[i], exits[i], open_[i % 3])
+            np.testing.assert_allclose(batched.equity[i], single.equity[0])
+            pd.testing.assert_series_equal(batched.metrics.iloc[i], single.metrics.iloc[0], check_names=False)
+        self.assertTrue((batched.metrics["trades"] > 0).all())
+
+    def test_short_side_and_forced_close(self):
+        """
+        Verifica que un corto gana cuando el precio cae y que la posición abierta se cierra al final.
+        """
+        close = np.array([[np.nan, 10, 9, 8, 7.0]])
+        entries = np.array([[True, True, False, False, False]])
+        exits = np.zeros_like(entries)
+        result = run_backtest(close, entries, exits, direction=-1, commission=0.0, slippage=0.0)
+        self.assertAlmostEqual(result.equity[0, -1], 10000 * (1 + 0.3))
+        trade = result.trades.iloc[0]
+        self.assertEqual((trade["entry_index"], trade["exit_index"]), (2, 4))
+
+    def test_backtest_store_runs_parameter_grid(self):
+        """
+        Verifica el backtest de una rejilla de parámetros sobre el almacén columnar.
+        """
+        root = tempfile.mkdtemp()
+        try:
+            store = BarStore(root, "intraday")
+            open_, close = random_open_close(2, 600, seed=3)
+            times = pd.date_range("2024-01-02 14:30", periods=600, freq="5min")
+            for row, symbol in enumerate(["AAPL", "MSFT"]):
+                store.write_frame(symbol, pd.DataFrame({
+                    "datetime": times, "open": open_[row], "high": close[row], "low": close[row],
+                    "close": close[row], "volume": 1.0, "trade_count": 1, "vwap": close[row],
+                }))
+
+            def crossover(prices, fast, slow):
+                fast_ma, slow_ma = sma(prices["close"], fast), sma(prices["close"], slow)
+                return cross_above(fast_ma, slow_ma), cross_below(fast_ma, slow_ma)
+
+            result = backtest_store(store, crossover, [{"fast": 5, "slow": 20}, {"fast": 10, "slow": 40}])
+            self.assertEqual(list(result.metrics["symbol"]), ["AAPL", "MSFT", "AAPL", "MSFT"])
+            self.assertEqual(list(result.metrics["fast"]), [5, 5, 10, 10])
+            single = run_backtest(close[1], *crossover({"close": close[1]}, 10, 40), open_[1])
+            self.assertAlmostEqual(result.metrics["final_equity"].iloc[3], single.metrics["final_equity"].iloc[0])
+            first_trade = result.trades_with_times().iloc[0]
+            self.assertEqual(first_trade["entry_datetime"], times[first_trade["entry_index"]])
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    unittest.main()
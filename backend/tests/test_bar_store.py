@@ -0,0 +1,85 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from backend.app.db import Base
+from backend.app.modules.bar_store import BarStore
+
+
+def intraday_frame(start, periods):
+    times = pd.date_range(start, periods=periods, freq="5min")
+    return pd.DataFrame({
+        "symbol": "AAPL",
+        "datetime": times,
+        "open": np.arange(periods, dtype=float),
+        "high": np.arange(periods, dtype=float) + 1,
+        "low": np.arange(periods, dtype=float) - 1,
+        "close": np.arange(periods, dtype=float) + 0.5,
+        "volume": 100.0,
+        "trade_count": [None] + [10] * (periods - 1),
+        "vwap": 1.0,
+    })
+
+
+class TestBarStore(unittest.TestCase):
+    """
+    Pruebas unitarias para el almacén columnar de velas.
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = BarStore(self.root, "intraday")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_partitions_by_month_and_reads_memory_mapped_views(self):
+        """
+        Verifica la partición mensual y que una lectura dentro de un mes no copia datos.
+        """
+        frame = intraday_frame("2024-01-31 23:45", 6)
+        self.assertEqual(self.store.write_frame("AAPL", frame), ["2024-01", "2024-02"])
+
+        bars = self.store.read("AAPL", start="2024-01-31 23:50", end="2024-02-01 00:00")
+        close = bars.column("close")
+        self.assertIsInstance(close, np.memmap)
+        np.testing.assert_array_equal(close, [1.5, 2.5])
+
+        everything = self.store.read("AAPL")
+        self.assertEqual(len(everything), 6)
+        np.testing.assert_array_equal(everything.column("trade_count")[:2], [-1, 10])
+
+    def test_refresh_from_db_is_incremental(self):
+        """
+        Verifica que la actualización desde la base de datos reescribe solo desde el último mes.
+        """
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        intraday_frame("2024-01-31 23:45", 6).to_sql("sp500_intraday_data", engine, if_exists="append", index=False)
+
+        self.assertEqual(self.store.refresh_from_db(engine), {"AAPL": 6})
+        intraday_frame("2024-01-31 23:45", 12).iloc[6:].to_sql(
+            "sp500_intraday_data", engine, if_exists="append", index=False
+        )
+        self.assertEqual(self.store.refresh_from_db(engine), {"AAPL": 9})
+
+        frame = self.store.read("AAPL").to_frame()
+        self.assertEqual(len(frame), 12)
+        self.assertTrue(frame["datetime"].is_monotonic_increasing)
+
+    def test_read_matrix_aligns_symbols_on_union_index(self):
+        """
+        Verifica que la lectura matricial alinea los símbolos por fecha y rellena con NaN.
+        """
+        self.store.write_frame("AAPL", intraday_frame("2024-01-02 15:00", 4))
+        self.store.write_frame("MSFT", intraday_frame("2024-01-02 15:10", 4).assign(symbol="MSFT"))
+
+        symbols, index, matrices = self.store.read_matrix(["MSFT", "AAPL", "NVDA"], columns=["close"])
+        self.assertEqual(symbols, ["MSFT", "AAPL"])
+        self.assertEqual(len(index), 6)
+        np.testing.assert_array_equal(matrices["close"][0], [np.nan, np.nan, 0.5, 1.5, 2.5, 3.5])
+        np.testing.assert_array_equal(matrices["close"][1], [0.5, 1.5, 2.5, 3.5, np.nan, np.nan])
+
+if __name__ == "__main__":
+    unittest.main()
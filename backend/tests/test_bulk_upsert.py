@@ -0,0 +1,49 @@
+import datetime
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.app.db import Base
+from backend.app.models import SP500Data
+from backend.app.modules.bulk_upsert import upsert_rows
+
+UPDATE_COLUMNS = ["name", "open", "high", "low", "close", "adj_close", "volume"]
+
+
+def daily_row(day, close):
+    return {
+        "symbol": "AAPL", "name": "Apple", "date": datetime.date(2024, 1, day),
+        "open": close, "high": close, "low": close, "close": close,
+        "adj_close": close, "volume": 100,
+    }
+
+
+class TestBulkUpsert(unittest.TestCase):
+    """
+    Pruebas unitarias para el upsert en lote sobre SQLite.
+    """
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.session = sessionmaker(bind=engine)()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_inserts_and_updates_in_batches(self):
+        """
+        Verifica que las filas nuevas se insertan y las existentes se actualizan por (symbol, date).
+        """
+        table = SP500Data.__table__
+        upsert_rows(self.session, table, [daily_row(d, 1.0) for d in range(1, 6)],
+                    ["symbol", "date"], UPDATE_COLUMNS, batch_size=2)
+        upsert_rows(self.session, table, [daily_row(d, 2.0) for d in range(4, 9)],
+                    ["symbol", "date"], UPDATE_COLUMNS, batch_size=2)
+        self.session.commit()
+
+        closes = dict(self.session.query(SP500Data.date, SP500Data.close))
+        self.assertEqual(len(closes), 8)
+        self.assertEqual(closes[datetime.date(2024, 1, 3)], 1.0)
+        self.assertEqual(closes[datetime.date(2024, 1, 4)], 2.0)
+
+if __name__ == "__main__":
+    unittest.main()
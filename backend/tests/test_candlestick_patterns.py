@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from backend.app.modules.bar_store import BarStore
+from backend.app.modules.candlestick_patterns import (
+    PATTERNS, CandleStream, hits_from_masks, pattern_masks, scan_frame, scan_store,
+)
+from backend.tests.utils import random_walk
+
+
+def random_bars(symbol, periods=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    close = random_walk(rng, periods, 0.3)
+    open_ = close + rng.normal(0, 0.3, periods)
+    return pd.DataFrame({
+        "symbol": symbol,
+        "datetime": pd.date_range("2024-01-02 14:30", periods=periods, freq="5min"),
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.exponential(0.15, periods),
+        "low": np.minimum(open_, close) - rng.exponential(0.15, periods),
+        "close": close,
+        "volume": 100.0, "trade_count": 1, "vwap": close,
+    })
+
+
+class TestCandlestickPatterns(unittest.TestCase):
+    """
+    Pruebas unitarias para el escáner de patrones de velas.
+    """
+    def test_textbook_candles(self):
+        """
+        Verifica la detección de un martillo tras una caída y de una envolvente alcista.
+        """
+        # Caída de seis velas, martillo y después una envolvente alcista
+        open_ = [10.5, 10, 9.5, 9, 8.5, 8, 7.6, 7.55, 7.3]
+        close = [10, 9.6, 9.1, 8.6, 8.1, 7.6, 7.55, 7.4, 7.7]
+        high = [10.5, 10, 9.5, 9, 8.5, 8, 7.62, 7.55, 7.7]
+        low = [10, 9.6, 9.1, 8.6, 8.1, 7.6, 7.0, 7.3, 7.25]
+        masks = pattern_masks(open_, high, low, close)
+        self.assertEqual(np.flatnonzero(masks["HAMMER"]).tolist(), [6])
+        self.assertFalse(masks["HANGING_MAN"].any())
+        self.assertEqual(np.flatnonzero(masks["BULLISH_ENGULFING"]).tolist(), [8])
+
+    def test_thresholds_are_configurable(self):
+        """
+        Verifica que los umbrales de cuerpo cambian qué velas se consideran doji.
+        """
+        candle = ([10.0], [11.0], [9.0], [10.15])
+        self.assertTrue(pattern_masks(*candle, patterns=["DOJI"])["DOJI"][0])
+        self.assertFalse(pattern_masks(*candle, thresholds={"doji_body": 0.05}, patterns=["DOJI"])["DOJI"][0])
+
+    def test_stream_matches_vectorized_scan(self):
+        """
+        Verifica que la comprobación vela a vela coincide con las máscaras vectorizadas.
+        """
+        bars = random_bars("AAPL")
+        ohlc = [bars[name].to_numpy() for name in ("open", "high", "low", "close")]
+        masks = pattern_masks(*ohlc)
+        stream = CandleStream()
+        streamed = {name: np.zeros(len(bars), dtype=bool) for name in PATTERNS}
+        for i, bar in enumerate(zip(*ohlc)):
+            for name in stream.update(*bar):
+                streamed[name][i] = True
+        for name in PATTERNS:
+            np.testing.assert_array_equal(streamed[name], masks[name], err_msg=name)
+        self.assertTrue(all(masks[name].any() for name in ("DOJI", "HAMMER", "BEARISH_ENGULFING")))
+
+    def test_universe_scan_matches_matrix_and_does_not_cross_symbols(self):
+        """
+        Verifica que el escaneo concatenado por símbolos da los mismos aciertos que la matriz símbolos × velas.
+        """
+        data = pd.concat([random_bars(symbol, seed=seed) for seed, symbol in enumerate(["MSFT", "AAPL", "AMZN"])])
+        hits = scan_frame(data, chunk_symbols=2)
+
+        symbols = ["AAPL", "AMZN", "MSFT"]
+        wide = {name: data.pivot(index="datetime", columns="symbol", values=name)[symbols].to_numpy().T
+                for name in ("open", "high", "low", "close")}
+        times = np.sort(data["datetime"].unique())
+        expected = hits_from_masks(pattern_masks(wide["open"], wide["high"], wide["low"], wide["close"]),
+                                   symbols, times)
+        pd.testing.assert_frame_equal(hits, expected)
+        self.assertEqual(list(hits.columns), ["symbol", "datetime", "pattern"])
+
+    def test_scan_store_reads_columnar_bars(self):
+        """
+        Verifica que el escaneo del almacén columnar equivale al del DataFrame.
+        """
+        root = tempfile.mkdtemp()
+        try:
+            store = BarStore(root, "intraday")
+            data = pd.concat([random_bars("AAPL", 500, 1), random_bars("MSFT", 400, 2)])
+            for symbol, frame in data.groupby("symbol"):
+                store.write_frame(symbol, frame)
+            pd.testing.assert_frame_equal(scan_store(store), scan_frame(data))
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    unittest.main()
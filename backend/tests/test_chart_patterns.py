@@ -0,0 +1,123 @@
+import json
+import unittest
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.app.models import ChartPattern, ChartPatternState, SP500Data
+from backend.app.modules.chart_patterns import (
+    DAILY_TIMEFRAME, ChartPatternDetector, apply_bars, detect_chart_patterns, scan_stored_bars, update_chart_patterns,
+)
+from backend.app.modules.intraday_storage import create_intraday_table, write_intraday_bars
+
+
+def path_bars(turning_points, steps=20, symbol="AAPL", freq="5min"):
+    """Velas que recorren en línea recta los puntos de giro dados, con un rango fijo de 0.1."""
+    segments = [np.linspace(a, b, steps, endpoint=False) for a, b in zip(turning_points, turning_points[1:])]
+    close = np.concatenate(segments + [[turning_points[-1]]])
+    return pd.DataFrame({
+        "symbol": symbol, "timeframe": "5Min",
+        "datetime": pd.date_range("2024-01-02 14:30", periods=len(close), freq=freq),
+        "open": close, "high": close + 0.05, "low": close - 0.05, "close": close,
+        "volume": 100.0, "trade_count": 1, "vwap": close,
+    })
+
+
+class TestChartPatterns(unittest.TestCase):
+    """
+    Pruebas unitarias para la detección de pivotes y patrones de gráfico.
+    """
+    def test_zigzag_finds_turning_points(self):
+        """
+        Verifica que el zig-zag confirma como pivotes los puntos de giro de la serie.
+        """
+        bars = path_bars([90, 100, 95, 105, 92])
+        detector = ChartPatternDetector()
+        apply_bars(detector, bars)
+        self.assertEqual([(kind, round(price, 2)) for _, _, price, kind in detector.pivots],
+                         [("L", 89.95), ("H", 100.05), ("L", 94.95), ("H", 105.05)])
+
+    def test_templates(self):
+        """
+        Verifica la detección de hombro-cabeza-hombro, triángulo ascendente y bandera alcista.
+        """
+        cases = {
+            "HEAD_AND_SHOULDERS": [90, 100, 95, 105, 95.5, 100.5, 90],
+            "INVERSE_HEAD_AND_SHOULDERS": [110, 100, 105, 95, 104.5, 99.5, 110],
+            "ASCENDING_TRIANGLE": [90, 100, 94, 100.2, 97, 100.1, 90],
+            "BULL_FLAG": [80, 100, 96, 98.5, 95, 110],
+        }
+        for pattern, points in cases.items():
+            found = set(detect_chart_patterns(path_bars(points))["pattern"])
+            self.assertIn(pattern, found, msg=pattern)
+        self.assertNotIn("HEAD_AND_SHOULDERS", set(detect_chart_patterns(path_bars(cases["BULL_FLAG"]))["pattern"]))
+
+    def test_checkpoint_continues_identically(self):
+        """
+        Verifica que un detector restaurado desde JSON detecta lo mismo que uno sin interrupción.
+        """
+        rng = np.random.default_rng(4)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, 5000)))
+        bars = pd.DataFrame({"datetime": pd.date_range("2024-01-02", periods=len(close), freq="5min"),
+                             "high": close * 1.001, "low": close * 0.999, "close": close})
+        expected = apply_bars(ChartPatternDetector(), bars)
+
+        first = ChartPatternDetector()
+        matches = apply_bars(first, bars.iloc[:2500])
+        restored = ChartPatternDetector.from_state(json.loads(json.dumps(first.to_state())), first.last_datetime)
+        matches += apply_bars(restored, bars.iloc[2400:])  # El solapamiento se ignora
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(matches, expected)
+
+    def test_update_persists_patterns_and_state(self):
+        """
+        Verifica que las velas nuevas actualizan los patrones y el estado guardados sin duplicar filas.
+        """
+        engine = create_engine("sqlite://")
+        create_intraday_table(engine)
+        ChartPattern.__table__.create(engine)
+        ChartPatternState.__table__.create(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            bars = path_bars([90, 100, 95, 105, 95.5, 100.5, 90])
+            write_intraday_bars(session, bars.iloc[:-10])
+            session.commit()
+            update_chart_patterns(session, bars.iloc[-20:-10])  # Sin estado: se inicializa con la historia
+            session.commit()
+            self.assertIn("HEAD_AND_SHOULDERS", {row.pattern for row in session.query(ChartPattern)})
+
+            new = update_chart_patterns(session, bars.iloc[-15:])
+            session.commit()
+            self.assertTrue(new.empty)
+            self.assertEqual(session.query(ChartPatternState).one().last_datetime,
+                             bars["datetime"].iloc[-1].to_pydatetime())
+            self.assertEqual(session.query(ChartPattern).count(),
+                             len(detect_chart_patterns(bars)))
+        finally:
+            session.close()
+
+    def test_scan_stored_daily_bars_is_incremental(self):
+        """
+        Verifica que el escaneo de velas diarias solo procesa las velas posteriores al estado guardado.
+        """
+        engine = create_engine("sqlite://")
+        for model in (SP500Data, ChartPattern, ChartPatternState):
+            model.__table__.create(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            bars = path_bars([110, 100, 105, 95, 104.5, 99.5, 110], freq="D")
+            daily = bars.assign(date=bars["datetime"].dt.date, name="Apple", adj_close=bars["close"], volume=100)
+            daily[["symbol", "name", "date", "open", "high", "low", "close", "adj_close", "volume"]].to_sql(
+                "sp500_data", engine, if_exists="append", index=False)
+
+            first = scan_stored_bars(session, DAILY_TIMEFRAME)
+            self.assertGreater(first["AAPL"], 0)
+            self.assertEqual(scan_stored_bars(session, DAILY_TIMEFRAME), {"AAPL": 0})
+            patterns = {row.pattern for row in session.query(ChartPattern).filter_by(timeframe=DAILY_TIMEFRAME)}
+            self.assertIn("INVERSE_HEAD_AND_SHOULDERS", patterns)
+        finally:
+            session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import json
+import threading
+import unittest
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+from backend.app.modules.concurrent_ingestion import TokenBucket, run_concurrent_ingestion
+
+FAKE_BARS = {
+    "AAA": 3,
+    "BBB": 5,
+    "CCC": 0,  # Símbolo sin datos
+}
+PAGE_SIZE = 2  # Barras por página: AAA necesita 2 peticiones y BBB 3
+
+
+class FakeBarsHandler(BaseHTTPRequestHandler):
+    """Servidor local que imita la API de barras paginada: GET /bars/<symbol>?page=<n>."""
+    def do_GET(self):
+        path, _, page = self.path.partition("?page=")
+        symbol, page = path.rsplit("/", 1)[-1], int(page or 0)
+        if symbol not in FAKE_BARS:
+            self.send_response(500)
+            self.end_headers()
+            return
+        bars = [
+            {"t": f"2024-01-02T14:{30 + 5 * i}:00Z", "o": 1.0, "h": 2.0, "l": 0.5, "c": 1.5, "v": 100}
+            for i in range(FAKE_BARS[symbol])
+        ][page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        next_page = page + 1 if (page + 1) * PAGE_SIZE < FAKE_BARS[symbol] else None
+        body = json.dumps({"bars": bars, "next_page": next_page}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSession:
+    def close(self):
+        pass
+
+
+class TestTokenBucket(unittest.TestCase):
+    """
+    Pruebas unitarias para el limitador de peticiones.
+    """
+    def test_waits_when_bucket_is_empty(self):
+        """
+        Verifica que, agotada la ráfaga, cada petición espera 1/rate segundos.
+        """
+        now = [0.0]
+        bucket = TokenBucket(2.0, capacity=2, clock=lambda: now[0],
+                             sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+        waits = [bucket.acquire() for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.5)
+        self.assertAlmostEqual(now[0], 1.0)
+
+
+class TestConcurrentIngestion(unittest.TestCase):
+    """
+    Pruebas de la ingesta concurrente contra un servidor local de barras.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBarsHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def get_page(self, symbol, page):
+        with urllib.request.urlopen(f"{self.base_url}/bars/{symbol}?page={page}", timeout=5) as response:
+            return json.load(response)
+
+    def fetch(self, symbol, get_page=None):
+        """Descarga todas las páginas de un símbolo; `get_page` hace cada petición HTTP."""
+        get_page = get_page or self.get_page
+        bars, page = [], 0
+        while page is not None:
+            body = get_page(symbol, page)
+            bars.extend(body["bars"])
+            page = body["next_page"]
+        return pd.DataFrame(bars)
+
+    def test_pipeline_reports_per_symbol_stats(self):
+        """
+        Verifica que se escriben todos los símbolos con datos y que los errores quedan aislados.
+        """
+        written = {}
+
+        def write_batch(session, batch):
+            for symbol, data in batch:
+                written[symbol] = len(data)
+            return dict(written)
+
+        report = run_concurrent_ingestion(
+            ["AAA", "BBB", "CCC", "ERR"], self.fetch, write_batch, FakeSession,
+            workers=3, queue_size=1, batch_rows=4, flush_seconds=0.05,
+        )
+        report = report.set_index("symbol")
+
+        self.assertEqual(written, {"AAA": 3, "BBB": 5})
+        self.assertEqual(report.loc["AAA", "status"], "ok")
+        self.assertEqual(report.loc["BBB", "rows_written"], 5)
+        self.assertEqual(report.loc["CCC", "status"], "empty")
+        self.assertEqual(report.loc["ERR", "status"], "fetch_error")
+
+    def test_write_errors_mark_the_whole_batch(self):
+        """
+        Verifica que un fallo del escritor se refleja en las estadísticas sin abortar la ingesta.
+        """
+        def write_batch(session, batch):
+            raise RuntimeError("db down")
+
+        report = run_concurrent_ingestion(["AAA", "BBB"], self.fetch, write_batch, FakeSession,
+                                          workers=2, flush_seconds=0.05)
+        self.assertEqual(set(report["status"]), {"write_error"})
+
+    def test_rate_limiter_charges_every_http_request(self):
+        """
+        Verifica que el limitador consume un token por petición HTTP (cada página), no por símbolo.
+        """
+        bucket = TokenBucket(1.0, capacity=100, clock=lambda: 0.0)
+        get_page = bucket.limit(self.get_page)
+        run_concurrent_ingestion(["AAA", "BBB", "CCC", "ERR"], lambda symbol: self.fetch(symbol, get_page),
+                                 lambda session, batch: {}, FakeSession, workers=2, flush_seconds=0.05)
+        self.assertAlmostEqual(bucket._tokens, 100 - (2 + 3 + 1 + 1))
+
+    def test_writer_failure_does_not_block_fetchers(self):
+        """
+        Verifica que si el escritor muere los descargadores no se quedan bloqueados en la cola
+        llena y los símbolos sin guardar se marcan como error.
+        """
+        def broken_session_factory():
+            raise RuntimeError("no connection")
+
+        def fetch(symbol):
+            return pd.DataFrame({"close": [1.0]})
+
+        symbols = [f"S{i}" for i in range(20)]
+        outcome = {}
+        runner = threading.Thread(target=lambda: outcome.update(report=run_concurrent_ingestion(
+            symbols, fetch, lambda session, batch: {}, broken_session_factory, workers=4, queue_size=1,
+            flush_seconds=0.05,
+        )), daemon=True)
+        runner.start()
+        runner.join(timeout=10)
+        self.assertFalse(runner.is_alive(), "la ingesta quedó bloqueada tras morir el escritor")
+        report = outcome["report"]
+        self.assertEqual(set(report["status"]), {"write_error"})
+        self.assertIn("no connection", report["error"].iloc[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import datetime
+import os
+import tempfile
+import unittest
+import pandas as pd
+from sqlalchemy import create_engine
+from backend.app.modules.data_quality import (
+    compare_intraday_with_daily, inconsistent_dates, run_streaming_quality_report, summarize_intraday_sessions,
+    summarize_symbol_intraday,
+)
+from backend.app.modules.market_calendar import expected_index
+
+
+def intraday(symbol, start, end):
+    index = expected_index(start, end).tz_localize(None)
+    close = pd.Series(range(len(index)), dtype=float) + 100
+    return pd.DataFrame({
+        "symbol": symbol, "datetime": index, "open": close - 0.5, "high": close + 1,
+        "low": close - 1, "close": close, "volume": 10.0,
+    })
+
+
+class TestDataQuality(unittest.TestCase):
+    """
+    Pruebas unitarias para la comparación vectorizada entre datos intradía y diarios.
+    """
+    def setUp(self):
+        # Se añade una vela fuera de sesión (20:00 hora de Nueva York) que no debe contar
+        after_hours = pd.DataFrame({
+            "symbol": ["AAPL"], "datetime": [pd.Timestamp("2024-01-03 01:00")],
+            "open": [1.0], "high": [999.0], "low": [1.0], "close": [1.0], "volume": [1.0],
+        })
+        self.intraday = pd.concat([
+            intraday("MSFT", "2024-01-02", "2024-01-04"),
+            intraday("AAPL", "2024-01-02", "2024-01-04"),
+            after_hours,
+        ], ignore_index=True).sample(frac=1, random_state=1)
+
+    def test_summary_uses_session_date_and_last_close(self):
+        """
+        Verifica el resumen por símbolo y sesión ignorando velas fuera de horario.
+        """
+        summary = summarize_intraday_sessions(self.intraday)
+        aapl = summary[summary["symbol"] == "AAPL"].sort_values("date")
+        self.assertEqual(aapl["bars"].tolist(), [78, 78])
+        self.assertEqual(aapl["intraday_close"].tolist(), [177.0, 255.0])
+        self.assertEqual(aapl["intraday_high"].tolist(), [178.0, 256.0])
+        self.assertEqual(aapl["intraday_volume"].tolist(), [780.0, 780.0])
+
+    def test_flags_mismatches_with_tolerances(self):
+        """
+        Verifica las marcas de cierre, volumen y días sin datos intradía.
+        """
+        daily = pd.DataFrame({
+            "symbol": ["AAPL", "AAPL", "AAPL", "MSFT"],
+            "date": [datetime.date(2024, 1, 2), datetime.date(2024, 1, 3), datetime.date(2024, 1, 4),
+                     datetime.date(2024, 1, 2)],
+            "high": [178.0, 256.0, 1.0, 178.0], "low": [99.0, 177.0, 1.0, 99.0],
+            "close": [177.005, 255.5, 1.0, 177.0], "volume": [780, 780, 1, 2000],
+        })
+        flags = compare_intraday_with_daily(self.intraday, daily, volume_tolerance=0.5)
+        self.assertEqual(flags["close_mismatch"].tolist(), [False, True, False, False])
+        self.assertEqual(flags["missing_intraday"].tolist(), [False, False, True, False])
+        self.assertEqual(flags["volume_mismatch"].tolist(), [False, False, False, True])
+        self.assertEqual(inconsistent_dates(flags), {
+            "AAPL": [datetime.date(2024, 1, 3), datetime.date(2024, 1, 4)],
+            "MSFT": [datetime.date(2024, 1, 2)],
+        })
+
+class TestStreamingQualityReport(unittest.TestCase):
+    """
+    Pruebas unitarias para el reporte de calidad por símbolo con escritura incremental.
+    """
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        self.directory = tempfile.TemporaryDirectory()
+        self.report_path = os.path.join(self.directory.name, "quality_report.csv")
+
+        bars = pd.concat([
+            intraday("AAPL", "2024-01-02", "2024-01-04"),
+            intraday("MSFT", "2024-01-02", "2024-01-04").drop(index=[10, 11]),  # Sesión incompleta
+        ], ignore_index=True).assign(timeframe="5Min")
+        bars.to_sql("sp500_intraday_data", self.engine, index=False)
+        pd.DataFrame({
+            "symbol": ["AAPL", "AAPL", "MSFT", "MSFT"],
+            "date": [datetime.date(2024, 1, 2), datetime.date(2024, 1, 3)] * 2,
+            "high": 0.0, "low": 0.0, "close": [177.0, 255.0, 177.0, 255.0], "volume": 0,
+        }).to_sql("sp500_data", self.engine, index=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_report_and_filtered_table_are_written_per_symbol(self):
+        """
+        Verifica el reporte por símbolo y que solo los símbolos recuperables pasan a la tabla filtrada.
+        """
+        report = run_streaming_quality_report(self.engine, self.report_path, filtered_table="filtered",
+                                              resume=False, chunksize=50)
+        self.assertEqual(report["symbol"].tolist(), ["AAPL", "MSFT"])
+        self.assertEqual(report["status"].tolist(), ["ok", "problematic"])
+        self.assertEqual(report["incomplete_days"].tolist(), [0, 1])
+
+        stored = pd.read_sql("SELECT symbol, COUNT(*) AS bars FROM filtered GROUP BY symbol", self.engine)
+        self.assertEqual(stored.values.tolist(), [["AAPL", 156], ["MSFT", 154]])
+
+    def test_chunked_summary_matches_full_summary(self):
+        """
+        Verifica que resumir por bloques (con sesiones partidas entre bloques) da lo mismo que
+        resumir todas las velas de una vez.
+        """
+        summary, rows = summarize_symbol_intraday(self.engine, "MSFT", chunksize=50)
+        full = summarize_intraday_sessions(pd.read_sql(
+            "SELECT * FROM sp500_intraday_data WHERE symbol = 'MSFT'", self.engine, parse_dates=["datetime"]))
+        self.assertEqual(rows, 154)
+        pd.testing.assert_frame_equal(summary, full)
+
+    def test_resume_skips_finished_symbols(self):
+        """
+        Verifica que al reanudar solo se procesan los símbolos que faltan en el reporte.
+        """
+        run_streaming_quality_report(self.engine, self.report_path, resume=False, symbols=["AAPL"])
+        report = run_streaming_quality_report(self.engine, self.report_path, resume=True)
+        self.assertEqual(report["symbol"].tolist(), ["AAPL", "MSFT"])
+
+if __name__ == "__main__":
+    unittest.main()
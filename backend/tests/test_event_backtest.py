@@ -0,0 +1,145 @@
+import time
+import unittest
+import numpy as np
+import pandas as pd
+from backend.app.modules.event_backtest import LIMIT, Strategy, run_event_backtest, window_mask
+
+
+def session_bars(rows, start="2024-01-02 14:30"):
+    """Velas de 5 minutos desde `start` (UTC) con filas (open, high, low, close)."""
+    frame = pd.DataFrame(rows, columns=["open", "high", "low", "close"], dtype=float)
+    frame.insert(0, "datetime", pd.date_range(start, periods=len(frame), freq="5min"))
+    frame["volume"] = 100.0
+    return frame
+
+
+class ScriptedStrategy(Strategy):
+    """Ejecuta en cada vela las acciones programadas para ella."""
+    def __init__(self, actions, wake=None):
+        self.actions = actions
+        self.wake = wake
+        self.visited = []
+        self.fills = []
+
+    def on_bar(self, ctx, i):
+        self.visited.append(i)
+        if i in self.actions:
+            self.actions[i](ctx)
+
+    def on_fill(self, ctx, fill):
+        self.fills.append(fill)
+
+
+class TestEventBacktest(unittest.TestCase):
+    """
+    Pruebas unitarias para el backtester por eventos.
+    """
+    def test_bracket_take_profit_and_stop(self):
+        """
+        Verifica la entrada de mercado en la apertura siguiente y la salida por objetivo o por stop.
+        """
+        rows = [(100, 100.5, 99.5, 100), (100.2, 101, 99.8, 100.5), (100.5, 102.5, 100.4, 102), (102, 102, 101, 101)]
+        strategy = ScriptedStrategy({0: lambda ctx: ctx.bracket(1, 10, take_profit=102, stop_loss=99)})
+        result = run_event_backtest(session_bars(rows), strategy, commission=0.0, slippage=0.0)
+        self.assertEqual([(bar, side, price) for bar, _, side, _, price, _ in strategy.fills],
+                         [(1, 1, 100.2), (2, -1, 102.0)])
+        trade = result.trades.iloc[0]
+        self.assertAlmostEqual(trade["pnl"], 18.0)
+        self.assertAlmostEqual(result.equity[-1], 10018.0)
+        self.assertEqual(result.metrics.iloc[0]["trades"], 1)
+
+        # Si el stop abre con hueco se ejecuta en la apertura, con deslizamiento
+        rows[2] = (98.5, 99, 98, 98.8)
+        strategy = ScriptedStrategy({0: lambda ctx: ctx.bracket(1, 10, take_profit=102, stop_loss=99)})
+        result = run_event_backtest(session_bars(rows), strategy, commission=0.0, slippage=0.001)
+        self.assertEqual(strategy.fills[-1][0], 2)
+        self.assertAlmostEqual(strategy.fills[-1][4], 98.5 * 0.999)
+        self.assertLess(result.trades.iloc[0]["pnl"], 0)
+
+    def test_intrabar_path_decides_oco(self):
+        """
+        Verifica que, si la vela toca objetivo y stop, gana el extremo más cercano a la apertura.
+        """
+        rows = [(100, 100, 100, 100), (100, 100, 100, 100), (100, 103, 98.5, 101)]
+        for open_, expected in ((101.5, 102.0), (99.5, 99.0)):
+            rows[2] = (open_, 103, 98.5, 101)
+            strategy = ScriptedStrategy({0: lambda ctx: ctx.bracket(1, 1, take_profit=102, stop_loss=99)})
+            run_event_backtest(session_bars(rows), strategy, commission=0.0, slippage=0.0)
+            self.assertEqual(len(strategy.fills), 2)
+            self.assertEqual(strategy.fills[-1][4], expected)
+
+    def test_limit_order_fills_at_level_or_better_open(self):
+        """
+        Verifica que una compra límite se ejecuta a su precio, o en la apertura si abre por debajo.
+        """
+        rows = [(100, 100, 100, 100), (100, 100.5, 99.8, 100), (99.5, 99.9, 99.2, 99.6), (99, 99.5, 98.8, 99)]
+        strategy = ScriptedStrategy({0: lambda ctx: ctx.buy(5, LIMIT, 99.7), 2: lambda ctx: ctx.buy(5, LIMIT, 99.4)})
+        run_event_backtest(session_bars(rows), strategy, commission=0.0, slippage=0.0)
+        self.assertEqual([(bar, price) for bar, _, _, _, price, _ in strategy.fills[:2]], [(2, 99.5), (3, 99.0)])
+
+    def test_session_close_flattens_and_cancels(self):
+        """
+        Verifica que la última vela de la sesión cierra la posición al cierre y cancela las órdenes.
+        """
+        rows = [(100, 100, 100, 100)] * 78 + [(101, 101, 101, 101)] * 3
+        strategy = ScriptedStrategy({0: lambda ctx: (ctx.buy(10), ctx.sell(10, LIMIT, 200))})
+        result = run_event_backtest(session_bars(rows), strategy, commission=0.0, slippage=0.0)
+        self.assertEqual([(bar, side) for bar, _, side, _, _, _ in strategy.fills], [(1, 1), (77, -1)])
+        self.assertEqual(len(result.fills), 2)
+        self.assertEqual(result.trades.iloc[0]["exit_index"], 77)
+
+        # Ventana propia: de 10:00 a 10:30 de Nueva York
+        tradable, _ = window_mask(session_bars(rows)["datetime"], ("10:00", "10:30"))
+        self.assertEqual(np.flatnonzero(tradable).tolist(), list(range(6, 12)))
+        strategy = ScriptedStrategy({6: lambda ctx: ctx.buy(10)})
+        result = run_event_backtest(session_bars(rows), strategy, window=("10:00", "10:30"), slippage=0.0)
+        self.assertEqual(result.trades.iloc[0]["exit_index"], 11)
+        self.assertEqual(strategy.visited, list(range(6, 12)))
+
+    def test_zero_quantity_sends_no_order(self):
+        """
+        Verifica que una cantidad redondeada a 0 no envía orden y que una negativa se rechaza.
+        """
+        rows = [(100, 100, 100, 100)] * 78
+        strategy = ScriptedStrategy({0: lambda ctx: (ctx.buy(ctx.shares_for(1e-6)), ctx.sell(0),
+                                                     ctx.bracket(1, 0, take_profit=102, stop_loss=99))})
+        result = run_event_backtest(session_bars(rows), strategy, initial_capital=1000.0)
+        self.assertEqual(len(result.fills), 0)
+        self.assertEqual(len(result.trades), 0)
+
+        strategy = ScriptedStrategy({0: lambda ctx: ctx.buy(-5)})
+        with self.assertRaises(ValueError):
+            run_event_backtest(session_bars(rows), strategy)
+
+    def test_idle_bars_are_skipped(self):
+        """
+        Verifica que sin posición ni órdenes solo se visitan las velas de despertar, y el rendimiento.
+        """
+        rng = np.random.default_rng(2)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, 78 * 250)))
+        start = pd.Timestamp("2024-01-02 14:30")
+        days = pd.bdate_range("2024-01-02", periods=400)
+        times = np.concatenate([pd.date_range(day + (start - start.normalize()), periods=78, freq="5min")
+                                for day in days])[:len(close)]
+        bars = pd.DataFrame({"datetime": times, "open": close, "high": close * 1.002, "low": close * 0.998,
+                             "close": close, "volume": 100.0})
+        wake = np.zeros(len(bars), dtype=bool)
+        wake[::780] = True  # Una señal cada diez sesiones
+
+        def enter(ctx):
+            ctx.bracket(1, ctx.shares_for(1.0), take_profit=ctx.close[ctx.bar] * 1.01,
+                        stop_loss=ctx.close[ctx.bar] * 0.99)
+
+        actions = {i: enter for i in np.flatnonzero(wake).tolist()}
+        strategy = ScriptedStrategy(actions, wake=wake)
+        started = time.perf_counter()
+        result = run_event_backtest(bars, strategy)
+        elapsed = time.perf_counter() - started
+        self.assertLess(len(strategy.visited), len(bars) // 5)
+        self.assertGreater(len(result.trades), 0)
+        self.assertTrue((result.trades["exit_index"] >= result.trades["entry_index"]).all())
+        self.assertLess(elapsed, 5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
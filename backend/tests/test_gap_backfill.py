@@ -0,0 +1,41 @@
+import unittest
+import pandas as pd
+from backend.app.modules.gap_backfill import coalesce_gaps, find_missing_timestamps, plan_backfill_requests
+from backend.app.modules.market_calendar import expected_index
+
+
+class TestGapBackfill(unittest.TestCase):
+    """
+    Pruebas unitarias para la detección y agrupación de lagunas intradía.
+    """
+    def test_missing_timestamps_are_coalesced_into_ranges(self):
+        """
+        Verifica que las velas faltantes consecutivas forman un único rango.
+        """
+        expected = expected_index("2024-01-02", "2024-01-04")
+        available = expected.delete([3, 4, 5, 40])
+        missing = find_missing_timestamps(available.tz_localize(None), expected[0], expected[-1])
+        gaps = coalesce_gaps(missing)
+        self.assertEqual(gaps["bars"].tolist(), [3, 1])
+        self.assertEqual(gaps["start"][0], expected[3])
+        self.assertEqual(gaps["end"][0], expected[5])
+
+    def test_plan_merges_ranges_and_symbols(self):
+        """
+        Verifica que rangos cercanos y símbolos con ventanas solapadas comparten petición.
+        """
+        ts = lambda value: pd.Timestamp(value, tz="UTC")
+        gaps = pd.DataFrame({
+            "symbol": ["AAPL", "AAPL", "MSFT", "XOM"],
+            "start": [ts("2024-01-02 15:00"), ts("2024-01-02 18:00"), ts("2024-01-02 16:00"), ts("2024-06-03 15:00")],
+            "end": [ts("2024-01-02 15:10"), ts("2024-01-02 18:00"), ts("2024-01-02 16:00"), ts("2024-06-03 15:00")],
+        })
+        requests = plan_backfill_requests(gaps)
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests[0]["symbols"], ["AAPL", "MSFT"])
+        self.assertEqual(requests[0]["start"], ts("2024-01-02 15:00"))
+        self.assertEqual(requests[0]["end"], ts("2024-01-02 18:05"))
+        self.assertEqual(requests[1]["symbols"], ["XOM"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from backend.app.modules.indicator_cache import INDICATOR_SPECS, IndicatorCache
+from backend.tests.utils import sample_bars
+
+
+PARAMS = {
+    "SMA": (50,), "EMA": (20,), "RSI": (14,), "MACD": (12, 26, 9), "ATR": (14,), "PSAR": (0.02, 0.2),
+    "VWAP": (), "BOLLINGER": (20, 2), "FIBONACCI": (100,),
+}
+
+
+class TestIndicatorCache(unittest.TestCase):
+    """
+    Pruebas unitarias para la caché de indicadores en memoria y disco.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.bars = sample_bars()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_repeated_request_is_a_hit(self):
+        """
+        Verifica que una segunda petición con las mismas velas se sirve desde memoria.
+        """
+        cache = IndicatorCache(disk_dir=self.directory)
+        first = cache.get("AAPL", "5Min", "SMA", (50,), self.bars)
+        second = cache.get("AAPL", "5Min", "SMA", (50,), self.bars)
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_extension_matches_full_recompute(self):
+        """
+        Verifica que extender con velas nuevas da lo mismo que recalcular toda la serie.
+        """
+        self.assertEqual(set(PARAMS), set(INDICATOR_SPECS))
+        cache = IndicatorCache(disk_dir=None)
+        for indicator, params in PARAMS.items():
+            cache.get("AAPL", "5Min", indicator, params, self.bars.iloc[:250])
+            cache.get("AAPL", "5Min", indicator, params, self.bars.iloc[:320])
+            extended = cache.get("AAPL", "5Min", indicator, params, self.bars)
+            full = IndicatorCache(disk_dir=None).get("AAPL", "5Min", indicator, params, self.bars)
+            np.testing.assert_allclose(extended, full, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=indicator)
+        self.assertEqual(cache.stats()["extensions"], 2 * len(PARAMS))
+
+    def test_changed_history_is_recomputed(self):
+        """
+        Verifica que si cambian velas ya cacheadas la serie se recalcula en lugar de extenderse.
+        """
+        cache = IndicatorCache(disk_dir=None)
+        cache.get("AAPL", "5Min", "SMA", (5,), self.bars)
+        shifted = self.bars.assign(datetime=self.bars["datetime"] + pd.Timedelta(days=1))
+        cache.get("AAPL", "5Min", "SMA", (5,), shifted)
+        self.assertEqual(cache.stats()["misses"], 2)
+        self.assertEqual(cache.stats()["extensions"], 0)
+
+    def test_restated_bars_are_not_served_stale(self):
+        """
+        Verifica que si el proveedor corrige velas ya cacheadas (mismas fechas) la serie se
+        recalcula, tanto al repetir la petición como al extenderla con velas nuevas.
+        """
+        cache = IndicatorCache(disk_dir=self.directory)
+        cache.get("AAPL", "5Min", "EMA", (20,), self.bars.iloc[:300])
+        restated = self.bars.copy()
+        restated.loc[297:299, "close"] += 5.0
+
+        for bars in (restated.iloc[:300], restated):
+            served = IndicatorCache(disk_dir=self.directory).get("AAPL", "5Min", "EMA", (20,), bars)
+            full = IndicatorCache(disk_dir=None).get("AAPL", "5Min", "EMA", (20,), bars)
+            np.testing.assert_allclose(served, full, equal_nan=True)
+
+        cache.get("AAPL", "5Min", "EMA", (20,), restated.iloc[:300])
+        stats = cache.stats()
+        self.assertEqual((stats["restated"], stats["hits"], stats["misses"]), (1, 0, 2))
+
+    def test_lru_eviction_respects_byte_budget(self):
+        """
+        Verifica que el nivel en memoria desaloja la entrada menos usada al superar el presupuesto.
+        """
+        cache = IndicatorCache(max_bytes=2 * 2 * 8 * len(self.bars), disk_dir=None)
+        cache.get("AAPL", "5Min", "SMA", (10,), self.bars)
+        cache.get("AAPL", "5Min", "SMA", (20,), self.bars)
+        cache.get("AAPL", "5Min", "SMA", (10,), self.bars)
+        cache.get("AAPL", "5Min", "SMA", (30,), self.bars)
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertLessEqual(stats["bytes"], cache.max_bytes)
+        cache.get("AAPL", "5Min", "SMA", (10,), self.bars)
+        self.assertEqual(cache.stats()["hits"], 2)
+
+    def test_disk_tier_survives_new_instance(self):
+        """
+        Verifica que una instancia nueva recupera del disco la serie y su estado incremental.
+        """
+        cache = IndicatorCache(disk_dir=self.directory)
+        cache.get("AAPL", "5Min", "RSI", (14,), self.bars.iloc[:300])
+        cache.get("AAPL", "5Min", "RSI", (14,), self.bars.iloc[:350])
+
+        reloaded = IndicatorCache(disk_dir=self.directory)
+        extended = reloaded.get("AAPL", "5Min", "RSI", (14,), self.bars)
+        full = IndicatorCache(disk_dir=None).get("AAPL", "5Min", "RSI", (14,), self.bars)
+        np.testing.assert_allclose(extended, full, equal_nan=True)
+        stats = reloaded.stats()
+        self.assertEqual((stats["disk_hits"], stats["extensions"], stats["misses"]), (1, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
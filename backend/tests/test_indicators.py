@@ -0,0 +1,152 @@
+import unittest
+import numpy as np
+import pandas as pd
+from backend.app.modules.indicators import (
+    atr, bollinger_bands, ema, fibonacci_levels, indicator_panel, macd, parabolic_sar, rolling_max, rolling_min,
+    rsi, sma, to_matrix, vwap,
+)
+from backend.tests.utils import random_walk
+
+
+def random_series(symbols=3, bars=400, seed=7):
+    rng = np.random.default_rng(seed)
+    close = random_walk(rng, (symbols, bars))
+    high = close + rng.uniform(0, 1, close.shape)
+    low = close - rng.uniform(0, 1, close.shape)
+    volume = rng.uniform(100, 1000, close.shape)
+    return high, low, close, volume
+
+
+def reference_psar(high, low, step=0.02, max_step=0.2):
+    """Implementación directa del SAR parabólico para una sola serie."""
+    out = [np.nan]
+    long, sar, extreme, factor = True, low[0], high[0], step
+    for t in range(1, len(high)):
+        candidate = sar + factor * (extreme - sar)
+        if long:
+            candidate = min([candidate, low[t - 1]] + ([low[t - 2]] if t >= 2 else []))
+            if low[t] < candidate:
+                long, candidate, extreme, factor = False, extreme, low[t], step
+            elif high[t] > extreme:
+                extreme, factor = high[t], min(factor + step, max_step)
+        else:
+            candidate = max([candidate, high[t - 1]] + ([high[t - 2]] if t >= 2 else []))
+            if high[t] > candidate:
+                long, candidate, extreme, factor = True, extreme, high[t], step
+            elif low[t] < extreme:
+                extreme, factor = low[t], min(factor + step, max_step)
+        sar = candidate
+        out.append(sar)
+    return np.array(out)
+
+
+class TestIndicators(unittest.TestCase):
+    """
+    Pruebas unitarias del motor de indicadores contra implementaciones de referencia.
+    """
+    def setUp(self):
+        self.high, self.low, self.close, self.volume = random_series()
+
+    def assertMatches(self, actual, expected):
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+    def test_moving_averages_match_pandas(self):
+        """
+        Verifica SMA, EMA y Bandas de Bollinger frente a pandas, fila a fila.
+        """
+        upper = bollinger_bands(self.close, 20, 2.0)[1]
+        for row in range(self.close.shape[0]):
+            series = pd.Series(self.close[row])
+            self.assertMatches(sma(self.close, 50)[row], series.rolling(50).mean())
+            reference = series.ewm(span=20, adjust=False).mean()
+            reference[:19] = np.nan
+            self.assertMatches(ema(self.close, span=20)[row], reference)
+            self.assertMatches(upper[row], series.rolling(20).mean() + 2 * series.rolling(20).std(ddof=0))
+
+    def test_oscillators_match_reference(self):
+        """
+        Verifica RSI, MACD y ATR de Wilder frente a pandas.
+        """
+        series = pd.Series(self.close[0])
+        delta = series.diff()
+        gains = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        losses = (-delta).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        reference = 100 - 100 / (1 + gains / losses)
+        reference[:14] = np.nan
+        self.assertMatches(rsi(self.close)[0], reference)
+
+        line, signal, hist = macd(self.close)
+        reference = series.ewm(span=12, adjust=False).mean() - series.ewm(span=26, adjust=False).mean()
+        self.assertTrue(np.isnan(line[0, :25]).all())
+        self.assertMatches(line[0, 25:], reference[25:])
+        self.assertMatches(hist, line - signal)
+
+        high, low = pd.Series(self.high[0]), pd.Series(self.low[0])
+        previous = series.shift()
+        true_range = pd.concat([high - low, (high - previous).abs(), (low - previous).abs()], axis=1).max(axis=1)
+        reference = true_range.ewm(alpha=1 / 14, adjust=False).mean()
+        reference[:13] = np.nan
+        self.assertMatches(atr(self.high, self.low, self.close)[0], reference)
+
+    def test_parabolic_sar_matches_scalar_loop(self):
+        """
+        Verifica el SAR parabólico vectorizado frente a un bucle directo por símbolo.
+        """
+        sar = parabolic_sar(self.high, self.low)
+        for row in range(self.close.shape[0]):
+            self.assertMatches(sar[row], reference_psar(self.high[row], self.low[row]))
+
+    def test_vwap_resets_each_session(self):
+        """
+        Verifica que el VWAP se reinicia al cambiar de sesión.
+        """
+        sessions = np.repeat([0, 1], 200)
+        result = vwap(self.high, self.low, self.close, self.volume, sessions)
+        typical = (self.high + self.low + self.close) / 3
+        second = slice(200, 400)
+        expected = np.cumsum(typical[:, second] * self.volume[:, second], axis=1) / np.cumsum(self.volume[:, second],
+                                                                                             axis=1)
+        self.assertMatches(result[:, second], expected)
+
+    def test_rolling_extremes_and_fibonacci(self):
+        """
+        Verifica máximos y mínimos móviles y los niveles de Fibonacci.
+        """
+        highest = pd.Series(self.high[1]).rolling(30).max()
+        lowest = pd.Series(self.low[1]).rolling(30).min()
+        self.assertMatches(rolling_max(self.high, 30)[1], highest)
+        self.assertMatches(rolling_min(self.low, 30)[1], lowest)
+        self.assertMatches(fibonacci_levels(self.high, self.low, 30)[0.618][1], highest - (highest - lowest) * 0.618)
+
+    def test_warmup_starts_at_first_valid_bar(self):
+        """
+        Verifica que un símbolo con historia más corta (NaN a la izquierda) calienta desde su primera vela.
+        """
+        padded = self.close.copy()
+        padded[2, :100] = np.nan
+        result = sma(padded, 50)
+        self.assertTrue(np.isnan(result[2, :149]).all())
+        self.assertMatches(result[2, 149:], sma(self.close[2, 100:], 50)[49:])
+        self.assertMatches(ema(padded, span=10)[2, 109:], ema(self.close[2, 100:], span=10)[9:])
+        self.assertMatches(sma(self.close[0], 50), sma(self.close, 50)[0])
+
+    def test_panel_from_long_frame(self):
+        """
+        Verifica la conversión de velas en formato largo a matriz y el panel completo.
+        """
+        times = pd.date_range("2024-01-02 14:30", periods=400, freq="5min")
+        data = pd.concat([
+            pd.DataFrame({"symbol": symbol, "datetime": times, "high": self.high[i], "low": self.low[i],
+                          "close": self.close[i], "volume": self.volume[i]})
+            for i, symbol in enumerate(["MSFT", "AAPL", "XOM"])
+        ])
+        symbols, index, close = to_matrix(data, "close")
+        self.assertEqual(symbols, ["AAPL", "MSFT", "XOM"])
+        self.assertMatches(close[1], self.close[0])
+
+        panel = indicator_panel(self.high, self.low, self.close, self.volume)
+        self.assertIn("MACD_signal", panel)
+        self.assertEqual(panel["VWAP"].shape, self.close.shape)
+
+if __name__ == "__main__":
+    unittest.main()
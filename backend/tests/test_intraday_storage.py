@@ -0,0 +1,141 @@
+import unittest
+import pandas as pd
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import text
+from backend.app.modules.intraday_storage import (
+    create_intraday_table, fetch_intraday_range, migrate_datetimes_to_utc, upgrade_intraday_table,
+    write_intraday_bars,
+)
+from backend.app.modules.intraday_sync import fetch_high_water_marks
+from backend.app.modules.market_calendar import NYSE_TZ, expected_index
+
+
+def bars(symbol, timeframe, start, periods, freq):
+    return pd.DataFrame({
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "datetime": pd.date_range(start, periods=periods, freq=freq),
+        "open": 1.0, "high": 1.0, "low": 1.0, "close": range(periods), "volume": 10.0,
+    })
+
+
+class TestIntradayStorage(unittest.TestCase):
+    """
+    Pruebas unitarias para el esquema intradía multi-temporalidad (variante SQLite).
+    """
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        create_intraday_table(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_unique_key_allows_several_timeframes(self):
+        """
+        Verifica que la clave única incluye la temporalidad y rechaza velas duplicadas.
+        """
+        bars("AAPL", "5Min", "2024-01-02 14:30", 2, "5min").to_sql(
+            "sp500_intraday_data", self.engine, if_exists="append", index=False)
+        bars("AAPL", "1Min", "2024-01-02 14:30", 2, "1min").to_sql(
+            "sp500_intraday_data", self.engine, if_exists="append", index=False)
+        with self.assertRaises(IntegrityError):
+            bars("AAPL", "5Min", "2024-01-02 14:30", 1, "5min").to_sql(
+                "sp500_intraday_data", self.engine, if_exists="append", index=False)
+
+    def test_range_query_filters_symbols_timeframe_and_dates(self):
+        """
+        Verifica el filtro [start, end) por símbolos y temporalidad, ordenado por símbolo y fecha.
+        """
+        for symbol in ("AAPL", "MSFT", "XOM"):
+            bars(symbol, "5Min", "2024-01-02 14:30", 10, "5min").to_sql(
+                "sp500_intraday_data", self.engine, if_exists="append", index=False)
+        bars("AAPL", "1Min", "2024-01-02 14:30", 10, "1min").to_sql(
+            "sp500_intraday_data", self.engine, if_exists="append", index=False)
+
+        data = fetch_intraday_range(self.session, ["MSFT", "AAPL"], start="2024-01-02 09:40-05:00",
+                                    end="2024-01-02 14:55")
+        self.assertEqual(data["symbol"].tolist(), ["AAPL"] * 3 + ["MSFT"] * 3)
+        self.assertEqual(data["close"].tolist(), [2, 3, 4] * 2)
+
+    def test_direct_write_path_upserts_in_batches(self):
+        """
+        Verifica que la escritura sin ORM inserta por lotes y actualiza velas existentes.
+        """
+        data = bars("AAPL", "5Min", "2024-01-02 14:30", 5, "5min").assign(
+            close=[1.0, 2.0, 3.0, 4.0, 5.0],
+            trade_count=pd.array([7, None, 7, 7, 7], dtype="Int64"),
+            vwap=[1.0, None, 1.0, 1.0, 1.0],
+        )
+        self.assertEqual(write_intraday_bars(self.session, data, batch_size=2), 5)
+        write_intraday_bars(self.session, data.iloc[3:].assign(close=[40.0, 50.0]), batch_size=2)
+        self.session.commit()
+
+        stored = fetch_intraday_range(self.session, ["AAPL"])
+        self.assertEqual(stored["close"].tolist(), [1.0, 2.0, 3.0, 40.0, 50.0])
+        self.assertTrue(pd.isna(stored["trade_count"][1]))
+        self.assertEqual(stored["datetime"][0], pd.Timestamp("2024-01-02 14:30"))
+
+    def test_upgrade_adds_timeframe_to_legacy_table(self):
+        """
+        Verifica que una tabla antigua sin `timeframe` recibe la columna y el índice compuesto.
+        """
+        engine = create_engine("sqlite://")
+        with engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE sp500_intraday_data (id INTEGER PRIMARY KEY, symbol VARCHAR NOT NULL, "
+                "datetime DATETIME NOT NULL, open FLOAT NOT NULL, high FLOAT NOT NULL, low FLOAT NOT NULL, "
+                "close FLOAT NOT NULL, volume FLOAT NOT NULL, trade_count INTEGER, vwap FLOAT)"
+            ))
+            connection.execute(text(
+                "INSERT INTO sp500_intraday_data (symbol, datetime, open, high, low, close, volume) "
+                "VALUES ('AAPL', '2024-01-02 14:30:00', 1, 1, 1, 1, 1)"
+            ))
+        upgrade_intraday_table(engine)
+
+        inspector = inspect(engine)
+        self.assertIn("timeframe", {c["name"] for c in inspector.get_columns("sp500_intraday_data")})
+        self.assertIn("uq_sp500_intraday_symbol_timeframe_datetime",
+                      {i["name"] for i in inspector.get_indexes("sp500_intraday_data")})
+        with engine.connect() as connection:
+            self.assertEqual(connection.execute(text("SELECT timeframe FROM sp500_intraday_data")).scalar(), "5Min")
+
+    def test_migrate_new_york_datetimes_to_utc(self):
+        """
+        Verifica que las velas guardadas en hora de Nueva York pasan a UTC (en invierno y en
+        verano) sin duplicar las que la sincronización ya había vuelto a descargar en UTC.
+        """
+        def new_york_bars(start, end):
+            times = pd.date_range(start, end, freq="5min")
+            # El cierre identifica la vela por su hora en Nueva York (HHMM)
+            return bars("AAPL", "5Min", start, len(times), "5min").assign(close=times.hour * 100 + times.minute)
+
+        # Carga anterior, en hora local: dos días completos (con la vela de las 16:00) y una mañana
+        legacy = pd.concat([new_york_bars("2024-01-03 09:30", "2024-01-03 16:00"),
+                            new_york_bars("2024-07-02 09:30", "2024-07-02 16:00"),
+                            new_york_bars("2024-01-04 09:30", "2024-01-04 12:00")])
+        legacy.to_sql("sp500_intraday_data", self.engine, if_exists="append", index=False)
+        # La sincronización posterior descarga el 4 de enero completo ya en UTC
+        times = pd.DatetimeIndex(expected_index("2024-01-04", "2024-01-04 23:59"))
+        local = times.tz_convert(NYSE_TZ)
+        write_intraday_bars(self.session, bars("AAPL", "5Min", times[0].tz_convert(None), len(times), "5min")
+                            .assign(close=local.hour * 100 + local.minute, trade_count=1, vwap=1.0))
+        self.session.commit()
+
+        migrate_datetimes_to_utc(self.engine)
+
+        stored = fetch_intraday_range(self.session, ["AAPL"])
+        expected = pd.DatetimeIndex(expected_index("2024-01-03", "2024-07-02 23:59"))
+        expected = expected[expected.normalize().isin(pd.DatetimeIndex(["2024-01-03", "2024-01-04", "2024-07-02"],
+                                                                       tz="UTC"))]
+        self.assertEqual(stored["datetime"].tolist(), expected.tz_convert(None).tolist())
+        local = pd.DatetimeIndex(stored["datetime"]).tz_localize("UTC").tz_convert(NYSE_TZ)
+        self.assertEqual(stored["close"].tolist(), (local.hour * 100 + local.minute).tolist())
+        self.assertEqual(fetch_high_water_marks(self.session)["AAPL"], pd.Timestamp("2024-07-02 19:55"))
+        self.assertEqual(migrate_datetimes_to_utc(self.engine), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from backend.app.modules.intraday_storage import (
+    create_intraday_table, fetch_intraday_range, migrate_datetimes_to_utc,
+)
+from backend.app.modules.intraday_sync import SYNC_START_DATE, sync_intraday_bars, sync_start_date
+from backend.app.modules.market_calendar import NYSE_TZ, expected_index
+
+
+def alpaca_bars(start, end, close=1.0):
+    """Velas de sesión regular con las columnas de Alpaca (Datetime en UTC)."""
+    times = pd.DatetimeIndex(expected_index(start, end))
+    return pd.DataFrame({
+        "Datetime": times, "Open": 1.0, "High": 2.0, "Low": 0.5, "Close": close,
+        "Volume": 100.0, "TradeCount": 5, "VWAP": 1.0,
+    })
+
+
+class FakeSource:
+    """Proveedor de velas en memoria que registra la fecha de inicio de cada descarga."""
+    def __init__(self, bars):
+        self.bars = bars
+        self.starts = {}
+
+    def __call__(self, symbol, timeframe, start_date):
+        self.starts[symbol] = start_date
+        start = pd.Timestamp(start_date)
+        start = start.tz_localize("UTC") if start.tz is None else start
+        data = self.bars.get(symbol, pd.DataFrame())
+        return data[data["Datetime"] >= start].reset_index(drop=True) if not data.empty else data
+
+
+class TestIntradaySync(unittest.TestCase):
+    """
+    Pruebas unitarias para la sincronización incremental de velas intradía.
+    """
+    def setUp(self):
+        self.engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+        create_intraday_table(self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+
+    def stored(self, symbol):
+        session = self.session_factory()
+        try:
+            return fetch_intraday_range(session, [symbol])
+        finally:
+            session.close()
+
+    def test_start_date_from_high_water_mark(self):
+        """
+        Verifica que sin datos se parte de la fecha por defecto y con datos de la última vela
+        menos la ventana de solapamiento, en UTC.
+        """
+        self.assertEqual(sync_start_date(None), SYNC_START_DATE)
+        self.assertEqual(sync_start_date(pd.Timestamp("2024-01-02 20:55")), "2024-01-02T20:25:00+00:00")
+        self.assertEqual(sync_start_date(pd.Timestamp("2024-01-02 20:55"), overlap=pd.Timedelta(0)),
+                         "2024-01-02T20:55:00+00:00")
+
+    def test_serial_sync_downloads_only_new_bars_and_overlap(self):
+        """
+        Verifica que la segunda sincronización parte de la marca de agua, recoge las
+        correcciones dentro del solapamiento y no duplica velas.
+        """
+        source = FakeSource({"AAA": alpaca_bars("2024-01-02", "2024-01-02 23:59")})
+        written = sync_intraday_bars(["AAA"], source, self.session_factory, update_indicators=False)
+        self.assertEqual(source.starts["AAA"], SYNC_START_DATE)
+        self.assertEqual(written, {"AAA": 78})
+
+        # El proveedor corrige dos velas (una dentro del solapamiento y otra fuera) y publica otro día
+        restated = alpaca_bars("2024-01-02", "2024-01-02 23:59")
+        restated.loc[[0, 77], "Close"] = 9.0
+        source.bars["AAA"] = pd.concat([restated, alpaca_bars("2024-01-03", "2024-01-03 23:59")], ignore_index=True)
+        written = sync_intraday_bars(["AAA"], source, self.session_factory, update_indicators=False)
+        self.assertEqual(source.starts["AAA"], "2024-01-02T20:25:00+00:00")
+        self.assertEqual(written, {"AAA": 7 + 78})
+
+        stored = self.stored("AAA")
+        self.assertEqual(len(stored), 2 * 78)
+        self.assertFalse(stored["datetime"].duplicated().any())
+        closes = stored.set_index("datetime")["close"]
+        self.assertEqual(closes[pd.Timestamp("2024-01-02 20:55")], 9.0)
+        self.assertEqual(closes[pd.Timestamp("2024-01-02 14:30")], 1.0)
+
+    def test_concurrent_sync_uses_each_symbol_high_water_mark(self):
+        """
+        Verifica que la sincronización concurrente calcula el inicio de cada símbolo por separado.
+        """
+        source = FakeSource({"AAA": alpaca_bars("2024-01-02", "2024-01-03 23:59"),
+                             "BBB": alpaca_bars("2024-01-02", "2024-01-03 23:59")})
+        sync_intraday_bars(["AAA"], FakeSource({"AAA": alpaca_bars("2024-01-02", "2024-01-02 23:59")}),
+                           self.session_factory, update_indicators=False)
+
+        report = sync_intraday_bars(["AAA", "BBB"], source, self.session_factory, concurrent=True, workers=2,
+                                    update_indicators=False)
+        self.assertEqual(source.starts, {"AAA": "2024-01-02T20:25:00+00:00", "BBB": SYNC_START_DATE})
+        self.assertEqual(report.set_index("symbol")["rows_written"].to_dict(), {"AAA": 7 + 78, "BBB": 2 * 78})
+        for symbol in ("AAA", "BBB"):
+            stored = self.stored(symbol)
+            self.assertEqual(len(stored), 2 * 78)
+            self.assertFalse(stored["datetime"].duplicated().any())
+
+    def test_sync_after_migrating_new_york_datetimes(self):
+        """
+        Verifica que tras migrar las velas antiguas (hora de Nueva York) la marca de agua se lee
+        en UTC y la sincronización no duplica velas.
+        """
+        legacy = alpaca_bars("2024-01-02", "2024-01-02 23:59")
+        pd.DataFrame({
+            "symbol": "AAA", "timeframe": "5Min",
+            "datetime": legacy["Datetime"].dt.tz_convert(NYSE_TZ).dt.tz_localize(None),
+            "open": 1.0, "high": 2.0, "low": 0.5, "close": 1.0, "volume": 100.0,
+        }).to_sql("sp500_intraday_data", self.engine, if_exists="append", index=False)
+        self.assertEqual(migrate_datetimes_to_utc(self.engine), (78, 0))
+
+        source = FakeSource({"AAA": alpaca_bars("2024-01-02", "2024-01-03 23:59")})
+        sync_intraday_bars(["AAA"], source, self.session_factory, update_indicators=False)
+        self.assertEqual(source.starts["AAA"], "2024-01-02T20:25:00+00:00")
+        stored = self.stored("AAA")
+        self.assertEqual(stored["datetime"].tolist(),
+                         pd.DatetimeIndex(expected_index("2024-01-02", "2024-01-03 23:59")).tz_convert(None).tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
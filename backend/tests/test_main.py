@@ -1,6 +1,6 @@
 # ~/project/backend/tests/test_main.py
 import unittest
-from app.main import app
+from backend.app.main import app
 from fastapi.testclient import TestClient
 
 client = TestClient(app)
@@ -0,0 +1,71 @@
+import datetime
+import unittest
+import pandas as pd
+from backend.app.modules.market_calendar import (
+    expected_bars_per_session, expected_index, incomplete_sessions, nyse_early_closes, nyse_holidays,
+    session_mask, sessions,
+)
+
+
+class TestMarketCalendar(unittest.TestCase):
+    """
+    Pruebas unitarias para el calendario de sesiones de la NYSE.
+    """
+    def test_holidays_and_early_closes(self):
+        """
+        Verifica festivos observados, Viernes Santo y cierres anticipados de 2024.
+        """
+        holidays = nyse_holidays(2024)
+        self.assertIn(datetime.date(2024, 3, 29), holidays)  # Viernes Santo
+        self.assertIn(datetime.date(2024, 6, 19), holidays)  # Juneteenth
+        self.assertIn(datetime.date(2024, 11, 28), holidays)  # Thanksgiving
+        self.assertEqual(len(holidays), 10)
+        self.assertEqual(nyse_early_closes(2024), {
+            datetime.date(2024, 7, 3), datetime.date(2024, 11, 29), datetime.date(2024, 12, 24),
+        })
+        # Año nuevo de 2022 cayó en sábado: el viernes 31 de diciembre de 2021 hubo sesión
+        self.assertNotIn(datetime.date(2021, 12, 31), nyse_holidays(2021) | nyse_holidays(2022))
+
+    def test_expected_index_crosses_dst_and_skips_non_sessions(self):
+        """
+        Verifica 78 velas de 5 minutos por sesión con el cambio de hora y sin fines de semana.
+        """
+        # Viernes 2024-03-08 (EST) y lunes 2024-03-11 (EDT, tras el cambio de hora)
+        index = expected_index("2024-03-08", "2024-03-12")
+        self.assertEqual(len(index), 2 * 78)
+        self.assertEqual(index[0], pd.Timestamp("2024-03-08 14:30", tz="UTC"))
+        self.assertEqual(index[78], pd.Timestamp("2024-03-11 13:30", tz="UTC"))
+        self.assertEqual(len(expected_index("2024-03-29", "2024-03-30")), 0)
+
+    def test_early_close_has_fewer_bars(self):
+        """
+        Verifica que el día siguiente a Thanksgiving termina a las 13:00 (42 velas de 5 minutos).
+        """
+        counts = expected_bars_per_session("2024-11-27", "2024-11-29")
+        self.assertEqual(counts.tolist(), [78, 42])
+        self.assertTrue(sessions("2024-11-29", "2024-11-29")["early_close"].iloc[0])
+        self.assertEqual(len(expected_index("2024-11-29", "2024-11-30", "1Min")), 210)
+
+    def test_session_mask_uses_half_open_sessions(self):
+        """
+        Verifica la máscara [apertura, cierre) con marcas sin zona horaria (UTC).
+        """
+        times = pd.to_datetime([
+            "2024-01-02 14:25", "2024-01-02 14:30", "2024-01-02 20:55", "2024-01-02 21:00",
+            "2024-01-01 15:00", "2024-11-29 18:00", None,
+        ])
+        self.assertEqual(session_mask(times).tolist(), [False, True, True, False, False, False, False])
+
+    def test_incomplete_sessions_counts_missing_days(self):
+        """
+        Verifica que se detectan sesiones con velas faltantes, incluidas las que no tienen ninguna.
+        """
+        index = expected_index("2024-07-01", "2024-07-09").tz_localize(None)
+        # Se elimina el 2024-07-05 completo y una vela del 2024-07-03 (cierre anticipado)
+        data = index[(index.date != datetime.date(2024, 7, 5))].delete(78 * 2)
+        incomplete = incomplete_sessions(data)
+        self.assertEqual(incomplete.index.strftime("%Y-%m-%d").tolist(), ["2024-07-03", "2024-07-05"])
+        self.assertEqual(incomplete.tolist(), [41, 0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.app.models import MarketRegime, SP500Data
+from backend.app.modules import market_regimes
+from backend.app.modules.intraday_storage import create_intraday_table, write_intraday_bars
+from backend.app.modules.market_regimes import (
+    GAP_FILLED, GAP_UP, INDEX_SYMBOL, OPEN_DRIVE_UP, TREND_BEAR, TREND_BULL, VOL_HIGH, VOL_LOW, VOL_NORMAL,
+    compute_regimes, flag_names, flags_from_names, label_daily, load_regimes, opening_returns, regime_mask,
+    read_daily_bars, select_days, update_regimes,
+)
+from backend.tests import utils
+
+
+def daily_bars(symbol, close, start="2023-01-02"):
+    dates = pd.bdate_range(start, periods=len(close))
+    return pd.DataFrame({"symbol": symbol, "date": dates.date, "open": close, "high": close * 1.01,
+                         "low": close * 0.99, "close": close})
+
+
+def random_walk(days, seed, drift=0.0, vol=0.01):
+    return utils.random_walk(np.random.default_rng(seed), days, vol, drift, geometric=True)
+
+
+class TestMarketRegimes(unittest.TestCase):
+    """
+    Pruebas unitarias para el etiquetado de regímenes de mercado.
+    """
+    def test_daily_labels(self):
+        """
+        Verifica tendencia, cambio de volatilidad y hueco cerrado en series construidas a mano.
+        """
+        swings = np.where(np.arange(310) % 2 == 0, 1.0, -1.0)
+        returns = 0.002 + swings * np.where(np.arange(310) < 280, 0.005, 0.03)  # Calma y después volatilidad
+        close = pd.DataFrame({"UP": 100 * np.exp(np.cumsum(returns)), "DOWN": 100 * np.exp(np.cumsum(-returns))})
+        open_, high, low = close.shift(1).fillna(close), close * 1.01, close * 0.99
+        open_.iloc[-1, 0] = close.iloc[-2, 0] * 1.02  # Hueco alcista que el mínimo del día cierra
+        low.iloc[-1, 0] = close.iloc[-2, 0] * 0.999
+        flags = label_daily(open_, high, low, close)["flags"].iloc[-1]
+        self.assertEqual(flags["UP"] & (TREND_BULL | VOL_HIGH | GAP_UP | GAP_FILLED),
+                         TREND_BULL | VOL_HIGH | GAP_UP | GAP_FILLED)
+        self.assertTrue(flags["DOWN"] & TREND_BEAR)
+        self.assertIn("VOL_HIGH", flag_names(flags["DOWN"]))
+        calm = label_daily(open_, high, low, close)["flags"].iloc[270]
+        self.assertEqual(calm["UP"] & (VOL_LOW | VOL_NORMAL | VOL_HIGH), VOL_NORMAL)
+        self.assertEqual(flags_from_names("VOL_HIGH", "TREND_BEAR"), VOL_HIGH | TREND_BEAR)
+
+    def test_opening_returns_and_index(self):
+        """
+        Verifica la rentabilidad de la primera media hora y las filas del índice equiponderado.
+        """
+        times = pd.date_range("2024-01-02 14:30", periods=12, freq="5min")
+        intraday = pd.DataFrame({"symbol": "AAPL", "datetime": times, "open": np.arange(100, 112.0),
+                                 "close": np.arange(100.5, 112.5)})
+        opening = opening_returns(intraday)
+        self.assertAlmostEqual(opening["open_return"].iloc[0], 105.5 / 100 - 1)
+
+        daily = pd.concat([daily_bars("AAPL", random_walk(260, 1)), daily_bars("MSFT", random_walk(260, 2))])
+        opening = pd.DataFrame({"symbol": ["AAPL"], "date": [daily["date"].iloc[-1]], "open_return": [0.01]})
+        regimes = compute_regimes(daily, opening)
+        self.assertEqual(set(regimes["symbol"]), {"AAPL", "MSFT", INDEX_SYMBOL})
+        self.assertEqual(len(regimes), 3 * 260)
+        last_aapl = regimes[regimes["symbol"] == "AAPL"].iloc[-1]
+        self.assertTrue(last_aapl["flags"] & OPEN_DRIVE_UP)
+        self.assertTrue(regimes[regimes["symbol"] == INDEX_SYMBOL].iloc[-1]["flags"] & OPEN_DRIVE_UP)
+
+    def test_incremental_update_matches_full_computation(self):
+        """
+        Verifica que la actualización incremental escribe solo los días nuevos y coincide con un cálculo completo.
+        """
+        engine = create_engine("sqlite://")
+        create_intraday_table(engine)
+        SP500Data.__table__.create(engine)
+        MarketRegime.__table__.create(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            daily = pd.concat([daily_bars(symbol, random_walk(400, seed, 0.0005))
+                               for seed, symbol in enumerate(["AAPL", "MSFT", "NVDA"])])
+            daily = daily.assign(name=daily["symbol"], adj_close=daily["close"], volume=100)
+            first, rest = daily.groupby("symbol").head(390), daily.groupby("symbol").tail(10)
+            first.to_sql("sp500_data", engine, if_exists="append", index=False)
+            self.assertEqual(update_regimes(session), 4 * 390)
+            session.commit()
+
+            rest.to_sql("sp500_data", engine, if_exists="append", index=False)
+            last_day = pd.Timestamp(rest["date"].max())
+            times = pd.date_range(last_day + pd.Timedelta(hours=14, minutes=30), periods=6, freq="5min")
+            write_intraday_bars(session, pd.DataFrame({
+                "symbol": "AAPL", "timeframe": "5Min", "datetime": times, "open": 100.0, "high": 102.0,
+                "low": 100.0, "close": [100.2, 100.5, 101, 101.2, 101.5, 102], "volume": 1.0, "trade_count": 1,
+                "vwap": 101.0}))
+            session.commit()
+            self.assertEqual(update_regimes(session), 4 * 11)  # Diez días nuevos y el último recalculado
+            session.commit()
+
+            stored = load_regimes(session)
+            expected = compute_regimes(daily)
+            self.assertEqual(len(stored), len(expected))
+            merged = stored.merge(expected, on=["symbol", "date"], suffixes=("", "_full"))
+            np.testing.assert_array_equal(merged["flags"] & ~OPEN_DRIVE_UP, merged["flags_full"])
+            np.testing.assert_allclose(merged["trend"], merged["trend_full"], equal_nan=True)
+            aapl_last = stored[(stored["symbol"] == "AAPL")].iloc[-1]
+            self.assertAlmostEqual(aapl_last["open_return"], 0.02)
+        finally:
+            session.close()
+
+    def test_stale_symbol_does_not_pin_the_update_start(self):
+        """
+        Verifica que un símbolo que dejó de cotizar no obliga a releer su historia y que un
+        símbolo nuevo se etiqueta completo.
+        """
+        engine = create_engine("sqlite://")
+        create_intraday_table(engine)
+        SP500Data.__table__.create(engine)
+        MarketRegime.__table__.create(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            active = pd.concat([daily_bars(symbol, random_walk(900, seed, 0.0005))
+                                for seed, symbol in enumerate(["AAPL", "MSFT"])])
+            stale = daily_bars("OLD", random_walk(300, 7))  # Deja de cotizar 600 sesiones antes
+            newcomer = daily_bars("NEW", random_walk(900, 8))
+            daily = pd.concat([active, stale])
+            daily = daily.assign(name=daily["symbol"], adj_close=daily["close"], volume=100)
+            daily.groupby("symbol").head(890).to_sql("sp500_data", engine, if_exists="append", index=False)
+            update_regimes(session)
+            session.commit()
+
+            newcomer = newcomer.assign(name="NEW", adj_close=newcomer["close"], volume=100)
+            pd.concat([daily.groupby("symbol").tail(10)[lambda frame: frame["symbol"] != "OLD"], newcomer]).to_sql(
+                "sp500_data", engine, if_exists="append", index=False)
+            reads = []
+
+            def recording_read(session, start=None, symbols=None):
+                reads.append((start, symbols))
+                return read_daily_bars(session, start, symbols)
+
+            with mock.patch.object(market_regimes, "read_daily_bars", recording_read):
+                written = update_regimes(session)
+            session.commit()
+            # Diez días nuevos y el último recalculado para AAPL, MSFT y el índice; toda la historia de NEW
+            self.assertEqual(written, 3 * 11 + 900)
+            self.assertGreater(pd.Timestamp(reads[0][0]), pd.Timestamp(stale["date"].max()))
+            self.assertEqual(reads[1], (None, ["NEW"]))
+
+            stored = load_regimes(session, symbols=["NEW"])
+            expected = compute_regimes(newcomer, with_index=False)
+            np.testing.assert_array_equal(stored["flags"], expected["flags"])
+        finally:
+            session.close()
+
+    def test_select_days_and_bar_mask(self):
+        """
+        Verifica la selección de días por bits en la base de datos y la máscara de velas.
+        """
+        engine = create_engine("sqlite://")
+        MarketRegime.__table__.create(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            days = pd.bdate_range("2024-01-02", periods=4).date
+            flags = [VOL_HIGH | TREND_BEAR, VOL_HIGH | TREND_BULL, VOL_LOW | TREND_BEAR, VOL_HIGH | TREND_BEAR | GAP_UP]
+            session.add_all([MarketRegime(symbol=INDEX_SYMBOL, date=day, flags=flag) for day, flag in zip(days, flags)])
+            session.add(MarketRegime(symbol="AAPL", date=days[1], flags=VOL_HIGH | TREND_BEAR))
+            session.commit()
+            self.assertEqual(select_days(session, VOL_HIGH | TREND_BEAR), [days[0], days[3]])
+            self.assertEqual(select_days(session, VOL_HIGH | TREND_BEAR, exclude=GAP_UP), [days[0]])
+
+            times = pd.date_range("2024-01-02 14:30", periods=4, freq="D")
+            regimes = load_regimes(session)
+            self.assertEqual(regime_mask(times, regimes, VOL_HIGH | TREND_BEAR).tolist(), [True, False, False, True])
+            matrix = regime_mask(times, regimes, VOL_HIGH | TREND_BEAR, symbols=["AAPL", INDEX_SYMBOL])
+            self.assertEqual(matrix.tolist(), [[False, True, False, False], [True, False, False, True]])
+        finally:
+            session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from backend.app.modules.backtest import cross_above, cross_below, run_backtest
+from backend.app.modules.indicators import sma
+from backend.app.modules.optimizer import (
+    ParameterOptimizer, SharedPrices, evaluate_parameter_sets, grid_parameters, random_parameters, rank_results,
+)
+from backend.tests.utils import random_open_close
+
+
+def crossover(prices, fast, slow):
+    """Cruce de medias: función de módulo para poder enviarla a los procesos del pool."""
+    fast_ma, slow_ma = sma(prices["close"], fast), sma(prices["close"], slow)
+    return cross_above(fast_ma, slow_ma), cross_below(fast_ma, slow_ma)
+
+
+def random_prices(symbols=3, bars=3000, seed=0):
+    open_, close = random_open_close(symbols, bars, seed, drift=0.0001)
+    return {"open": open_, "close": close}
+
+
+SPACE = {"fast": [5, 10, 20], "slow": [30, 60, 120]}
+
+
+class TestOptimizer(unittest.TestCase):
+    """
+    Pruebas unitarias para el optimizador de parámetros.
+    """
+    def test_parameter_generation(self):
+        """
+        Verifica la rejilla completa y el muestreo aleatorio sin repeticiones dentro de los rangos.
+        """
+        grid = grid_parameters(SPACE)
+        self.assertEqual(len(grid), 9)
+        self.assertEqual(grid[1], {"fast": 5, "slow": 60})
+        sample = random_parameters({"fast": (2, 30), "slow": [50, 100], "k": (0.5, 1.5)}, 20, seed=1)
+        self.assertEqual(len({tuple(p.items()) for p in sample}), 20)
+        self.assertTrue(all(2 <= p["fast"] <= 30 and isinstance(p["fast"], int) for p in sample))
+        self.assertTrue(all(0.5 <= p["k"] <= 1.5 for p in sample))
+
+    def test_pool_matches_in_process_and_releases_memory(self):
+        """
+        Verifica que el pool con memoria compartida da lo mismo que el cálculo en el proceso y libera el bloque.
+        """
+        prices = random_prices()
+        grid = grid_parameters(SPACE)
+        expected = evaluate_parameter_sets(prices, crossover, grid)
+        with ParameterOptimizer(prices, crossover, workers=2, batch_size=2) as optimizer:
+            name = optimizer.shared.block.name
+            pd.testing.assert_frame_equal(optimizer.evaluate(grid), expected)
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+        # El resumen de una combinación agrega las ejecuciones de cada símbolo
+        single = run_backtest(prices["close"], *crossover(prices, 5, 30), prices["open"])
+        row = expected.iloc[0]
+        self.assertEqual(row["trades"], len(single.trades))
+        self.assertAlmostEqual(row["total_return"], single.metrics["total_return"].mean())
+        self.assertAlmostEqual(row["max_drawdown"], single.metrics["max_drawdown"].min())
+
+    def test_shared_prices_round_trip(self):
+        """
+        Verifica que las matrices abiertas desde el nombre del bloque son las originales y de solo lectura.
+        """
+        prices = random_prices(2, 50)
+        shared = SharedPrices.create(prices)
+        try:
+            attached = SharedPrices.attach(shared.spec)
+            np.testing.assert_array_equal(attached.arrays["close"], prices["close"])
+            self.assertFalse(attached.arrays["open"].flags.writeable)
+            attached.close()
+        finally:
+            shared.close()
+
+    def test_ranking_and_successive_halving(self):
+        """
+        Verifica el orden del ranking y que la eliminación sucesiva termina con los mejores candidatos.
+        """
+        table = pd.DataFrame({"p": [1, 2, 3, 4], "trades": [5, 5, 0, 5], "profit_factor": [1.2, 1.5, np.nan, 1.5],
+                              "expectancy": [0.1, 0.2, np.nan, 0.3], "max_drawdown": [-0.1, -0.2, 0.0, -0.3]})
+        self.assertEqual(list(rank_results(table)["p"]), [4, 2, 1, 3])
+
+        prices = random_prices(seed=5)
+        candidates = random_parameters({"fast": (3, 40), "slow": (50, 200)}, 27, seed=2)
+        optimizer = ParameterOptimizer(prices, crossover, workers=1, max_drawdown_limit=-1.0)
+        ranking = optimizer.successive_halving(candidates, eta=3, min_fraction=1 / 9)
+        self.assertEqual(len(ranking), 3)
+        full = optimizer.evaluate([{"fast": ranking["fast"][0], "slow": ranking["slow"][0]}]).iloc[0]
+        self.assertAlmostEqual(full["profit_factor"], ranking["profit_factor"][0])
+
+    def test_walk_forward(self):
+        """
+        Verifica los tramos walk-forward y que las métricas fuera de muestra son las de los parámetros elegidos.
+        """
+        prices = random_prices(seed=7)
+        optimizer = ParameterOptimizer(prices, crossover, workers=1, max_drawdown_limit=-1.0)
+        result = optimizer.walk_forward(grid_parameters(SPACE), splits=3, in_sample=0.7, halving=False)
+        self.assertEqual(list(result["oos_start"]), [2100, 2400, 2700])
+        self.assertEqual(list(result["is_start"]), [0, 300, 600])
+        self.assertEqual(result["oos_stop"].iloc[-1], 3000)
+        last = result.iloc[-1]
+        check = optimizer.evaluate([{"fast": int(last["fast"]), "slow": int(last["slow"])}], 2700, 3000).iloc[0]
+        self.assertAlmostEqual(last["oos_total_return"], check["total_return"])
+        best = optimizer.search(grid_parameters(SPACE), 600, 2700).iloc[0]
+        self.assertEqual((best["fast"], best["slow"]), (last["fast"], last["slow"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
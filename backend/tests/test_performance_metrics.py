@@ -0,0 +1,86 @@
+import unittest
+import numpy as np
+import pandas as pd
+from backend.app.modules.backtest import run_backtest
+from backend.app.modules.performance_metrics import (
+    TradeArrays, comparison_report, compute_metrics, equity_metrics, periods_per_year, trade_metrics,
+)
+
+
+class TestPerformanceMetrics(unittest.TestCase):
+    """
+    Pruebas unitarias para el cálculo de métricas de rendimiento por lotes.
+    """
+    def test_trade_metrics_from_ragged_arrays(self):
+        """
+        Verifica las métricas de operaciones en formato CSR, con una ejecución sin operaciones.
+        """
+        trades = TradeArrays.from_runs(run=[2, 0, 0, 2, 0, 2, 2], pnl=[-1, 10, -5, -2, -3, 4, -1], runs=3)
+        np.testing.assert_array_equal(trades.offsets, [0, 3, 3, 7])
+        metrics = trade_metrics(trades)
+        np.testing.assert_array_equal(metrics["trades"], [3, 0, 4])
+        self.assertAlmostEqual(metrics["profit_factor"][0], 10 / 8)
+        self.assertAlmostEqual(metrics["expectancy"][2], 0.0)
+        self.assertAlmostEqual(metrics["win_rate"][2], 0.25)
+        np.testing.assert_array_equal(metrics["max_loss"], [-5, 0, -2])
+        self.assertAlmostEqual(metrics["average_loss"][0], -4.0)
+        self.assertTrue(np.isnan(metrics["profit_factor"][1]))
+        # Rachas: [10, -5, -3] -> 2; [-1, -2, 4, -1] -> 2 (no continúa la racha de la ejecución anterior)
+        np.testing.assert_array_equal(metrics["max_consecutive_losses"], [2, 0, 2])
+
+    def test_equity_metrics(self):
+        """
+        Verifica caída, tiempo bajo agua, Sharpe y Sortino frente a un cálculo directo.
+        """
+        equity = np.array([[100, 110, 99, 105, 121, 120.0]])
+        metrics = equity_metrics(equity, initial_capital=100, periods=252).iloc[0]
+        self.assertAlmostEqual(metrics["max_drawdown"], 99 / 110 - 1)
+        self.assertEqual(metrics["max_time_under_water"], 2)
+        self.assertAlmostEqual(metrics["total_return"], 0.2)
+        returns = np.diff(np.concatenate([[100], equity[0]])) / np.concatenate([[100], equity[0, :-1]])
+        self.assertAlmostEqual(metrics["sharpe"], returns.mean() / returns.std(ddof=1) * np.sqrt(252))
+        downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2))
+        self.assertAlmostEqual(metrics["sortino"], returns.mean() / downside * np.sqrt(252))
+        self.assertEqual(periods_per_year("5Min"), 252 * 78)
+        self.assertEqual(periods_per_year("1Day"), 252)
+
+    def test_batch_matches_row_by_row(self):
+        """
+        Verifica que calcular miles de ejecuciones a la vez equivale a calcularlas una a una.
+        """
+        rng = np.random.default_rng(0)
+        equity = 1000 * np.exp(np.cumsum(rng.normal(0, 0.01, (1000, 300)), axis=1))
+        run = rng.integers(0, 1000, 5000)
+        trades = pd.DataFrame({"run": run, "pnl": rng.normal(0, 1, 5000)})
+        batched = compute_metrics(equity, trades, 1000)
+        for row in (0, 17, 999):
+            single = compute_metrics(equity[row], trades[trades["run"] == row].assign(run=0), 1000)
+            pd.testing.assert_series_equal(batched.iloc[row], single.iloc[0], check_names=False)
+
+    def test_comparison_report(self):
+        """
+        Verifica el reporte comparativo: etiquetas, objetivos cumplidos y orden por profit factor.
+        """
+        equity = np.array([[100, 101, 102.0], [100, 98, 97.0], [100, 102, 104.0]])
+        trades = pd.DataFrame({"run": [0, 0, 1, 2], "pnl": [3, -1, -3, 4]})
+        report = comparison_report(equity, trades, labels={"strategy": ["a", "b", "c"]}, initial_capital=100)
+        self.assertEqual(list(report["strategy"]), ["c", "a", "b"])
+        self.assertEqual(list(report["rank"]), [1, 2, 3])
+        self.assertEqual(list(report["meets_targets"]), [True, True, False])
+
+    def test_backtest_delegates_metrics(self):
+        """
+        Verifica que las métricas del backtester son las del módulo de métricas.
+        """
+        rng = np.random.default_rng(1)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (2, 500)), axis=1))
+        entries = rng.random((2, 500)) < 0.05
+        exits = rng.random((2, 500)) < 0.05
+        result = run_backtest(close, entries, exits, periods=periods_per_year("5Min"))
+        expected = compute_metrics(result.equity, result.trades, 10000.0, periods_per_year("5Min"))
+        pd.testing.assert_frame_equal(result.metrics, expected)
+        self.assertIn("sharpe", result.metrics)
+
+
+if __name__ == "__main__":
+    unittest.main()
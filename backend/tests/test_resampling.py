@@ -0,0 +1,105 @@
+import unittest
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.app.modules.intraday_storage import create_intraday_table, write_intraday_bars
+from backend.app.modules.market_calendar import expected_index
+from backend.app.modules.resampling import ResampleCache, RESAMPLE_TIMEFRAMES, resample_bars
+
+
+def base_bars(symbol, start, end, seed=0, extended=False):
+    """Velas de 5 minutos de sesión regular (y, con `extended`, una vela previa a la apertura por día)."""
+    times = pd.DatetimeIndex(expected_index(start, end)).tz_convert(None)
+    if extended:
+        times = times.union(pd.DatetimeIndex(pd.Series(times.normalize().unique()) + pd.Timedelta(hours=13)))
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, len(times)))
+    return pd.DataFrame({
+        "symbol": symbol, "timeframe": "5Min", "datetime": times, "open": close - 0.05, "high": close + 0.2,
+        "low": close - 0.2, "close": close, "volume": rng.integers(100, 1000, len(times)).astype(float),
+        "trade_count": rng.integers(1, 50, len(times)), "vwap": close + 0.01,
+    })
+
+
+class TestResampling(unittest.TestCase):
+    """
+    Pruebas unitarias para el remuestreo de velas.
+    """
+    def test_session_aligned_buckets_and_aggregation(self):
+        """
+        Verifica la alineación con la apertura, la vela final corta, el cierre anticipado y las reglas de agregación.
+        """
+        bars = base_bars("AAPL", "2024-11-27", "2024-11-30", extended=True)  # El 29 cierra a las 13:00
+        hourly = resample_bars(bars, "1Hour")
+        first_day = hourly[hourly["datetime"].dt.date == pd.Timestamp("2024-11-27").date()]
+        self.assertEqual(first_day["datetime"].dt.strftime("%H:%M").tolist(),
+                         ["14:30", "15:30", "16:30", "17:30", "18:30", "19:30", "20:30"])
+        self.assertEqual(first_day["bars"].tolist(), [12] * 6 + [6])
+        early = hourly[hourly["datetime"].dt.date == pd.Timestamp("2024-11-29").date()]
+        self.assertEqual(early["bars"].tolist(), [12, 12, 12, 6])
+
+        regular = bars[bars["datetime"].dt.hour != 13]
+        bucket = regular[(regular["datetime"] >= "2024-11-27 14:30") & (regular["datetime"] < "2024-11-27 15:30")]
+        row = first_day.iloc[0]
+        self.assertEqual(row["open"], bucket["open"].iloc[0])
+        self.assertEqual(row["close"], bucket["close"].iloc[-1])
+        self.assertEqual(row["high"], bucket["high"].max())
+        self.assertEqual(row["trade_count"], bucket["trade_count"].sum())
+        self.assertAlmostEqual(row["vwap"], (bucket["vwap"] * bucket["volume"]).sum() / bucket["volume"].sum())
+
+    def test_daily_and_weekly(self):
+        """
+        Verifica que la vela diaria es la sesión regular completa y que la semanal se fecha en lunes.
+        """
+        bars = pd.concat([base_bars(symbol, "2024-01-10", "2024-01-19 23:59", seed)
+                          for seed, symbol in enumerate(["AAPL", "MSFT"])])
+        daily = resample_bars(bars, "1Day")
+        self.assertEqual(len(daily), 2 * 7)  # El 15 de enero es festivo
+        self.assertTrue((daily["bars"] == 78).all())
+        aapl = bars[bars["symbol"] == "AAPL"]
+        self.assertEqual(daily["volume"].iloc[0], aapl[aapl["datetime"].dt.date == pd.Timestamp("2024-01-10").date()]
+                         ["volume"].sum())
+        weekly = resample_bars(bars, "1Week")
+        self.assertEqual(weekly["datetime"].dt.strftime("%Y-%m-%d").tolist(), ["2024-01-08", "2024-01-15"] * 2)
+        self.assertEqual(weekly["bars"].tolist(), [3 * 78, 4 * 78] * 2)
+
+    def test_incremental_cache_matches_full_resample(self):
+        """
+        Verifica que extender la caché por partes (cortando periodos a medias) equivale a remuestrear todo.
+        """
+        bars = pd.concat([base_bars(symbol, "2024-03-04", "2024-03-15 23:59", seed)
+                          for seed, symbol in enumerate(["AAPL", "MSFT"])])
+        bars = bars.sort_values("datetime", ignore_index=True)
+        cache = ResampleCache()
+        for chunk in np.array_split(np.arange(len(bars)), 7):
+            cache.update(bars.iloc[chunk])
+        self.assertEqual(cache.update(bars.iloc[-50:]), 0)  # Velas ya aplicadas
+        for timeframe in RESAMPLE_TIMEFRAMES:
+            expected = resample_bars(bars, timeframe)
+            pd.testing.assert_frame_equal(cache.get(timeframe), expected, check_dtype=False, obj=timeframe)
+        self.assertEqual(len(cache.get("30Min", symbols=["MSFT"], start="2024-03-15")), 13)
+
+    def test_update_from_db(self):
+        """
+        Verifica que la caché lee de la base de datos solo las velas posteriores a las aplicadas.
+        """
+        engine = create_engine("sqlite://")
+        create_intraday_table(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            bars = base_bars("AAPL", "2024-05-06", "2024-05-08")
+            write_intraday_bars(session, bars.iloc[:100])
+            session.commit()
+            cache = ResampleCache(timeframes=("15Min", "1Day"))
+            self.assertEqual(cache.update_from_db(session, ["AAPL"]), 100)
+            write_intraday_bars(session, bars.iloc[100:])
+            session.commit()
+            self.assertEqual(cache.update_from_db(session, ["AAPL"]), len(bars) - 100)
+            pd.testing.assert_frame_equal(cache.get("1Day"), resample_bars(bars, "1Day"), check_dtype=False)
+        finally:
+            session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
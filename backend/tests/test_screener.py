@@ -0,0 +1,134 @@
+import unittest
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from backend.app.db import get_db
+from backend.app.main import app
+from backend.app.routes import screener
+from backend.app.modules.intraday_storage import create_intraday_table, write_intraday_bars
+from backend.app.modules.market_calendar import expected_index
+from backend.app.modules.screener import UniverseSnapshot, compile_expression
+from backend.tests.utils import random_walk
+
+
+def universe_bars(symbols, start="2024-04-03", end="2024-05-08 23:59", seed=0):
+    """
+    Velas de 5 minutos de varios símbolos (25 sesiones). En la última sesión el volumen del
+    símbolo en la posición i se multiplica por i + 1.
+    """
+    times = pd.DatetimeIndex(expected_index(start, end)).tz_convert(None)
+    rng = np.random.default_rng(seed)
+    frames = []
+    for position, symbol in enumerate(symbols):
+        close = random_walk(rng, len(times), 0.002, drift=0.0002 * (position - 1), geometric=True)
+        volume = np.where(times >= pd.Timestamp("2024-05-08"), 1000.0 * (position + 1), 1000.0)
+        frames.append(pd.DataFrame({
+            "symbol": symbol, "timeframe": "5Min", "datetime": times, "open": close, "high": close * 1.001,
+            "low": close * 0.999, "close": close, "volume": volume, "trade_count": 10, "vwap": close,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+class TestScreener(unittest.TestCase):
+    """
+    Pruebas unitarias para el escáner del universo.
+    """
+    def test_expressions_are_validated(self):
+        """
+        Verifica que solo se admiten columnas, números, aritmética, comparaciones y funciones permitidas.
+        """
+        self.assertEqual(compile_expression("RSI_14 < 30 and session_volume > 3 * volume_avg_20d")[1],
+                         ("RSI_14", "session_volume", "volume_avg_20d"))
+        for expression in ["__import__('os').system('ls')", "close.__class__", "unknown > 1", "[close]",
+                           "close if close else 1", "abs(x=close)", "close <", "abs(close, volume) > 0",
+                           "min(close) > 0", "max(close, open, volume)", "abs()"]:
+            with self.assertRaises(ValueError, msg=expression):
+                compile_expression(expression)
+
+    def test_screen_filters_ranks_and_paginates(self):
+        """
+        Verifica el filtro, el orden por volumen relativo a la media de 20 sesiones, la paginación
+        y las columnas derivadas.
+        """
+        bars = universe_bars(["AAA", "BBB", "CCC", "DDD"])
+        snapshot = UniverseSnapshot()
+        self.assertEqual(snapshot.update(bars), len(bars))
+        result = snapshot.screen("relative_volume > 1.5", sort="relative_volume", limit=2)
+        self.assertEqual(result["total"], 3)
+        self.assertEqual([row["symbol"] for row in result["results"]], ["DDD", "CCC"])
+        self.assertAlmostEqual(result["results"][0]["relative_volume"], 4.0)
+        daily = snapshot.screen("volume_avg_20d > 0", columns=["volume_avg_20d", "bar_relative_volume"])["results"]
+        self.assertEqual({row["volume_avg_20d"] for row in daily}, {78 * 1000.0})
+        self.assertEqual({row["bar_relative_volume"] for row in daily}, {1.0})
+        page = snapshot.screen("relative_volume > 1.5", sort="relative_volume", offset=2, limit=2)
+        self.assertEqual([(row["rank"], row["symbol"]) for row in page["results"]], [(3, "BBB")])
+
+        aaa = bars[bars["symbol"] == "AAA"]
+        previous_close = aaa[aaa["datetime"] < "2024-05-08"]["close"].iloc[-1]
+        row = snapshot.screen("close > 0", sort="-change", descending=False, columns=["change", "RSI_14"])["results"]
+        expected = aaa["close"].iloc[-1] / previous_close - 1
+        self.assertAlmostEqual(next(item["change"] for item in row if item["symbol"] == "AAA"), expected)
+        with self.assertRaises(ValueError):
+            snapshot.screen(columns=["unknown"])
+
+    def test_incremental_update_matches_full_replay(self):
+        """
+        Verifica que aplicar las velas por partes (con velas repetidas) da la misma instantánea.
+        """
+        bars = universe_bars(["AAA", "BBB"])
+        full, partial = UniverseSnapshot(), UniverseSnapshot()
+        full.update(bars)
+        cut = bars["datetime"] < "2024-05-08 15:00"
+        partial.update(bars[cut])
+        self.assertEqual(partial.update(bars[bars["datetime"] >= "2024-05-08 14:00"]), (~cut).sum())
+        for name, values in full.columns.items():
+            np.testing.assert_allclose(partial.columns[name], values, equal_nan=True, err_msg=name)
+
+    def test_api_endpoint(self):
+        """
+        Verifica la ruta del escáner: refresco desde la base de datos, resultados y errores de la expresión.
+        """
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        create_intraday_table(engine)
+        Session = sessionmaker(bind=engine)
+        session = Session()
+        write_intraday_bars(session, universe_bars(["AAA", "BBB", "CCC"]))
+        session.commit()
+        session.close()
+
+        def override_get_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        screener.snapshot = UniverseSnapshot()
+        try:
+            client = TestClient(app)
+            response = client.get("/screener", params={"filter": "relative_volume > 1.5", "sort": "relative_volume"})
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertEqual(body["universe"], 3)
+            self.assertEqual([row["symbol"] for row in body["results"]], ["CCC", "BBB"])
+            # Media diaria inicializada con las sesiones anteriores a la historia reproducida
+            self.assertAlmostEqual(body["results"][0]["relative_volume"], 3.0)
+            self.assertEqual(body["as_of"], "2024-05-08T19:55:00")
+            self.assertEqual(client.get("/screener", params={"filter": "open(1)"}).status_code, 400)
+            volume = screener.snapshot.columns["volume"].copy()
+            self.assertEqual(client.get("/screener", params={"filter": "abs(close, volume) > 0"}).status_code, 400)
+            self.assertEqual(client.get("/screener", params={"filter": "min(close) > 0"}).status_code, 400)
+            np.testing.assert_array_equal(screener.snapshot.columns["volume"], volume)
+            self.assertEqual(client.get("/screener", params={"filter": "max(close, 0) > abs(-1)"}).json()["total"], 3)
+            self.assertEqual(client.get("/screener", params={"limit": 0}).status_code, 422)
+            self.assertIn("RSI_14", client.get("/screener/columns").json()["columns"])
+        finally:
+            app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import unittest
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.app.models import IndicatorState
+from backend.app.modules.indicators import indicator_panel
+from backend.app.modules.intraday_storage import create_intraday_table, write_intraday_bars
+from backend.app.modules.market_calendar import session_dates
+from backend.app.modules.streaming_indicators import IndicatorSet, apply_bars, update_indicator_states
+from backend.tests import utils
+
+
+def sample_bars(symbol="AAPL", periods=300, seed=3):
+    bars = utils.sample_bars(symbol, periods, seed, timeframe="5Min", trade_count=1)
+    return bars.assign(vwap=bars["close"])
+
+
+class TestStreamingIndicators(unittest.TestCase):
+    """
+    Pruebas unitarias para los indicadores incrementales y su persistencia.
+    """
+    def setUp(self):
+        self.bars = sample_bars()
+
+    def test_streaming_matches_batch_engine(self):
+        """
+        Verifica que, vela a vela, los indicadores incrementales coinciden con el cálculo vectorizado.
+        """
+        indicator_set = IndicatorSet()
+        streamed = []
+        for _, row in self.bars.iterrows():
+            streamed.append(dict(apply_bars(indicator_set, row.to_frame().T)))
+        streamed = pd.DataFrame(streamed)
+
+        sessions = session_dates(self.bars["datetime"]).astype("int64")
+        panel = indicator_panel(self.bars["high"], self.bars["low"], self.bars["close"], self.bars["volume"],
+                                sessions)
+        for name in streamed.columns:
+            np.testing.assert_allclose(streamed[name].to_numpy(float), panel[name], rtol=1e-9, atol=1e-9,
+                                       equal_nan=True, err_msg=name)
+
+    def test_checkpoint_round_trip_continues_identically(self):
+        """
+        Verifica que un estado guardado en JSON y restaurado continúa igual que sin interrupción.
+        """
+        uninterrupted = IndicatorSet()
+        apply_bars(uninterrupted, self.bars)
+
+        first = IndicatorSet()
+        apply_bars(first, self.bars.iloc[:150])
+        restored = IndicatorSet.from_state(json.loads(json.dumps(first.to_state())), first.last_datetime)
+        values = apply_bars(restored, self.bars.iloc[140:])  # El solapamiento se ignora
+
+        self.assertEqual(restored.last_datetime, uninterrupted.last_datetime)
+        for name, value in uninterrupted.values().items():
+            self.assertAlmostEqual(values[name], value, places=9, msg=name)
+
+    def test_update_persists_state_and_bootstraps_from_history(self):
+        """
+        Verifica que los símbolos sin estado se inicializan con la historia guardada y el estado queda en la BD.
+        """
+        engine = create_engine("sqlite://")
+        create_intraday_table(engine)
+        IndicatorState.__table__.create(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            write_intraday_bars(session, self.bars)
+            session.commit()
+
+            latest = update_indicator_states(session, self.bars.iloc[-5:])
+            session.commit()
+            expected = IndicatorSet()
+            apply_bars(expected, self.bars)
+            self.assertAlmostEqual(latest.loc["AAPL", "SMA_200"], expected.values()["SMA_200"], places=9)
+
+            following = sample_bars(periods=301).iloc[-1:]
+            update_indicator_states(session, following)
+            session.commit()
+            stored = session.query(IndicatorState).one()
+            self.assertEqual(stored.last_datetime, following["datetime"].iloc[0].to_pydatetime())
+        finally:
+            session.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from backend.app.modules.event_backtest import window_mask as tradable_mask
+from backend.app.modules.market_calendar import expected_index
+from backend.app.modules.time_windows import (
+    WINDOW_BITS, WINDOWS, TimeWindow, register_window, window_bits, window_flags, window_mask, window_names,
+)
+
+
+class TestTimeWindows(unittest.TestCase):
+    """
+    Pruebas unitarias para las franjas horarias.
+    """
+    def test_london_open_across_dst_gap(self):
+        """
+        Verifica la apertura de Londres antes, durante y después del desfase de horarios de marzo.
+        """
+        times = pd.DatetimeIndex(["2024-03-05 08:00", "2024-03-12 08:00", "2024-04-02 07:00", "2024-04-02 08:00"])
+        flags = window_flags(times)
+        self.assertEqual(window_mask(times, "london_open").tolist(), [True, True, True, False])
+        # El 12 de marzo Nueva York ya está en horario de verano y Londres no: 8:00 GMT son las 4:00 en Nueva York
+        self.assertEqual(window_names(flags[1]), ["premarket", "london_open", "london_session"])
+        self.assertEqual(window_names(flags[0]), ["london_open", "london_session"])
+
+    def test_anchored_windows_follow_early_closes(self):
+        """
+        Verifica que las franjas ancladas a la sesión siguen los cierres anticipados.
+        """
+        times = pd.DatetimeIndex(expected_index("2024-11-27", "2024-11-29 23:59")).tz_convert(None)
+        last_hour = times[window_mask(times, "ny_close")]
+        self.assertEqual(last_hour.strftime("%d %H:%M")[[0, 11, 12, 23]].tolist(),
+                         ["27 20:00", "27 20:55", "29 17:00", "29 17:55"])
+        self.assertTrue(window_mask(times, "regular").all())
+        self.assertEqual(window_mask(times, "ny_open").sum(), 2 * 12)
+
+    def test_bitwise_combination_matches_direct_masks(self):
+        """
+        Verifica que combinar bits equivale a combinar las máscaras calculadas franja a franja.
+        """
+        times = pd.date_range("2024-03-01", "2024-04-30", freq="5min")
+        flags = window_flags(times)
+        regular, london = WINDOW_BITS["regular"], WINDOW_BITS["london_session"]
+        overlap = (flags & (regular | london)) == (regular | london)
+        direct = TimeWindow("regular", ("open", 0), ("close", 0)).mask(times) \
+            & TimeWindow("london", "08:00", "16:30", tz="Europe/London", trading_days=False).mask(times)
+        np.testing.assert_array_equal(overlap, direct)
+        self.assertTrue(overlap.any())
+        np.testing.assert_array_equal(window_mask(times, ["regular"], exclude="ny_open"),
+                                      ((flags & regular) != 0) & ((flags & window_bits("ny_open")) == 0))
+
+    def test_custom_windows(self):
+        """
+        Verifica una franja propia que cruza la medianoche y el filtro del backtester por nombre y por horas.
+        """
+        # La franja de prueba se retira del registro global al terminar
+        for registry in (WINDOWS, WINDOW_BITS):
+            patcher = mock.patch.dict(registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        bit = register_window("asia_test", "20:00", "02:00", tz="Asia/Tokyo", trading_days=False)
+        times = pd.DatetimeIndex(["2024-06-03 10:55", "2024-06-03 11:00", "2024-06-03 16:55", "2024-06-03 17:00"])
+        self.assertEqual(((window_flags(times) & bit) != 0).tolist(), [False, True, True, False])
+
+        times = pd.DatetimeIndex(["2024-06-03 13:30", "2024-06-03 14:00", "2024-06-03 14:30", "2024-06-08 14:00"])
+        self.assertEqual(tradable_mask(times, "ny_open")[0].tolist(), [True, True, False, False])
+        self.assertEqual(tradable_mask(times, ("10:00", "10:30"))[0].tolist(), [False, True, False, False])
+        with self.assertRaises(ValueError):
+            TimeWindow("bad", ("noon", 0), "13:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
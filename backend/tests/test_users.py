@@ -1,5 +1,5 @@
 import unittest
-from app.main import app
+from backend.app.main import app
 from fastapi.testclient import TestClient
 
 client = TestClient(app)
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.app.modules import validate_and_clean_data
+from backend.app.modules.indicator_cache import IndicatorCache
+from backend.app.modules.intraday_storage import create_intraday_table
+from backend.app.modules.market_calendar import expected_index
+from backend.app.modules.validate_and_clean_data import validate_symbol, validate_symbols_parallel
+
+CRASH_MARKER = None  # Fichero que indica que el proceso de CRASH ya murió una vez
+
+
+def crash_once(symbol, store=None):
+    """Valida sin base de datos; el primer intento de CRASH mata el proceso y rompe el pool."""
+    if symbol == "CRASH" and not os.path.exists(CRASH_MARKER):
+        open(CRASH_MARKER, "w").close()
+        os._exit(1)
+    return {"Symbol": symbol, "Status": "Valid", "Message": "Data ready for backtesting", "Seconds": 0.0}
+
+
+def always_crash(symbol, store=None):
+    if symbol == "CRASH":
+        os._exit(1)
+    return crash_once(symbol, store)
+
+
+class TestValidateAndCleanData(unittest.TestCase):
+    """
+    Pruebas unitarias para la validación de símbolos, en serie y en paralelo.
+    """
+    def setUp(self):
+        global CRASH_MARKER
+        self.directory = tempfile.mkdtemp()
+        CRASH_MARKER = os.path.join(self.directory, "crashed")
+        self.engine = create_engine("sqlite://")
+        create_intraday_table(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        times = pd.DatetimeIndex(expected_index("2024-01-02", "2024-03-29")).tz_convert(None)
+        for symbol, close in (("GOOD", 100.0), ("BAD", -1.0)):
+            pd.DataFrame({
+                "symbol": symbol, "timeframe": "5Min", "datetime": times,
+                "open": 100.0, "high": 101.0, "low": 99.0, "close": close, "volume": 1000.0,
+                "trade_count": 10, "vwap": 100.0,
+            }).to_sql("sp500_intraday_data", self.engine, if_exists="append", index=False)
+        # Umbrales reducidos para no generar 18 meses de velas
+        for name, value in (("MIN_REQUIRED_BARS", 1000), ("MIN_DATE_RANGE_DAYS", 60),
+                            ("INDICATOR_CACHE", IndicatorCache(disk_dir=None))):
+            patcher = mock.patch.object(validate_and_clean_data, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_validate_symbol_rows(self):
+        """
+        Verifica la fila del reporte de un símbolo válido, uno con valores inválidos y uno sin datos.
+        """
+        rows = [validate_symbol(symbol, session=self.session) for symbol in ("GOOD", "BAD", "NONE")]
+        self.assertEqual([(row["Symbol"], row["Status"], row["Message"]) for row in rows], [
+            ("GOOD", "Valid", "Data ready for backtesting"),
+            ("BAD", "Invalid", "Invalid values in close"),
+            ("NONE", "Invalid", "No data"),
+        ])
+        for row in rows:
+            self.assertIsInstance(row["Seconds"], float)
+            self.assertGreaterEqual(row["Seconds"], 0.0)
+
+    def test_parallel_rows_follow_symbol_order(self):
+        """
+        Verifica que la validación en procesos devuelve una fila con `Seconds` por símbolo, en el
+        orden pedido y no en el de finalización.
+        """
+        symbols = ["ZZZ", "AAA", "MMM", "BBB"]
+        rows = validate_symbols_parallel(symbols, workers=2)
+        self.assertEqual([row["Symbol"] for row in rows], symbols)
+        for row in rows:
+            self.assertIsNotNone(row["Seconds"])
+
+    def test_broken_pool_resubmits_unfinished_symbols(self):
+        """
+        Verifica que si un proceso muere los símbolos sin terminar se validan en un pool nuevo.
+        """
+        symbols = ["AAA", "CRASH", "ZZZ", "MMM"]
+        with mock.patch.object(validate_and_clean_data, "validate_symbol", crash_once):
+            rows = validate_symbols_parallel(symbols, workers=2)
+        self.assertTrue(os.path.exists(CRASH_MARKER))
+        self.assertEqual([(row["Symbol"], row["Status"]) for row in rows], [(symbol, "Valid") for symbol in symbols])
+
+        with mock.patch.object(validate_and_clean_data, "validate_symbol", always_crash):
+            rows = validate_symbols_parallel(symbols, workers=2, restarts=1)
+        self.assertEqual([row["Symbol"] for row in rows], symbols)
+        crashed = rows[1]
+        self.assertEqual((crashed["Status"], crashed["Seconds"]), ("Error", None))
+        self.assertIn("Worker failure", crashed["Message"])
+
+
+if __name__ == "__main__":
+    unittest.main()
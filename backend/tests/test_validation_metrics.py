@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.app.modules import validation_metrics
+from backend.app.modules.intraday_storage import create_intraday_table, write_intraday_bars
+from backend.app.modules.validation_metrics import fetch_validation_metrics, verdict_from_metrics
+
+
+def bars(symbol, times, close=1.0):
+    return pd.DataFrame({
+        "symbol": symbol, "timeframe": "5Min", "datetime": pd.to_datetime(times),
+        "open": 1.0, "high": 1.0, "low": 1.0, "close": close, "volume": 10.0, "trade_count": 1, "vwap": 1.0,
+    })
+
+
+class TestValidationMetrics(unittest.TestCase):
+    """
+    Pruebas unitarias para la validación agregada en la base de datos.
+    """
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        create_intraday_table(engine)
+        self.session = sessionmaker(bind=engine)()
+        data = pd.concat([
+            # Dos sesiones separadas más de 18 meses, más una vela nocturna que no cuenta
+            bars("AAPL", ["2022-01-03 14:30", "2022-01-03 14:35", "2023-09-05 13:30", "2023-09-05 23:00"]),
+            bars("MSFT", ["2024-01-02 14:30", "2024-01-02 14:35"]),
+            bars("XOM", ["2022-01-03 14:30", "2023-09-05 13:30"], close=[1.0, -1.0]),
+            bars("NITE", ["2024-01-02 23:00"]),
+        ], ignore_index=True)
+        write_intraday_bars(self.session, data)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def verdicts(self, **kwargs):
+        metrics = fetch_validation_metrics(self.session, **kwargs).set_index("symbol")
+        return {
+            symbol: verdict_from_metrics(metrics.loc[symbol] if symbol in metrics.index else None, symbol)
+            for symbol in ("AAPL", "MSFT", "XOM", "NITE")
+        }
+
+    def test_aggregates_only_session_bars(self):
+        """
+        Verifica el recuento y las marcas de valores inválidos restringidos a sesión regular.
+        """
+        metrics = fetch_validation_metrics(self.session).set_index("symbol")
+        self.assertEqual(metrics.loc["AAPL", "bars"], 3)
+        self.assertEqual(metrics.loc["AAPL", "max_datetime"], pd.Timestamp("2023-09-05 13:30"))
+        self.assertEqual(metrics.loc["XOM", "invalid_close"], 1)
+        self.assertNotIn("NITE", metrics.index)
+        self.assertEqual(fetch_validation_metrics(self.session, regular_hours=False)
+                         .set_index("symbol").loc["AAPL", "bars"], 4)
+
+    def test_verdicts_match_pandas_validation_messages(self):
+        """
+        Verifica los mismos veredictos y mensajes que `validate_data_quality`.
+        """
+        self.assertEqual(self.verdicts(), {
+            "AAPL": (False, "Insufficient bars"),
+            "MSFT": (False, "Insufficient date range"),
+            "XOM": (False, "Insufficient bars"),
+            "NITE": (False, "No data in NYSE trading hours"),
+        })
+        with mock.patch.object(validation_metrics, "MIN_REQUIRED_BARS", 2):
+            verdicts = self.verdicts()
+        self.assertEqual(verdicts["AAPL"], (True, "Data valid"))
+        self.assertEqual(verdicts["XOM"], (False, "Invalid values in close"))
+
+if __name__ == "__main__":
+    unittest.main()
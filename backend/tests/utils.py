@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from backend.app.modules.market_calendar import expected_index
+
+# Generadores de precios sintéticos compartidos por las pruebas. Todos reciben la semilla (o
+# el generador) de quien llama, de modo que cada prueba sigue siendo reproducible.
+
+
+def random_walk(rng, shape, sigma=1.0, drift=0.0, start=100.0, geometric=False):
+    """
+    Paseo aleatorio a lo largo del último eje de `shape` a partir de `start`.
+
+    Con `geometric` los pasos son rendimientos logarítmicos (precios siempre positivos); sin
+    él son incrementos absolutos.
+    """
+    steps = rng.normal(drift, sigma, shape)
+    if geometric:
+        return start * np.exp(np.cumsum(steps, axis=-1))
+    return start + np.cumsum(steps, axis=-1)
+
+
+def random_open_close(symbols=3, bars=2000, seed=0, drift=0.0):
+    """Matrices símbolos x velas de apertura y cierre: la apertura es el cierre anterior con ruido."""
+    rng = np.random.default_rng(seed)
+    close = random_walk(rng, (symbols, bars), 0.003, drift, geometric=True)
+    open_ = np.roll(close, 1, axis=1) * (1 + rng.normal(0, 0.0005, (symbols, bars)))
+    open_[:, 0] = close[:, 0]
+    return open_, close
+
+
+def sample_bars(symbol="AAPL", periods=400, seed=5, **columns):
+    """
+    Velas de 5 minutos de sesión regular desde el 2 de enero de 2024 (UTC sin zona), con
+    máximo y mínimo aleatorios alrededor del cierre. `columns` añade columnas constantes.
+    """
+    rng = np.random.default_rng(seed)
+    close = random_walk(rng, periods)
+    return pd.DataFrame({
+        "symbol": symbol,
+        "datetime": expected_index("2024-01-02", "2024-02-29")[:periods].tz_localize(None),
+        "open": close, "high": close + rng.uniform(0, 1, periods), "low": close - rng.uniform(0, 1, periods),
+        "close": close, "volume": rng.uniform(100, 1000, periods),
+    }).assign(**columns)